@@ -0,0 +1,214 @@
+# src/catalog_subscriptions.py
+
+"""
+Catalog subscription table
+
+Platforms that SUBSCRIBE to the Catalog event are kept here with their
+dialog, event ID and expiry, so catalog changes can be sent to each of
+them as a NOTIFY:
+
+- expiry timers live in a hashed timer wheel, so a refresh or an
+  unsubscribe is O(1) and one tick only looks at one slot
+- channel changes are coalesced for coalesce_window seconds, then every
+  subscriber gets a single NOTIFY with everything it has not seen yet
+  (merged by CatalogTracker.changes_since)
+- expired subscriptions get a final NOTIFY with Subscription-State terminated
+
+Sending is left to the owner through the send callback, which goes out
+over the shared SIP transport. Settings come from config["sip"]["catalog"].
+"""
+
+import math
+import threading
+import time
+
+from logger import log
+
+
+class TimerWheel:
+    """Hashed timer wheel keyed by an arbitrary hashable key"""
+
+    def __init__(self, tick=1.0, slots=256, now=None):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # key -> deadline
+        self.where = {}  # key -> slot index
+        self.current = int((time.monotonic() if now is None else now) / tick)
+
+    def schedule(self, key, deadline):
+        """(Re)arm the timer of key; a key has at most one timer"""
+        self.cancel(key)
+        tick = max(math.ceil(deadline / self.tick), self.current + 1)
+        index = tick % len(self.slots)
+        self.slots[index][key] = deadline
+        self.where[key] = index
+
+    def cancel(self, key):
+        index = self.where.pop(key, None)
+        if index is not None:
+            self.slots[index].pop(key, None)
+
+    def advance(self, now):
+        """Move the wheel up to now and return the keys whose deadline has passed"""
+        target = int(now / self.tick)
+        steps = min(target - self.current, len(self.slots))
+        expired = []
+        for step in range(1, steps + 1):
+            slot = self.slots[(self.current + step) % len(self.slots)]
+            for key, deadline in list(slot.items()):
+                if deadline <= now:  # timers for later rounds stay in the slot
+                    del slot[key]
+                    del self.where[key]
+                    expired.append(key)
+        self.current = max(self.current, target)
+        return expired
+
+    def __len__(self):
+        return len(self.where)
+
+
+class SubscriptionManager:
+    """Catalog subscriptions with expiry and coalesced per-subscriber NOTIFYs"""
+
+    def __init__(self, config, tracker, send):
+        """
+        Args:
+            config (dict): Application config
+            tracker (CatalogTracker): Source of catalog versions and merged changes
+            send (callable): send(subscription, events, state) -> bool; events is None
+                when the subscriber is too far behind for a delta and needs the full catalog
+        """
+        catalog_config = (config or {}).get("sip", {}).get("catalog", {})
+        self.default_expires = catalog_config.get("subscription_expires", 3600)
+        self.max_expires = catalog_config.get("max_subscription_expires", 86400)
+        self.coalesce_window = catalog_config.get("coalesce_window", 1.0)
+        self.tracker = tracker
+        self.send = send
+
+        self.subscriptions = {}  # Call-ID -> subscription dict
+        self.wheel = TimerWheel(tick=1.0)
+        self._flush_at = None
+        self._cond = threading.Condition()
+        self.running = False
+        self._thread = None
+        self.stats = {"notifies": 0, "failed": 0, "expired": 0, "coalesced": 0}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="catalog-subscriptions")
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def subscribe(self, call_id, dialog, expires=None):
+        """Add or refresh a subscription
+
+        Args:
+            call_id (str): Call-ID of the SUBSCRIBE dialog
+            dialog (dict): remote_uri, from_header, to_header and event for the NOTIFYs
+            expires (int): Requested Expires; 0 ends the subscription
+
+        Returns:
+            int: Granted expiry in seconds (0 when the subscription ended)
+        """
+        expires = self.default_expires if expires is None else min(int(expires), self.max_expires)
+        if expires <= 0:
+            self.unsubscribe(call_id)
+            return 0
+
+        with self._cond:
+            subscription = self.subscriptions.get(call_id)
+            if subscription is None:
+                subscription = {"call_id": call_id, "cseq": 0, "version": self.tracker.version}
+                self.subscriptions[call_id] = subscription
+                log.info(f"[CATALOG] 📋 New catalog subscription {call_id} for {expires}s")
+            else:
+                log.debug(f"[CATALOG] Catalog subscription {call_id} refreshed for {expires}s")
+            subscription.update(dialog)
+            subscription["expires_at"] = time.monotonic() + expires
+            self.wheel.schedule(call_id, subscription["expires_at"])
+        return expires
+
+    def unsubscribe(self, call_id):
+        """Drop a subscription (Expires: 0); returns whether it existed"""
+        with self._cond:
+            self.wheel.cancel(call_id)
+            removed = self.subscriptions.pop(call_id, None) is not None
+        if removed:
+            log.info(f"[CATALOG] 📋 Catalog subscription {call_id} ended")
+        return removed
+
+    def publish(self, events):
+        """Queue catalog changes; subscribers are notified once the coalesce window closes"""
+        if not events:
+            return
+        with self._cond:
+            if not self.subscriptions:
+                return
+            if self._flush_at is None:
+                self._flush_at = time.monotonic() + self.coalesce_window
+                self._cond.notify_all()
+            else:
+                self.stats["coalesced"] += len(events)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self.running:
+                    return
+                now = time.monotonic()
+                timeout = self.wheel.tick
+                if self._flush_at is not None:
+                    timeout = min(timeout, max(0.0, self._flush_at - now))
+                self._cond.wait(timeout)
+                if not self.running:
+                    return
+
+                now = time.monotonic()
+                expired = [self.subscriptions.pop(call_id) for call_id in self.wheel.advance(now)
+                           if call_id in self.subscriptions]
+                flush = self._flush_at is not None and now >= self._flush_at
+                if flush:
+                    self._flush_at = None
+                    subscriptions = list(self.subscriptions.values())
+
+            for subscription in expired:
+                self.stats["expired"] += 1
+                log.info(f"[CATALOG] ⏰ Catalog subscription {subscription['call_id']} expired")
+                self._notify(subscription, [], "terminated;reason=timeout")
+            if flush:
+                self.flush(subscriptions)
+
+    def flush(self, subscriptions=None):
+        """Send every subscriber one NOTIFY with the changes it has not seen yet"""
+        if subscriptions is None:
+            with self._cond:
+                subscriptions = list(self.subscriptions.values())
+        version = self.tracker.version
+        for subscription in subscriptions:
+            pending = self.tracker.changes_since(subscription["version"])
+            if pending == []:
+                continue
+            remaining = max(0, int(subscription["expires_at"] - time.monotonic()))
+            if self._notify(subscription, pending, f"active;expires={remaining}"):
+                subscription["version"] = version
+
+    def _notify(self, subscription, events, state):
+        subscription["cseq"] += 1
+        try:
+            sent = self.send(subscription, events, state)
+        except Exception as e:
+            log.error(f"[CATALOG] ❌ Error sending catalog NOTIFY to {subscription['call_id']}: {e}")
+            sent = False
+        self.stats["notifies" if sent else "failed"] += 1
+        return sent
+
+    def get_stats(self):
+        with self._cond:
+            return {**self.stats, "subscriptions": len(self.subscriptions)}
@@ -0,0 +1,150 @@
+# src/catalog_tracker.py
+
+"""
+Catalog versioning and change events
+
+The platform used to learn about catalog changes only from a full catalog
+sent every 60 seconds, whether anything had changed or not. The tracker
+keeps the last catalog it has seen and a version number, and turns every
+new snapshot into GB28181 catalog events for the channels that changed:
+
+- ADD / DEL for channels that appear or disappear
+- ON / OFF when only the Status of a channel changed
+- UPDATE when any other platform-visible field changed
+
+A short history of versions is kept so that the changes since a given
+version can be replayed as one merged batch. Settings come from
+config["sip"]["catalog"].
+"""
+
+import threading
+from collections import deque
+
+from logger import log
+
+# Event types of a GB28181 catalog change notification
+CATALOG_EVENTS = ("ADD", "DEL", "ON", "OFF", "UPDATE")
+
+# Channel fields the platform sees; internal ones (rtsp_url, video_path, ...) are ignored
+TRACKED_FIELDS = ("name", "manufacturer", "model", "parent_id", "status")
+
+
+def merge_events(events):
+    """Collapse a sequence of catalog events to at most one per channel
+
+    ADD followed by later changes stays ADD with the latest fields, ADD
+    followed by DEL cancels out, and anything else keeps the latest event.
+
+    Args:
+        events (list): Events in the order they happened
+
+    Returns:
+        list: Merged events, in order of each channel's first event
+    """
+    merged = {}
+    for event in events:
+        channel_id = event["channel_id"]
+        previous = merged.get(channel_id)
+        if previous and previous["event"] == "ADD":
+            if event["event"] == "DEL":
+                del merged[channel_id]
+                continue
+            event = {**event, "event": "ADD"}
+        elif previous and previous["event"] == "DEL" and event["event"] == "ADD":
+            event = {**event, "event": "UPDATE"}
+        merged[channel_id] = event
+    return list(merged.values())
+
+
+class CatalogTracker:
+    """Versioned view of the device catalog that reports per-channel changes"""
+
+    def __init__(self, config):
+        catalog_config = (config or {}).get("sip", {}).get("catalog", {})
+        self.version = 0
+        self.channels = {}  # channel_id -> tracked fields
+        self.history = deque(maxlen=catalog_config.get("history", 32))  # (version, events)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _visible(channel_info):
+        return {field: channel_info.get(field) for field in TRACKED_FIELDS}
+
+    def _record(self, events):
+        self.version += 1
+        self.history.append((self.version, events))
+        log.info(f"[CATALOG] 📋 Catalog version {self.version}: " +
+                 ", ".join(f"{e['channel_id']} {e['event']}" for e in events))
+
+    def update(self, catalog):
+        """Compare a freshly generated catalog with the previous one
+
+        The first snapshot only sets the baseline (version 1) and yields no events.
+
+        Args:
+            catalog (dict): channel_id -> channel info, as in SIPClient.device_catalog
+
+        Returns:
+            list: Change events ({"channel_id", "event", "info"}), empty if nothing changed
+        """
+        current = {channel_id: self._visible(info) for channel_id, info in catalog.items()}
+        with self._lock:
+            if self.version == 0:
+                self.channels = current
+                self.version = 1
+                return []
+
+            events = []
+            for channel_id, info in current.items():
+                previous = self.channels.get(channel_id)
+                if previous is None:
+                    events.append({"channel_id": channel_id, "event": "ADD", "info": info})
+                elif previous != info:
+                    status_only = {**previous, "status": info["status"]} == info
+                    if status_only and info["status"] in ("ON", "OFF"):
+                        events.append({"channel_id": channel_id, "event": info["status"], "info": info})
+                    else:
+                        events.append({"channel_id": channel_id, "event": "UPDATE", "info": info})
+            for channel_id, info in self.channels.items():
+                if channel_id not in current:
+                    events.append({"channel_id": channel_id, "event": "DEL", "info": info})
+
+            self.channels = current
+            if events:
+                self._record(events)
+            return events
+
+    def set_status(self, channel_id, status):
+        """Record a Status change of a single channel (ON or OFF)
+
+        Returns:
+            list: The ON/OFF event, or empty if the channel is unknown or unchanged
+        """
+        with self._lock:
+            info = self.channels.get(channel_id)
+            if info is None or info["status"] == status:
+                return []
+            info = {**info, "status": status}
+            self.channels[channel_id] = info
+            events = [{"channel_id": channel_id, "event": status, "info": info}]
+            self._record(events)
+            return events
+
+    def changes_since(self, version):
+        """Merged events after the given version
+
+        Returns:
+            list: Events to bring a catalog of that version up to date, or None
+            if the history no longer reaches back that far (send the full catalog)
+        """
+        with self._lock:
+            if version >= self.version:
+                return []
+            if not self.history or self.history[0][0] > version + 1:
+                return None
+            events = [event for v, batch in self.history if v > version for event in batch]
+        return merge_events(events)
+
+    def get_stats(self):
+        with self._lock:
+            return {"version": self.version, "channels": len(self.channels), "history": len(self.history)}
@@ -0,0 +1,217 @@
+# src/encoder_governor.py
+
+"""
+Encoder admission control
+
+Every live or playback session runs its own x264enc, so without a limit
+an overloaded host degrades every stream at once. The governor keeps an
+encode budget in CPU cores and decides per new session, before its pipeline
+is built:
+
+- the cost of a session is estimated from its preset and pixel rate
+  (width * height * framerate), using cores per megapixel/s per preset
+- when host CPU is above cpu_high, or the session would push the committed
+  budget past soft_limit, the new session is stepped down the ladder:
+  cheaper presets first, then lower resolutions with a matching bitrate
+- if not even the cheapest step fits the budget the call is rejected with
+  486 Busy Here; above cpu_max it is rejected with 503 Service Unavailable
+- sessions already running are never touched
+
+Settings come from config["media"]["admission"].
+"""
+
+import os
+import threading
+import time
+
+from logger import log
+
+# Cores needed per megapixel/s of 8-bit 4:2:0 H.264 for each x264 preset
+# (704x576@25 at superfast is ~0.35 core on a current x86 core)
+PRESET_COST = {
+    "ultrafast": 0.025,
+    "superfast": 0.035,
+    "veryfast": 0.05,
+    "faster": 0.07,
+    "fast": 0.09,
+    "medium": 0.12,
+    "slow": 0.18
+}
+
+# Resolutions to fall back to, largest first (1080p, 720p, D1, 360p, CIF, QCIF)
+RESOLUTION_STEPS = [(1920, 1080), (1280, 720), (704, 576), (640, 360), (352, 288), (176, 144)]
+
+# Same defaults MediaStreamer uses for keys missing from encoder_params
+ENCODER_DEFAULTS = {"width": 704, "height": 576, "framerate": 25, "bitrate": 1024, "speed_preset": "medium"}
+
+
+class EncoderGovernor:
+    """Encode budget, host CPU tracking and admission decisions for new sessions"""
+
+    def __init__(self, config):
+        admission_config = (config or {}).get("media", {}).get("admission", {})
+        self.enabled = admission_config.get("enabled", True)
+        cores = os.cpu_count() or 1
+        self.budget = admission_config.get("budget_cores", cores * admission_config.get("budget_fraction", 0.8))
+        self.soft_limit = admission_config.get("soft_limit", 0.7)
+        self.cpu_high = admission_config.get("cpu_high", 0.75)
+        self.cpu_max = admission_config.get("cpu_max", 0.95)
+        self.min_preset = admission_config.get("min_preset", "ultrafast")
+        self.min_height = admission_config.get("min_height", 288)
+        self.preset_cost = {**PRESET_COST, **admission_config.get("preset_cost", {})}
+
+        self.sessions = {}  # session_id -> {"cost", "params", "degraded"}
+        self._lock = threading.Lock()
+        self._cpu_sample = None  # (time, busy, total) from /proc/stat
+        self._cpu_load = 0.0
+        self.stats = {"admitted": 0, "degraded": 0, "rejected_busy": 0, "rejected_overload": 0}
+
+    def estimate_cost(self, params):
+        """Cores an encoder with these parameters is expected to use"""
+        params = {**ENCODER_DEFAULTS, **(params or {})}
+        per_mpixel = self.preset_cost.get(params["speed_preset"], self.preset_cost["medium"])
+        pixel_rate = params["width"] * params["height"] * params["framerate"] / 1e6
+        return per_mpixel * pixel_rate
+
+    def host_cpu(self):
+        """Host CPU busy fraction since the previous sample (0.0 - 1.0)"""
+        now = time.time()
+        if self._cpu_sample and now - self._cpu_sample[0] < 0.5:
+            return self._cpu_load
+        try:
+            with open("/proc/stat") as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+            total = sum(fields)
+            if self._cpu_sample and total > self._cpu_sample[2]:
+                busy = (total - idle) - self._cpu_sample[1]
+                self._cpu_load = busy / (total - self._cpu_sample[2])
+            self._cpu_sample = (now, total - idle, total)
+        except (OSError, ValueError, IndexError):
+            self._cpu_load = os.getloadavg()[0] / (os.cpu_count() or 1)
+            self._cpu_sample = (now, 0, 0)
+        return self._cpu_load
+
+    def committed(self):
+        """Cores committed to running sessions"""
+        return sum(session["cost"] for session in self.sessions.values())
+
+    def _ladder(self, params):
+        """Candidate parameter sets, requested first, then ever cheaper ones"""
+        params = {**ENCODER_DEFAULTS, **params}
+        presets = list(PRESET_COST)
+        start = presets.index(params["speed_preset"]) if params["speed_preset"] in presets else presets.index("medium")
+        floor = presets.index(self.min_preset) if self.min_preset in presets else 0
+
+        steps = [dict(params)]
+        for preset in reversed(presets[floor:start]):
+            steps.append({**params, "speed_preset": preset})
+
+        cheapest = steps[-1]
+        for width, height in RESOLUTION_STEPS:
+            if height >= params["height"] or height < self.min_height:
+                continue
+            scale = (width * height) / (params["width"] * params["height"])
+            steps.append({**cheapest, "width": width, "height": height,
+                          "bitrate": max(128, int(params["bitrate"] * scale))})
+        return steps
+
+    def admit(self, session_id, params):
+        """Decide whether a new session may start, and with which encoder parameters
+
+        Args:
+            session_id (str): Call-ID or stream ID the budget is booked under
+            params (dict): Requested encoder parameters
+
+        Returns:
+            dict: status (200, 486 or 503), reason, params to use, cost and degraded flag
+        """
+        params = dict(params or {})
+        if not self.enabled:
+            return {"status": 200, "reason": "OK", "params": params, "cost": 0.0, "degraded": False}
+
+        cpu = self.host_cpu()
+        with self._lock:
+            if session_id in self.sessions:
+                session = self.sessions[session_id]
+                return {"status": 200, "reason": "OK", "params": session["params"], "cost": session["cost"],
+                        "degraded": session["degraded"]}
+
+            if cpu >= self.cpu_max:
+                self.stats["rejected_overload"] += 1
+                log.warning(f"[ADMISSION] ❌ Rejecting {session_id}: host CPU at {cpu:.0%}")
+                return {"status": 503, "reason": "Service Unavailable", "params": params, "cost": 0.0,
+                        "degraded": False}
+
+            committed = self.committed()
+            steps = self._ladder(params)
+            requested = steps[0]
+            # Under pressure new sessions start at least one step down
+            if cpu >= self.cpu_high or committed + self.estimate_cost(requested) > self.budget * self.soft_limit:
+                steps = steps[1:] or steps
+
+            for step in steps:
+                cost = self.estimate_cost(step)
+                if committed + cost <= self.budget:
+                    break
+            else:
+                self.stats["rejected_busy"] += 1
+                log.warning(f"[ADMISSION] ❌ Rejecting {session_id}: encoder budget saturated "
+                            f"({committed:.2f}/{self.budget:.2f} cores)")
+                return {"status": 486, "reason": "Busy Here", "params": params, "cost": 0.0, "degraded": False}
+
+            degraded = step is not requested
+            chosen = params if not degraded else {
+                **params, **{key: step[key] for key in ("speed_preset", "width", "height", "bitrate")}}
+            self.sessions[session_id] = {"cost": cost, "params": chosen, "degraded": degraded}
+            self.stats["admitted"] += 1
+            if degraded:
+                self.stats["degraded"] += 1
+
+        if degraded:
+            log.info(f"[ADMISSION] ⚠️ {session_id} stepped down to {chosen['speed_preset']} "
+                     f"{chosen['width']}x{chosen['height']} @ {chosen['bitrate']} kbps "
+                     f"(CPU {cpu:.0%}, {committed + cost:.2f}/{self.budget:.2f} cores)")
+        else:
+            log.info(f"[ADMISSION] ✅ {session_id} admitted ({cost:.2f} cores, "
+                     f"{committed + cost:.2f}/{self.budget:.2f} committed)")
+        return {"status": 200, "reason": "OK", "params": chosen, "cost": cost, "degraded": degraded}
+
+    def release(self, session_id):
+        """Give a finished session's budget back"""
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def transfer(self, session_id, new_session_id):
+        """Book a running session's budget under another ID (its encoder now serves that session)"""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.sessions[new_session_id] = session
+            return session is not None
+
+    def get_stats(self):
+        with self._lock:
+            committed = self.committed()
+            sessions = len(self.sessions)
+        return {
+            **self.stats,
+            "sessions": sessions,
+            "committed_cores": round(committed, 2),
+            "budget_cores": round(self.budget, 2),
+            "host_cpu": round(self._cpu_load, 2)
+        }
+
+
+# Global instance
+_encoder_governor = None
+
+
+def get_encoder_governor(config=None):
+    """Get or create the shared EncoderGovernor instance"""
+    global _encoder_governor
+
+    if _encoder_governor is None:
+        _encoder_governor = EncoderGovernor(config)
+
+    return _encoder_governor
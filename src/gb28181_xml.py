@@ -207,6 +207,55 @@ def format_media_status_response(device_id, stream_info):
 """
     return xml_template
 
+def format_media_status_notify(device_id, sn=None):
+    """Format a MediaStatus notify (NotifyType 121, end of file) sent when a playback or download finishes"""
+    if sn is None:
+        sn = str(int(datetime.now().timestamp()))
+        
+    xml_template = f"""<?xml version="1.0" encoding="UTF-8"?>
+<Notify>
+  <CmdType>MediaStatus</CmdType>
+  <SN>{sn}</SN>
+  <DeviceID>{device_id}</DeviceID>
+  <NotifyType>121</NotifyType>
+</Notify>
+"""
+    return xml_template
+
+def format_catalog_notify(device_id, events, sn=None):
+    """Format a catalog change Notify listing only the channels that changed
+
+    ADD and UPDATE items carry the channel fields, ON, OFF and DEL items
+    only the DeviceID and Event.
+    """
+    if sn is None:
+        sn = str(int(datetime.now().timestamp()))
+
+    items = []
+    for event in events:
+        item = f"<Item><DeviceID>{event['channel_id']}</DeviceID><Event>{event['event']}</Event>"
+        if event["event"] in ("ADD", "UPDATE"):
+            info = event.get("info") or {}
+            item += (f"<Name>{info.get('name') or 'Channel'}</Name>"
+                     f"<Manufacturer>{info.get('manufacturer') or 'GB28181-Restreamer'}</Manufacturer>"
+                     f"<Model>{info.get('model') or 'Camera'}</Model>"
+                     f"<Status>{info.get('status') or 'ON'}</Status>"
+                     f"<Parental>1</Parental><ParentID>{info.get('parent_id') or device_id}</ParentID>")
+        items.append(f"    {item}</Item>")
+
+    items_xml = "\n".join(items)
+    xml_template = f"""<?xml version="1.0" encoding="GB2312"?>
+<Notify>
+<CmdType>Catalog</CmdType>
+<SN>{sn}</SN>
+<DeviceID>{device_id}</DeviceID>
+<SumNum>{len(events)}</SumNum>
+<DeviceList Num="{len(events)}">
+{items_xml}
+</DeviceList>
+</Notify>"""
+    return xml_template
+
 def format_recordinfo_response(device_id, records, sn=None):
     """Format a RecordInfo response XML according to GB28181 standard"""
     if sn is None:
@@ -254,6 +303,111 @@ def format_record_item(record):
     </Item>
 """
 
+# MANSCDP root elements, used to find the body of a raw SIP message
+MANSCDP_ROOTS = ("Query", "Control", "Response", "Notify")
+
+# Commands whose body is needed beyond CmdType/SN/DeviceID, so they get a full ElementTree
+MANSCDP_TREE_COMMANDS = ("RecordInfo", "DeviceControl")
+
+
+def _element_text(xml, tag, start=0):
+    """Text of the first <tag>...</tag> at or after start, without parsing the document"""
+    open_tag = f"<{tag}>"
+    begin = xml.find(open_tag, start)
+    if begin < 0:
+        return ""
+    begin += len(open_tag)
+    end = xml.find("<", begin)
+    return xml[begin:end].strip() if end >= 0 else ""
+
+
+def scan_manscdp(message_text):
+    """Single-pass scan of a MANSCDP body (or a whole SIP message carrying one)
+
+    Finds the root element and reads CmdType, SN and DeviceID with plain
+    string searches, which is all that keepalives, catalog and device info
+    queries need.
+
+    Args:
+        message_text (str): MANSCDP XML, with or without declaration and SIP headers
+
+    Returns:
+        dict: root, cmd_type, sn, device_id and xml (the body from its root element),
+        or None if there is no MANSCDP body
+    """
+    if not message_text:
+        return None
+
+    start = message_text.find("<?xml")
+    if start >= 0:
+        start = message_text.find("?>", start) + 2
+    else:
+        positions = [message_text.find(f"<{root}") for root in MANSCDP_ROOTS]
+        positions = [position for position in positions if position >= 0]
+        if not positions:
+            return None
+        start = min(positions)
+
+    # Skip whitespace and comments up to the root element
+    while True:
+        start = message_text.find("<", start)
+        if start < 0:
+            return None
+        if not message_text.startswith("<!--", start):
+            break
+        start = message_text.find("-->", start) + 3
+
+    name_end = start + 1
+    while name_end < len(message_text) and message_text[name_end] not in " \t\r\n/>":
+        name_end += 1
+    root = message_text[start + 1:name_end]
+
+    xml = message_text[start:]
+    close_tag = f"</{root}>"
+    end = xml.find(close_tag)
+    if end >= 0:
+        xml = xml[:end + len(close_tag)]
+
+    return {
+        "root": root,
+        "cmd_type": _element_text(xml, "CmdType"),
+        "sn": _element_text(xml, "SN"),
+        "device_id": _element_text(xml, "DeviceID"),
+        "xml": xml
+    }
+
+
+def parse_manscdp(message_text):
+    """Parse a MANSCDP message once for dispatch
+
+    Simple messages only get the fields from scan_manscdp; RecordInfo and
+    DeviceControl are also parsed with ElementTree (as "tree") and get their
+    command-specific fields. Handlers receive this dict so nothing is parsed twice.
+
+    Returns:
+        dict: Parsed message or None if there is no MANSCDP body or the body is malformed
+    """
+    message = scan_manscdp(message_text)
+    if message is None or message["cmd_type"] not in MANSCDP_TREE_COMMANDS:
+        return message
+
+    try:
+        # Some implementations send a namespace ElementTree would prefix every tag with
+        root = ET.fromstring(message["xml"].replace('xmlns="http://www.chinamobile.com/wvmp"', ''))
+    except ET.ParseError as e:
+        log.error(f"[XML] Malformed {message['cmd_type']} message: {e}")
+        return None
+
+    message["tree"] = root
+    if message["cmd_type"] == "RecordInfo":
+        message.setdefault("start_time", None)
+        message.setdefault("end_time", None)
+        parse_record_info_query(message, root)
+    elif message["cmd_type"] == "DeviceControl":
+        parse_device_control(message, root)
+    return message
+
+
 def parse_xml_message(message_text):
     """Parse a GB28181 XML message
     
@@ -263,45 +417,21 @@ def parse_xml_message(message_text):
     Returns:
         dict: Parsed message content or None if parsing failed
     """
-    try:
-        # Extract XML content from SIP message
-        xml_match = re.search(r'<\?xml.*<\/Response>', message_text, re.DOTALL)
-        if not xml_match:
-            log.warning("[XML] Could not extract XML from message")
-            return None
-            
-        xml_content = xml_match.group(0)
-        root = ET.fromstring(xml_content)
-        
-        # Parse common fields
-        cmd_type = root.find('CmdType').text if root.find('CmdType') is not None else ""
-        device_id = root.find('DeviceID').text if root.find('DeviceID') is not None else ""
-        sn = root.find('SN').text if root.find('SN') is not None else ""
-        
-        # Create base result
-        result = {
-            'cmd_type': cmd_type,
-            'device_id': device_id,
-            'sn': sn
-        }
-        
-        # Process based on command type
-        if cmd_type == "Catalog":
-            parse_catalog_query(result, root)
-        elif cmd_type == "DeviceInfo":
-            parse_device_info_query(result, root)
-        elif cmd_type == "DeviceStatus":
-            parse_device_status_query(result, root)
-        elif cmd_type == "Keepalive":
-            parse_keepalive(result, root)
-        elif cmd_type == "RecordInfo":
-            parse_record_info_query(result, root)
-        
-        return result
-    except Exception as e:
-        log.error(f"[XML] Error parsing XML message: {e}")
+    message = parse_manscdp(message_text)
+    if message is None:
+        log.warning("[XML] Could not extract XML from message")
         return None
 
+    result = {
+        'cmd_type': message['cmd_type'],
+        'device_id': message['device_id'],
+        'sn': message['sn']
+    }
+    for key in ('start_time', 'end_time', 'commands'):
+        if key in message:
+            result[key] = message[key]
+    return result
+
 def parse_catalog_query(result, root):
     """Parse a catalog query"""
     # No special fields for catalog query
@@ -322,6 +452,12 @@ def parse_keepalive(result, root):
     # No special fields for keepalive
     return result
 
+def parse_device_control(result, root):
+    """Parse a device control command (PTZCmd, RecordCmd, GuardCmd, TeleBoot, ...)"""
+    result['commands'] = {child.tag: (child.text or "").strip() for child in root
+                          if child.tag not in ("CmdType", "SN", "DeviceID")}
+    return result
+
 def parse_record_info_query(result, root):
     """Parse a record info query"""
     try:
@@ -348,51 +484,20 @@ def parse_recordinfo_query(message_text):
     Returns:
         dict: Parsed query parameters or None if parsing failed
     """
-    try:
-        # Extract XML content from SIP message
-        xml_match = re.search(r'<\?xml.*<\/Query>', message_text, re.DOTALL)
-        if not xml_match:
-            log.warning("[XML] Could not extract RecordInfo XML from message")
-            return None
+    message = parse_manscdp(message_text)
+    if message is None:
+        log.warning("[XML] Could not extract RecordInfo XML from message")
+        return None
 
-        xml_content = xml_match.group(0)
-        
-        # Fix potential XML issues (some implementations send malformed XML)
-        xml_content = xml_content.replace('xmlns="http://www.chinamobile.com/wvmp"', '')
-        
-        root = ET.fromstring(xml_content)
-        
-        # Check if this is a RecordInfo query
-        cmd_type_elem = root.find('CmdType')
-        if cmd_type_elem is None or cmd_type_elem.text != 'RecordInfo':
-            log.warning("[XML] Not a RecordInfo query")
-            return None
-        
-        # Extract basic info
-        device_id = root.find('DeviceID').text if root.find('DeviceID') is not None else ""
-        sn = root.find('SN').text if root.find('SN') is not None else ""
-        
-        # Extract time range
-        start_time = None
-        end_time = None
-        
-        start_time_elem = root.find('.//StartTime')
-        end_time_elem = root.find('.//EndTime')
-        
-        if start_time_elem is not None:
-            start_time = start_time_elem.text
-        
-        if end_time_elem is not None:
-            end_time = end_time_elem.text
-        
-        # Create result
-        return {
-            'cmd_type': 'RecordInfo',
-            'device_id': device_id,
-            'sn': sn,
-            'start_time': start_time,
-            'end_time': end_time
-        }
-    except Exception as e:
-        log.error(f"[XML] Error parsing RecordInfo query: {e}")
-        return None 
\ No newline at end of file
+    # Check if this is a RecordInfo query
+    if message['cmd_type'] != 'RecordInfo':
+        log.warning("[XML] Not a RecordInfo query")
+        return None
+
+    return {
+        'cmd_type': 'RecordInfo',
+        'device_id': message['device_id'],
+        'sn': message['sn'],
+        'start_time': message['start_time'],
+        'end_time': message['end_time']
+    } 
\ No newline at end of file
@@ -0,0 +1,182 @@
+# src/keepalive_scheduler.py
+
+"""
+Shared keepalive scheduler
+
+Keepalive MESSAGEs to the SIP platform are sent from one timer thread
+instead of a sleeping loop per client, so that restreamers started
+together do not hit the platform in synchronized bursts:
+
+- the first keepalive of a registration goes out after a short delay (or a
+  random phase within the interval), later ones every heartbeat_interval
+  seconds, each spread by +/- heartbeat_jitter
+- a keepalive counts as missed when the platform has not answered it by the
+  time the next one is due, or when it could not be sent at all
+- after max_heartbeat_timeout misses in a row the key's on_timeout callback
+  runs (the SIP client re-REGISTERs); a single lost packet does nothing
+
+Keys are registrations (one per platform). Settings come from config["sip"].
+"""
+
+import heapq
+import random
+import threading
+import time
+
+from logger import log
+
+
+class KeepaliveScheduler:
+    """Jittered keepalive timers with missed-response tracking"""
+
+    def __init__(self, config):
+        sip_config = (config or {}).get("sip", {})
+        self.interval = sip_config.get("heartbeat_interval", 60)
+        self.max_missed = sip_config.get("max_heartbeat_timeout", 3)
+        self.jitter = sip_config.get("heartbeat_jitter", 0.1)
+
+        self.entries = {}        # key -> keepalive state
+        self.heap = []           # (due, seq, key)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stats = {"sent": 0, "acknowledged": 0, "missed": 0, "timeouts": 0}
+
+    def start(self):
+        """Start the timer thread"""
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name="keepalive")
+        self.thread.start()
+        log.info(f"[KEEPALIVE] Scheduler started (every {self.interval}s ±{self.jitter:.0%}, "
+                 f"timeout after {self.max_missed} missed)")
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(1)
+
+    def add(self, key, send, on_timeout, delay=None):
+        """Start sending keepalives for key
+
+        Args:
+            key (str): Registration the keepalives belong to
+            send (callable): send() -> token (e.g. the Call-ID) passed back to acknowledge(),
+                or a false value when the keepalive could not be sent
+            on_timeout (callable): on_timeout(key) after max_missed misses in a row; runs on
+                the timer thread, so it should hand slow work off
+            delay (float): Seconds until the first keepalive; a random phase within the interval if None
+        """
+        if delay is None:
+            delay = random.uniform(0, self.interval)
+        with self._cond:
+            self.entries[key] = {
+                "send": send,
+                "on_timeout": on_timeout,
+                "outstanding": None,
+                "missed": 0,
+                "last_ack": None,
+                "due": None
+            }
+            self._push(key, time.time() + delay)
+
+    def remove(self, key):
+        """Stop sending keepalives for key"""
+        with self._cond:
+            return self.entries.pop(key, None) is not None
+
+    def acknowledge(self, token):
+        """Record the platform's answer to a keepalive; returns whether token was outstanding"""
+        with self._cond:
+            for entry in self.entries.values():
+                if entry["outstanding"] == token:
+                    entry["outstanding"] = None
+                    entry["missed"] = 0
+                    entry["last_ack"] = time.time()
+                    self.stats["acknowledged"] += 1
+                    return True
+        return False
+
+    def _next_delay(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, key, due):
+        """Queue key's next keepalive (caller holds the lock)"""
+        self._seq += 1
+        self.entries[key]["due"] = due  # a re-added key leaves its old heap entry stale
+        heapq.heappush(self.heap, (due, self._seq, key))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.time()):
+                    self._cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+                if not self.running:
+                    return
+                due, _, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+                if entry is None or entry["due"] != due:
+                    continue
+                if entry["outstanding"] is not None:
+                    entry["outstanding"] = None
+                    entry["missed"] += 1
+                    self.stats["missed"] += 1
+                timed_out = entry["missed"] >= self.max_missed
+                if timed_out:
+                    entry["missed"] = 0
+                    self.stats["timeouts"] += 1
+                self._push(key, time.time() + self._next_delay())
+
+            if timed_out:
+                log.error(f"[KEEPALIVE] 🚨 {key}: {self.max_missed} keepalives unanswered")
+                self._call(entry["on_timeout"], key)
+                continue
+
+            token = self._call(entry["send"])
+            with self._cond:
+                if token:
+                    entry["outstanding"] = token
+                    self.stats["sent"] += 1
+                else:
+                    entry["missed"] += 1
+                    self.stats["missed"] += 1
+            if not token:
+                log.warning(f"[KEEPALIVE] ⚠️ {key}: keepalive not sent ({entry['missed']}/{self.max_missed} missed)")
+
+    def _call(self, callback, *args):
+        try:
+            return callback(*args)
+        except Exception as e:
+            log.error(f"[KEEPALIVE] Callback error: {e}")
+            return None
+
+    def get_stats(self, key=None):
+        """Get keepalive state of one key, or scheduler-wide counters"""
+        with self._cond:
+            if key is not None:
+                entry = self.entries.get(key)
+                if entry is None:
+                    return None
+                return {"missed": entry["missed"], "outstanding": entry["outstanding"] is not None,
+                        "last_ack": entry["last_ack"]}
+            return {**self.stats, "registrations": len(self.entries)}
+
+
+# Global instance
+_keepalive_scheduler = None
+
+
+def get_keepalive_scheduler(config=None):
+    """Get or create the shared KeepaliveScheduler instance"""
+    global _keepalive_scheduler
+
+    if _keepalive_scheduler is None:
+        _keepalive_scheduler = KeepaliveScheduler(config)
+
+    return _keepalive_scheduler
@@ -11,6 +11,10 @@ import threading
 import logging
 from typing import Dict, Optional, Tuple, Any
 from logger import log
+from udp_egress import get_udp_egress, APPSINK_NAME as UDP_EGRESS_SINK
+from stream_watchdog import get_stream_watchdog
+from reconnect_scheduler import get_reconnect_scheduler
+from media_runtime import get_media_runtime
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib, GObject
@@ -26,11 +30,20 @@ class LiveStreamHandler:
         self.active_streams: Dict[str, Dict] = {}
         self.pipelines: Dict[str, Gst.Pipeline] = {}
         self.stream_threads: Dict[str, threading.Thread] = {}
-        self.glib_loop = None
-        self.glib_thread = None
-        self.monitoring_thread = None
         self.running = False
         
+        # Shared batched UDP sender (sendmmsg/GSO) replacing per-stream udpsink
+        self.udp_egress = get_udp_egress(config)
+        
+        # Shared buffer-flow watchdog; a stalled RTSP source triggers _recover_stream
+        self.watchdog = get_stream_watchdog(config)
+        
+        # Shared reconnect scheduler: one recovery per stream, backoff, concurrency cap
+        self.reconnects = get_reconnect_scheduler(config)
+        
+        # Shared GLib main loop and per-stream command queue for pipeline start/stop
+        self.runtime = get_media_runtime(config)
+        
         # Initialize GStreamer
         if not Gst.is_initialized():
             Gst.init(None)
@@ -55,11 +68,11 @@ class LiveStreamHandler:
         """Start the live stream handler"""
         self.running = True
         
-        # Start GLib main loop
-        self._start_glib_loop()
+        # Bus messages are dispatched by the shared media main loop
+        self.runtime.start()
         
-        # Start monitoring thread
-        self._start_monitoring()
+        # Stream health comes from the buffer-flow watchdog
+        self.watchdog.start()
         
         log.info("[LIVE] LiveStreamHandler started")
     
@@ -71,107 +84,34 @@ class LiveStreamHandler:
         for stream_id in list(self.active_streams.keys()):
             self.stop_stream(stream_id)
         
-        # Stop monitoring
-        if self.monitoring_thread and self.monitoring_thread.is_alive():
-            self.monitoring_thread.join(timeout=5)
-        
-        # Stop GLib loop
-        if self.glib_loop and self.glib_loop.is_running():
-            self.glib_loop.quit()
-        
-        if self.glib_thread and self.glib_thread.is_alive():
-            self.glib_thread.join(timeout=5)
-        
         log.info("[LIVE] LiveStreamHandler stopped")
     
-    def _start_glib_loop(self):
-        """Start GLib main loop in separate thread"""
-        if not self.glib_loop:
-            self.glib_loop = GLib.MainLoop()
-            self.glib_thread = threading.Thread(target=self._run_glib_loop, daemon=True)
-            self.glib_thread.start()
-            log.info("[LIVE] GLib main loop started")
-    
-    def _run_glib_loop(self):
-        """Run the GLib main loop"""
-        try:
-            self.glib_loop.run()
-        except Exception as e:
-            log.error(f"[LIVE] GLib main loop error: {e}")
-    
-    def _start_monitoring(self):
-        """Start stream monitoring thread"""
-        if not self.monitoring_thread or not self.monitoring_thread.is_alive():
-            self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
-            self.monitoring_thread.start()
-            log.info("[LIVE] Stream monitoring started")
-    
-    def _monitoring_loop(self):
-        """Monitor active streams and handle recovery"""
-        while self.running:
-            try:
-                # Check each active stream
-                for stream_id in list(self.active_streams.keys()):
-                    self._check_stream_health(stream_id)
-                
-                # Sleep before next check
-                time.sleep(5)
-            except Exception as e:
-                log.error(f"[LIVE] Monitoring loop error: {e}")
-                time.sleep(5)
-    
-    def _check_stream_health(self, stream_id: str):
-        """Check health of a specific stream"""
-        if stream_id not in self.active_streams:
+    def _recover_stream(self, stream_id: str, reason: str = "stalled"):
+        """Ask the reconnect scheduler to rebuild a failed stream's pipeline"""
+        stream_info = self.active_streams.get(stream_id)
+        if not stream_info:
             return
-        
-        stream_info = self.active_streams[stream_id]
-        pipeline = self.pipelines.get(stream_id)
-        
-        if not pipeline:
-            log.warning(f"[LIVE] No pipeline found for stream {stream_id}")
-            return
-        
-        # Check pipeline state
-        state_ret = pipeline.get_state(Gst.CLOCK_TIME_NONE)
-        if state_ret[0] == Gst.StateChangeReturn.SUCCESS:
-            current_state = state_ret[1]
-            
-            if current_state != Gst.State.PLAYING:
-                log.warning(f"[LIVE] Stream {stream_id} not in PLAYING state: {current_state.value_nick}")
-                # Try to recover
-                self._recover_stream(stream_id)
-            else:
-                # Update last seen time
-                stream_info['last_seen'] = time.time()
-        else:
-            log.warning(f"[LIVE] Failed to get state for stream {stream_id}")
-            self._recover_stream(stream_id)
+        self.reconnects.request(stream_id, lambda: self._reconnect_stream(stream_id),
+                                source=stream_info['rtsp_url'], reason=reason)
     
-    def _recover_stream(self, stream_id: str):
-        """Attempt to recover a failed stream"""
-        if stream_id not in self.active_streams:
-            return
+    def _reconnect_stream(self, stream_id: str) -> bool:
+        """Rebuild a stream's pipeline (runs on a reconnect scheduler worker)"""
+        return self.runtime.call(stream_id, self._rebuild_stream, stream_id)
+    
+    def _rebuild_stream(self, stream_id: str) -> bool:
+        """Replace a stream's pipeline with a fresh one (runs in its command queue)"""
+        stream_info = self.active_streams.get(stream_id)
+        if not stream_info:
+            return True
         
-        stream_info = self.active_streams[stream_id]
         stream_info['recovery_attempts'] = stream_info.get('recovery_attempts', 0) + 1
-        
-        if stream_info['recovery_attempts'] > 3:
-            log.error(f"[LIVE] Max recovery attempts reached for stream {stream_id}")
-            return
-        
         log.info(f"[LIVE] Attempting recovery for stream {stream_id} (attempt #{stream_info['recovery_attempts']})")
         
         # Stop current pipeline
-        if stream_id in self.pipelines:
-            self.pipelines[stream_id].set_state(Gst.State.NULL)
-            del self.pipelines[stream_id]
-        
-        # Wait before retry
-        time.sleep(2)
+        self._stop_pipeline(stream_id)
         
         # Restart stream
-        self._start_stream_pipeline(
+        return self._start_stream_pipeline(
             stream_id,
             stream_info['rtsp_url'],
             stream_info['dest_ip'],
@@ -180,6 +120,12 @@ class LiveStreamHandler:
             stream_info.get('encoder_params')
         )
     
+    def _on_stream_flowing(self, stream_id: str):
+        """Watchdog callback: the stream delivers data again"""
+        if stream_id in self.active_streams:
+            self.active_streams[stream_id]['last_seen'] = time.time()
+        self.reconnects.report_healthy(stream_id)
+    
     def start_rtsp_stream(self, stream_id: str, rtsp_url: str, dest_ip: str, dest_port: int, 
                          ssrc: Optional[str] = None, encoder_params: Optional[Dict] = None) -> bool:
         """
@@ -213,7 +159,8 @@ class LiveStreamHandler:
         }
         
         # Start the pipeline
-        success = self._start_stream_pipeline(stream_id, rtsp_url, dest_ip, dest_port, ssrc, encoder_params)
+        success = self.runtime.call(stream_id, self._start_stream_pipeline, stream_id, rtsp_url,
+                                    dest_ip, dest_port, ssrc, encoder_params)
         
         if not success:
             del self.active_streams[stream_id]
@@ -239,10 +186,15 @@ class LiveStreamHandler:
             # Create pipeline
             pipeline = Gst.parse_launch(pipeline_str)
             
-            # Set up bus monitoring
-            bus = pipeline.get_bus()
-            bus.add_signal_watch()
-            bus.connect("message", lambda b, m: self._on_bus_message(b, m, stream_id))
+            # Feed the egress appsink into the shared UDP sender
+            egress_sink = pipeline.get_by_name(UDP_EGRESS_SINK)
+            if egress_sink is not None:
+                self.udp_egress.register_stream(stream_id, dest_ip, dest_port)
+                self.udp_egress.attach_appsink(stream_id, egress_sink)
+            
+            # Only ERROR and EOS reach Python; stalls come from the flow watchdog
+            self.runtime.watch_bus(stream_id, pipeline, lambda b, m: self._on_bus_message(b, m, stream_id),
+                                   ("error", "eos"))
             
             # Store pipeline
             self.pipelines[stream_id] = pipeline
@@ -253,6 +205,8 @@ class LiveStreamHandler:
                 log.error(f"[LIVE] Failed to start pipeline for {stream_id}")
                 return False
             
+            self.watchdog.watch(stream_id, pipeline, self._recover_stream, self._on_stream_flowing)
+            
             log.info(f"[LIVE] ✅ Pipeline started successfully for {stream_id}")
             return True
             
@@ -377,14 +331,20 @@ class LiveStreamHandler:
             'max-size-buffers=0',
             'max-size-time=0',
             'leaky=downstream',
-            '!',
-            f'udpsink host={dest_ip} port={dest_port} sync=false async=false'
+            '!'
         ])
         
+        if self.udp_egress.enabled:
+            pipeline_parts.append(
+                f'appsink name={UDP_EGRESS_SINK} emit-signals=true sync=false async=false max-buffers=0 drop=false'
+            )
+        else:
+            pipeline_parts.append(f'udpsink host={dest_ip} port={dest_port} sync=false async=false')
+        
         return ' '.join(pipeline_parts)
     
     def _on_bus_message(self, bus: Gst.Bus, message: Gst.Message, stream_id: str):
-        """Handle GStreamer bus messages"""
+        """Handle ERROR and EOS bus messages (runs in the stream's command queue)"""
         msg_type = message.type
         
         if msg_type == Gst.MessageType.ERROR:
@@ -392,26 +352,12 @@ class LiveStreamHandler:
             log.error(f"[LIVE] Pipeline error for {stream_id}: {error}")
             log.debug(f"[LIVE] Debug info: {debug}")
             # Schedule recovery
-            threading.Thread(target=self._recover_stream, args=(stream_id,), daemon=True).start()
-            
-        elif msg_type == Gst.MessageType.WARNING:
-            warning, debug = message.parse_warning()
-            log.warning(f"[LIVE] Pipeline warning for {stream_id}: {warning}")
+            self._recover_stream(stream_id, f"error: {error}")
             
         elif msg_type == Gst.MessageType.EOS:
             log.info(f"[LIVE] End of stream for {stream_id}")
             # For live streams, EOS might indicate connection loss
-            threading.Thread(target=self._recover_stream, args=(stream_id,), daemon=True).start()
-            
-        elif msg_type == Gst.MessageType.STATE_CHANGED:
-            if message.src == self.pipelines.get(stream_id):
-                old_state, new_state, pending_state = message.parse_state_changed()
-                log.debug(f"[LIVE] Stream {stream_id} state changed: {old_state.value_nick} -> {new_state.value_nick}")
-                
-                if new_state == Gst.State.PLAYING:
-                    if stream_id in self.active_streams:
-                        self.active_streams[stream_id]['last_seen'] = time.time()
-                        self.active_streams[stream_id]['recovery_attempts'] = 0
+            self._recover_stream(stream_id, "end of stream")
     
     def stop_stream(self, stream_id: str) -> bool:
         """Stop a specific stream"""
@@ -420,10 +366,10 @@ class LiveStreamHandler:
             return False
         
         # Stop pipeline
-        if stream_id in self.pipelines:
-            pipeline = self.pipelines[stream_id]
-            pipeline.set_state(Gst.State.NULL)
-            del self.pipelines[stream_id]
+        self.runtime.call(stream_id, self._stop_pipeline, stream_id)
+        self.udp_egress.unregister_stream(stream_id)
+        self.watchdog.unwatch(stream_id)
+        self.reconnects.cancel(stream_id)
         
         # Remove from active streams
         del self.active_streams[stream_id]
@@ -431,6 +377,13 @@ class LiveStreamHandler:
         log.info(f"[LIVE] Stream {stream_id} stopped")
         return True
     
+    def _stop_pipeline(self, stream_id: str):
+        """Stop a stream's pipeline and remove its bus watch (runs in its command queue)"""
+        pipeline = self.pipelines.pop(stream_id, None)
+        if pipeline is not None:
+            pipeline.set_state(Gst.State.NULL)
+        self.runtime.unwatch_bus(stream_id)
+    
     def get_stream_status(self, stream_id: Optional[str] = None) -> Dict:
         """Get status of streams"""
         if stream_id:
@@ -441,6 +394,16 @@ class LiveStreamHandler:
                     state_ret = self.pipelines[stream_id].get_state(Gst.CLOCK_TIME_NONE)
                     if state_ret[0] == Gst.StateChangeReturn.SUCCESS:
                         stream_info['pipeline_state'] = state_ret[1].value_nick
+                reconnect_stats = self.reconnects.get_stats(stream_id)
+                if reconnect_stats:
+                    stream_info['reconnect'] = reconnect_stats
+                flow_stats = self.watchdog.get_stats(stream_id)
+                if flow_stats:
+                    stream_info['flow'] = flow_stats
+                    stream_info['last_seen'] = time.time() - flow_stats['idle_ms'] / 1000.0
+                egress_stats = self.udp_egress.get_stats(stream_id)
+                if egress_stats:
+                    stream_info['egress'] = egress_stats
                 return stream_info
             else:
                 return {}
@@ -13,6 +13,7 @@ import os
 import re
 import time
 from logger import log
+from manscdp_codec import decode_sip_message
 import signal
 import sys
 
@@ -108,7 +109,7 @@ class LocalSIPServer:
                 log.info(f"[LOCAL-SIP] Received packet from {address[0]}:{address[1]}")
                 
                 # Handle the received packet
-                self._process_sip_message(data.decode('utf-8', errors='ignore'))
+                self._process_sip_message(decode_sip_message(data))
                 
             except Exception as e:
                 if self.running:  # Only log if we're still supposed to be running
@@ -130,7 +131,7 @@ class LocalSIPServer:
                     break
             
             # Process the message
-            message = buffer.decode('utf-8', errors='ignore')
+            message = decode_sip_message(buffer)
             self._process_sip_message(message)
             
             # Send a response
@@ -165,6 +166,26 @@ class LocalSIPServer:
             else:
                 log.warning("[LOCAL-SIP] No SIP client available to handle INVITE")
                 
+        elif method == "INFO":
+            log.info("[LOCAL-SIP] Received INFO message")
+            
+            # MANSRTSP playback control (PLAY/PAUSE/Scale) for a playback session
+            if self.sip_client:
+                log.info("[LOCAL-SIP] Forwarding playback control to main SIP handler")
+                self.sip_client.handle_playback_control(message)
+            else:
+                log.warning("[LOCAL-SIP] No SIP client available to handle INFO")
+                
+        elif method in ("BYE", "CANCEL"):
+            log.info(f"[LOCAL-SIP] Received {method} message")
+            
+            # Ends the call: stop its media and release its ports
+            if self.sip_client:
+                log.info(f"[LOCAL-SIP] Forwarding {method} to main SIP handler")
+                self.sip_client.handle_call_end(message, method)
+            else:
+                log.warning(f"[LOCAL-SIP] No SIP client available to handle {method}")
+                
         elif method == "SUBSCRIBE":
             log.info("[LOCAL-SIP] Received SUBSCRIBE message")
             
@@ -72,7 +72,9 @@ from live_stream_handler import LiveStreamHandler
 from sip_handler_pjsip import SIPClient
 from local_sip_server import LocalSIPServer
 from media_streamer import MediaStreamer
+from media_workers import create_media_streamer
 from recording_manager import get_recording_manager
+from message_capture import get_message_capture
 import cv2
 import numpy as np
 
@@ -289,6 +291,13 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+def capture_signal_handler(sig, frame):
+    """Dump the SIP message capture buffer on request"""
+    path = get_message_capture().dump("signal")
+    if path:
+        log.info(f"[CAPTURE] Dumping recent SIP messages to {path}")
+
+
 def find_available_port(start_port, max_tries=10):
     """Find an available port starting from the given port."""
     import socket
@@ -382,6 +391,8 @@ def main():
     # Register signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    # SIGUSR1 writes the recent SIP messages and pjsua output to logs/captures
+    signal.signal(signal.SIGUSR1, capture_signal_handler)
     
     # Register cleanup function to be called on exit
     atexit.register(cleanup)
@@ -439,8 +450,9 @@ def main():
                 "async": False
             }
             
-        streamer = MediaStreamer(config)
-        # Start GLib main loop for GStreamer event handling
+        # In-process MediaStreamer, or a pool of media worker processes (media.workers.processes)
+        streamer = create_media_streamer(config)
+        # Start GLib main loop (or the worker processes) for GStreamer event handling
         streamer.start_glib_loop()
         
         # Start RTSP sources with live stream handler
@@ -0,0 +1,140 @@
+# src/manscdp_codec.py
+
+"""
+MANSCDP body encoding
+
+GB28181 bodies usually declare encoding="GB2312" and platforms decode them
+that way, so Chinese channel names must go out in GB2312/GBK bytes, not
+UTF-8. This module keeps every body in the encoding its XML declaration
+names:
+
+- encode_sip_message / decode_sip_message convert between str and wire
+  bytes; headers are ASCII, the body uses its declared encoding, and
+  Content-Length is the encoded byte length
+- CatalogItemCache keeps each catalog <Item> with its encoded byte length,
+  so MTU packing adds up cached sizes instead of re-encoding the catalog
+
+GB2312 is written with the GBK codec (a superset that platforms accept).
+Characters the codec cannot represent become XML character references.
+"""
+
+import codecs
+import re
+
+from logger import log
+
+# Declared encodings -> Python codec used on the wire
+WIRE_CODECS = {
+    "gb2312": "gbk",
+    "gbk": "gbk",
+    "gb18030": "gb18030",
+    "utf-8": "utf-8",
+    "utf8": "utf-8"
+}
+
+DEFAULT_ENCODING = "utf-8"
+
+_DECLARATION = re.compile(r'<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_DECLARATION_BYTES = re.compile(rb'<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_CONTENT_LENGTH = re.compile(r'^(Content-Length|l):[ \t]*\d+', re.IGNORECASE | re.MULTILINE)
+
+
+def wire_codec(label):
+    """Python codec for a declared encoding label, UTF-8 if unknown"""
+    if not label:
+        return DEFAULT_ENCODING
+    label = label.lower()
+    codec = WIRE_CODECS.get(label, label)
+    try:
+        codecs.lookup(codec)
+    except LookupError:
+        log.warning(f"[CODEC] Unknown XML encoding {label!r}, using {DEFAULT_ENCODING}")
+        return DEFAULT_ENCODING
+    return codec
+
+
+def declared_encoding(xml):
+    """Encoding named in the XML declaration of a str or bytes body, or None"""
+    pattern = _DECLARATION_BYTES if isinstance(xml, (bytes, bytearray)) else _DECLARATION
+    match = pattern.search(xml, 0, 200)
+    if not match:
+        return None
+    label = match.group(1)
+    return label.decode("ascii") if isinstance(label, bytes) else label
+
+
+def encode_xml(xml):
+    """Encode an XML body in the encoding it declares"""
+    return xml.encode(wire_codec(declared_encoding(xml)), errors="xmlcharrefreplace")
+
+
+def decode_xml(data):
+    """Decode an XML body using the encoding it declares"""
+    return data.decode(wire_codec(declared_encoding(data)), errors="replace")
+
+
+def _split(message, separators):
+    for separator in separators:
+        index = message.find(separator)
+        if index >= 0:
+            return message[:index], separator, message[index + len(separator):]
+    return message, None, None
+
+
+def encode_sip_message(sip_message):
+    """Wire bytes of a SIP message: ASCII headers, body in its declared encoding
+
+    Content-Length is rewritten to the encoded body length.
+    """
+    head, separator, body = _split(sip_message, ("\r\n\r\n", "\n\n"))
+    if separator is None:
+        return sip_message.encode("utf-8")
+    body_bytes = encode_xml(body) if body else b""
+    head = _CONTENT_LENGTH.sub(lambda m: f"{m.group(1)}: {len(body_bytes)}", head, count=1)
+    return head.encode("utf-8") + separator.encode("ascii") + body_bytes
+
+
+def decode_sip_message(data):
+    """str of a received SIP message, decoding its body with the declared encoding"""
+    head, separator, body = _split(data, (b"\r\n\r\n", b"\n\n"))
+    if separator is None:
+        return data.decode("utf-8", errors="replace")
+    return head.decode("utf-8", errors="replace") + separator.decode("ascii") + decode_xml(body)
+
+
+class CatalogItemCache:
+    """Catalog <Item> strings with their encoded byte lengths, built once per channel state"""
+
+    def __init__(self, encoding="GB2312", name_length=20):
+        self.codec = wire_codec(encoding)
+        self.name_length = name_length
+        self._items = {}  # channel_id -> (key, xml, encoded length)
+
+    def item(self, channel_id, channel_info, parent_id):
+        """Catalog item XML and its encoded size for a channel
+
+        Args:
+            channel_id (str): Channel DeviceID
+            channel_info (dict): Channel entry of SIPClient.device_catalog
+            parent_id (str): DeviceID of the parent device
+
+        Returns:
+            tuple: (item XML, length in bytes once encoded)
+        """
+        # Truncate by characters (never splits a multibyte character); the byte size comes from the codec
+        name = channel_info['name'][:self.name_length]
+        key = (name, channel_info['status'], parent_id)
+        cached = self._items.get(channel_id)
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+
+        xml = (f"""    <Item><DeviceID>{channel_id}</DeviceID><Name>{name}</Name><Status>{channel_info['status']}</Status>"""
+               f"""<Parental>1</Parental><ParentID>{parent_id}</ParentID></Item>""")
+        size = len(xml.encode(self.codec, errors="xmlcharrefreplace"))
+        self._items[channel_id] = (key, xml, size)
+        return xml, size
+
+    def prune(self, channel_ids):
+        """Forget cached items of channels no longer in the catalog"""
+        for channel_id in set(self._items) - set(channel_ids):
+            del self._items[channel_id]
@@ -0,0 +1,88 @@
+# src/mansrtsp.py
+
+"""
+MANSRTSP playback control parsing for GB28181
+
+During historical playback the platform sends SIP INFO requests whose body
+(Content-Type: Application/MANSRTSP) is an RTSP-style control request, e.g.:
+
+    PLAY MANSRTSP/1.0
+    CSeq: 3
+    Scale: 2.0
+    Range: npt=120-
+"""
+
+import re
+
+from logger import log
+
+MANSRTSP_METHODS = ("PLAY", "PAUSE", "TEARDOWN")
+
+
+def extract_mansrtsp_body(message_text):
+    """Extract the MANSRTSP request body from a SIP INFO message
+
+    Returns:
+        str or None: The body starting at the MANSRTSP request line
+    """
+    match = re.search(r"^(PLAY|PAUSE|TEARDOWN)\s+(?:MANS)?RTSP/1\.0.*",
+                      message_text, re.MULTILINE | re.DOTALL)
+    if not match:
+        return None
+    return match.group(0)
+
+
+def parse_mansrtsp(body):
+    """Parse a MANSRTSP playback control request
+
+    Args:
+        body (str): MANSRTSP request text
+
+    Returns:
+        dict or None: method, cseq, scale (float or None), range_start and
+                      range_end (seconds from playback start, or None for "now"/open)
+    """
+    if not body:
+        return None
+
+    try:
+        lines = [line.strip() for line in body.replace("\r\n", "\n").split("\n") if line.strip()]
+        request_line = lines[0].split()
+        method = request_line[0].upper()
+        if method not in MANSRTSP_METHODS:
+            log.warning(f"[MANSRTSP] Unsupported method: {method}")
+            return None
+
+        result = {
+            "method": method,
+            "cseq": None,
+            "scale": None,
+            "range_start": None,
+            "range_end": None
+        }
+
+        for line in lines[1:]:
+            if ":" not in line:
+                continue
+            name, value = line.split(":", 1)
+            name = name.strip().lower()
+            value = value.strip()
+
+            if name == "cseq":
+                result["cseq"] = value
+            elif name == "scale":
+                result["scale"] = float(value)
+            elif name == "range":
+                range_match = re.match(r"npt\s*=\s*([\w.]*)\s*-\s*([\w.]*)", value)
+                if range_match:
+                    start, end = range_match.groups()
+                    if start and start != "now":
+                        result["range_start"] = float(start)
+                    if end and end != "now":
+                        result["range_end"] = float(end)
+
+        return result
+
+    except Exception as e:
+        log.error(f"[MANSRTSP] Failed to parse playback control request: {e}")
+        return None
@@ -0,0 +1,201 @@
+# src/media_runtime.py
+
+"""
+Shared media runtime for all GStreamer pipelines
+
+MediaStreamer, LiveStreamHandler and RTSPHandler used to each run their own
+GLib.MainLoop thread, and every pipeline connected a Python "message" handler
+that was invoked for every bus message, TAG and STATE_CHANGED noise included.
+This runtime replaces that with:
+
+- one GLib main loop thread on the default main context for the whole process
+- bus watches connected per message type ("message::error", ...), so GObject
+  drops every other message by its detail quark in C and Python only runs
+  for ERROR, EOS and the types a component explicitly asks for
+- a thread-safe command queue: pipeline start/stop commands and bus message
+  handlers are serialized per key (stream ID or URL) on a small worker pool,
+  so a teardown can never race a restart of the same stream, blocking state
+  changes never run on the main loop thread, and different streams still
+  start concurrently
+
+call() blocks until its command has run. A command that calls back into
+its own key runs inline, but one that waits on another key's queue would
+hold a worker of the shared pool while it waits, and enough of those at
+once (a mass teardown racing reconnects) leave no worker to run anything.
+So call() for a different key is refused on a command worker; commands
+that need to act on another stream submit() to it instead.
+
+Settings come from config["media"]["runtime"].
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from logger import log
+
+# Bus message types dispatched when a component does not ask for others;
+# "application" carries custom health messages posted by elements
+DEFAULT_MESSAGES = ("error", "eos", "application")
+
+
+class MediaRuntime:
+    """Single GLib main loop, filtered bus dispatch and per-key command queue"""
+
+    def __init__(self, config):
+        runtime_config = (config or {}).get("media", {}).get("runtime", {})
+        self.command_workers = runtime_config.get("command_workers", 8)
+        self.executor = ThreadPoolExecutor(max_workers=self.command_workers, thread_name_prefix="media-cmd")
+
+        self.queues = {}    # key -> deque of (fn, args, future)
+        self.watches = {}   # key -> (bus, handler ids)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.loop = None
+        self.thread = None
+        self.stats = {"commands": 0, "messages": 0, "failed": 0}
+
+    def start(self):
+        """Start the shared GLib main loop thread (idempotent)"""
+        from gi.repository import GLib
+
+        with self._lock:
+            if self.loop is not None:
+                return
+            self.loop = GLib.MainLoop()
+        self.thread = threading.Thread(target=self._run_loop, name="media-loop", daemon=True)
+        self.thread.start()
+        log.info(f"[RUNTIME] Shared GLib main loop started ({self.command_workers} command workers)")
+
+    def _run_loop(self):
+        try:
+            self.loop.run()
+        except Exception as e:
+            log.error(f"[RUNTIME] Error in GLib main loop: {e}")
+
+    def stop(self):
+        """Stop the main loop and the command workers"""
+        for key in list(self.watches):
+            self.unwatch_bus(key)
+        with self._lock:
+            loop, self.loop = self.loop, None
+        if loop and loop.is_running():
+            loop.quit()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(1)
+        self.executor.shutdown(wait=False)
+        log.info("[RUNTIME] Shared GLib main loop stopped")
+
+    def submit(self, key, fn, *args):
+        """Queue fn(*args) behind the other commands for key
+
+        Returns:
+            Future: Resolves to the return value of fn
+        """
+        future = Future()
+        with self._lock:
+            queue = self.queues.get(key)
+            idle = queue is None
+            if idle:
+                queue = self.queues[key] = deque()
+            queue.append((fn, args, future))
+        if idle:
+            self.executor.submit(self._drain, key)
+        return future
+
+    def call(self, key, fn, *args):
+        """Run fn(*args) in key's command queue and wait for its result
+
+        A command that issues another command for its own key (e.g. an EOS
+        handler restarting its stream) runs it inline instead of deadlocking.
+        
+        Raises:
+            RuntimeError: Called from a command of another key, which would hold
+                a command worker while waiting; use submit() there
+        """
+        current = getattr(self._local, "key", None)
+        if current == key:
+            return fn(*args)
+        if current is not None:
+            raise RuntimeError(f"call() for {key} from a command of {current} would block a command worker, "
+                               f"use submit()")
+        return self.submit(key, fn, *args).result()
+
+    def _drain(self, key):
+        """Run the queued commands of one key in order (on a command worker)"""
+        while True:
+            with self._lock:
+                queue = self.queues[key]
+                if not queue:
+                    del self.queues[key]
+                    return
+                fn, args, future = queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._local.key = key
+            try:
+                future.set_result(fn(*args))
+                self.stats["commands"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                log.error(f"[RUNTIME] Command for {key} failed: {e}")
+                future.set_exception(e)
+            finally:
+                self._local.key = None
+
+    def watch_bus(self, key, pipeline, handler, message_types=DEFAULT_MESSAGES):
+        """Dispatch the bus messages of a pipeline to handler(bus, message)
+
+        Only the given message types reach Python; the handler runs in key's
+        command queue, never on the main loop or a streaming thread.
+
+        Args:
+            key (str): Stream ID or URL the pipeline belongs to
+            pipeline (Gst.Pipeline): Pipeline whose bus is watched
+            handler (callable): Called with (bus, message)
+            message_types (tuple): Message type names, e.g. ("error", "eos", "segment-done")
+        """
+        self.start()
+        self.unwatch_bus(key)
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        handler_ids = [bus.connect(f"message::{message_type}", self._on_message, key, handler)
+                       for message_type in message_types]
+        self.watches[key] = (bus, handler_ids)
+
+    def unwatch_bus(self, key):
+        """Remove the bus watch of key's pipeline"""
+        bus, handler_ids = self.watches.pop(key, (None, []))
+        if bus is None:
+            return
+        for handler_id in handler_ids:
+            bus.disconnect(handler_id)
+        bus.remove_signal_watch()
+
+    def _on_message(self, bus, message, key, handler):
+        self.stats["messages"] += 1
+        self.submit(key, handler, bus, message)
+
+    def get_stats(self):
+        with self._lock:
+            queued = sum(len(queue) for queue in self.queues.values())
+        return {
+            **self.stats,
+            "queued": queued,
+            "watched_buses": len(self.watches),
+            "loop_running": bool(self.loop and self.loop.is_running())
+        }
+
+
+# Global instance
+_media_runtime = None
+
+
+def get_media_runtime(config=None):
+    """Get or create the shared MediaRuntime instance"""
+    global _media_runtime
+
+    if _media_runtime is None:
+        _media_runtime = MediaRuntime(config)
+
+    return _media_runtime
@@ -13,6 +13,12 @@ import warnings
 import logging
 import gi
 
+from ps_packetizer import PSRtpSender
+from udp_egress import get_udp_egress, APPSINK_NAME as UDP_EGRESS_SINK
+from tcp_media_listener import get_tcp_media_listener, APPSINK_NAME as TCP_PASSIVE_SINK
+from stream_watchdog import get_stream_watchdog
+from media_runtime import get_media_runtime
+
 # Set GStreamer environment variables BEFORE importing GStreamer
 # This suppresses internal GStreamer debug messages and critical warnings
 os.environ.setdefault('GST_DEBUG', '0')
@@ -80,14 +86,14 @@ logging.getLogger().addFilter(gst_filter)
 # Initialize GStreamer with error suppression
 Gst.init(None)
 
+# Bus messages MediaStreamer handles; all other types are dropped before reaching Python
+BUS_MESSAGES = ("error", "eos", "segment-done")
+
 class MediaStreamer:
     def __init__(self, config):
         self.pipelines = {}  # Dictionary to store multiple pipelines
         self.config = config
         self.streams_info = {}  # Dictionary to store info for multiple streams
-        self.main_loop = None
-        self.main_loop_thread = None
-        self.health_check_thread = None
         self.running = False
         self.stream_health = {}  # Dictionary to store health info for multiple streams
         
@@ -99,74 +105,68 @@ class MediaStreamer:
         
         # Dictionary of named processor functions
         self.named_processors = {}
+        
+        # Native PS/RTP senders for passthrough (download) streams
+        self.ps_senders = {}
+        
+        # Shared batched UDP sender (sendmmsg/GSO) replacing per-stream udpsink
+        self.udp_egress = get_udp_egress(config)
+        
+        # Pooled listener for TCP-passive sessions (the platform connects to us)
+        self.tcp_listener = get_tcp_media_listener(config)
+        
+        # Buffer-flow watchdog: pad probes on the sinks, one timer wheel for all streams
+        self.watchdog = get_stream_watchdog(config)
+        self.max_recoveries = config.get("media", {}).get("watchdog", {}).get("max_recoveries", 3)
+        self.on_stream_failed = None  # called with stream_id once recovery gives up
+        
+        # Shared GLib main loop, filtered bus dispatch and per-stream command queue
+        self.runtime = get_media_runtime(config)
 
     def start_glib_loop(self):
-        """Start GLib main loop in a separate thread for event handling"""
-        if self.main_loop is not None:
-            return
-            
-        self.main_loop = GLib.MainLoop()
-        self.main_loop_thread = threading.Thread(target=self._run_glib_loop, daemon=True)
-        self.main_loop_thread.start()
-        log.info("[STREAM] GLib main loop started")
-    
-    def _run_glib_loop(self):
-        """Run the GLib main loop"""
+        """Start the shared GLib main loop that dispatches bus messages"""
+        self.runtime.start()
         self.running = True
-        try:
-            self.main_loop.run()
-        except Exception as e:
-            log.error(f"[STREAM] Error in GLib main loop: {e}")
-        finally:
-            self.running = False
     
     def start_health_monitoring(self):
-        """Start a thread to monitor stream health"""
-        if self.health_check_thread is not None and self.health_check_thread.is_alive():
-            return
-            
-        self.health_check_thread = threading.Thread(target=self._health_check_loop, daemon=True)
-        self.health_check_thread.start()
-        log.info("[STREAM] Stream health monitoring started")
+        """Start the shared buffer-flow watchdog"""
+        self.watchdog.start()
     
-    def _health_check_loop(self):
-        """Periodically check stream health and attempt recovery if needed"""
-        check_interval = 5  # seconds
-        
-        while self.running:
-            try:
-                # Check health for each active stream
-                for stream_id in list(self.pipelines.keys()):
-                    self._check_stream_health(stream_id)
-                time.sleep(check_interval)
-            except Exception as e:
-                log.error(f"[STREAM] Error in health check loop: {e}")
+    def _track_stream_health(self, stream_id, pipeline):
+        """Reset a started pipeline's health record and watch its buffer flow"""
+        previous = self.stream_health.get(stream_id, {})
+        self.stream_health[stream_id] = {
+            "active": True,
+            "start_time": time.time(),
+            "errors": 0,
+            "last_error": None,
+            "recoveries": previous.get("recoveries", 0),
+            "last_recovery": previous.get("last_recovery")
+        }
+        self.watchdog.watch(stream_id, pipeline, self._on_stream_stalled)
     
-    def _check_stream_health(self, stream_id):
-        """Check if the specified stream is healthy"""
-        if stream_id not in self.pipelines or stream_id not in self.stream_health:
+    def _on_stream_stalled(self, stream_id):
+        """Watchdog callback: no buffers reached the sinks of stream_id for the stall time"""
+        health = self.stream_health.get(stream_id)
+        if stream_id not in self.pipelines or not health:
             return
-            
-        pipeline = self.pipelines[stream_id]
-        health = self.stream_health[stream_id]
-            
-        # Update watchdog time
-        health["watchdog_time"] = time.time()
-        
-        # Check pipeline state
-        state_return = pipeline.get_state(0)
-        if state_return[0] != Gst.StateChangeReturn.SUCCESS:
-            log.warning(f"[STREAM] Pipeline state change issues detected for stream {stream_id}")
-            health["errors"] += 1
-            
-        # If there are errors and we haven't recovered recently, attempt recovery
-        if health["errors"] > 3:
-            now = time.time()
-            # Only attempt recovery if we haven't tried in the last 30 seconds
-            if not health["last_recovery"] or (now - health["last_recovery"]) > 30:
-                log.warning(f"[STREAM] Attempting to recover pipeline {stream_id} after {health['errors']} errors")
-                self._recover_stream(stream_id)
-                health["errors"] = 0  # Reset error counter
+        
+        health["errors"] += 1
+        health["last_error"] = "buffer flow stalled"
+        
+        # A stream that ran cleanly for a while gets a fresh recovery budget
+        now = time.time()
+        if health["last_recovery"] and now - health["last_recovery"] > 300:
+            health["recoveries"] = 0
+        
+        if health["recoveries"] >= self.max_recoveries:
+            log.error(f"[STREAM] ❌ Stream {stream_id} still stalled after {health['recoveries']} recoveries, giving up")
+            if self.on_stream_failed:
+                self.on_stream_failed(stream_id)
+            return
+        
+        log.warning(f"[STREAM] Stream {stream_id} stalled, rebuilding its pipeline")
+        self.runtime.call(stream_id, self._recover_stream, stream_id)
     
     def _recover_stream(self, stream_id):
         """Attempt to recover a stream by recreating the pipeline"""
@@ -179,15 +179,21 @@ class MediaStreamer:
             self.stream_health[stream_id]["last_recovery"] = time.time()
             self.stream_health[stream_id]["recoveries"] += 1
         
+        # Attempt to restart with same parameters
+        info = self.streams_info[stream_id]
+        log.info(f"[STREAM] 🔄 Recovery attempt for stream {stream_id}")
+        
+        # Playback and download sessions reopen their current file of the window
+        if "playback" in info:
+            result = self._open_playback_segment(stream_id)
+            log.info(f"[STREAM] {'✅' if result else '❌'} Playback stream {stream_id} reopened")
+            return result
+        
         # Stop the current pipeline
         if stream_id in self.pipelines:
             self.pipelines[stream_id].set_state(Gst.State.NULL)
             del self.pipelines[stream_id]
         
-        # Attempt to restart with same parameters
-        info = self.streams_info[stream_id]
-        log.info(f"[STREAM] 🔄 Recovery attempt for stream {stream_id}")
-        
         # Start the stream again
         result = self._create_pipeline(
             stream_id,
@@ -206,7 +212,8 @@ class MediaStreamer:
         
         return result
 
-    def start_stream(self, video_path, dest_ip, dest_port, ssrc=None, encoder_params=None, transport_protocol="UDP"):
+    def start_stream(self, video_path, dest_ip, dest_port, ssrc=None, encoder_params=None, transport_protocol="UDP",
+                     tcp_setup="active", local_port=None):
         """
         Start streaming a video file to the specified destination
         
@@ -217,6 +224,8 @@ class MediaStreamer:
             ssrc (str, optional): SSRC value for RTP
             encoder_params (dict, optional): Encoding parameters
             transport_protocol (str): Transport protocol ("UDP", "TCP/RTP/AVP", etc.)
+            tcp_setup (str): "active" to connect to the platform, "passive" to wait for it
+            local_port (int, optional): Port reserved from the TCP listener for passive setup
         
         Returns:
             bool: True if stream started successfully, False otherwise
@@ -255,11 +264,14 @@ class MediaStreamer:
             "ssrc": ssrc or "0000000001",  # Provide default SSRC if None
             "start_time": time.time(),
             "encoder_params": encoder_params or {},
-            "transport_protocol": transport_protocol
+            "transport_protocol": transport_protocol,
+            "tcp_setup": tcp_setup,
+            "local_port": local_port
         }
         
         # Create the pipeline
-        success = self._create_pipeline(stream_id, video_path, dest_ip, dest_port, ssrc, encoder_params, transport_protocol)
+        success = self.runtime.call(stream_id, self._create_pipeline, stream_id, video_path, dest_ip, dest_port,
+                                    ssrc, encoder_params, transport_protocol)
         
         # Start health monitoring
         self.start_health_monitoring()
@@ -268,6 +280,10 @@ class MediaStreamer:
         
     def _create_pipeline(self, stream_id, video_path, dest_ip, dest_port, ssrc=None, encoder_params=None, transport_protocol="UDP"):
         """Create a GStreamer pipeline for streaming"""
+        # Download sessions are remuxed, never re-encoded
+        if self.streams_info.get(stream_id, {}).get("playback", {}).get("download"):
+            return self._create_download_pipeline(stream_id, video_path, dest_ip, dest_port, ssrc, transport_protocol)
+        
         # Suppress GStreamer debug warnings that don't affect functionality
         os.environ.setdefault('GST_DEBUG_NO_COLOR', '1')
         os.environ.setdefault('GST_DEBUG', '0')  # Suppress all debug messages including CRITICAL warnings
@@ -414,7 +430,12 @@ class MediaStreamer:
                         pipeline_str += 'ssrc=1 ! '
 
             # Choose sink based on transport protocol
-            if "TCP" in transport_protocol:
+            if "TCP" in transport_protocol and self._is_tcp_passive(stream_id):
+                # TCP passive: the platform connects to our pooled listener, which
+                # writes the RFC 4571 framing itself
+                pipeline_str += f'appsink name={TCP_PASSIVE_SINK} emit-signals=true sync=false async=false max-buffers=0 drop=false'
+                log.info(f"[STREAM] Using TCP-passive transport on local port {self.streams_info[stream_id]['local_port']}")
+            elif "TCP" in transport_protocol:
                 # TCP transport (active). RFC 4571 requires each RTP packet to be framed
                 # with a 2-byte length header. GStreamer's rtpstreampay element does this.
                 # For PS format, we already have RTP packets from rtpgstpay, so we need rtpstreampay.
@@ -444,8 +465,8 @@ class MediaStreamer:
                 log.info("[STREAM] Using TCP transport with queue buffer (async=false)")
             else:
                 # Default UDP transport
-                pipeline_str += f'udpsink host={dest_ip} port={dest_port} sync=false async=false'
-                log.info(f"[STREAM] Using UDP transport (default)")
+                pipeline_str += self._udp_sink(dest_ip, dest_port)
+                log.info(f"[STREAM] Using UDP transport (default, egress: {self.udp_egress.mode})")
 
             
             log.debug(f"[STREAM] Pipeline for stream {stream_id}: {pipeline_str}")
@@ -487,14 +508,16 @@ class MediaStreamer:
                         f'rtph264pay config-interval=1 pt={payload_type} perfect-rtptime=false ssrc={fallback_ssrc} ! '
                     )
                     
-                    if "TCP" in transport_protocol:
+                    if "TCP" in transport_protocol and self._is_tcp_passive(stream_id):
+                        fallback_pipeline += f'appsink name={TCP_PASSIVE_SINK} emit-signals=true sync=false async=false max-buffers=0 drop=false'
+                    elif "TCP" in transport_protocol:
                         fallback_pipeline += (
                             f'rtpstreampay ! '
                             f'queue max-size-buffers=0 max-size-time=0 leaky=downstream ! '
                             f'tcpclientsink async=false host={dest_ip} port={dest_port} sync=false'
                         )
                     else:
-                        fallback_pipeline += f'udpsink host={dest_ip} port={dest_port} sync=false async=false'
+                        fallback_pipeline += self._udp_sink(dest_ip, dest_port)
                     
                     try:
                         log.info(f"[STREAM] Attempting H.264 RTP fallback pipeline for stream {stream_id}")
@@ -507,8 +530,18 @@ class MediaStreamer:
                 else:
                     return False
             
+            self._attach_udp_egress(stream_id, pipeline, dest_ip, dest_port)
+            self._attach_tcp_passive(stream_id, pipeline, ssrc)
+            
             # Set to PLAYING state with improved state change handling and crash protection
             try:
+                # Historical playback: position the pipeline on the requested window first
+                if "playback" in self.streams_info.get(stream_id, {}):
+                    if not self._seek_playback_segment(stream_id, pipeline):
+                        pipeline.set_state(Gst.State.NULL)
+                        del self.pipelines[stream_id]
+                        return False
+                
                 ret = pipeline.set_state(Gst.State.PLAYING)
                 if ret == Gst.StateChangeReturn.FAILURE:
                     log.error(f"[STREAM] Failed to set pipeline to PLAYING state for {stream_id}")
@@ -525,22 +558,12 @@ class MediaStreamer:
                 log.error(f"[STREAM] Exception during pipeline state change for {stream_id}: {state_error}")
                 return False
 
-            # Setup bus to watch for EOS and errors
-            bus = pipeline.get_bus()
-            bus.add_signal_watch()
-            # Pass stream_id to the callback
-            bus.connect("message", lambda b, m, sid=stream_id: self._on_bus_message(b, m, sid))
+            # Watch the bus for EOS, errors and segment ends only
+            self.runtime.watch_bus(stream_id, pipeline,
+                                   lambda b, m, sid=stream_id: self._on_bus_message(b, m, sid), BUS_MESSAGES)
             
             # Initialize stream health monitoring
-            self.stream_health[stream_id] = {
-                "active": True,
-                "start_time": time.time(),
-                "errors": 0,
-                "last_error": None,
-                "recoveries": 0,
-                "last_recovery": None,
-                "watchdog_time": time.time()
-            }
+            self._track_stream_health(stream_id, pipeline)
             
             log.info(f"[STREAM] ✅ Pipeline for stream {stream_id} started successfully.")
             return True
@@ -561,8 +584,9 @@ class MediaStreamer:
             return False
     
     def _on_bus_message(self, bus, message, stream_id):
-        """Handle GStreamer bus messages with improved error filtering"""
-        if stream_id not in self.pipelines:
+        """Handle ERROR, EOS and SEGMENT_DONE bus messages (runs in the stream's command queue)"""
+        # Messages queued before a restart belong to the replaced pipeline
+        if stream_id not in self.pipelines or bus != self.pipelines[stream_id].get_bus():
             return
             
         t = message.type
@@ -597,61 +621,26 @@ class MediaStreamer:
                 log.error(f"[STREAM] Fatal file error for stream {stream_id}, stopping pipeline")
                 self.stop_stream(stream_id)
             else:
-                # For non-fatal errors, let health monitoring handle recovery
-                log.warning(f"[STREAM] Non-fatal error for stream {stream_id}, health monitoring will attempt recovery if needed")
-                
-        elif t == Gst.MessageType.WARNING:
-            warn, debug = message.parse_warning()
-            warning_msg = str(warn.message)
-            
-            # Filter out specific GStreamer warnings that are non-critical
-            warning_filters = [
-                "gst_segment_to_running_time",
-                "segment format",
-                "assertion",
-                "format == format"
-            ]
-            
-            if any(filter_text in warning_msg for filter_text in warning_filters):
-                # Suppress these specific warnings
-                log.debug(f"[STREAM] Suppressed GStreamer warning for stream {stream_id}: {warning_msg}")
-                return
+                # For non-fatal errors, the flow watchdog recovers the stream if its data stops
+                log.warning(f"[STREAM] Non-fatal error for stream {stream_id}, watchdog will recover it if data stops")
                 
-            # Log other warnings normally
-            log.warning(f"[STREAM] ⚠ GStreamer warning for stream {stream_id}: {warning_msg}")
-            if debug:
-                log.debug(f"[STREAM] Warning debug info: {debug}")
+        elif t == Gst.MessageType.SEGMENT_DONE:
+            # Segment seek reached the end of the requested playback window in this file
+            log.info(f"[STREAM] Playback segment done for stream {stream_id}")
+            self._advance_playback_segment(stream_id)
                 
         elif t == Gst.MessageType.EOS:
             log.info(f"[STREAM] ✅ End of stream reached for stream {stream_id}.")
             
+            # Playback streams continue with the next file of the window instead of looping
+            if "playback" in self.streams_info.get(stream_id, {}):
+                self._advance_playback_segment(stream_id)
             # For file sources, loop the video by restarting the pipeline
-            if stream_id in self.streams_info and os.path.isfile(self.streams_info[stream_id]["video_path"]):
+            elif stream_id in self.streams_info and os.path.isfile(self.streams_info[stream_id]["video_path"]):
                 log.info(f"[STREAM] Restarting video file for continuous playback of stream {stream_id}")
                 self._restart_stream_for_looping(stream_id)
             else:
                 self.stop_stream(stream_id)
-                
-        elif t == Gst.MessageType.STATE_CHANGED:
-            if stream_id in self.pipelines and message.src == self.pipelines[stream_id]:
-                old_state, new_state, pending_state = message.parse_state_changed()
-                log.debug(f"[STREAM] Pipeline state changed for stream {stream_id} from {old_state.value_nick} to {new_state.value_nick}")
-                
-                # Reset error counter when pipeline reaches PLAYING state
-                if new_state == Gst.State.PLAYING:
-                    if stream_id in self.stream_health:
-                        self.stream_health[stream_id]["errors"] = 0
-        
-        elif t == Gst.MessageType.INFO:
-            # Handle info messages quietly
-            info, debug = message.parse_info()
-            log.debug(f"[STREAM] GStreamer info for stream {stream_id}: {info.message}")
-            
-        elif t == Gst.MessageType.TAG:
-            # Handle tag messages (metadata) quietly
-            log.debug(f"[STREAM] Received tag message for stream {stream_id}")
-            
-        # Ignore other message types to reduce log noise
     
     def _restart_stream_for_looping(self, stream_id):
         """Restart the stream to create a looping effect for video files"""
@@ -673,7 +662,8 @@ class MediaStreamer:
             info["dest_ip"], 
             info["dest_port"],
             info["ssrc"],
-            info.get("encoder_params", {})
+            info.get("encoder_params", {}),
+            info.get("transport_protocol", "UDP")
         )
         
         log.info(f"[STREAM] Video restarted for continuous looping of stream {stream_id}")
@@ -690,8 +680,12 @@ class MediaStreamer:
             for sid in list(self.pipelines.keys()):
                 self.stop_stream(sid)
             return
-                
-        # Stop the specific stream
+        
+        # Serialized with starts, restarts and bus handlers of the same stream
+        self.runtime.call(stream_id, self._stop_stream, stream_id)
+    
+    def _stop_stream(self, stream_id):
+        """Tear down one stream's pipeline and resources (runs in its command queue)"""
         if stream_id in self.pipelines:
             try:
                 pipeline = self.pipelines[stream_id]
@@ -702,10 +696,8 @@ class MediaStreamer:
                 pipeline.set_state(Gst.State.NULL)
                 pipeline.get_state(Gst.CLOCK_TIME_NONE)  # Wait for state change
                 
-                # Remove bus signal watchers to prevent memory leaks
-                bus = pipeline.get_bus()
-                if bus:
-                    bus.remove_signal_watch()
+                # Remove the bus watch to prevent memory leaks
+                self.runtime.unwatch_bus(stream_id)
                     
                 # Clean up the pipeline reference
                 del self.pipelines[stream_id]
@@ -718,6 +710,14 @@ class MediaStreamer:
                 if stream_id in self.pipelines:
                     del self.pipelines[stream_id]
             
+            # Close the native PS/RTP sender
+            if stream_id in self.ps_senders:
+                self.ps_senders.pop(stream_id).close()
+            self.udp_egress.unregister_stream(stream_id)
+            self.watchdog.unwatch(stream_id)
+            if self._is_tcp_passive(stream_id):
+                self.tcp_listener.close_session(stream_id)
+            
             # Clean up appsink/appsrc resources
             if stream_id in self.appsrc_elements:
                 del self.appsrc_elements[stream_id]
@@ -733,21 +733,20 @@ class MediaStreamer:
                 
             # Remove stream info
             if stream_id in self.streams_info:
+                was_download = self.streams_info[stream_id].get("playback", {}).get("download")
                 del self.streams_info[stream_id]
+                
+                # Hand the finished download's share back to the remaining ones
+                if was_download:
+                    self._rebalance_downloads()
     
     def shutdown(self):
         """Completely shut down the streamer and all threads"""
         self.running = False
         self.stop_stream()  # Stop all streams
         
-        if self.main_loop and self.main_loop.is_running():
-            self.main_loop.quit()
-            
-        # Wait for threads to complete
-        if self.main_loop_thread and self.main_loop_thread.is_alive():
-            self.main_loop_thread.join(1)
-        if self.health_check_thread and self.health_check_thread.is_alive():
-            self.health_check_thread.join(1)
+        # Stop the shared main loop and command workers
+        self.runtime.stop()
             
         log.info("[STREAM] Media streamer shut down")
     
@@ -781,7 +780,7 @@ class MediaStreamer:
         if self.streams_info[stream_id].get("start_time"):
             duration = int(time.time() - self.streams_info[stream_id]["start_time"])
         
-        # Calculate health status
+        # Calculate health status; a PLAYING pipeline with no buffer flow is not healthy
         health_status = "good"
         if stream_id in self.stream_health and self.stream_health[stream_id]["errors"] > 0:
             error_count = self.stream_health[stream_id]["errors"]
@@ -789,6 +788,8 @@ class MediaStreamer:
                 health_status = "critical"
             else:
                 health_status = "warning"
+        if self.watchdog.is_stalled(stream_id):
+            health_status = "critical"
                 
         result = {
             "stream_id": stream_id,
@@ -809,9 +810,44 @@ class MediaStreamer:
                 "recoveries": self.stream_health[stream_id].get("recoveries", 0),
                 "last_error": self.stream_health[stream_id].get("last_error")
             })
+        
+        flow_stats = self.watchdog.get_stats(stream_id)
+        if flow_stats:
+            result["flow"] = flow_stats
+        
+        egress_stats = self.udp_egress.get_stats(stream_id) or self.tcp_listener.get_stats(stream_id)
+        if egress_stats:
+            result["egress"] = egress_stats
             
         return result
         
+    def _udp_sink(self, dest_ip, dest_port, sync=False):
+        """Pipeline tail for UDP output: batched egress appsink or plain udpsink"""
+        if self.udp_egress.enabled:
+            return f'appsink name={UDP_EGRESS_SINK} emit-signals=true sync={str(sync).lower()} async=false max-buffers=0 drop=false'
+        return f'udpsink host={dest_ip} port={dest_port} sync={str(sync).lower()} async=false'
+    
+    def _attach_udp_egress(self, stream_id, pipeline, dest_ip, dest_port):
+        """Hook a pipeline's egress appsink (if any) up to the shared UDP sender"""
+        appsink = pipeline.get_by_name(UDP_EGRESS_SINK)
+        if appsink is None:
+            return
+        self.udp_egress.register_stream(stream_id, dest_ip, dest_port)
+        self.udp_egress.attach_appsink(stream_id, appsink)
+        
+    def _is_tcp_passive(self, stream_id):
+        """True when the platform connects to us for this stream's media"""
+        info = self.streams_info.get(stream_id, {})
+        return info.get("tcp_setup") == "passive" and info.get("local_port") is not None
+    
+    def _attach_tcp_passive(self, stream_id, pipeline, ssrc):
+        """Hook a pipeline's TCP-passive appsink (if any) up to the pooled listener"""
+        appsink = pipeline.get_by_name(TCP_PASSIVE_SINK)
+        if appsink is None:
+            return
+        self.tcp_listener.open_session(stream_id, self.streams_info[stream_id]["local_port"], ssrc)
+        self.tcp_listener.attach_appsink(stream_id, appsink)
+        
     def get_active_streams_count(self):
         """Get the count of currently active streams"""
         return len(self.pipelines)
@@ -874,7 +910,8 @@ class MediaStreamer:
             self.processing_enabled[stream_id] = True
         
         # Create the processing pipeline
-        success = self._create_processing_pipeline(stream_id, video_path, dest_ip, dest_port, ssrc, encoder_params)
+        success = self.runtime.call(stream_id, self._create_processing_pipeline, stream_id, video_path,
+                                    dest_ip, dest_port, ssrc, encoder_params)
         
         # Start health monitoring
         self.start_health_monitoring()
@@ -883,140 +920,586 @@ class MediaStreamer:
     
     def start_recording_playback(self, recording_info, dest_ip, dest_port, 
                                start_timestamp=None, end_timestamp=None,
-                               ssrc=None, encoder_params=None):
+                               ssrc=None, encoder_params=None, segments=None,
+                               on_complete=None):
         """
         Start streaming a recording with time-based parameters
         
         This method allows playback of a recording with specific start and end times
-        according to GB28181 requirements for historical playback.
+        according to GB28181 requirements for historical playback. The requested
+        wall-clock window is mapped to file offsets: each file is opened with a
+        flushing keyframe seek to the window start and a segment seek that stops
+        at the window end, and playback moves on to the next file when a segment
+        finishes.
         
         Args:
             recording_info (dict): Recording metadata
             dest_ip (str): Destination IP address
             dest_port (int): Destination port
-            start_timestamp (str, optional): Start time in GB28181 format (YYYYMMDDThhmmssZ)
-            end_timestamp (str, optional): End time in GB28181 format
+            start_timestamp (str or float, optional): Start time as Unix seconds or GB28181 format (YYYYMMDDThhmmssZ, UTC)
+            end_timestamp (str or float, optional): End time, in the same form
             ssrc (str, optional): SSRC value for RTP
             encoder_params (dict, optional): Encoding parameters
+            segments (list, optional): Ordered file segments covering the window, as
+                returned by RecordingManager.get_playback_segments()
+            on_complete (callable, optional): Called once the whole window has been sent
             
         Returns:
             bool: True if stream started successfully, False otherwise
         """
         log.info(f"[STREAM] Starting historical playback to {dest_ip}:{dest_port}")
         
-        video_path = recording_info.get("path")
-        if not video_path or not os.path.isfile(video_path):
-            log.error(f"[STREAM] Recording file not found: {video_path}")
+        if not segments:
+            video_path = recording_info.get("path")
+            if not video_path or not os.path.isfile(video_path):
+                log.error(f"[STREAM] Recording file not found: {video_path}")
+                return False
+            segments = [self._playback_segment_from_recording(recording_info, start_timestamp, end_timestamp)]
+        
+        segments = [seg for seg in segments if seg.get("path") and os.path.isfile(seg["path"])]
+        if not segments:
+            log.error("[STREAM] None of the recording files for this playback window exist")
             return False
             
         # Generate a unique stream ID for this playback
-        stream_id = f"{dest_ip}:{dest_port}:playback"
-        if ssrc:
-            stream_id = f"{stream_id}:{ssrc}"
+        stream_id = self.get_playback_stream_id(dest_ip, dest_port, ssrc)
+        
+        # Start GLib main loop if not running already
+        self.start_glib_loop()
+        
+        # If this stream is already running, stop it first
+        if stream_id in self.pipelines:
+            log.info(f"[STREAM] Stopping previous stream with ID {stream_id}...")
+            self.stop_stream(stream_id)
+        
+        log.info(f"[STREAM] Playback window spans {len(segments)} file(s), "
+                 f"first seek to {segments[0].get('offset', 0):.1f}s in {segments[0]['path']}")
+        
+        self.streams_info[stream_id] = {
+            "video_path": segments[0]["path"],
+            "dest_ip": dest_ip,
+            "dest_port": dest_port,
+            "ssrc": ssrc or "0000000001",  # Provide default SSRC if None
+            "start_time": time.time(),
+            "encoder_params": encoder_params or {},
+            "transport_protocol": "UDP",
+            "playback": {
+                "segments": segments,
+                "index": 0,
+                "on_complete": on_complete
+            }
+        }
+        
+        success = self.runtime.call(stream_id, self._create_pipeline, stream_id, segments[0]["path"],
+                                    dest_ip, dest_port, ssrc, encoder_params)
+        
+        # Start health monitoring
+        self.start_health_monitoring()
+        
+        return success
+    
+    def start_recording_download(self, segments, dest_ip, dest_port, ssrc=None,
+                                 speed=1.0, transport_protocol="UDP", on_complete=None):
+        """
+        Start a GB28181 Download session for a recorded time window
+        
+        The stored H.264 is remuxed to PS without re-encoding and sent at the
+        requested speed multiplier (faster than realtime). Concurrent downloads
+        share the media.download_total_speed budget equally so one export cannot
+        starve the others of disk bandwidth.
+        
+        Args:
+            segments (list): Ordered file segments covering the window, as
+                returned by RecordingManager.get_playback_segments()
+            dest_ip (str): Destination IP address
+            dest_port (int): Destination port
+            ssrc (str, optional): SSRC value for RTP
+            speed (float): Requested download speed multiplier (downloadspeed)
+            transport_protocol (str): Transport protocol ("UDP", "TCP/RTP/AVP", etc.)
+            on_complete (callable, optional): Called once the whole window has been sent
             
-        # Validate timestamps if provided
-        playback_settings = {}
+        Returns:
+            bool: True if the download started successfully, False otherwise
+        """
+        segments = [seg for seg in (segments or []) if seg.get("path") and os.path.isfile(seg["path"])]
+        if not segments:
+            log.error("[STREAM] None of the recording files for this download window exist")
+            return False
+        
+        stream_id = self.get_playback_stream_id(dest_ip, dest_port, ssrc, mode="download")
+        
+        self.start_glib_loop()
+        
+        if stream_id in self.pipelines:
+            log.info(f"[STREAM] Stopping previous stream with ID {stream_id}...")
+            self.stop_stream(stream_id)
         
-        # Convert timestamps to Unix timestamps if provided
-        start_time_unix = None
-        end_time_unix = None
+        log.info(f"[STREAM] ⏬ Starting download to {dest_ip}:{dest_port} at {speed}x, "
+                 f"{len(segments)} file(s) in window")
+        
+        self.streams_info[stream_id] = {
+            "video_path": segments[0]["path"],
+            "dest_ip": dest_ip,
+            "dest_port": dest_port,
+            "ssrc": ssrc or "0000000001",
+            "start_time": time.time(),
+            "encoder_params": {},
+            "transport_protocol": transport_protocol,
+            "playback": {
+                "segments": segments,
+                "index": 0,
+                "download": True,
+                "requested_speed": max(1.0, float(speed)),
+                "scale": max(1.0, float(speed)),
+                "on_complete": on_complete
+            }
+        }
+        
+        # Give the new download its share before its pipeline starts
+        self._rebalance_downloads()
+        
+        success = self.runtime.call(stream_id, self._create_pipeline, stream_id, segments[0]["path"],
+                                    dest_ip, dest_port, ssrc, None, transport_protocol)
+        if not success:
+            self.streams_info.pop(stream_id, None)
+            self._rebalance_downloads()
+        
+        self.start_health_monitoring()
+        
+        return success
+    
+    def _rebalance_downloads(self):
+        """Split the download speed budget equally between active download sessions"""
+        downloads = [sid for sid, info in list(self.streams_info.items())
+                     if info.get("playback", {}).get("download")]
+        if not downloads:
+            return
+        
+        budget = float(self.config.get("media", {}).get("download_total_speed", 16))
+        share = budget / len(downloads)
+        instant_rate = getattr(Gst.SeekFlags, "INSTANT_RATE_CHANGE", None)
+        
+        for sid in downloads:
+            playback = self.streams_info[sid]["playback"]
+            rate = min(playback["requested_speed"], share)
+            if rate == playback.get("scale"):
+                continue
+            
+            playback["scale"] = rate
+            log.info(f"[STREAM] Download {sid} rate set to {rate:.2f}x ({len(downloads)} active)")
+            
+            # The native sender's pacing caps the download at its share right away
+            sender = self.ps_senders.get(sid)
+            if sender:
+                sender.set_pacing(self._download_pacing_kbps(sid))
+            
+            # Running downloads change rate in place; without instant rate change
+            # support the new share takes effect from the next file
+            pipeline = self.pipelines.get(sid)
+            if pipeline and instant_rate is not None:
+                pipeline.seek(rate, Gst.Format.TIME, instant_rate,
+                              Gst.SeekType.NONE, -1, Gst.SeekType.NONE, -1)
+    
+    def _create_download_pipeline(self, stream_id, video_path, dest_ip, dest_port, ssrc=None, transport_protocol="UDP"):
+        """Create a remux-only pipeline (demux ! h264parse ! mpegpsmux) for Download sessions"""
+        file_ext = os.path.splitext(video_path)[1].lower()
+        demuxer = {
+            ".mp4": "qtdemux", ".mov": "qtdemux", ".m4v": "qtdemux",
+            ".avi": "avidemux", ".mkv": "matroskademux",
+            ".ts": "tsdemux", ".flv": "flvdemux"
+        }.get(file_ext, "parsebin")
+        
+        native = self.config.get("media", {}).get("ps_packetizer", "native") == "native"
+        
+        pipeline_str = (
+            f'filesrc location="{video_path}" ! {demuxer} ! queue ! h264parse ! '
+            f'video/x-h264,stream-format=byte-stream,alignment=au ! '
+        )
+        if native:
+            # PS muxing, RTP packetization and pacing are done by PSRtpSender
+            pipeline_str += 'appsink name=ps_sink emit-signals=true sync=true max-buffers=50 drop=false'
+        else:
+            ssrc_value = ssrc or "0000000001"
+            try:
+                ssrc_int = int(ssrc_value) if str(ssrc_value).isdigit() else int(str(ssrc_value), 16)
+            except (ValueError, TypeError):
+                log.warning(f"[STREAM] Invalid SSRC value '{ssrc_value}', using default")
+                ssrc_int = 1
+            
+            pipeline_str += f'mpegpsmux ! rtpgstpay pt=96 perfect-rtptime=false ssrc={ssrc_int} ! '
+            if "TCP" in transport_protocol:
+                pipeline_str += f'rtpstreampay ! tcpclientsink async=false host={dest_ip} port={dest_port} sync=true'
+            else:
+                pipeline_str += self._udp_sink(dest_ip, dest_port, sync=True)
+        
+        log.debug(f"[STREAM] Download pipeline for stream {stream_id}: {pipeline_str}")
+        
+        try:
+            pipeline = Gst.parse_launch(pipeline_str)
+            self.pipelines[stream_id] = pipeline
+            self._attach_udp_egress(stream_id, pipeline, dest_ip, dest_port)
+            
+            if native:
+                # The sender outlives the per-file pipelines so RTP sequence and
+                # timestamps stay continuous across the whole window
+                if stream_id not in self.ps_senders:
+                    self.ps_senders[stream_id] = PSRtpSender(
+                        dest_ip, dest_port, ssrc or "0000000001",
+                        transport=transport_protocol,
+                        mtu=int(self.config.get("media", {}).get("rtp_mtu", 1400)),
+                        pacing_kbps=self._download_pacing_kbps(stream_id)
+                    )
+                else:
+                    self.ps_senders[stream_id].set_pacing(self._download_pacing_kbps(stream_id))
+                appsink = pipeline.get_by_name("ps_sink")
+                appsink.connect("new-sample", lambda sink, sid=stream_id: self._on_ps_sample(sink, sid))
+            
+            if not self._seek_playback_segment(stream_id, pipeline):
+                pipeline.set_state(Gst.State.NULL)
+                del self.pipelines[stream_id]
+                return False
+            
+            if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+                log.error(f"[STREAM] Failed to set download pipeline to PLAYING for {stream_id}")
+                pipeline.set_state(Gst.State.NULL)
+                del self.pipelines[stream_id]
+                return False
+            
+            self.runtime.watch_bus(stream_id, pipeline,
+                                   lambda b, m, sid=stream_id: self._on_bus_message(b, m, sid), BUS_MESSAGES)
+            
+            self._track_stream_health(stream_id, pipeline)
+            
+            log.info(f"[STREAM] ✅ Download pipeline for stream {stream_id} started (remux only).")
+            return True
+        except Exception as e:
+            log.exception(f"[STREAM] Failed to launch download pipeline for stream {stream_id}: {e}")
+            if stream_id in self.pipelines:
+                self.pipelines[stream_id].set_state(Gst.State.NULL)
+                del self.pipelines[stream_id]
+            return False
+    
+    def _download_pacing_kbps(self, stream_id):
+        """Pacing rate for a download: the file's average bitrate at its share of download_total_speed"""
+        playback = self.streams_info[stream_id]["playback"]
+        segment = playback["segments"][playback["index"]]
+        size = segment.get("size")
+        duration = segment.get("duration")
+        if not size or not duration:
+            return None
+        return (size * 8 / duration / 1000) * playback.get("scale", playback.get("requested_speed", 1.0))
+    
+    def _on_ps_sample(self, appsink, stream_id):
+        """Hand an encoded access unit from the download pipeline to the native PS/RTP sender"""
+        sample = appsink.emit("pull-sample")
+        if not sample:
+            return Gst.FlowReturn.ERROR
+        
+        sender = self.ps_senders.get(stream_id)
+        if not sender:
+            return Gst.FlowReturn.OK
+        
+        buffer = sample.get_buffer()
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return Gst.FlowReturn.ERROR
+        
+        try:
+            pts = buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else buffer.dts
+            if pts == Gst.CLOCK_TIME_NONE:
+                pts = 0
+            dts = buffer.dts if buffer.dts != Gst.CLOCK_TIME_NONE else None
+            
+            sent = sender.send_frame(
+                bytes(map_info.data),
+                pts * 90000 // Gst.SECOND,
+                dts * 90000 // Gst.SECOND if dts is not None else None,
+                keyframe=not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+            )
+        except Exception as e:
+            log.error(f"[STREAM] Error packetizing sample for stream {stream_id}: {e}")
+            sent = False
+        finally:
+            buffer.unmap(map_info)
+        
+        return Gst.FlowReturn.OK if sent else Gst.FlowReturn.ERROR
+    
+    def _playback_segment_from_recording(self, recording_info, start_timestamp=None, end_timestamp=None):
+        """Build a single playback segment for a recording and an optional GB28181 time window
+        
+        The window is given as Unix seconds (SDP t=) or as YYYYMMDDTHHMMSSZ in local
+        time, the convention RecordingManager files recordings under.
+        """
+        from datetime import datetime
+        
+        def to_unix(value):
+            if isinstance(value, (int, float)):
+                return float(value)
+            return datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S").timestamp()
+        
+        recording_start_time = recording_info.get("timestamp")
+        segment = {
+            "path": recording_info.get("path"),
+            "timestamp": recording_start_time,
+            "duration": recording_info.get("duration"),
+            "offset": 0.0,
+            "stop": None
+        }
+        
+        if not recording_start_time:
+            return segment
         
         if start_timestamp:
             try:
-                from datetime import datetime
-                # Parse GB28181 format timestamp (YYYYMMDDThhmmssZ)
-                dt_format = "%Y%m%dT%H%M%SZ"
-                start_dt = datetime.strptime(start_timestamp, dt_format)
-                start_time_unix = start_dt.timestamp()
-                log.info(f"[STREAM] Playback start time: {start_dt}")
+                start_time_unix = to_unix(start_timestamp)
+                segment["offset"] = max(0.0, start_time_unix - recording_start_time)
             except Exception as e:
                 log.error(f"[STREAM] Failed to parse start timestamp {start_timestamp}: {e}")
                 
         if end_timestamp:
             try:
-                from datetime import datetime
-                # Parse GB28181 format timestamp (YYYYMMDDThhmmssZ)
-                dt_format = "%Y%m%dT%H%M%SZ"
-                end_dt = datetime.strptime(end_timestamp, dt_format)
-                end_time_unix = end_dt.timestamp()
-                log.info(f"[STREAM] Playback end time: {end_dt}")
+                end_time_unix = to_unix(end_timestamp)
+                if end_time_unix > recording_start_time:
+                    segment["stop"] = end_time_unix - recording_start_time
             except Exception as e:
                 log.error(f"[STREAM] Failed to parse end timestamp {end_timestamp}: {e}")
         
-        # Prepare time parameters for playback
-        if start_time_unix or end_time_unix:
-            try:
-                # Get recording start timestamp from metadata
-                recording_start_time = recording_info.get("timestamp")
-                
-                # Create a frame processor to handle time-based playback
-                def time_based_frame_processor(frame, timestamp, stream_info):
-                    # If we don't have stream info or start time info, just pass through
-                    if not stream_info or "start_time" not in stream_info:
-                        return frame, timestamp
-                    
-                    # Calculate relative time in the video
-                    stream_start_time = stream_info["start_time"]
-                    video_time = recording_start_time + (timestamp - stream_start_time)
-                    
-                    # Check if this frame is within our requested time window
-                    is_in_range = True
-                    
-                    if start_time_unix and video_time < start_time_unix:
-                        is_in_range = False
-                    
-                    if end_time_unix and video_time > end_time_unix:
-                        is_in_range = False
-                    
-                    if not is_in_range:
-                        # Return a black frame for frames outside the time range
-                        # or we could return None to skip the frame entirely
-                        black_frame = np.zeros_like(frame)
-                        return black_frame, timestamp
-                    
-                    # Add timestamp overlay to the frame
-                    # Create a copy of the frame
-                    processed_frame = frame.copy()
-                    
-                    # Format the timestamp for display
-                    dt = datetime.fromtimestamp(video_time)
-                    time_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    # Add text to the frame
-                    cv2.putText(
-                        processed_frame,
-                        f"Time: {time_str}",
-                        (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1,
-                        (0, 255, 0),  # Green
-                        2
-                    )
-                    
-                    return processed_frame, timestamp
-                    
-                # Use the processing-enabled pipeline for time-based playback
-                return self.start_stream_with_processing(
-                    video_path=video_path,
-                    dest_ip=dest_ip,
-                    dest_port=dest_port,
-                    frame_processor_callback=time_based_frame_processor,
-                    ssrc=ssrc,
-                    encoder_params=encoder_params
-                )
+        return segment
+    
+    def _seek_playback_segment(self, stream_id, pipeline):
+        """
+        Preroll a playback pipeline and seek it to the current segment window
+        
+        Performs a flushing seek to the keyframe at or before the segment offset,
+        with a segment stop at the window end so the pipeline posts SEGMENT_DONE
+        instead of decoding the rest of the file.
+        
+        Returns:
+            bool: True if the pipeline is positioned and ready to play
+        """
+        playback = self.streams_info[stream_id]["playback"]
+        segment = playback["segments"][playback["index"]]
+        offset = playback.pop("resume_offset", None)
+        if offset is None:
+            offset = segment.get("offset") or 0.0
+        
+        ret = pipeline.set_state(Gst.State.PAUSED)
+        if ret == Gst.StateChangeReturn.FAILURE:
+            log.error(f"[STREAM] Failed to preroll playback pipeline for {stream_id}")
+            return False
+        pipeline.get_state(5 * Gst.SECOND)
+        
+        # Pace playback against the pipeline clock so Scale changes take effect
+        sinks = pipeline.iterate_sinks()
+        while True:
+            result, sink = sinks.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            sink.set_property("sync", True)
+        
+        if offset <= 0 and segment.get("stop") is None and playback.get("scale", 1.0) == 1.0:
+            return True
+        
+        # The sinks do not wait for preroll (async=false), so the demuxer may still be
+        # reading the file header when we get here; retry briefly until it accepts the seek
+        for _ in range(20):
+            if self._seek_playback(stream_id, pipeline, offset):
+                return True
+            time.sleep(0.1)
+        
+        log.error(f"[STREAM] Seek to {offset:.1f}s failed for playback {stream_id}")
+        return False
+    
+    def _seek_playback(self, stream_id, pipeline, position):
+        """
+        Seek a playback pipeline within its current file
+        
+        Uses the stream's current scale as the playback rate. At high scales the
+        decoder is switched to keyframe-only trick mode so fast-forward does not
+        have to decode every frame.
+        
+        Args:
+            stream_id (str): Playback stream ID
+            pipeline (Gst.Pipeline): Pipeline to seek
+            position (float): Position in seconds relative to the start of the file
+            
+        Returns:
+            bool: True if the seek was accepted
+        """
+        playback = self.streams_info[stream_id]["playback"]
+        segment = playback["segments"][playback["index"]]
+        stop = segment.get("stop")
+        rate = playback.get("scale", 1.0)
+        
+        flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_BEFORE | Gst.SeekFlags.SEGMENT
+        keyframe_only_scale = self.config.get("media", {}).get("trickmode_key_units_scale", 4.0)
+        if rate >= keyframe_only_scale and not playback.get("download"):
+            flags |= Gst.SeekFlags.TRICKMODE | Gst.SeekFlags.TRICKMODE_KEY_UNITS
+        
+        stop_type = Gst.SeekType.SET if stop is not None else Gst.SeekType.NONE
+        stop_ns = int(stop * Gst.SECOND) if stop is not None else -1
+        
+        if not pipeline.seek(rate, Gst.Format.TIME, flags,
+                             Gst.SeekType.SET, int(max(0.0, position) * Gst.SECOND),
+                             stop_type, stop_ns):
+            return False
+        
+        log.info(f"[STREAM] Playback {stream_id} seeked to {position:.1f}s at scale {rate}"
+                 + (f", stopping at {stop:.1f}s" if stop is not None else ""))
+        return True
+    
+    def _locate_playback_position(self, playback, npt):
+        """Map a position relative to the playback window start onto (segment index, file position)"""
+        elapsed = 0.0
+        for index, segment in enumerate(playback["segments"]):
+            offset = segment.get("offset") or 0.0
+            end = segment.get("stop")
+            if end is None:
+                end = segment.get("duration") or 0.0
+            length = max(0.0, end - offset)
+            if npt < elapsed + length:
+                return index, offset + (npt - elapsed)
+            elapsed += length
+        return None, None
+    
+    def control_playback(self, stream_id, method, scale=None, position=None):
+        """
+        Apply a GB28181 MANSRTSP playback control to a running playback stream
+        
+        PAUSE pauses the pipeline in place. PLAY resumes it, optionally jumping to
+        a new position (Range) and/or changing speed (Scale). Jumps within the
+        current file and scale changes are done with a flushing seek on the
+        running pipeline, so the encoder is not restarted; only jumps into a
+        different file reopen the pipeline.
+        
+        Args:
+            stream_id (str): Playback stream ID
+            method (str): MANSRTSP method (PLAY, PAUSE or TEARDOWN)
+            scale (float, optional): Playback speed multiplier
+            position (float, optional): Position in seconds from the playback window start
+            
+        Returns:
+            bool: True if the control was applied
+        """
+        # Serialized with the EOS/SEGMENT_DONE handlers that advance the same playback
+        return self.runtime.call(stream_id, self._control_playback, stream_id, method, scale, position)
+    
+    def _control_playback(self, stream_id, method, scale=None, position=None):
+        """Apply a playback control (runs in the stream's command queue)"""
+        info = self.streams_info.get(stream_id)
+        pipeline = self.pipelines.get(stream_id)
+        if not info or not pipeline or "playback" not in info:
+            log.warning(f"[STREAM] Playback control for unknown stream {stream_id}")
+            return False
+        
+        playback = info["playback"]
+        method = method.upper()
+        
+        try:
+            if method == "TEARDOWN":
+                self.stop_stream(stream_id)
+                return True
+            
+            if method == "PAUSE":
+                # A paused playback sends nothing on purpose
+                self.watchdog.suspend(stream_id)
+                ret = pipeline.set_state(Gst.State.PAUSED)
+                log.info(f"[STREAM] ⏸ Playback {stream_id} paused")
+                return ret != Gst.StateChangeReturn.FAILURE
+            
+            if method != "PLAY":
+                log.warning(f"[STREAM] Unsupported playback control method: {method}")
+                return False
+            
+            if scale is not None:
+                if scale <= 0:
+                    log.warning(f"[STREAM] Unsupported playback scale {scale} for {stream_id}")
+                    return False
+                playback["scale"] = scale
+            
+            if position is not None:
+                index, file_position = self._locate_playback_position(playback, position)
+                if index is None:
+                    log.warning(f"[STREAM] Playback position {position}s is outside the window of {stream_id}")
+                    return False
                 
-            except Exception as e:
-                log.error(f"[STREAM] Error setting up time-based playback: {e}")
+                if index != playback["index"]:
+                    # Position lies in another file of the window: reopen on that file
+                    playback["index"] = index
+                    playback["resume_offset"] = file_position
+                    return self._open_playback_segment(stream_id)
+            elif scale is not None:
+                # Rate change only: re-seek from where we are now
+                ok, current = pipeline.query_position(Gst.Format.TIME)
+                file_position = current / Gst.SECOND if ok else None
+            else:
+                file_position = None
+            
+            if file_position is not None and not self._seek_playback(stream_id, pipeline, file_position):
+                log.error(f"[STREAM] Seek failed for playback {stream_id}")
                 return False
-        else:
-            # If no time constraints, use regular streaming
-            return self.start_stream(
-                video_path=video_path,
-                dest_ip=dest_ip,
-                dest_port=dest_port,
-                ssrc=ssrc,
-                encoder_params=encoder_params
-            )
+            
+            ret = pipeline.set_state(Gst.State.PLAYING)
+            self.watchdog.resume(stream_id)
+            log.info(f"[STREAM] ▶ Playback {stream_id} playing at scale {playback.get('scale', 1.0)}")
+            return ret != Gst.StateChangeReturn.FAILURE
+        
+        except Exception as e:
+            log.error(f"[STREAM] Error applying playback control to {stream_id}: {e}")
+            return False
+    
+    def _advance_playback_segment(self, stream_id):
+        """Move a playback stream on to the next file of its window, or finish it"""
+        info = self.streams_info.get(stream_id)
+        if not info or "playback" not in info:
+            return
+        
+        playback = info["playback"]
+        playback["index"] += 1
+        
+        if playback["index"] >= len(playback["segments"]):
+            log.info(f"[STREAM] ✅ Playback window finished for stream {stream_id}")
+            self.stop_stream(stream_id)
+            if playback.get("on_complete"):
+                try:
+                    playback["on_complete"]()
+                except Exception as e:
+                    log.error(f"[STREAM] Error in playback completion callback for {stream_id}: {e}")
+            return
+        
+        self._open_playback_segment(stream_id)
+    
+    def _open_playback_segment(self, stream_id):
+        """Replace a playback stream's pipeline with one opened on its current segment"""
+        info = self.streams_info[stream_id]
+        playback = info["playback"]
+        segment = playback["segments"][playback["index"]]
+        info["video_path"] = segment["path"]
+        log.info(f"[STREAM] Playback {stream_id} continuing with file "
+                 f"{playback['index'] + 1}/{len(playback['segments'])}: {segment['path']}")
+        
+        # Tear down the previous file's pipeline before opening the next one
+        if stream_id in self.pipelines:
+            pipeline = self.pipelines.pop(stream_id)
+            pipeline.set_state(Gst.State.NULL)
+            self.runtime.unwatch_bus(stream_id)
+        
+        return self._create_pipeline(
+            stream_id,
+            segment["path"],
+            info["dest_ip"],
+            info["dest_port"],
+            info["ssrc"],
+            info.get("encoder_params", {}),
+            info.get("transport_protocol", "UDP")
+        )
+    
+    def get_playback_stream_id(self, dest_ip, dest_port, ssrc=None, mode="playback"):
+        """Get the stream ID used for a historical playback or download stream"""
+        stream_id = f"{dest_ip}:{dest_port}:{mode}"
+        if ssrc:
+            stream_id = f"{stream_id}:{ssrc}"
+        return stream_id
     
     def _create_processing_pipeline(self, stream_id, video_path, dest_ip, dest_port, ssrc=None, encoder_params=None):
         """Create a GStreamer pipeline with appsink/appsrc for frame processing"""
@@ -1212,21 +1695,12 @@ class MediaStreamer:
             self.pipelines[stream_id] = pipeline
             pipeline.set_state(Gst.State.PLAYING)
             
-            # Setup bus to watch for EOS and errors
-            bus = pipeline.get_bus()
-            bus.add_signal_watch()
-            bus.connect("message", lambda b, m, sid=stream_id: self._on_bus_message(b, m, sid))
+            # Watch the bus for EOS, errors and segment ends only
+            self.runtime.watch_bus(stream_id, pipeline,
+                                   lambda b, m, sid=stream_id: self._on_bus_message(b, m, sid), BUS_MESSAGES)
             
             # Initialize stream health monitoring
-            self.stream_health[stream_id] = {
-                "active": True,
-                "start_time": time.time(),
-                "errors": 0,
-                "last_error": None,
-                "recoveries": 0,
-                "last_recovery": None,
-                "watchdog_time": time.time()
-            }
+            self._track_stream_health(stream_id, pipeline)
             
             log.info(f"[STREAM] ✅ Processing pipeline for stream {stream_id} started successfully.")
             return True
@@ -0,0 +1,397 @@
+# src/media_workers.py
+
+"""
+Multi-process media workers
+
+With media.workers.processes > 0 the SIP process no longer runs any
+pipelines itself. MediaWorkerPool starts N worker processes, each with its
+own MediaStreamer, GLib loop and GIL, and stands in for the MediaStreamer
+the SIP client talks to:
+
+- start/stop/control calls are sent to a worker over a multiprocessing Pipe
+  and answered asynchronously, so calls from several SIP threads overlap
+- a new stream goes to the least loaded worker; a TCP-passive stream goes
+  to the worker that owns its listening port, since each worker binds its
+  own slice of media.tcp_passive_port_range
+- every reply carries the worker's current stream IDs, which is how the
+  pool knows where to route later stop/control calls
+- playback completion and "recovery gave up" are sent back as events and
+  run the callbacks in the SIP process
+- when a worker dies (e.g. a GStreamer segfault) its streams are reported
+  failed, so their calls are torn down, and the worker is restarted after
+  media.workers.restart_delay seconds; SIP registration is not affected
+
+Settings come from config["media"]["workers"]; processes may be "auto" for
+one worker per CPU core.
+"""
+
+import copy
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from logger import log
+
+
+def _worker_main(index, conn, config):
+    """Entry point of a media worker process"""
+    from media_streamer import MediaStreamer
+
+    streamer = MediaStreamer(config)
+    streamer.start_glib_loop()
+    streamer.start_health_monitoring()
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def on_complete(token):
+        return lambda: send({"event": "complete", "token": token})
+
+    streamer.on_stream_failed = lambda stream_id: send({"event": "failed", "stream_id": stream_id})
+
+    def run(request):
+        kwargs = request["kwargs"]
+        if "on_complete" in kwargs:
+            token = kwargs.pop("on_complete")
+            kwargs["on_complete"] = on_complete(token) if token is not None else None
+        try:
+            if request["method"] == "tcp_reserve_port":
+                result, error = streamer.tcp_listener.reserve_port(), None
+            elif request["method"] == "tcp_release_port":
+                result, error = streamer.tcp_listener.release_port(*request["args"]), None
+            else:
+                result, error = getattr(streamer, request["method"])(*request["args"], **kwargs), None
+        except Exception as e:
+            log.error(f"[WORKER-{index}] {request['method']} failed: {e}")
+            result, error = None, str(e)
+        send({"id": request["id"], "result": result, "error": error, "streams": list(streamer.streams_info)})
+
+    executor = ThreadPoolExecutor(max_workers=config.get("media", {}).get("workers", {}).get("threads", 8))
+    log.info(f"[WORKER-{index}] Media worker started (pid {os.getpid()})")
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request["method"] == "shutdown":
+            break
+        executor.submit(run, request)
+
+    streamer.shutdown()
+    executor.shutdown(wait=False)
+    log.info(f"[WORKER-{index}] Media worker stopped")
+
+
+class _TcpListenerProxy:
+    """tcp_listener of the pool: reserves TCP-passive ports from the workers"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def reserve_port(self):
+        for worker in self.pool._workers_by_load():
+            port = self.pool._call(worker, "tcp_reserve_port")
+            if port:
+                worker["ports"].add(port)
+                return port
+        return None
+
+    def release_port(self, port):
+        worker = self.pool._port_owner(port)
+        if worker:
+            worker["ports"].discard(port)
+            self.pool._call(worker, "tcp_release_port", port)
+
+
+class MediaWorkerPool:
+    """Supervisor that shards media streams across worker processes"""
+
+    def __init__(self, config):
+        workers_config = config.get("media", {}).get("workers", {})
+        processes = workers_config.get("processes", 0)
+        self.processes = (os.cpu_count() or 1) if processes == "auto" else int(processes)
+        self.restart_delay = workers_config.get("restart_delay", 2)
+        self.command_timeout = workers_config.get("command_timeout", 30)
+
+        # Workers get a plain copy; the live config later holds the streamer itself
+        self.config = copy.deepcopy({k: v for k, v in config.items() if k != "streamer"})
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.callbacks = {}  # token -> on_complete callback
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.running = False
+        self.on_stream_failed = None  # called with stream_id once a stream is lost
+        self.tcp_listener = _TcpListenerProxy(self)
+
+        port_start, port_end = config.get("media", {}).get("tcp_passive_port_range", [30000, 30099])
+        share = max(1, (port_end - port_start + 1) // self.processes)
+        for index in range(self.processes):
+            first = port_start + index * share
+            last = port_end if index == self.processes - 1 else first + share - 1
+            self.workers.append({
+                "index": index,
+                "port_range": [first, last],
+                "process": None,
+                "conn": None,
+                "send_lock": threading.Lock(),
+                "pending": {},
+                "streams": set(),
+                "ports": set(),
+                "restarts": 0,
+                "alive": False
+            })
+
+    def start_glib_loop(self):
+        """Start the worker processes (the pipelines' main loops run inside them)"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+        for worker in self.workers:
+            self._spawn(worker)
+        log.info(f"[WORKERS] Started {len(self.workers)} media worker processes")
+
+    def start_health_monitoring(self):
+        """Stream health is watched inside each worker"""
+
+    def _spawn(self, worker):
+        config = copy.deepcopy(self.config)
+        config.setdefault("media", {})["tcp_passive_port_range"] = worker["port_range"]
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(worker["index"], child_conn, config),
+                                       name=f"media-worker-{worker['index']}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker.update({"process": process, "conn": parent_conn, "alive": True})
+        threading.Thread(target=self._read_loop, args=(worker, parent_conn), daemon=True).start()
+        log.info(f"[WORKERS] Worker {worker['index']} running as pid {process.pid}")
+
+    def _read_loop(self, worker, conn):
+        """Dispatch replies and events from one worker until it exits"""
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            if "event" in message:
+                # Callbacks may call back into the pool, so keep this thread free for replies
+                threading.Thread(target=self._on_event, args=(message,), daemon=True).start()
+                continue
+            future = worker["pending"].pop(message["id"], None)
+            worker["streams"] = set(message["streams"])
+            if future:
+                future.set_result(message)
+        self._on_worker_exit(worker, conn)
+
+    def _on_event(self, message):
+        if message["event"] == "complete":
+            callback = self.callbacks.pop(message["token"], None)
+            if callback:
+                callback()
+        elif message["event"] == "failed" and self.on_stream_failed:
+            self.on_stream_failed(message["stream_id"])
+
+    def _on_worker_exit(self, worker, conn):
+        if worker["conn"] is not conn:
+            return
+        worker["alive"] = False
+        process = worker["process"]
+        process.join(1)
+        lost = worker["streams"]
+        worker.update({"streams": set(), "ports": set()})
+        for future in list(worker["pending"].values()):
+            future.set_result({"result": None, "error": "media worker exited", "streams": []})
+        worker["pending"].clear()
+        if not self.running:
+            return
+
+        log.error(f"[WORKERS] ❌ Worker {worker['index']} (pid {process.pid}) exited with code "
+                  f"{process.exitcode}, {len(lost)} stream(s) lost")
+        if self.on_stream_failed:
+            for stream_id in lost:
+                self.on_stream_failed(stream_id)
+
+        time.sleep(self.restart_delay)
+        if self.running:
+            worker["restarts"] += 1
+            self._spawn(worker)
+
+    def _call(self, worker, method, *args, **kwargs):
+        """Run a MediaStreamer method in a worker and wait for its result"""
+        if not worker["alive"]:
+            log.warning(f"[WORKERS] Worker {worker['index']} is down, dropping {method}")
+            return None
+        request_id = next(self._ids)
+        future = Future()
+        worker["pending"][request_id] = future
+        try:
+            with worker["send_lock"]:
+                worker["conn"].send({"id": request_id, "method": method, "args": args, "kwargs": kwargs})
+            reply = future.result(timeout=self.command_timeout)
+        except Exception as e:
+            worker["pending"].pop(request_id, None)
+            log.error(f"[WORKERS] {method} on worker {worker['index']} failed: {e}")
+            return None
+        if reply["error"]:
+            log.error(f"[WORKERS] {method} on worker {worker['index']} raised: {reply['error']}")
+        return reply["result"]
+
+    def _workers_by_load(self):
+        alive = [w for w in self.workers if w["alive"]]
+        return sorted(alive, key=lambda w: len(w["streams"]) + len(w["ports"]))
+
+    def _pick_worker(self, local_port=None):
+        if local_port:
+            return self._port_owner(local_port)
+        alive = self._workers_by_load()
+        return alive[0] if alive else None
+
+    def _port_owner(self, port):
+        for worker in self.workers:
+            first, last = worker["port_range"]
+            if first <= port <= last:
+                return worker
+        return None
+
+    def _stream_owner(self, stream_id):
+        for worker in self.workers:
+            if stream_id in worker["streams"]:
+                return worker
+        return None
+
+    def _callback_token(self, on_complete):
+        if on_complete is None:
+            return None
+        token = next(self._ids)
+        self.callbacks[token] = on_complete
+        return token
+
+    def start_stream(self, video_path, dest_ip, dest_port, ssrc=None, encoder_params=None, transport_protocol="UDP",
+                     tcp_setup="active", local_port=None):
+        """Start a stream on the least loaded worker (or the owner of its TCP-passive port)"""
+        worker = self._pick_worker(local_port)
+        if worker is None:
+            log.error("[WORKERS] ❌ No media worker available")
+            return False
+        if local_port:
+            worker["ports"].discard(local_port)
+        return bool(self._call(worker, "start_stream", video_path, dest_ip, dest_port, ssrc=ssrc,
+                               encoder_params=encoder_params, transport_protocol=transport_protocol,
+                               tcp_setup=tcp_setup, local_port=local_port))
+
+    def start_recording_playback(self, recording_info, dest_ip, dest_port, start_timestamp=None,
+                                 end_timestamp=None, ssrc=None, encoder_params=None, segments=None,
+                                 on_complete=None):
+        worker = self._pick_worker()
+        if worker is None:
+            return False
+        return bool(self._call(worker, "start_recording_playback", recording_info, dest_ip, dest_port,
+                               start_timestamp=start_timestamp, end_timestamp=end_timestamp, ssrc=ssrc,
+                               encoder_params=encoder_params, segments=segments,
+                               on_complete=self._callback_token(on_complete)))
+
+    def start_recording_download(self, segments, dest_ip, dest_port, ssrc=None, speed=1.0,
+                                 transport_protocol="UDP", on_complete=None):
+        worker = self._pick_worker()
+        if worker is None:
+            return False
+        return bool(self._call(worker, "start_recording_download", segments, dest_ip, dest_port, ssrc=ssrc,
+                               speed=speed, transport_protocol=transport_protocol,
+                               on_complete=self._callback_token(on_complete)))
+
+    def get_playback_stream_id(self, dest_ip, dest_port, ssrc=None, mode="playback"):
+        """Get the stream ID used for a historical playback or download stream"""
+        stream_id = f"{dest_ip}:{dest_port}:{mode}"
+        if ssrc:
+            stream_id = f"{stream_id}:{ssrc}"
+        return stream_id
+
+    def control_playback(self, stream_id, method, scale=None, position=None):
+        worker = self._stream_owner(stream_id)
+        if worker is None:
+            log.warning(f"[WORKERS] Playback control for unknown stream {stream_id}")
+            return False
+        return bool(self._call(worker, "control_playback", stream_id, method, scale=scale, position=position))
+
+    def stop_stream(self, stream_id=None):
+        """Stop a stream on its worker, or all streams on every worker"""
+        if stream_id is None:
+            for worker in self.workers:
+                self._call(worker, "stop_stream")
+            return
+        worker = self._stream_owner(stream_id)
+        if worker:
+            self._call(worker, "stop_stream", stream_id)
+
+    def get_stream_status(self, stream_id=None):
+        """Get the status of one stream, or of all streams across the workers"""
+        if stream_id is not None:
+            worker = self._stream_owner(stream_id)
+            status = self._call(worker, "get_stream_status", stream_id) if worker else None
+            return status or {"status": "stopped", "stream_id": stream_id}
+        result = {}
+        for worker in self.workers:
+            for sid, status in (self._call(worker, "get_stream_status") or {}).items():
+                status["worker"] = worker["index"]
+                result[sid] = status
+        return result
+
+    def get_active_streams_count(self):
+        return sum(len(worker["streams"]) for worker in self.workers)
+
+    def register_frame_processor(self, name, processor_function):
+        """Register a named frame processor in every worker (must be a module-level function)"""
+        for worker in self.workers:
+            self._call(worker, "register_frame_processor", name, processor_function)
+
+    def get_stats(self):
+        return {
+            "workers": [{
+                "index": worker["index"],
+                "pid": worker["process"].pid if worker["process"] else None,
+                "alive": worker["alive"],
+                "streams": len(worker["streams"]),
+                "restarts": worker["restarts"],
+                "port_range": worker["port_range"]
+            } for worker in self.workers],
+            "streams": self.get_active_streams_count()
+        }
+
+    def shutdown(self):
+        """Stop all streams and worker processes"""
+        self.running = False
+        for worker in self.workers:
+            if not worker["alive"]:
+                continue
+            try:
+                with worker["send_lock"]:
+                    worker["conn"].send({"method": "shutdown"})
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            process = worker["process"]
+            if process is None:
+                continue
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        log.info("[WORKERS] Media worker processes shut down")
+
+
+def create_media_streamer(config):
+    """Create the media streamer for the configured mode
+
+    Returns a MediaWorkerPool when media.workers.processes is set, otherwise
+    an in-process MediaStreamer.
+    """
+    if config.get("media", {}).get("workers", {}).get("processes", 0):
+        return MediaWorkerPool(config)
+
+    from media_streamer import MediaStreamer
+    return MediaStreamer(config)
@@ -0,0 +1,165 @@
+# src/message_capture.py
+
+"""
+In-memory capture of recent SIP traffic
+
+Every catalog response used to be written to catalog_response_*.xml in the
+working directory and every pjsua output line was printed on top of being
+parsed, synchronously on the SIP threads. Instead, the lines and messages
+are kept in a bounded ring buffer and only written out when someone asks:
+
+- record() appends to a deque of the last `size` records and never blocks
+  on I/O
+- dump() snapshots the buffer and hands it to a background writer thread,
+  which writes one file into dump_dir and keeps the newest max_dumps files
+- error() dumps too (when dump_on_error is set), at most once every
+  min_dump_interval seconds so a failure loop cannot fill the disk
+- main.py dumps on SIGUSR1
+
+Settings come from config["logging"]["capture"].
+"""
+
+import collections
+import os
+import queue
+import re
+import threading
+import time
+
+from logger import log
+from manscdp_codec import decode_sip_message
+
+
+class MessageCapture:
+    """Ring buffer of recent SIP messages, dumped to disk on demand or on error"""
+
+    def __init__(self, config):
+        capture_config = (config or {}).get("logging", {}).get("capture", {})
+        self.enabled = capture_config.get("enabled", True)
+        self.size = capture_config.get("size", 2000)
+        self.dump_dir = capture_config.get("dump_dir", "./logs/captures")
+        self.dump_on_error = capture_config.get("dump_on_error", True)
+        self.min_dump_interval = capture_config.get("min_dump_interval", 60)
+        self.max_dumps = capture_config.get("max_dumps", 20)
+
+        self.records = collections.deque(maxlen=self.size)
+        self._lock = threading.Lock()
+        self._dumps = queue.Queue(maxsize=4)
+        self._writer = None
+        self._last_error_dump = 0.0
+        self.stats = {"recorded": 0, "dumps": 0, "dumps_dropped": 0, "errors": 0}
+
+    def record(self, kind, data, **meta):
+        """Keep a message or output line
+
+        Args:
+            kind (str): What it is ("pjsua", "tx", "rx", "catalog", ...)
+            data (str or bytes): The line or message; wire bytes are decoded only when dumped
+            **meta: Extra fields written with the record (sn, destination, ...)
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.records.append((time.time(), kind, data, meta))
+            self.stats["recorded"] += 1
+
+    def snapshot(self, kind=None):
+        """Records currently in the buffer, oldest first (only those of one kind if given)"""
+        with self._lock:
+            records = list(self.records)
+        return [r for r in records if kind is None or r[1] == kind]
+
+    def dump(self, reason="manual"):
+        """Write the buffer to a file in dump_dir on the writer thread
+
+        Returns:
+            str: Path of the dump file, or None when capture is off or the writer is backed up
+        """
+        if not self.enabled:
+            return None
+        records = self.snapshot()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        slug = re.sub(r"[^\w.-]+", "_", reason)[:40]
+        path = os.path.join(self.dump_dir, f"capture-{stamp}-{int(time.time() * 1000) % 1000:03d}-{slug}.log")
+        try:
+            self._dumps.put_nowait((path, reason, records))
+        except queue.Full:
+            self.stats["dumps_dropped"] += 1
+            log.warning(f"[CAPTURE] Dump '{reason}' dropped, writer is busy")
+            return None
+        self._start_writer()
+        return path
+
+    def error(self, reason):
+        """Something went wrong: dump the buffer, unless a dump on error was just written"""
+        self.stats["errors"] += 1
+        if not self.dump_on_error:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._last_error_dump and now - self._last_error_dump < self.min_dump_interval:
+                return None
+            self._last_error_dump = now
+        return self.dump(f"error-{reason}")
+
+    def flush(self):
+        """Wait until the queued dumps are written"""
+        self._dumps.join()
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_dumps, daemon=True, name="capture-writer")
+                self._writer.start()
+
+    def _write_dumps(self):
+        while True:
+            path, reason, records = self._dumps.get()
+            try:
+                self._write(path, reason, records)
+                self.stats["dumps"] += 1
+                log.info(f"[CAPTURE] 💾 {len(records)} records written to {path} ({reason})")
+            except OSError as e:
+                log.error(f"[CAPTURE] Could not write {path}: {e}")
+            finally:
+                self._dumps.task_done()
+
+    def _write(self, path, reason, records):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# {reason}: {len(records)} records\n")
+            for timestamp, kind, data, meta in records:
+                if isinstance(data, bytes):
+                    data = decode_sip_message(data)
+                when = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}"
+                fields = "".join(f" {key}={value}" for key, value in meta.items())
+                f.write(f"[{when}] {kind.upper()}{fields}\n{data.rstrip()}\n")
+        self._prune()
+
+    def _prune(self):
+        """Keep the newest max_dumps dump files"""
+        dumps = sorted((os.path.join(self.dump_dir, name) for name in os.listdir(self.dump_dir)
+                        if name.startswith("capture-")), key=os.path.getmtime)
+        for path in dumps[:-self.max_dumps] if self.max_dumps else []:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "buffered": len(self.records)}
+
+
+# Global instance
+_message_capture = None
+
+
+def get_message_capture(config=None):
+    """Get or create the shared MessageCapture instance"""
+    global _message_capture
+
+    if _message_capture is None:
+        _message_capture = MessageCapture(config)
+
+    return _message_capture
@@ -0,0 +1,148 @@
+# src/platforms.py
+
+"""
+Upstream platforms
+
+The device can be registered to several platforms at once (a primary WVP, a
+backup, a provincial platform, ...) from one process. Each platform has its
+own registration state, keepalives, message builder and catalog view, while
+the cameras are ingested once and shared between them:
+
+- the primary platform is config["sip"] itself
+- more platforms are listed in config["sip"]["platforms"]; each entry
+  overrides server, port, server_id, server_domain and may bring its own
+  username, password and expires (the rest is inherited from config["sip"])
+- "channels" limits the catalog a platform sees to those channel IDs
+
+Requests are mapped back to the platform that sent them by the platform's
+server ID (the user part of its From URI), then by its host and port in the
+header text, then by the address pjsua received the request from (the
+server's resolved IPs, so a platform configured by hostname still matches),
+then by its host alone. A platform without a server_id can only be told
+apart by address, so one is logged at startup.
+"""
+
+import re
+import socket
+
+from logger import log
+from sip_message_builder import SipMessageBuilder
+
+
+class Platform:
+    """One upstream platform the device registers to"""
+
+    def __init__(self, name, sip_config, device_id, local_ip, local_port):
+        self.name = name
+        self.sip_config = sip_config  # config["sip"] as seen by this platform
+        self.server = sip_config["server"]
+        self.port = sip_config["port"]
+        self.server_id = sip_config.get("server_id")
+        self.key = f"{self.server}:{self.port}"
+        channels = sip_config.get("channels")
+        self.channels = set(channels) if channels else None
+        self.messages = SipMessageBuilder(device_id, local_ip, local_port, self.server, self.port)
+        self.registration_status = "OFFLINE"
+        self.registration = None  # RegistrationClient when registering in-process
+        self._host = re.compile(rf"(?<![\w.-]){re.escape(self.server)}(?![\w.-])")
+        self._host_port = re.compile(rf"(?<![\w.-]){re.escape(self.server)}:{self.port}(?!\d)")
+        self._ips = None  # resolved lazily by sent_from()
+
+    @property
+    def address(self):
+        return (self.server, self.port)
+
+    def sees(self, channel_id):
+        """Whether a channel is part of this platform's catalog view"""
+        return self.channels is None or channel_id in self.channels
+
+    def matches(self, text):
+        """3 for our server ID in text, 2 for our host:port, 1 for our host alone, else 0"""
+        if self.server_id and self.server_id in text:
+            return 3
+        if self._host_port.search(text):
+            return 2
+        return 1 if self._host.search(text) else 0
+
+    def sent_from(self, ip, port=None):
+        """2 if (ip, port) is our server address, 1 if only the IP is ours, else 0"""
+        if self._ips is None:
+            try:
+                self._ips = set(socket.gethostbyname_ex(self.server)[2]) | {self.server}
+            except OSError:
+                self._ips = {self.server}
+        if ip not in self._ips:
+            return 0
+        return 2 if port == self.port else 1
+
+
+class PlatformRegistry:
+    """The primary platform plus the ones listed in config["sip"]["platforms"]"""
+
+    def __init__(self, config, local_ip, local_port):
+        sip_config = config["sip"]
+        device_id = sip_config["device_id"]
+        primary = {key: value for key, value in sip_config.items() if key != "platforms"}
+
+        self.primary = Platform("primary", primary, device_id, local_ip, local_port)
+        self.platforms = [self.primary]
+        for index, entry in enumerate(sip_config.get("platforms", [])):
+            if not entry.get("enabled", True):
+                continue
+            merged = {**primary, "channels": None, "server_id": None, "server_domain": None, **entry}
+            platform = Platform(entry.get("name", f"platform-{index + 1}"), merged, device_id, local_ip, local_port)
+            if any(p.key == platform.key for p in self.platforms):
+                log.warning(f"[PLATFORM] Duplicate platform {platform.key} ignored")
+                continue
+            if not platform.server_id:
+                log.warning(f"[PLATFORM] ⚠️ Platform {platform.name} ({platform.key}) has no server_id, "
+                            f"its requests can only be recognised by source address")
+            self.platforms.append(platform)
+
+        if len(self.platforms) > 1:
+            log.info(f"[PLATFORM] Registering to {len(self.platforms)} platforms: "
+                     f"{', '.join(f'{p.name} ({p.key})' for p in self.platforms)}")
+
+    def __iter__(self):
+        return iter(list(self.platforms))
+
+    def __len__(self):
+        return len(self.platforms)
+
+    def get(self, key):
+        """Platform by key ("server:port"), or None"""
+        for platform in self.platforms:
+            if platform.key == key:
+                return platform
+        return None
+
+    def resolve(self, *texts, source=None):
+        """Platform that sent a request; the primary if unknown
+
+        Args:
+            *texts: From/Via/To header text of the request
+            source (tuple, optional): (ip, port) pjsua received the request from
+
+        Returns:
+            Platform: Matched by server ID, host:port in the headers, source
+                address, host in the headers, source IP, in that order
+        """
+        texts = [text for text in texts if text]
+        for score in (3, 2):
+            for text in texts:
+                for platform in self.platforms:
+                    if platform.matches(text) == score:
+                        return platform
+        if source:
+            for platform in self.platforms:
+                if platform.sent_from(*source) == 2:
+                    return platform
+        for text in texts:
+            for platform in self.platforms:
+                if platform.matches(text):
+                    return platform
+        if source:
+            for platform in self.platforms:
+                if platform.sent_from(*source):
+                    return platform
+        return self.primary
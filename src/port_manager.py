@@ -0,0 +1,182 @@
+# src/port_manager.py
+
+"""
+Media port lease manager
+
+Hands out RTP ports from config["media"]["rtp_port_range"] instead of
+probing the OS. Every lease is an even RTP port with the following odd port
+reserved for RTCP, owned by a Call-ID and expiring unless renewed while the
+call is alive.
+
+Allocation and release are O(1): free ports sit in a FIFO deque, so a
+just-released port goes to the back of the queue and is not reused while
+late packets of the old session may still arrive.
+"""
+
+import collections
+import threading
+import time
+
+from logger import log
+
+
+class PortLeaseManager:
+    """Central allocator for RTP/RTCP port pairs"""
+
+    def __init__(self, config):
+        media_config = (config or {}).get("media", {})
+        start, end = media_config.get("rtp_port_range", [10000, 20000])
+        start += start % 2  # RTP on even ports, RTCP on the next odd one
+        self.port_start = start
+        self.port_end = end
+        self.lease_timeout = media_config.get("port_lease_timeout", 300)
+
+        self.free_ports = collections.deque(range(start, end, 2))
+        self.leases = {}         # owner -> {"port", "expires", "allocated"}
+        self.port_owners = {}    # port -> owner
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "allocations": 0,
+            "releases": 0,
+            "expirations": 0,
+            "exhaustions": 0,
+            "peak_in_use": 0
+        }
+
+        log.info(f"[PORTS] Media port pool {start}-{end}: {len(self.free_ports)} RTP/RTCP pairs, "
+                 f"lease timeout {self.lease_timeout}s")
+
+    def allocate(self, owner, timeout=None):
+        """Lease an RTP port (RTCP is port + 1)
+
+        Allocating again for an owner that already holds a lease renews and
+        returns the same port, so INVITE retransmissions do not leak ports.
+
+        Args:
+            owner (str): Lease owner, normally the Call-ID
+            timeout (float, optional): Lease lifetime in seconds
+
+        Returns:
+            int or None: RTP port, or None if the pool is exhausted
+        """
+        timeout = timeout or self.lease_timeout
+        now = time.time()
+        with self._lock:
+            lease = self.leases.get(owner)
+            if lease:
+                lease["expires"] = now + timeout
+                return lease["port"]
+
+            if not self.free_ports:
+                self._reap_expired(now)
+            if not self.free_ports:
+                self.stats["exhaustions"] += 1
+                log.error(f"[PORTS] ❌ Media port pool exhausted ({len(self.leases)} leases active)")
+                return None
+
+            port = self.free_ports.popleft()
+            self.leases[owner] = {"port": port, "expires": now + timeout, "allocated": now}
+            self.port_owners[port] = owner
+            self.stats["allocations"] += 1
+            self.stats["peak_in_use"] = max(self.stats["peak_in_use"], len(self.leases))
+
+        log.debug(f"[PORTS] Leased {port}/{port + 1} to {owner}")
+        return port
+
+    def reserve_block(self, owner, pairs):
+        """Permanently reserve a contiguous block at the start of the pool
+
+        Used for pjsua's own RTP ports (--rtp-port) so they never collide
+        with leased ones. Must be called before any allocation.
+
+        Returns:
+            int or None: First port of the block
+        """
+        with self._lock:
+            if len(self.free_ports) < pairs or self.leases:
+                return None
+            first = self.free_ports[0]
+            for _ in range(pairs):
+                self.port_owners[self.free_ports.popleft()] = owner
+        log.info(f"[PORTS] Reserved {first}-{first + pairs * 2 - 1} for {owner}")
+        return first
+
+    def release(self, owner):
+        """Release the lease held by owner
+
+        Returns:
+            bool: True if a lease was released
+        """
+        with self._lock:
+            lease = self.leases.pop(owner, None)
+            if lease is None:
+                return False
+            self.port_owners.pop(lease["port"], None)
+            self.free_ports.append(lease["port"])
+            self.stats["releases"] += 1
+
+        log.debug(f"[PORTS] Released {lease['port']}/{lease['port'] + 1} from {owner}")
+        return True
+
+    def renew(self, owner, timeout=None):
+        """Extend a lease while its call is still alive
+
+        Returns:
+            bool: True if the owner holds a lease
+        """
+        with self._lock:
+            lease = self.leases.get(owner)
+            if lease is None:
+                return False
+            lease["expires"] = time.time() + (timeout or self.lease_timeout)
+            return True
+
+    def get_port(self, owner):
+        """Get the port leased to owner, or None"""
+        lease = self.leases.get(owner)
+        return lease["port"] if lease else None
+
+    def reap_expired(self):
+        """Return expired leases to the pool
+
+        Returns:
+            int: Number of leases reclaimed
+        """
+        with self._lock:
+            return self._reap_expired(time.time())
+
+    def _reap_expired(self, now):
+        expired = [owner for owner, lease in self.leases.items() if lease["expires"] <= now]
+        for owner in expired:
+            lease = self.leases.pop(owner)
+            self.port_owners.pop(lease["port"], None)
+            self.free_ports.append(lease["port"])
+            self.stats["expirations"] += 1
+            log.warning(f"[PORTS] Lease for {owner} on port {lease['port']} expired")
+        return len(expired)
+
+    def get_stats(self):
+        """Get pool usage and exhaustion metrics"""
+        with self._lock:
+            return {
+                "range": [self.port_start, self.port_end],
+                "capacity": len(self.free_ports) + len(self.leases),
+                "in_use": len(self.leases),
+                "free": len(self.free_ports),
+                **self.stats
+            }
+
+
+# Global instance
+_port_manager = None
+
+
+def get_port_manager(config=None):
+    """Get or create the shared PortLeaseManager instance"""
+    global _port_manager
+
+    if _port_manager is None:
+        _port_manager = PortLeaseManager(config)
+
+    return _port_manager
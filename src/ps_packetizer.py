@@ -0,0 +1,347 @@
+# src/ps_packetizer.py
+
+"""
+Native MPEG-PS over RTP packetizer for GB28181
+
+Used for passthrough streams (already-encoded H.264/H.265 from stored files)
+instead of the `mpegpsmux ! rtpgstpay ! rtpstreampay` GStreamer chain:
+
+- Each access unit is wrapped as PS: pack header, system header + PSM on
+  keyframes, and one or more video PES packets (split at the 16-bit PES
+  length limit).
+- The PS bytes are split into RTP packets of at most `mtu` payload bytes, as
+  GB28181 platforms expect (PT 96, 90 kHz timestamps taken from the PTS,
+  marker bit on the last packet of each frame, decimal 10-digit SSRC).
+- Packets for a frame are sent in one batch: sendmmsg for UDP, a single
+  gathered sendmsg (writev) with RFC 4571 length prefixes for TCP.
+- An optional per-stream token bucket paces the output so keyframes are not
+  sent as one line-rate burst.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from logger import log
+from udp_egress import sendmmsg
+
+# PS / PES constants
+PACK_START_CODE = b"\x00\x00\x01\xba"
+SYSTEM_HEADER_START_CODE = b"\x00\x00\x01\xbb"
+PSM_START_CODE = b"\x00\x00\x01\xbc"
+VIDEO_STREAM_ID = 0xE0
+STREAM_TYPE_H264 = 0x1B
+STREAM_TYPE_H265 = 0x24
+
+# Largest PES payload that still fits the 16-bit PES_packet_length
+# (3 bytes of flags/header length + 10 bytes of PTS/DTS are counted in it)
+MAX_PES_PAYLOAD = 0xFFFF - 13
+
+RTP_HEADER = struct.Struct("!BBHII")
+RTP_VERSION = 0x80
+DEFAULT_MTU = 1400
+DEFAULT_PAYLOAD_TYPE = 96
+
+# Linux iovec limit per sendmsg call
+IOV_MAX = 1024
+
+
+def _build_crc32_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_CRC32_TABLE = _build_crc32_table()
+
+
+def mpeg_crc32(data):
+    """CRC-32/MPEG-2 as used by the program stream map"""
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC32_TABLE[((crc >> 24) ^ byte) & 0xFF]
+    return crc
+
+
+def gb28181_ssrc(ssrc):
+    """Convert a GB28181 SSRC (10-digit decimal string, or hex) to a 32-bit integer"""
+    if ssrc is None:
+        return 1
+    try:
+        if isinstance(ssrc, int):
+            value = ssrc
+        elif str(ssrc).isdigit():
+            value = int(ssrc)
+        else:
+            value = int(str(ssrc), 16)
+    except (ValueError, TypeError):
+        log.warning(f"[PS-RTP] Invalid SSRC value '{ssrc}', using default")
+        value = 1
+    return value & 0xFFFFFFFF
+
+
+def _encode_timestamp(prefix, ts):
+    """Encode a 33-bit PTS/DTS into the 5-byte PES form"""
+    return bytes((
+        (prefix << 4) | (((ts >> 30) & 0x07) << 1) | 1,
+        (ts >> 22) & 0xFF,
+        (((ts >> 15) & 0x7F) << 1) | 1,
+        (ts >> 7) & 0xFF,
+        ((ts & 0x7F) << 1) | 1,
+    ))
+
+
+def build_pack_header(scr, mux_rate=6106):
+    """Build a 14-byte MPEG-2 pack header (SCR in 90 kHz units, mux_rate in 50 byte/s units)"""
+    scr &= 0x1FFFFFFFF
+    return PACK_START_CODE + bytes((
+        0x44 | ((scr >> 27) & 0x38) | ((scr >> 28) & 0x03),
+        (scr >> 20) & 0xFF,
+        0x04 | ((scr >> 12) & 0xF8) | ((scr >> 13) & 0x03),
+        (scr >> 5) & 0xFF,
+        0x04 | ((scr << 3) & 0xF8),
+        0x01,
+        (mux_rate >> 14) & 0xFF,
+        (mux_rate >> 6) & 0xFF,
+        ((mux_rate << 2) & 0xFC) | 0x03,
+        0xF8,
+    ))
+
+
+def build_system_header(rate_bound=6106):
+    """Build a system header describing a single video stream"""
+    body = bytes((
+        0x80 | ((rate_bound >> 15) & 0x7F),
+        (rate_bound >> 7) & 0xFF,
+        ((rate_bound << 1) & 0xFE) | 0x01,
+        0x00,               # audio_bound 0, not fixed rate, not CSPS
+        0xE1,               # audio/video locked, video_bound 1
+        0xFF,               # no packet rate restriction
+        VIDEO_STREAM_ID, 0xE0, 0xE8,  # P-STD buffer bound 232 KB
+    ))
+    return SYSTEM_HEADER_START_CODE + struct.pack("!H", len(body)) + body
+
+
+def build_psm(stream_type=STREAM_TYPE_H264):
+    """Build a program stream map for a single video elementary stream"""
+    es_map = bytes((stream_type, VIDEO_STREAM_ID, 0x00, 0x00))
+    body = bytes((0xE0, 0xFF)) + struct.pack("!HH", 0, len(es_map)) + es_map
+    psm_length = len(body) + 4
+    without_crc = PSM_START_CODE + struct.pack("!H", psm_length) + body
+    return without_crc + struct.pack("!I", mpeg_crc32(without_crc))
+
+
+def build_pes_packets(payload, pts, dts=None):
+    """Split an access unit into video PES packets; only the first carries PTS/DTS"""
+    packets = []
+    view = memoryview(payload)
+    first = True
+    for start in range(0, max(len(view), 1), MAX_PES_PAYLOAD):
+        chunk = view[start:start + MAX_PES_PAYLOAD]
+        if first and dts is not None and dts != pts:
+            header = bytes((0x80, 0xC0, 10)) + _encode_timestamp(0x3, pts) + _encode_timestamp(0x1, dts)
+        elif first:
+            header = bytes((0x80, 0x80, 5)) + _encode_timestamp(0x2, pts)
+        else:
+            header = bytes((0x80, 0x00, 0))
+        first = False
+        packets.append(b"\x00\x00\x01" + bytes((VIDEO_STREAM_ID,))
+                       + struct.pack("!H", len(header) + len(chunk)) + header)
+        packets.append(chunk)
+    return packets
+
+
+class TokenBucket:
+    """Byte-rate token bucket used to pace RTP output per stream"""
+
+    def __init__(self, rate_kbps, burst_bytes=64 * 1024):
+        self.rate = max(1.0, rate_kbps * 1000 / 8.0)  # bytes per second
+        self.burst = burst_bytes
+        self.tokens = float(burst_bytes)
+        self.last = time.monotonic()
+
+    def set_rate(self, rate_kbps):
+        """Change the rate of a running bucket; tokens already earned are kept"""
+        self.rate = max(1.0, rate_kbps * 1000 / 8.0)
+
+    def consume(self, nbytes):
+        """Take nbytes from the bucket, sleeping until enough tokens have accumulated"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= nbytes
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+
+
+class PSRtpPacketizer:
+    """Mux access units to MPEG-PS and packetize them as GB28181 RTP"""
+
+    def __init__(self, ssrc, payload_type=DEFAULT_PAYLOAD_TYPE, mtu=DEFAULT_MTU,
+                 stream_type=STREAM_TYPE_H264):
+        self.ssrc = gb28181_ssrc(ssrc)
+        self.payload_type = payload_type & 0x7F
+        self.mtu = mtu
+        self.stream_type = stream_type
+        self.sequence = 0
+        self._ts_base = 0
+        self._last_ts = None
+        self._system_headers = build_system_header() + build_psm(stream_type)
+
+    def _rtp_timestamp(self, pts):
+        """Keep RTP timestamps monotonic when the source PTS restarts (e.g. next file)"""
+        ts = pts + self._ts_base
+        if self._last_ts is not None and ts <= self._last_ts - 90000:
+            self._ts_base = self._last_ts + 3600 - pts
+            ts = pts + self._ts_base
+        self._last_ts = ts
+        return ts
+
+    def mux_frame(self, data, pts, dts=None, keyframe=False):
+        """Wrap one access unit as PS
+
+        Args:
+            data (bytes): Annex-B access unit
+            pts (int): Presentation timestamp in 90 kHz units
+            dts (int, optional): Decode timestamp in 90 kHz units
+            keyframe (bool): Emit system header and PSM ahead of the PES
+
+        Returns:
+            list: PS byte chunks (kept separate to avoid copying the payload)
+        """
+        scr = dts if dts is not None else pts
+        chunks = [build_pack_header(scr)]
+        if keyframe:
+            chunks.append(self._system_headers)
+        chunks.extend(build_pes_packets(data, pts, dts))
+        return chunks
+
+    def packetize(self, data, pts, dts=None, keyframe=False):
+        """Mux one access unit and split it into RTP packets
+
+        Returns:
+            list: RTP packets as bytes, the last one with the marker bit set
+        """
+        ps = b"".join(self.mux_frame(data, pts, dts, keyframe))
+        timestamp = self._rtp_timestamp(pts) & 0xFFFFFFFF
+        view = memoryview(ps)
+        packets = []
+        total = len(view)
+        for start in range(0, total, self.mtu):
+            chunk = view[start:start + self.mtu]
+            marker = 0x80 if start + self.mtu >= total else 0
+            header = RTP_HEADER.pack(RTP_VERSION, marker | self.payload_type,
+                                     self.sequence, timestamp, self.ssrc)
+            self.sequence = (self.sequence + 1) & 0xFFFF
+            packets.append(header + chunk)
+        return packets
+
+
+class PSRtpSender:
+    """Send a PS/RTP stream to a platform over UDP or RFC 4571 TCP with optional pacing"""
+
+    def __init__(self, dest_ip, dest_port, ssrc, transport="UDP", payload_type=DEFAULT_PAYLOAD_TYPE,
+                 mtu=DEFAULT_MTU, pacing_kbps=None, stream_type=STREAM_TYPE_H264, sock=None):
+        self.dest = (dest_ip, int(dest_port))
+        self.tcp = "TCP" in str(transport).upper()
+        self.packetizer = PSRtpPacketizer(ssrc, payload_type, mtu, stream_type)
+        self.pacer = TokenBucket(pacing_kbps) if pacing_kbps else None
+        self.sock = sock
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def set_pacing(self, pacing_kbps):
+        """Pace output at pacing_kbps from now on (None turns pacing off)"""
+        if not pacing_kbps:
+            self.pacer = None
+        elif self.pacer:
+            self.pacer.set_rate(pacing_kbps)
+        else:
+            self.pacer = TokenBucket(pacing_kbps)
+
+    def open(self):
+        """Open the transport socket (TCP active connects to the platform)"""
+        if self.sock:
+            return True
+        try:
+            if self.tcp:
+                self.sock = socket.create_connection(self.dest, timeout=5)
+                self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.sock.settimeout(None)
+            else:
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+                self.sock.connect(self.dest)
+            log.info(f"[PS-RTP] Connected {'TCP' if self.tcp else 'UDP'} media socket to {self.dest[0]}:{self.dest[1]}")
+            return True
+        except Exception as e:
+            log.error(f"[PS-RTP] Failed to open media socket to {self.dest[0]}:{self.dest[1]}: {e}")
+            self.sock = None
+            return False
+
+    def send_frame(self, data, pts, dts=None, keyframe=False):
+        """Packetize and send one access unit (timestamps in 90 kHz units)
+
+        Returns:
+            bool: True if all packets were sent
+        """
+        with self._lock:
+            if not self.sock and not self.open():
+                return False
+
+            packets = self.packetizer.packetize(data, pts, dts, keyframe)
+            nbytes = sum(len(p) for p in packets)
+            if self.pacer:
+                self.pacer.consume(nbytes)
+
+            try:
+                if self.tcp:
+                    self._send_tcp(packets)
+                else:
+                    sendmmsg(self.sock, packets)
+            except OSError as e:
+                log.error(f"[PS-RTP] Send to {self.dest[0]}:{self.dest[1]} failed: {e}")
+                self.close()
+                return False
+
+            self.packets_sent += len(packets)
+            self.bytes_sent += nbytes
+            return True
+
+    def _send_tcp(self, packets):
+        """RFC 4571: prefix each RTP packet with its 16-bit length and writev the batch"""
+        iov = []
+        for packet in packets:
+            iov.append(struct.pack("!H", len(packet)))
+            iov.append(packet)
+        for start in range(0, len(iov), IOV_MAX):
+            batch = iov[start:start + IOV_MAX]
+            remaining = sum(len(b) for b in batch)
+            sent = self.sock.sendmsg(batch)
+            if sent < remaining:
+                # Partial write: push the rest of this batch out in order
+                self.sock.sendall(b"".join(batch)[sent:])
+
+    def get_stats(self):
+        """Get packet and byte counters for this stream"""
+        return {
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "sequence": self.packetizer.sequence,
+            "transport": "TCP" if self.tcp else "UDP"
+        }
+
+    def close(self):
+        """Close the media socket"""
+        if self.sock:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
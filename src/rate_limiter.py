@@ -0,0 +1,91 @@
+# src/rate_limiter.py
+
+"""
+Per-source token buckets for incoming SIP queries
+
+Every MANSCDP query makes us build and send a response (a full catalog for
+Catalog queries), so a platform that floods us with queries, or a spoofed
+source, can keep the SIP thread busy. Each source address gets a token
+bucket that refills at rate tokens per second up to burst; a query costs
+one token and is shed before it reaches its handler when the bucket is
+empty.
+
+- sources idle for longer than it takes to refill their bucket are forgotten
+- shedding is logged once per source per log_interval seconds
+
+Settings come from config["sip"]["rate_limit"] (enabled, rate, burst).
+"""
+
+import threading
+import time
+
+from logger import log
+
+
+class SourceRateLimiter:
+    """Token bucket per source address"""
+
+    def __init__(self, config):
+        rate_config = (config or {}).get("sip", {}).get("rate_limit", {})
+        self.enabled = rate_config.get("enabled", True)
+        self.rate = float(rate_config.get("rate", 5))
+        self.burst = float(rate_config.get("burst", 20))
+        self.log_interval = rate_config.get("log_interval", 10)
+
+        self.buckets = {}        # source -> {"tokens", "updated", "shed", "logged"}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.stats = {"allowed": 0, "shed": 0}
+
+    def allow(self, source, cost=1.0):
+        """Take cost tokens from source's bucket
+
+        Returns:
+            bool: False when the source is over its rate and the request should be shed
+        """
+        if not self.enabled or not source:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            bucket = self.buckets.get(source)
+            if bucket is None:
+                bucket = {"tokens": self.burst, "updated": now, "shed": 0, "logged": 0.0}
+                self.buckets[source] = bucket
+            else:
+                bucket["tokens"] = min(self.burst, bucket["tokens"] + (now - bucket["updated"]) * self.rate)
+                bucket["updated"] = now
+
+            if bucket["tokens"] >= cost:
+                bucket["tokens"] -= cost
+                self.stats["allowed"] += 1
+                return True
+
+            bucket["shed"] += 1
+            self.stats["shed"] += 1
+            report = now - bucket["logged"] >= self.log_interval
+            if report:
+                bucket["logged"] = now
+            shed = bucket["shed"]
+        if report:
+            log.warning(f"[RATE] ⚠️ Shedding queries from {source}: over {self.rate:g}/s "
+                        f"(burst {self.burst:g}, {shed} shed so far)")
+        return False
+
+    def _prune(self, now):
+        """Forget sources whose buckets are full again (caller holds the lock)"""
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        refill = self.burst / self.rate if self.rate > 0 else float("inf")
+        for source in [s for s, b in self.buckets.items() if now - b["updated"] > refill]:
+            del self.buckets[source]
+
+    def get_stats(self, source=None):
+        """Get one source's bucket, or limiter-wide counters"""
+        with self._lock:
+            if source is not None:
+                bucket = self.buckets.get(source)
+                return {"tokens": bucket["tokens"], "shed": bucket["shed"]} if bucket else None
+            return {**self.stats, "sources": len(self.buckets)}
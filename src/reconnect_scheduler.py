@@ -0,0 +1,261 @@
+# src/reconnect_scheduler.py
+
+"""
+Shared reconnect scheduler for live sources
+
+Every live source (LiveStreamHandler streams, RTSPHandler cameras) asks this
+scheduler to reconnect instead of starting its own retry thread, so that a
+flapping camera or a network blip across many channels does not turn into a
+reconnect storm:
+
+- at most one reconnect per key is scheduled or running at any time
+- retries back off exponentially with jitter (delay * uniform(1 - jitter, 1))
+- a worker pool caps how many reconnects run concurrently
+- a per-source circuit breaker opens after failure_threshold failed
+  reconnects in a row and only lets a probe through every open_timeout
+  seconds; its state is surfaced as the channel Status in the catalog
+
+Keys are whatever the caller restarts (a stream ID); sources are what the
+breaker and the catalog track (the RTSP URL). Settings come from
+config["media"]["reconnect"].
+"""
+
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import log
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ReconnectScheduler:
+    """Backoff, jitter, concurrency cap and circuit breaker for live source reconnects"""
+
+    def __init__(self, config):
+        reconnect_config = (config or {}).get("media", {}).get("reconnect", {})
+        self.base_delay = reconnect_config.get("base_delay", 1.0)
+        self.max_delay = reconnect_config.get("max_delay", 60.0)
+        self.multiplier = reconnect_config.get("multiplier", 2.0)
+        self.jitter = reconnect_config.get("jitter", 0.5)
+        self.max_concurrent = reconnect_config.get("max_concurrent", 4)
+        self.failure_threshold = reconnect_config.get("failure_threshold", 5)
+        self.open_timeout = reconnect_config.get("open_timeout", 300)
+        self.stable_time = reconnect_config.get("stable_time", 30)
+
+        self.entries = {}        # key -> reconnect state
+        self.breakers = {}       # source -> circuit breaker state
+        self.listeners = []      # called with (source, state) on breaker changes
+        self.heap = []           # (due, seq, key)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="reconnect")
+        self.running = False
+        self.thread = None
+        self.stats = {"scheduled": 0, "coalesced": 0, "succeeded": 0, "failed": 0, "breaker_opens": 0}
+
+    def start(self):
+        """Start the dispatcher thread"""
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.thread.start()
+        log.info(f"[RECONNECT] Scheduler started (max {self.max_concurrent} concurrent, "
+                 f"backoff {self.base_delay}-{self.max_delay}s)")
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(1)
+        self.executor.shutdown(wait=False)
+
+    def add_listener(self, listener):
+        """Register listener(source, state) for circuit breaker state changes"""
+        self.listeners.append(listener)
+
+    def request(self, key, reconnect, source=None, reason=""):
+        """Ask for a reconnect of key; repeated requests while one is pending are merged
+
+        Args:
+            key (str): What gets reconnected (stream ID or URL)
+            reconnect (callable): Does the reconnect, returns True on success
+            source (str, optional): Source for the circuit breaker (defaults to key)
+            reason (str): For the log
+
+        Returns:
+            float or None: Seconds until the attempt, None if one was already pending
+        """
+        self.start()
+        now = time.time()
+        with self._cond:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {"attempts": 0, "pending": False, "healthy_since": None, "last_error": None}
+                self.entries[key] = entry
+            entry["reconnect"] = reconnect
+            entry["source"] = source or key
+            if reason:
+                entry["last_error"] = reason
+
+            if entry["pending"]:
+                self.stats["coalesced"] += 1
+                return None
+
+            # Only a source that stayed up for stable_time starts over from the base delay
+            if entry["healthy_since"] and now - entry["healthy_since"] >= self.stable_time:
+                entry["attempts"] = 0
+            entry["healthy_since"] = None
+
+            delay = self._schedule(key, entry, now)
+        log.info(f"[RECONNECT] {key}: reconnect in {delay:.1f}s (attempt {entry['attempts'] + 1}"
+                 f"{', ' + reason if reason else ''})")
+        return delay
+
+    def report_healthy(self, key):
+        """A reconnected source is delivering data again"""
+        with self._cond:
+            entry = self.entries.get(key)
+            if entry is None or entry["pending"]:
+                return
+            entry["healthy_since"] = entry["healthy_since"] or time.time()
+            source = entry["source"]
+        self._set_breaker(source, CLOSED, failures=0)
+
+    def cancel(self, key):
+        """Forget key (its stream was stopped); a running attempt is not interrupted"""
+        with self._cond:
+            self.entries.pop(key, None)
+
+    def get_source_state(self, source):
+        """Circuit breaker state of a source: closed, open or half_open"""
+        breaker = self.breakers.get(source)
+        return breaker["state"] if breaker else CLOSED
+
+    def _delay(self, attempts):
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** attempts)
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def _schedule(self, key, entry, now):
+        """Queue the next attempt for key (caller holds the lock)"""
+        delay = self._delay(entry["attempts"])
+        breaker = self.breakers.get(entry["source"])
+        if breaker and breaker["state"] == OPEN:
+            # Wait out the open breaker, then let one probe through
+            delay = max(delay, breaker["opened"] + self.open_timeout - now)
+        entry["pending"] = True
+        self._seq += 1
+        heapq.heappush(self.heap, (now + delay, self._seq, key))
+        self.stats["scheduled"] += 1
+        self._cond.notify()
+        return delay
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.time()):
+                    self._cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+                if not self.running:
+                    return
+                _, _, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                breaker = self.breakers.get(entry["source"])
+            if breaker and breaker["state"] == OPEN:
+                self._set_breaker(entry["source"], HALF_OPEN)
+            self.executor.submit(self._run, key, entry)
+
+    def _run(self, key, entry):
+        try:
+            success = bool(entry["reconnect"]())
+        except Exception as e:
+            log.error(f"[RECONNECT] {key}: reconnect raised {e}")
+            entry["last_error"] = str(e)
+            success = False
+
+        with self._cond:
+            entry["attempts"] += 1
+            entry["pending"] = False
+            if key not in self.entries:
+                return
+            source = entry["source"]
+            if success:
+                self.stats["succeeded"] += 1
+            else:
+                self.stats["failed"] += 1
+
+        if success:
+            log.info(f"[RECONNECT] ✅ {key}: reconnected on attempt {entry['attempts']}")
+            return
+
+        breaker = self.breakers.get(source, {})
+        failures = breaker.get("failures", 0) + 1
+        if breaker.get("state") == HALF_OPEN or failures >= self.failure_threshold:
+            self._set_breaker(source, OPEN, failures=failures)
+        else:
+            self._set_breaker(source, breaker.get("state", CLOSED), failures=failures)
+
+        # Keep trying until the source is back or the stream is stopped
+        with self._cond:
+            if key in self.entries and not entry["pending"]:
+                delay = self._schedule(key, entry, time.time())
+                log.warning(f"[RECONNECT] {key}: attempt {entry['attempts']} failed, next in {delay:.1f}s")
+
+    def _set_breaker(self, source, state, failures=None):
+        with self._cond:
+            breaker = self.breakers.setdefault(source, {"state": CLOSED, "failures": 0, "opened": 0})
+            previous = breaker["state"]
+            breaker["state"] = state
+            if failures is not None:
+                breaker["failures"] = failures
+            if state == OPEN and previous != OPEN:
+                breaker["opened"] = time.time()
+                self.stats["breaker_opens"] += 1
+        if state == previous:
+            return
+        log.info(f"[RECONNECT] Circuit for {source}: {previous} -> {state}")
+        for listener in list(self.listeners):
+            try:
+                listener(source, state)
+            except Exception as e:
+                log.error(f"[RECONNECT] Breaker listener error: {e}")
+
+    def get_stats(self, key=None):
+        """Get reconnect state of one key, or scheduler-wide counters"""
+        if key is not None:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            return {
+                "attempts": entry["attempts"],
+                "pending": entry["pending"],
+                "last_error": entry["last_error"],
+                "circuit": self.get_source_state(entry["source"])
+            }
+        return {
+            **self.stats,
+            "pending": sum(1 for e in list(self.entries.values()) if e["pending"]),
+            "open_circuits": [s for s, b in list(self.breakers.items()) if b["state"] == OPEN]
+        }
+
+
+# Global instance
+_reconnect_scheduler = None
+
+
+def get_reconnect_scheduler(config=None):
+    """Get or create the shared ReconnectScheduler instance"""
+    global _reconnect_scheduler
+
+    if _reconnect_scheduler is None:
+        _reconnect_scheduler = ReconnectScheduler(config)
+
+    return _reconnect_scheduler
@@ -338,32 +338,32 @@ class RecordingManager:
     def _parse_time_string(self, time_str):
         """Parse a time string into a timestamp
         
-        Supports ISO format (YYYY-MM-DDTHH:MM:SS) and
-        GB28181 format (YYYYMMDDTHHMMSSZ)
+        Supports ISO format (YYYY-MM-DDTHH:MM:SS), GB28181 format
+        (YYYYMMDDTHHMMSSZ) and Unix seconds as in SDP t= lines.
+        Strings are the device's local wall-clock time, like the dates and
+        times recordings are filed under; GB28181 platforms append a Z to
+        local times, so it is ignored. An explicit UTC offset is honoured.
         """
+        if isinstance(time_str, (int, float)):
+            return float(time_str)
         try:
+            time_str = time_str.strip()
+            if time_str.endswith('Z'):
+                time_str = time_str[:-1]
+            
             # Try ISO format first
             try:
-                dt = datetime.datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+                dt = datetime.datetime.fromisoformat(time_str)
                 return dt.timestamp()
             except ValueError:
                 pass
                 
-            # Try GB28181 format (YYYYMMDDTHHMMSSZ)
-            if 'T' in time_str and time_str.endswith('Z'):
-                date_part = time_str.split('T')[0]
-                time_part = time_str.split('T')[1].rstrip('Z')
-                
-                year = int(date_part[0:4])
-                month = int(date_part[4:6])
-                day = int(date_part[6:8])
-                
-                hour = int(time_part[0:2])
-                minute = int(time_part[2:4])
-                second = int(time_part[4:6])
-                
-                dt = datetime.datetime(year, month, day, hour, minute, second)
+            # Try GB28181 format (YYYYMMDDTHHMMSS)
+            try:
+                dt = datetime.datetime.strptime(time_str, "%Y%m%dT%H%M%S")
                 return dt.timestamp()
+            except ValueError:
+                pass
                 
             # If all parsing attempts fail, return None
             log.warning(f"[REC-MANAGER] Could not parse time string: {time_str}")
@@ -441,6 +441,63 @@ class RecordingManager:
             log.error(f"[REC-MANAGER] Error getting recordings in range: {e}")
             return []
 
+    def get_playback_segments(self, start_time, end_time):
+        """Map a wall-clock playback window onto the recording files covering it
+
+        Unlike get_recordings_in_range(), which only looks at file start times,
+        this returns every file whose span overlaps the window (including the one
+        that started before the window opened), ordered oldest first, together
+        with the in-file offsets to seek to.
+
+        Args:
+            start_time (str or float): Window start (ISO, YYYYMMDDTHHMMSSZ or Unix seconds)
+            end_time (str or float): Window end (ISO, YYYYMMDDTHHMMSSZ or Unix seconds)
+
+        Returns:
+            list: Segment dicts with path, timestamp, duration, offset and stop
+                  (offset/stop are seconds relative to the start of each file)
+        """
+        try:
+            start_timestamp = self._parse_time_string(start_time) if start_time else None
+            end_timestamp = self._parse_time_string(end_time) if end_time else None
+
+            self.scan_recordings()
+
+            segments = []
+            for path, metadata in list(self.metadata_cache.items()):
+                file_start = metadata['timestamp']
+                duration = metadata.get('duration') or 0
+                file_end = file_start + duration
+
+                if start_timestamp and duration and file_end <= start_timestamp:
+                    continue
+                if end_timestamp and file_start >= end_timestamp:
+                    continue
+
+                offset = max(0.0, start_timestamp - file_start) if start_timestamp else 0.0
+                stop = None
+                if end_timestamp and (not duration or end_timestamp < file_end):
+                    stop = end_timestamp - file_start
+
+                segments.append({
+                    "path": path,
+                    "filename": metadata.get("filename", ""),
+                    "name": metadata.get("filename", ""),
+                    "timestamp": file_start,
+                    "duration": duration,
+                    "size": metadata.get("size", 0),
+                    "offset": offset,
+                    "stop": stop
+                })
+
+            segments.sort(key=lambda x: x['timestamp'])
+            log.info(f"[REC-MANAGER] Playback window {start_time} - {end_time} spans {len(segments)} file(s)")
+            return segments
+
+        except Exception as e:
+            log.error(f"[REC-MANAGER] Error mapping playback window: {e}")
+            return []
+
 # Global instance
 _recording_manager = None
 
@@ -5,13 +5,14 @@ import threading
 import time
 import subprocess
 import os
-import random
 from datetime import datetime, timedelta
 
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 
 from logger import log
+from reconnect_scheduler import get_reconnect_scheduler
+from media_runtime import get_media_runtime
 
 Gst.init(None)
 
@@ -91,13 +92,10 @@ class RTSPHandler:
     def __init__(self, rtsp_url):
         self.rtsp_url = rtsp_url
         self.pipeline = None
-        self.mainloop = None
-        self.mainloop_thread = None
         self.monitor_thread = None
         self.running = False
-        self.retry_count = 0
-        self.max_retries = 10  # Increased max retries
-        self.retry_backoff_time = 3  # Initial backoff time in seconds
+        self.reconnects = get_reconnect_scheduler()  # shared backoff/circuit breaker for all cameras
+        self.runtime = get_media_runtime()  # shared main loop and command queue for all pipelines
         self.status = RTSPConnectionStatus()
         self.last_keepalive = time.time()
         self.keepalive_interval = 30  # seconds
@@ -107,6 +105,10 @@ class RTSPHandler:
 
     def start(self):
         """Start the RTSP stream with improved error handling"""
+        return self.runtime.call(self.rtsp_url, self._start)
+    
+    def _start(self):
+        """Build and start the pipeline (runs in this URL's command queue)"""
         log.info(f"[RTSP] Launching stream: {self.rtsp_url}")
         self.status.connection_attempts += 1
         
@@ -120,10 +122,8 @@ class RTSPHandler:
                 self.status.mark_error("Pipeline creation failed")
                 return False
             
-            # Add bus watch
-            bus = self.pipeline.get_bus()
-            bus.add_signal_watch()
-            bus.connect("message", self._on_bus_message)
+            # Only ERROR and EOS reach Python; PLAYING is picked up by the monitor thread
+            self.runtime.watch_bus(self.rtsp_url, self.pipeline, self._on_bus_message, ("error", "eos"))
             
             # Start the pipeline
             ret = self.pipeline.set_state(Gst.State.PLAYING)
@@ -139,12 +139,6 @@ class RTSPHandler:
             log.info("[RTSP] GStreamer RTSP pipeline started.")
             self.running = True
             
-            # Start a GLib mainloop in a separate thread
-            if not self.mainloop:
-                self.mainloop = GLib.MainLoop()
-                self.mainloop_thread = threading.Thread(target=self._run_mainloop, daemon=True)
-                self.mainloop_thread.start()
-            
             # Start monitoring thread if not running
             if not self.monitor_thread or not self.monitor_thread.is_alive():
                 self.monitor_thread = threading.Thread(target=self._monitor_stream, daemon=True)
@@ -156,15 +150,6 @@ class RTSPHandler:
             self.status.mark_error(str(e))
             return False
     
-    def _run_mainloop(self):
-        """Run the GLib mainloop with exception handling"""
-        try:
-            self.mainloop.run()
-        except Exception as e:
-            log.error(f"[RTSP] Error in GLib mainloop: {e}")
-            # Try to recover by creating a new mainloop
-            self.mainloop = None
-    
     def _monitor_stream(self):
         """Continuously monitor stream health and handle reconnections"""
         log.info(f"[RTSP] Starting stream health monitoring for {self.rtsp_url}")
@@ -203,12 +188,14 @@ class RTSPHandler:
                 if not self.status.connected:
                     log.info(f"[RTSP] Connection to {self.rtsp_url} established")
                     self.status.mark_connected()
-                    self.retry_count = 0  # Reset retry counter on successful connection
-                    self.retry_backoff_time = 3  # Reset backoff time
+                    self.reconnects.report_healthy(self.rtsp_url)
             else:
                 log.warning(f"[RTSP] Stream not in PLAYING state, current state: {current_state.value_nick}")
                 if self.status.connected:
                     self.status.mark_disconnected()
+                if current_state == Gst.State.PAUSED:
+                    # Stuck in PAUSED: inspect the queues and rebuild if needed
+                    self.runtime.call(self.rtsp_url, self._check_pipeline_health)
         else:
             log.warning(f"[RTSP] Failed to get pipeline state: {state_return[0].value_nick}")
             if self.status.connected:
@@ -226,7 +213,9 @@ class RTSPHandler:
             self.last_keepalive = time.time()
 
     def _on_bus_message(self, bus, message):
-        """Handle GStreamer bus messages with enhanced error recovery"""
+        """Handle ERROR and EOS bus messages (runs in this URL's command queue)"""
+        if not self.pipeline or bus != self.pipeline.get_bus():
+            return  # queued before the pipeline was replaced
         t = message.type
         if t == Gst.MessageType.ERROR:
             err, debug = message.parse_error()
@@ -244,30 +233,9 @@ class RTSPHandler:
                 log.warning("[RTSP] Connection timeout, increasing buffer size...")
                 self._increase_buffer_size()
             
-            # Clean up and retry with exponential backoff
+            # Clean up and let the shared scheduler retry with backoff and jitter
             self._cleanup_pipeline()
-            
-            if self.retry_count < self.max_retries:
-                self.retry_count += 1
-                
-                # Calculate backoff time with randomization to avoid thundering herd
-                backoff_seconds = min(60, self.retry_backoff_time * (1.5 ** (self.retry_count - 1)))
-                jitter = random.uniform(0.5, 1.5)
-                wait_time = backoff_seconds * jitter
-                
-                log.info(f"[RTSP] Will retry {self.rtsp_url} in {wait_time:.1f}s " +
-                        f"(attempt {self.retry_count}/{self.max_retries})...")
-                
-                # Schedule retry
-                self.status.mark_recovery()
-                threading.Timer(wait_time, self._retry_connect).start()
-            else:
-                log.error(f"[RTSP] Max retries ({self.max_retries}) reached for {self.rtsp_url}")
-                log.info(f"[RTSP] Will attempt again in 5 minutes")
-                
-                # Reset retry count and try again after a longer pause
-                self.status.mark_recovery()
-                threading.Timer(300, self._reset_and_retry).start()
+            self._schedule_reconnect(err.message)
             
         elif t == Gst.MessageType.EOS:
             log.info("[RTSP] End of stream")
@@ -276,39 +244,24 @@ class RTSPHandler:
             
             # For RTSP streams, an EOS should trigger a reconnect attempt
             log.info("[RTSP] Reconnecting after EOS")
-            self.status.mark_recovery()
-            threading.Timer(3, self._retry_connect).start()
-            
-        elif t == Gst.MessageType.STATE_CHANGED:
-            if message.src == self.pipeline:
-                old, new, pending = message.parse_state_changed()
-                log.debug(f"[RTSP] Pipeline state changed from {old.value_nick} to {new.value_nick}")
-                
-                if new == Gst.State.PLAYING:
-                    log.info("[RTSP] Pipeline is now PLAYING")
-                    self.status.mark_connected()
-                    self.retry_count = 0  # Reset retry count on successful play
-                elif new == Gst.State.PAUSED:
-                    log.info("[RTSP] Pipeline is PAUSED, checking for issues...")
-                    self._check_pipeline_health()
+            self._schedule_reconnect("end of stream")
 
+    def _schedule_reconnect(self, reason):
+        """Queue a reconnect; repeated errors while one is pending are merged"""
+        self.status.mark_recovery()
+        self.reconnects.request(self.rtsp_url, self._retry_connect, reason=reason)
+    
     def _retry_connect(self):
-        """Retry connecting to RTSP stream"""
+        """Retry connecting to RTSP stream (runs on a reconnect scheduler worker)"""
         if not self.running:
-            return
+            return True
             
         log.info(f"[RTSP] Attempting to reconnect to {self.rtsp_url}")
-        self.start()
-    
-    def _reset_and_retry(self):
-        """Reset retry counter and attempt to connect again"""
-        self.retry_count = 0
-        self.retry_backoff_time = 3  # Reset backoff time
-        if self.running:
-            self._retry_connect()
+        return self.start()
     
     def _cleanup_pipeline(self):
         """Clean up pipeline resources without stopping the handler"""
+        self.runtime.unwatch_bus(self.rtsp_url)
         if self.pipeline:
             self.pipeline.set_state(Gst.State.NULL)
             self.pipeline = None
@@ -317,15 +270,10 @@ class RTSPHandler:
         """Stop the RTSP stream and all related threads"""
         log.info(f"[RTSP] Stopping stream: {self.rtsp_url}")
         self.running = False
+        self.reconnects.cancel(self.rtsp_url)
         
-        # Stop the pipeline
-        if self.pipeline:
-            self.pipeline.set_state(Gst.State.NULL)
-            self.pipeline = None
-            
-        # Stop the mainloop
-        if self.mainloop and self.mainloop.is_running():
-            self.mainloop.quit()
+        # Stop the pipeline in order with any queued restart
+        self.runtime.call(self.rtsp_url, self._cleanup_pipeline)
         
         # Mark disconnected
         self.status.mark_disconnected()
@@ -337,7 +285,7 @@ class RTSPHandler:
         return {
             "url": self.rtsp_url,
             "running": self.running,
-            "retry_count": self.retry_count,
+            "reconnect": self.reconnects.get_stats(self.rtsp_url),
             "stream_status": self.status.get_status_report()
         }
 
@@ -396,55 +344,6 @@ class RTSPHandler:
                     log.error(f"[RTSP] All pipeline variants failed: {e3}")
                     return None
 
-    def _on_pipeline_state_change(self, bus, message):
-        """Handle pipeline state changes with detailed monitoring"""
-        if message.type == Gst.MessageType.STATE_CHANGED:
-            old_state, new_state, pending_state = message.parse_state_changed()
-            if message.src == self.pipeline:
-                log.debug(f"[RTSP] Pipeline state changed from {old_state.value_nick} to {new_state.value_nick}")
-                
-                # Record state transition time
-                now = time.time()
-                if not hasattr(self, '_last_state_change'):
-                    self._last_state_change = {}
-                self._last_state_change[new_state.value_nick] = now
-                
-                # Check for state transition issues
-                if old_state == Gst.State.READY and new_state == Gst.State.PAUSED:
-                    # Check if we spent too long in READY state
-                    if 'ready' in self._last_state_change:
-                        ready_duration = now - self._last_state_change['ready']
-                        if ready_duration > 2.0:  # More than 2 seconds in READY state
-                            log.warning(f"[RTSP] Spent {ready_duration:.1f}s in READY state")
-                            self._check_pipeline_health()
-                
-                elif old_state == Gst.State.PAUSED and new_state == Gst.State.PLAYING:
-                    # Check if we spent too long in PAUSED state
-                    if 'paused' in self._last_state_change:
-                        paused_duration = now - self._last_state_change['paused']
-                        if paused_duration > 1.0:  # More than 1 second in PAUSED state
-                            log.warning(f"[RTSP] Spent {paused_duration:.1f}s in PAUSED state")
-                            self._check_pipeline_health()
-                
-                # Handle state transition issues
-                if new_state == Gst.State.PLAYING:
-                    # Check if pipeline is actually playing
-                    ret, state, pending = self.pipeline.get_state(Gst.CLOCK_TIME_NONE)
-                    if state != Gst.State.PLAYING:
-                        log.warning("[RTSP] Pipeline failed to reach PLAYING state")
-                        self._handle_pipeline_error()
-                elif new_state == Gst.State.PAUSED:
-                    # Check if pipeline is actually paused
-                    ret, state, pending = self.pipeline.get_state(Gst.CLOCK_TIME_NONE)
-                    if state != Gst.State.PAUSED:
-                        log.warning("[RTSP] Pipeline failed to reach PAUSED state")
-                        self._handle_pipeline_error()
-                    
-                # Log state transition timing
-                if old_state != Gst.State.NULL:
-                    transition_time = now - self._last_state_change.get(old_state.value_nick, now)
-                    log.debug(f"[RTSP] State transition {old_state.value_nick}->{new_state.value_nick} took {transition_time:.3f}s")
-
     def _handle_pipeline_error(self):
         """Handle pipeline errors and attempt recovery"""
         if self.recovery_attempts < self.max_recovery_attempts:
@@ -458,9 +357,7 @@ class RTSPHandler:
             self.pipeline = self._create_pipeline(self.rtsp_url)
             
             # Add bus watch
-            bus = self.pipeline.get_bus()
-            bus.add_signal_watch()
-            bus.connect('message', self._on_pipeline_state_change)
+            self.runtime.watch_bus(self.rtsp_url, self.pipeline, self._on_bus_message, ("error", "eos"))
             
             # Start pipeline
             ret = self.pipeline.set_state(Gst.State.PLAYING)
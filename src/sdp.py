@@ -0,0 +1,322 @@
+# src/sdp.py
+
+"""
+SDP parsing and answer generation for GB28181
+
+An INVITE's SDP is parsed once into a SessionDescription with typed access
+to the fields the device cares about:
+
+    s=Play|Playback|Download      session type
+    c=IN IP4 <ip>                 media destination (session or media level)
+    t=<start> <stop>              playback/download window (Unix seconds)
+    m=video <port> <proto> <pts>  port, RTP/AVP or TCP/RTP/AVP, payload types
+    a=rtpmap / a=setup / a=downloadspeed
+    y=<ssrc>                      GB28181 SSRC
+    f=v/<codec>/<resolution>/...  GB28181 media format
+
+Answers are rendered from a fixed template by build_sdp_answer().
+"""
+
+from logger import log
+
+GB28181_SESSION_TYPES = ("Play", "Playback", "Download", "Talk")
+
+# GB28181 f= video codec and resolution codes
+VIDEO_CODECS = {"1": "mpeg4", "2": "h264", "3": "svac", "4": "3gp", "5": "h265"}
+VIDEO_RESOLUTIONS = {
+    "1": (176, 144),    # QCIF
+    "2": (352, 288),    # CIF
+    "3": (704, 576),    # 4CIF
+    "4": (720, 576),    # D1
+    "5": (1280, 720),   # 720P
+    "6": (1920, 1080),  # 1080P
+}
+
+DIRECTIONS = ("sendrecv", "sendonly", "recvonly", "inactive")
+
+ANSWER_TEMPLATE = (
+    "v=0\r\n"
+    "o={username} {session_id} {session_id} IN IP4 {origin_ip}\r\n"
+    "s={session_name}\r\n"
+    "c=IN IP4 {connection_ip}\r\n"
+    "t={start} {stop}\r\n"
+    "m=video {port} {protocol} {payload_type}\r\n"
+    "a=sendonly\r\n"
+    "{setup}"
+    "a=rtpmap:{payload_type} {encoding}\r\n"
+    "y={ssrc}\r\n"
+    "f={media_format}\r\n"
+)
+
+SETUP_TEMPLATE = "a=setup:{setup}\r\na=connection:new\r\n"
+
+
+class MediaDescription:
+    """One m= section and its attributes"""
+
+    def __init__(self, media, port, protocol, formats):
+        self.media = media
+        self.port = port
+        self.protocol = protocol
+        self.formats = formats
+        self.connection_ip = None
+        self.attributes = []
+        self.rtpmap = {}
+
+    def get_attribute(self, name):
+        """Get the value of the first a=<name> attribute, or None"""
+        for attr_name, value in self.attributes:
+            if attr_name == name:
+                return value
+        return None
+
+    @property
+    def is_tcp(self):
+        return "TCP" in self.protocol.upper()
+
+    @property
+    def setup(self):
+        """a=setup value (active/passive/actpass), or None for UDP offers"""
+        value = self.get_attribute("setup")
+        return value.lower() if value else None
+
+    @property
+    def direction(self):
+        for attr_name, _ in self.attributes:
+            if attr_name in DIRECTIONS:
+                return attr_name
+        return "sendrecv"
+
+    def payload_type_for(self, encoding):
+        """Find the offered payload type mapped to an encoding name (e.g. "PS", "H264")"""
+        encoding = encoding.upper()
+        for pt in self.formats:
+            if self.rtpmap.get(pt, "").upper().split("/")[0] == encoding:
+                return pt
+        return None
+
+
+class SessionDescription:
+    """A parsed SDP body"""
+
+    def __init__(self):
+        self.version = None
+        self.origin = None
+        self.session_name = None
+        self.connection_ip = None
+        self.start_time = 0
+        self.stop_time = 0
+        self.uri = None
+        self.ssrc = None
+        self.media_format = None
+        self.attributes = []
+        self.media = []
+        self.lines = []
+
+    def get_attribute(self, name):
+        """Get a session-level attribute, falling back to the video section"""
+        for attr_name, value in self.attributes:
+            if attr_name == name:
+                return value
+        video = self.video
+        return video.get_attribute(name) if video else None
+
+    @property
+    def video(self):
+        """The first m=video section (or first section of any type)"""
+        for media in self.media:
+            if media.media == "video":
+                return media
+        return self.media[0] if self.media else None
+
+    @property
+    def session_type(self):
+        """GB28181 session type: Play, Playback, Download, Talk or the raw s= value"""
+        name = (self.session_name or "").strip()
+        for session_type in GB28181_SESSION_TYPES:
+            if name.lower() == session_type.lower():
+                return session_type
+        return name
+
+    @property
+    def is_playback(self):
+        return self.session_type == "Playback"
+
+    @property
+    def is_download(self):
+        return self.session_type == "Download"
+
+    @property
+    def download_speed(self):
+        """a=downloadspeed multiplier for Download sessions (1.0 if absent)"""
+        value = self.get_attribute("downloadspeed")
+        try:
+            return float(value) if value else 1.0
+        except ValueError:
+            log.warning(f"[SDP] Invalid downloadspeed '{value}'")
+            return 1.0
+
+    @property
+    def dest_ip(self):
+        video = self.video
+        if video and video.connection_ip:
+            return video.connection_ip
+        return self.connection_ip
+
+    @property
+    def dest_port(self):
+        video = self.video
+        return video.port if video else None
+
+    @property
+    def transport(self):
+        video = self.video
+        return video.protocol if video else None
+
+    @property
+    def is_tcp(self):
+        video = self.video
+        return bool(video and video.is_tcp)
+
+    @property
+    def setup(self):
+        video = self.video
+        return video.setup if video else None
+
+    @property
+    def video_format(self):
+        """Decoded f= line: codec, width, height, framerate (missing fields are None)"""
+        result = {"codec": None, "width": None, "height": None, "framerate": None}
+        if not self.media_format or not self.media_format.startswith("v/"):
+            return result
+        parts = self.media_format.split("a/")[0].split("/")
+        codec_id = parts[1] if len(parts) > 1 else ""
+        resolution_id = parts[2] if len(parts) > 2 else ""
+        framerate = parts[3] if len(parts) > 3 else ""
+        result["codec"] = VIDEO_CODECS.get(codec_id)
+        if resolution_id in VIDEO_RESOLUTIONS:
+            result["width"], result["height"] = VIDEO_RESOLUTIONS[resolution_id]
+        if framerate.isdigit():
+            result["framerate"] = int(framerate)
+        return result
+
+    def __str__(self):
+        return "\r\n".join(self.lines) + "\r\n"
+
+
+def extract_sdp_body(message_text):
+    """Cut the SDP body out of a SIP message (or pjsua log dump)
+
+    Returns:
+        list: SDP lines from v= up to the first line that is not an SDP line
+    """
+    raw_lines = [line.strip() for line in message_text.splitlines()]
+    lines = []
+    in_sdp = False
+    for line in raw_lines:
+        if not in_sdp:
+            if line.startswith("v="):
+                in_sdp = True
+            else:
+                continue
+        if not _is_sdp_line(line):
+            break
+        lines.append(line)
+
+    if not lines:
+        # Partial SDP in log output without a v= line: keep whatever fields are there
+        lines = [line for line in raw_lines if _is_sdp_line(line) and line[0] in "csmatyf"]
+    return lines
+
+
+def _is_sdp_line(line):
+    return len(line) >= 2 and line[1] == "=" and "a" <= line[0] <= "z"
+
+
+def parse_sdp(message_text):
+    """Parse the SDP carried in a SIP message or given on its own
+
+    Returns:
+        SessionDescription or None: None if the text holds no SDP
+    """
+    if not message_text:
+        return None
+
+    lines = extract_sdp_body(message_text)
+    if not lines:
+        return None
+
+    sdp = SessionDescription()
+    sdp.lines = lines
+    current = None
+
+    for line in lines:
+        key, value = line[0], line[2:].strip()
+        try:
+            if key == "v":
+                sdp.version = value
+            elif key == "o":
+                sdp.origin = value
+            elif key == "s":
+                sdp.session_name = value
+            elif key == "u":
+                sdp.uri = value
+            elif key == "c":
+                ip = value.split()[-1].split("/")[0]
+                if current:
+                    current.connection_ip = ip
+                else:
+                    sdp.connection_ip = ip
+            elif key == "t":
+                start, stop = value.split()[:2]
+                sdp.start_time, sdp.stop_time = int(start), int(stop)
+            elif key == "m":
+                parts = value.split()
+                current = MediaDescription(parts[0], int(parts[1].split("/")[0]), parts[2], parts[3:])
+                sdp.media.append(current)
+            elif key == "a":
+                name, _, attr_value = value.partition(":")
+                name = name.strip().lower()
+                attr_value = attr_value.strip()
+                target = current.attributes if current else sdp.attributes
+                target.append((name, attr_value))
+                if name == "rtpmap" and current:
+                    pt, _, encoding = attr_value.partition(" ")
+                    current.rtpmap[pt] = encoding.strip()
+            elif key == "y":
+                sdp.ssrc = value
+            elif key == "f":
+                sdp.media_format = value
+        except (ValueError, IndexError):
+            log.warning(f"[SDP] Ignoring malformed line: {line}")
+
+    return sdp
+
+
+def build_sdp_answer(origin_ip, connection_ip, port, protocol, payload_type, encoding, ssrc,
+                     session_name="Play", setup=None, media_format="v/2/25",
+                     start=0, stop=0, session_id=0, username="-"):
+    """Render a GB28181 SDP answer (a=sendonly, one rtpmap)
+
+    Args:
+        setup (str, optional): "active" or "passive" for TCP media, None for UDP
+
+    Returns:
+        str: SDP body with CRLF line endings
+    """
+    return ANSWER_TEMPLATE.format(
+        username=username,
+        session_id=session_id,
+        origin_ip=origin_ip,
+        session_name=session_name,
+        connection_ip=connection_ip,
+        start=start,
+        stop=stop,
+        port=port,
+        protocol=protocol,
+        payload_type=payload_type,
+        setup=SETUP_TEMPLATE.format(setup=setup) if setup else "",
+        encoding=encoding,
+        ssrc=ssrc,
+        media_format=media_format
+    )
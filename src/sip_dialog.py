@@ -0,0 +1,151 @@
+# src/sip_dialog.py
+
+"""
+Per-Call-ID SIP dialog state for incoming GB28181 INVITEs
+
+Each INVITE gets a Dialog that walks through
+
+    INVITED -> TRYING -> PREROLLING -> ANSWERED -> CONFIRMED -> TERMINATED
+                                   \\-> FAILED          (BYE/CANCEL -> TERMINATING)
+
+and keeps its own copy of the headers the responses must echo, so several
+calls can be set up at the same time. Media startup runs on a small worker
+pool instead of the pjsua output thread.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import log
+
+INVITED = "invited"
+TRYING = "trying"
+PREROLLING = "prerolling"
+ANSWERED = "answered"
+CONFIRMED = "confirmed"
+TERMINATING = "terminating"
+TERMINATED = "terminated"
+FAILED = "failed"
+
+TRANSITIONS = {
+    INVITED: (TRYING, FAILED, TERMINATING),
+    TRYING: (PREROLLING, FAILED, TERMINATING),
+    PREROLLING: (ANSWERED, FAILED, TERMINATING),
+    ANSWERED: (CONFIRMED, FAILED, TERMINATING),
+    CONFIRMED: (TERMINATING,),
+    TERMINATING: (TERMINATED,),
+    TERMINATED: (),
+    FAILED: (TERMINATED,),
+}
+
+FINAL_STATES = (TERMINATED, FAILED)
+
+
+class Dialog:
+    """State of one INVITE dialog"""
+
+    def __init__(self, call_id, headers=None):
+        self.call_id = call_id
+        self.state = INVITED
+        self.headers = headers or {}
+        self.local_tag = f"device{int(time.time() * 1000) % 10 ** 10}"
+        self.created = time.time()
+        self.updated = self.created
+        self.history = [(INVITED, self.created)]
+        self.channel_id = None
+        self.platform = None      # upstream Platform that sent the INVITE
+        self.stream_id = None
+        self.last_response = None
+        self.transaction = None   # (Call-ID, CSeq, method, branch) of the INVITE
+        self._lock = threading.Lock()
+
+    def transition(self, new_state):
+        """Move to new_state if the state machine allows it
+
+        Returns:
+            bool: False (and no change) for an invalid transition
+        """
+        with self._lock:
+            if new_state not in TRANSITIONS[self.state]:
+                log.warning(f"[DIALOG] {self.call_id}: invalid transition {self.state} -> {new_state}")
+                return False
+            log.debug(f"[DIALOG] {self.call_id}: {self.state} -> {new_state}")
+            self.state = new_state
+            self.updated = time.time()
+            self.history.append((new_state, self.updated))
+            return True
+
+    @property
+    def is_final(self):
+        return self.state in FINAL_STATES
+
+    @property
+    def setup_time(self):
+        """Seconds from INVITE to 200 OK, or None if not answered yet"""
+        for state, timestamp in self.history:
+            if state == ANSWERED:
+                return timestamp - self.created
+        return None
+
+
+class DialogManager:
+    """Registry of dialogs by Call-ID plus the worker pool that sets them up"""
+
+    def __init__(self, config):
+        sip_config = (config or {}).get("sip", {})
+        self.max_workers = sip_config.get("invite_workers", 8)
+        self.linger = sip_config.get("dialog_linger", 32)  # keep final dialogs for retransmissions
+        self.dialogs = {}
+        self._lock = threading.Lock()
+        self.teardowns = {}      # reason (bye/cancel/failure/shutdown) -> count
+        self.last_teardown_ms = None
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="invite")
+
+    def create(self, call_id, headers=None):
+        """Create the dialog for a new INVITE
+
+        Returns:
+            tuple: (Dialog, bool) - the bool is False when call_id is a
+                   retransmission of an INVITE already being handled
+        """
+        with self._lock:
+            self._expire()
+            dialog = self.dialogs.get(call_id)
+            if dialog is not None:
+                return dialog, False
+            dialog = Dialog(call_id, headers)
+            self.dialogs[call_id] = dialog
+            return dialog, True
+
+    def get(self, call_id):
+        return self.dialogs.get(call_id)
+
+    def remove(self, call_id):
+        with self._lock:
+            return self.dialogs.pop(call_id, None)
+
+    def submit(self, fn, *args):
+        """Run dialog setup work off the SIP receive thread"""
+        return self.executor.submit(fn, *args)
+
+    def _expire(self):
+        now = time.time()
+        for call_id in [cid for cid, d in self.dialogs.items() if d.is_final and now - d.updated > self.linger]:
+            del self.dialogs[call_id]
+
+    def record_teardown(self, reason, seconds):
+        """Count a finished call by what ended it and how long the teardown took"""
+        with self._lock:
+            self.teardowns[reason] = self.teardowns.get(reason, 0) + 1
+            self.last_teardown_ms = seconds * 1000
+
+    def get_stats(self):
+        """Count dialogs per state"""
+        counts = {}
+        for dialog in list(self.dialogs.values()):
+            counts[dialog.state] = counts.get(dialog.state, 0) + 1
+        return counts
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -9,6 +9,7 @@ import json
 import tempfile
 import signal
 import xml.etree.ElementTree as ET
+from functools import partial
 from logger import log
 from file_scanner import get_video_catalog, scan_video_files
 from media_streamer import MediaStreamer
@@ -19,11 +20,45 @@ from gb28181_xml import (
     format_keepalive_response,
     format_device_status_response,
     format_media_status_response,
+    format_media_status_notify,
+    format_catalog_notify,
     format_recordinfo_response,
     parse_xml_message,
-    parse_recordinfo_query
+    parse_recordinfo_query,
+    parse_manscdp
 )
 from gb28181_sip_sender import GB28181SIPSender
+from mansrtsp import extract_mansrtsp_body, parse_mansrtsp
+from port_manager import get_port_manager
+from catalog_tracker import CatalogTracker
+from catalog_subscriptions import SubscriptionManager
+from manscdp_codec import CatalogItemCache, declared_encoding, decode_sip_message, encode_sip_message
+from encoder_governor import get_encoder_governor
+from reconnect_scheduler import get_reconnect_scheduler, OPEN as CIRCUIT_OPEN
+from keepalive_scheduler import get_keepalive_scheduler
+from platforms import PlatformRegistry
+from sip_transactions import TransactionCache, request_key
+from rate_limiter import SourceRateLimiter
+from message_capture import get_message_capture
+from sip_registration import RegistrationClient, REGISTERED, FAILED as REGISTRATION_FAILED
+from sdp import parse_sdp, build_sdp_answer, SessionDescription, MediaDescription, GB28181_SESSION_TYPES
+from sip_dialog import DialogManager, TRYING, PREROLLING, ANSWERED, CONFIRMED, TERMINATING, TERMINATED, FAILED
+
+# Encoder profile used for each GB28181 f= video codec we can produce
+VIDEO_CODEC_PROFILES = {"mpeg4": "simple", "h264": "baseline", "h265": "main"}
+
+# Encoder settings requested for live streams to the platform; admission control may step them down
+PLATFORM_ENCODER_PARAMS = {
+    'width': 704,
+    'height': 576,
+    'framerate': 25,
+    'bitrate': 1024,
+    'keyframe_interval': 50,
+    'speed_preset': 'superfast',
+    'use_ps_format': True,  # GB28181 typically uses PS format
+    'codec': 'h264',
+    'payload_type': 96
+}
 
 class SIPClient:
     def __init__(self, config):
@@ -43,9 +78,48 @@ class SIPClient:
         self.active_streams = {}
         self.stream_locks = {}
         
+        # Media ports are leased per Call-ID; pjsua keeps a fixed block of its own
+        self.port_manager = get_port_manager(config)
+        self.pjsua_rtp_port = self.port_manager.reserve_block("pjsua", 16) or 10000
+        
+        # TCP-passive listening ports are bound up front by the media listener from their own range
+        tcp_start, tcp_end = config.get("media", {}).get("tcp_passive_port_range", [30000, 30099])
+        if tcp_start < self.port_manager.port_end and self.port_manager.port_start <= tcp_end:
+            log.warning(f"[SIP] ⚠️ media.tcp_passive_port_range {tcp_start}-{tcp_end} overlaps media.rtp_port_range "
+                        f"{self.port_manager.port_start}-{self.port_manager.port_end}, leased ports may collide")
+        
+        # Encoder budget: new sessions are stepped down or refused instead of overloading the host
+        self.encoder_governor = get_encoder_governor(config)
+        
+        # Incoming INVITEs get a dialog each and are set up on worker threads
+        self.dialogs = DialogManager(config)
+        
+        # Retransmitted requests are recognised by transaction; query floods are shed per source
+        self.transactions = TransactionCache(config)
+        self.rate_limiter = SourceRateLimiter(config)
+        
+        # Recent pjsua output and SIP messages stay in memory; they are written out on demand or on error
+        self.capture = get_message_capture(config)
+        
+        # Live sources whose reconnect circuit is open are reported OFF in the catalog
+        self.reconnects = get_reconnect_scheduler(config)
+        self.reconnects.add_listener(self._on_source_circuit_change)
+        
+        # Keepalives run on the shared jittered timer (one key per platform); unanswered ones trigger a re-REGISTER
+        self.keepalives = get_keepalive_scheduler(config)
+        
         # For storing device catalog
         self.device_catalog = {}
         
+        # Catalog versions: subscribed platforms get NOTIFY deltas, the full catalog is only resent slowly
+        self.catalog_tracker = CatalogTracker(config)
+        self.catalog_subscriptions = SubscriptionManager(config, self.catalog_tracker, self._send_subscription_notify)
+        self.catalog_items = CatalogItemCache("GB2312")  # catalog <Item>s with their GB2312 byte sizes
+        catalog_config = config["sip"].get("catalog", {})
+        self.catalog_check_interval = catalog_config.get("check_interval", 60)
+        self.catalog_full_refresh_interval = catalog_config.get("full_refresh_interval", 3600)
+        self._catalog_sources_signature = None
+        
         # FIXED: Thread-safe rate limiting for catalog responses
         self._catalog_lock = threading.Lock()
         self._last_catalog_time = 0
@@ -58,13 +132,15 @@ class SIPClient:
         self.registration_status = "OFFLINE"
         self.last_keepalive_time = None
         self.last_keepalive_check = time.time()
-        self.keepalive_interval = 15  # FIXED: Reduced from 30 to 15 seconds for WVP compatibility
+        self.keepalive_interval = self.keepalives.interval  # sip.heartbeat_interval
         self.registration_retry_interval = 20  # FIXED: Reduced from 30 to 20 seconds for faster recovery
         self.last_registration_time = 0  # Track when we last registered
         self.registration_timeout = 120  # FIXED: Registration expires in 2 minutes (120s) for WVP platform
         
         # Streamer connection
         self.streamer = config.get("streamer")
+        if self.streamer:
+            self.streamer.on_stream_failed = self._on_stream_failed
         
         # Initialize SIP sender for XML messages
         self.sip_sender = GB28181SIPSender(config)
@@ -91,17 +167,48 @@ class SIPClient:
         self._last_to = ""
         self._last_call_id = ""
         self._last_cseq = ""
+        self._last_source = ""  # address of the last request pjsua received
+        self._last_source_port = None
         self._local_tag = f"tag{int(time.time())}"
+        self._sip_socket = None  # shared UDP socket for the SIP messages we originate
+        self._sip_socket_lock = threading.Lock()
         self.local_ip = self._get_local_ip()  # Get actual local IP
+        
+        # Upstream platforms: config["sip"] plus sip.platforms, each with its own registration,
+        # keepalives, message builder and catalog view; self.messages is the primary's builder
+        self.platforms = PlatformRegistry(config, self.local_ip, self.local_port)
+        self.messages = self.platforms.primary.messages
+        
+        # REGISTER in-process (sip.registration.in_process) instead of through pjsua; pjsua still takes requests.
+        # The Contact we register is local_port, so pjsua must listen on a fixed one for the platforms to reach it
+        self.registration = None
+        in_process = config["sip"].get("registration", {}).get("in_process", False)
+        if in_process and not self.local_port:
+            log.error("[SIP] ❌ sip.registration.in_process needs a fixed sip.local_port (pjsua would pick a random "
+                      "one the registered Contact cannot name), registering through pjsua instead")
+            in_process = False
+        if in_process:
+            for platform in self.platforms:
+                platform.registration = RegistrationClient({"sip": platform.sip_config}, platform.messages,
+                                                           partial(self._send_registration, platform),
+                                                           partial(self._on_registration_state, platform))
+            self.registration = self.platforms.primary.registration
 
         # ADDED: Enhanced message processing with thread safety
         self._message_processing_lock = threading.Lock()
+        
+        # MANSCDP dispatch table: (root element, CmdType) -> handler(xml_content, parsed message)
+        self._manscdp_handlers = {
+            ("Query", "Catalog"): self._answer_catalog_query,
+            ("Query", "DeviceStatus"): self._answer_device_info_query,
+            ("Query", "DeviceInfo"): self._answer_device_info_query,
+            ("Query", "RecordInfo"): self._answer_recordinfo_query,
+            ("Control", "DeviceControl"): self._answer_device_control
+        }
         self._pending_catalog_queries = {}  # Track pending queries to prevent duplicates
         
-        # FIXED: Dedicated heartbeat thread for WVP platform compatibility with reduced intervals
-        self._heartbeat_thread = None
+        # Keepalives are registered with self.keepalives while this is set
         self._heartbeat_running = False
-        self._last_successful_keepalive = time.time()  # Track successful keepalives for failure detection
 
     def _get_local_ip(self):
         """Get the local IP address that can reach the SIP server"""
@@ -189,7 +296,7 @@ class SIPClient:
                                 'name': rtsp_name,
                                 'manufacturer': 'GB28181-Restreamer',
                                 'model': 'RTSP Camera',
-                                'status': 'ON',
+                                'status': self._source_status(rtsp_url),
                                 'parent_id': self.device_id,
                                 'rtsp_url': rtsp_url,
                                 'channel_type': 'rtsp'
@@ -252,7 +359,7 @@ class SIPClient:
                                 'name': f'RTSP Stream {i}',
                                 'manufacturer': 'GB28181-Restreamer',
                                 'model': 'RTSP Camera',
-                                'status': 'ON',
+                                'status': self._source_status(rtsp_url),
                                 'parent_id': self.device_id,
                                 'rtsp_url': rtsp_url
                             }
@@ -301,6 +408,7 @@ class SIPClient:
                 if len(self.device_catalog) > 3:
                     log.info(f"[SIP]   ... and {len(self.device_catalog) - 3} more channels")
                 
+                self._track_catalog_changes()
                 return self.device_catalog
                 
             except Exception as e:
@@ -333,264 +441,99 @@ class SIPClient:
                 self.last_catalog_update = time.time()
                 
                 log.error(f"[SIP] 🆘 Emergency catalog created with {len(self.device_catalog)} channels")
+                self._track_catalog_changes()
                 return self.device_catalog
 
-    def extract_sdp_from_message(self, msg_text):
-        """Extract SDP content from a SIP message with enhanced parsing
+    def _source_status(self, rtsp_url):
+        """Catalog Status of a live channel: OFF while its reconnect circuit is open"""
+        if not isinstance(rtsp_url, str):
+            return "ON"
+        return "OFF" if self.reconnects.get_source_state(rtsp_url) == CIRCUIT_OPEN else "ON"
+
+    def _on_source_circuit_change(self, source, state):
+        """Reconnect scheduler listener: keep catalog Status in step with the circuit breaker"""
+        status = "OFF" if state == CIRCUIT_OPEN else "ON"
+        for channel_id, channel_info in list(self.device_catalog.items()):
+            if channel_info.get('rtsp_url') == source and channel_info.get('status') != status:
+                channel_info['status'] = status
+                log.info(f"[SIP] 📡 Channel {channel_id} is now {status} (reconnect circuit {state})")
+                self.catalog_subscriptions.publish(self.catalog_tracker.set_status(channel_id, status))
+
+    def parse_sdp_offer(self, msg_text):
+        """Parse the SDP offer of a SIP message once, filling in fallbacks
         
-        This function handles various SDP formats found in GB28181 implementations:
-        - Standard SDP format (after empty line)
-        - Embedded SDP without proper separators
-        - Partial SDP information in log lines
-        - Malformed SDP with missing fields
-        """
-        # Method 1: Find the SDP section which typically starts after an empty line
-        sdp_section = re.search(r'\r\n\r\n(v=0.*)', msg_text, re.DOTALL)
-        if sdp_section:
-            log.debug("[SIP] Found SDP using standard empty line separator")
-            return self._validate_and_fix_sdp(sdp_section.group(1))
-        
-        # Method 2: Look for SDP with alternative separators
-        alt_sdp_section = re.search(r'(\r\n|\n)(v=0.*)', msg_text, re.DOTALL)
-        if alt_sdp_section:
-            log.debug("[SIP] Found SDP using alternative separator")
-            return self._validate_and_fix_sdp(alt_sdp_section.group(2))
-        
-        # Method 3: If we can't find the standard pattern, look for SDP contents more generally
-        sdp_start = msg_text.find('v=0')
-        if sdp_start != -1:
-            log.debug("[SIP] Found SDP using direct v=0 search")
-            return self._validate_and_fix_sdp(msg_text[sdp_start:])
-        
-        # Method 4: Extract key SDP fields to reconstruct a minimal valid SDP
-        log.debug("[SIP] No standard SDP found, attempting to extract key fields")
-        
-        # Extract IP address (c= line)
-        c_match = re.search(r'c=IN IP4 (\d+\.\d+\.\d+\.\d+)', msg_text)
-        # Extract port (m= line)
-        m_match = re.search(r'm=video (\d+)', msg_text)
-        # Look for SSRC (y= line in GB28181)
-        y_match = re.search(r'y=(\d+)', msg_text)
-        # Look for format (f= line in GB28181)
-        f_match = re.search(r'f=v/(\d+)/(\d+)', msg_text)
-        
-        if c_match or m_match or y_match:
-            log.debug("[SIP] Reconstructing SDP from partial fields")
-            sdp_parts = []
-            sdp_parts.append("v=0")
-            sdp_parts.append(f"o=- {int(time.time())} 1 IN IP4 127.0.0.1")
-            sdp_parts.append("s=GB28181 Stream")
-            sdp_parts.append("t=0 0")
-            
-            # Add connection information if available
-            if c_match:
-                sdp_parts.append(f"c=IN IP4 {c_match.group(1)}")
-            else:
-                # Use server IP as fallback
-                sdp_parts.append(f"c=IN IP4 {self.server}")
-                log.warning("[SIP] No IP found in SDP, using server IP as fallback")
-            
-            # Add media description if available
-            if m_match:
-                sdp_parts.append(f"m=video {m_match.group(1)} RTP/AVP 96")
-            else:
-                # Use default port as fallback
-                sdp_parts.append("m=video 9000 RTP/AVP 96")
-                log.warning("[SIP] No port found in SDP, using default port 9000")
-            
-            # Add RTPMAP for H.264
-            sdp_parts.append("a=rtpmap:96 H264/90000")
-            sdp_parts.append("a=fmtp:96 profile-level-id=42e01f")
+        A missing c= line falls back to the SIP server address and a missing
+        m=video line to port 9000, as GB28181 platforms occasionally send
+        partial offers.
+        
+        Args:
+            msg_text (str or SessionDescription): Full SIP message, bare SDP, or an already parsed offer
             
-            # Add SSRC if available (GB28181 specific)
-            if y_match:
-                sdp_parts.append(f"y={y_match.group(1)}")
-            else:
-                sdp_parts.append("y=0000000001")
-                
-            # Add format if available (GB28181 specific)
-            if f_match:
-                sdp_parts.append(f"f=v/{f_match.group(1)}/{f_match.group(2)}")
-            else:
-                sdp_parts.append("f=v/2/25")  # Default to H.264 at 25fps
-                
-            return "\n".join(sdp_parts)
+        Returns:
+            SessionDescription or None: None if the message carries no SDP
+        """
+        if isinstance(msg_text, SessionDescription):
+            return msg_text
         
-        log.error("[SIP] Failed to extract or reconstruct SDP from message")
-        return None
-
-    def _validate_and_fix_sdp(self, sdp_text):
-        """Validate and fix common SDP issues"""
-        if not sdp_text:
+        sdp = parse_sdp(msg_text)
+        if sdp is None:
+            log.error("[SIP] Failed to extract SDP from message")
             return None
-            
-        lines = sdp_text.splitlines()
-        fixed_lines = []
-        has_video = False
-        has_rtpmap = False
-        has_connection = False
         
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Fix common issues
-            if line.startswith('m=video'):
-                has_video = True
-                # Ensure RTP/AVP is present
-                if 'RTP/AVP' not in line:
-                    line = line.replace('UDP', 'RTP/AVP')
-                # Ensure payload type 96 is present
-                if not re.search(r'\s96(\s|$)', line):
-                    line = f"{line} 96"
-                    
-            elif line.startswith('c=IN'):
-                has_connection = True
-                # Ensure IPv4 is specified
-                if 'IP4' not in line:
-                    line = line.replace('IN ', 'IN IP4 ')
-                    
-            elif line.startswith('a=rtpmap:96'):
-                has_rtpmap = True
-                # Ensure correct format for H.264
-                if 'H264' not in line:
-                    line = 'a=rtpmap:96 H264/90000'
-                
-            fixed_lines.append(line)
-            
-        # Add missing required fields
-        if not has_video:
-            fixed_lines.append('m=video 9000 RTP/AVP 96')
-        if not has_connection:
-            fixed_lines.append(f'c=IN IP4 {self.server}') # This might be the platform's IP, use self.local_ip for local SIP client's perspective?
-                                                       # However, for an SDP *offer*, it indicates the target IP for media.
-        if not has_rtpmap:
-            fixed_lines.append('a=rtpmap:96 H264/90000')
-            fixed_lines.append('a=fmtp:96 profile-level-id=42e01f')
-            
-        # Ensure GB28181 specific fields
-        if not any(l.startswith('y=') for l in fixed_lines):
-            fixed_lines.append('y=0000000001')
-        if not any(l.startswith('f=') for l in fixed_lines):
-            fixed_lines.append('f=v/2/25')
-            
-        return '\n'.join(fixed_lines)
+        if not sdp.dest_ip:
+            log.warning(f"[SIP] ⚠️ No c= line in SDP, using server IP {self.server}")
+            sdp.connection_ip = self.server
+        if sdp.video is None:
+            log.warning("[SIP] ⚠️ No m=video line in SDP, using default port 9000")
+            sdp.media.append(MediaDescription("video", 9000, "RTP/AVP", ["96"]))
+        
+        log.debug(f"[SIP] Parsed SDP offer: s={sdp.session_name} c={sdp.dest_ip} "
+                  f"m={sdp.dest_port} {sdp.transport} y={sdp.ssrc}")
+        return sdp
 
     def parse_sdp_and_stream(self, sdp_text, callid=None, target_channel=None, ssrc=None):
         """Parse SDP offer and start streaming to the specified destination
         
         Enhanced with better error handling and recovery mechanisms.
         Added SSRC parameter for WVP compatibility.
+        sdp_text may be the SIP message, bare SDP or an already parsed SessionDescription.
         """
         try:
-            # Check if sdp_text is already SDP content or a full SIP message
-            if sdp_text.strip().startswith('v='):
-                # Already SDP content
-                sdp_content = sdp_text
-                log.debug("[SIP] Using provided SDP content directly")
-            else:
-                # Extract SDP content from full SIP message
-                sdp_content = self.extract_sdp_from_message(sdp_text)
-                if not sdp_content:
-                    log.warning("[SIP] ⚠️ No SDP content found in message, cannot start stream")
-                    return False
-                log.debug("[SIP] Extracted SDP content from SIP message")
-                
-            log.debug(f"[SIP] Using SDP content: {sdp_content}")
-                
-            # Extract destination IP (c= line)
-            ip_match = re.search(r"c=IN IP4 (\d+\.\d+\.\d+\.\d+)", sdp_content)
-            if not ip_match:
-                log.warning("[SIP] ⚠️ Failed to extract IP address from SDP")
-                # Use the server IP as fallback
-                ip = self.server
-                log.info(f"[SIP] Using fallback IP: {ip}")
-            else:
-                ip = ip_match.group(1)
-                
-            # Extract port (m= line)
-            port_match = re.search(r"m=video (\d+)", sdp_content)
-            if not port_match:
-                log.warning("[SIP] ⚠️ Failed to extract port from SDP")
-                # Use a default port as fallback
-                port = 9000
-                log.info(f"[SIP] Using fallback port: {port}")
-            else:
-                port = int(port_match.group(1))
-            
-            # CRITICAL FIX: Extract transport protocol from SDP
-            transport_protocol = "UDP"  # Default
-            m_line_match = re.search(r"m=video \d+ ([A-Z/]+)", sdp_content)
-            if m_line_match:
-                transport_protocol = m_line_match.group(1)
-                log.info(f"[SIP] 🚀 Detected transport protocol: {transport_protocol}")
-            else:
-                log.warning(f"[SIP] Could not detect transport protocol from SDP, using default UDP")
+            sdp = self.parse_sdp_offer(sdp_text)
+            if not sdp:
+                log.warning("[SIP] ⚠️ No SDP content found in message, cannot start stream")
+                return False
             
-            # Extract SSRC (y= line in GB28181) or use provided SSRC
+            ip = sdp.dest_ip
+            port = sdp.dest_port
+            video = sdp.video
+            transport_protocol = sdp.transport or "UDP"
+            log.info(f"[SIP] 🚀 Detected transport protocol: {transport_protocol}")
+            
+            # SSRC from the y= line in GB28181, unless provided
             if ssrc is None:
-                # Try to extract from SDP
-                y_match = re.search(r"y=(\d+)", sdp_content)
-                ssrc = y_match.group(1) if y_match else "0000000001"
+                ssrc = sdp.ssrc if sdp.ssrc and sdp.ssrc.isdigit() else "0000000001"
             else:
                 log.info(f"[SIP] 🎯 Using provided SSRC: {ssrc}")
             
-            # Extract video format requirements if available (f= line in GB28181)
+            # Payload types the platform mapped to PS and H264
             encoder_params = {}
-            use_ps_format = False
-            selected_pt = None  # payload type for H264/90000 if present
-            
-            # Scan SDP lines
-            for line in sdp_content.split('\n'):
-                line = line.strip()
-                # Detect PS request
-                if 'rtpmap:96 PS/' in line:
-                    use_ps_format = True
-                    log.info(f"[SIP] 🔧 Detected PS format requirement from SDP rtpmap")
-
-                # Detect H264 payload type mapping
-                if line.lower().startswith('a=rtpmap:') and 'h264/90000' in line.lower():
-                    try:
-                        selected_pt = line.split()[0].split(':')[1]
-                    except Exception:
-                        pass
-            
-            f_match = re.search(r"f=v/(\d+)/(\d+)", sdp_content)
-            if f_match:
-                codec_id = f_match.group(1)
-                resolution_id = f_match.group(2)
-                
-                # Map GB28181 codec IDs to GStreamer encoder parameters
-                if codec_id == "1":  # MPEG-4
-                    encoder_params["codec"] = "mpeg4"
-                    encoder_params["profile"] = "simple"
-                elif codec_id == "2":  # H.264
-                    encoder_params["codec"] = "h264"
-                    encoder_params["profile"] = "baseline"
-                elif codec_id == "3":  # H.265
-                    encoder_params["codec"] = "h265"
-                    encoder_params["profile"] = "main"
-                    
-                # Map GB28181 resolution IDs to actual resolutions
-                if resolution_id == "1":  # QCIF
-                    encoder_params["width"] = 176
-                    encoder_params["height"] = 144
-                elif resolution_id == "2":  # CIF
-                    encoder_params["width"] = 352
-                    encoder_params["height"] = 288
-                elif resolution_id == "3":  # 4CIF
-                    encoder_params["width"] = 704
-                    encoder_params["height"] = 576
-                elif resolution_id == "4":  # D1
-                    encoder_params["width"] = 720
-                    encoder_params["height"] = 576
-                elif resolution_id == "5":  # 720P
-                    encoder_params["width"] = 1280
-                    encoder_params["height"] = 720
-                elif resolution_id == "6":  # 1080P
-                    encoder_params["width"] = 1920
-                    encoder_params["height"] = 1080
+            ps_pt = video.payload_type_for("PS")
+            selected_pt = ps_pt or video.payload_type_for("H264")
+            use_ps_format = ps_pt is not None
+            if use_ps_format:
+                log.info(f"[SIP] 🔧 Detected PS format requirement from SDP rtpmap")
+            
+            # Video format requirements from the f= line
+            video_format = sdp.video_format
+            if sdp.media_format:
+                codec = video_format["codec"]
+                if codec in VIDEO_CODEC_PROFILES:
+                    encoder_params["codec"] = codec
+                    encoder_params["profile"] = VIDEO_CODEC_PROFILES[codec]
+                if video_format["width"]:
+                    encoder_params["width"] = video_format["width"]
+                    encoder_params["height"] = video_format["height"]
                     
                 log.info(f"[SIP] Video format request: codec={encoder_params.get('codec', 'h264')}, " +
                              f"resolution={encoder_params.get('width', '?')}x{encoder_params.get('height', '?')}")
@@ -652,6 +595,14 @@ class SIPClient:
                         log.error("[SIP] No RTSP sources configured either. Cannot start stream.")
                         return False
                 
+            # Admission control: step the encoder down under load, refuse once saturated
+            session_id = callid or f"{ip}:{port}:{ssrc}"
+            admission = self.encoder_governor.admit(session_id, encoder_params)
+            if admission["status"] != 200:
+                log.error(f"[SIP] ❌ Stream refused by admission control: {admission['reason']}")
+                return False
+            encoder_params = admission["params"]
+            
             # Check if this is an RTSP source and use the appropriate handler
             if str(video_source).startswith(("rtsp://", "rtsps://")):
                 # Use the live stream handler for RTSP sources
@@ -713,6 +664,7 @@ class SIPClient:
                 return True
             else:
                 log.error("[SIP] Failed to start stream")
+                self.encoder_governor.release(session_id)
                 return False
                 
         except Exception as e:
@@ -835,39 +787,35 @@ class SIPClient:
         except Exception as e:
             log.error(f"[SIP] Error during stream recovery: {e}")
             
-    def handle_catalog_query(self, msg_text):
-        """Handle catalog query according to GB28181 protocol with thread safety"""
+    def handle_catalog_query(self, msg_text, message=None, platform=None):
+        """Handle catalog query according to GB28181 protocol with thread safety
+        
+        Args:
+            msg_text (str): Raw SIP message or MANSCDP body
+            message (dict): Already parsed message from parse_manscdp, if the caller has one
+            platform (Platform): Platform that asked; its catalog view is answered (all channels if None)
+        """
         # FIXED: Thread-safe message processing to prevent race conditions
         with self._message_processing_lock:
             try:
                 log.info("[SIP] 🔍 Processing catalog query from platform (thread-safe)")
                 
-                # Extract XML from the message - improved to handle both with and without XML prolog
-                xml_match = re.search(r'(<\?xml.*?<\/Query>)', msg_text, re.DOTALL)
-                if not xml_match:
-                    xml_match = re.search(r'(<Query.*?<\/Query>)', msg_text, re.DOTALL)
-                if not xml_match:
+                if message is None:
+                    message = parse_manscdp(msg_text)
+                if message is None or message["root"] != "Query":
                     log.error("[SIP] ❌ Failed to extract <Query>…</Query> block from Catalog message")
                     log.debug(f"[SIP] Message content preview: {msg_text[:300]}...")
                     return None
-                    
-                xml_content = xml_match.group(1)
                 
-                if not xml_content.strip().startswith('<?xml'):
-                    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n' + xml_content
-                    
-                log.debug(f"[SIP] Extracted raw Catalog XML: {xml_content[:200]}...")
-                
-                if not re.search(r'<CmdType>\s*Catalog\s*</CmdType>', xml_content, re.IGNORECASE):
+                if message["cmd_type"].lower() != "catalog":
                     log.debug("[SIP] Not a catalog query, ignoring")
                     return None
                     
-                sn_match = re.search(r'<SN>(\d+)</SN>', xml_content)
-                if not sn_match:
+                if not message["sn"].isdigit():
                     log.warning("[SIP] No SN found in catalog query")
                     return None
                     
-                sn = sn_match.group(1)
+                sn = message["sn"]
                 log.info(f"✅ Valid catalog query confirmed (SN: {sn}), processing...")
                 
                 # IMPROVED: Check catalog status before rate limiting
@@ -898,7 +846,7 @@ class SIPClient:
                 
                 # Generate full catalog response
                 log.info(f"[SIP] 🏗️ Generating catalog response for SN: {sn}")
-                response_xml = self._generate_catalog_response(sn)
+                response_xml = self._generate_catalog_response(sn, platform)
                 
                 if response_xml:
                     # Verify response has content
@@ -911,15 +859,7 @@ class SIPClient:
                         log.debug(f"[SIP] Response preview: {response_xml[:500]}...")
                 else:
                     log.error(f"[SIP] ❌ Failed to generate catalog response")
-
-                # Save response to file for debugging
-                try:
-                    debug_filename = f"catalog_response_sn_{sn}.xml"
-                    with open(debug_filename, "w", encoding="utf-8") as f:
-                        f.write(response_xml if response_xml else "NO_RESPONSE_GENERATED")
-                    log.debug(f"[SIP] 💾 Saved response to {debug_filename}")
-                except Exception as e:
-                    log.warning(f"[SIP] Could not save debug file: {e}")
+                    self.capture.error(f"catalog-{sn}")
                 
                 # Clean up pending queries (remove old entries) - simplified
                 if hasattr(self, '_pending_catalog_queries'):
@@ -938,6 +878,7 @@ class SIPClient:
                 log.error(f"[SIP] ❌ CRITICAL ERROR in catalog query handling: {e}")
                 import traceback
                 log.error(f"[SIP] Full traceback: {traceback.format_exc()}")
+                self.capture.error("catalog-query")
                 
                 # Try to extract SN for error response
                 try:
@@ -961,8 +902,11 @@ class SIPClient:
                 log.error(f"[SIP] Emergency response size: {len(error_response_xml)} bytes")
                 return error_response_xml
 
-    def _generate_catalog_response(self, sn):
-        """Generate catalog response XML for given SN using thread-safe cached catalog"""
+    def _generate_catalog_response(self, sn, platform=None):
+        """Generate catalog response XML for given SN using thread-safe cached catalog
+        
+        Only the channels in platform's catalog view are listed (all of them if platform is None).
+        """
         try:
             # FIXED: Use the thread-safe cached device catalog instead of re-scanning
             with self._catalog_generation_lock:
@@ -976,6 +920,8 @@ class SIPClient:
                 video_file_channels = []
                 
                 for channel_id, channel_info in self.device_catalog.items():
+                    if platform is not None and not platform.sees(channel_id):
+                        continue
                     if channel_info.get('channel_type') == 'rtsp' or 'rtsp_url' in channel_info:
                         rtsp_channels.append((channel_id, channel_info))
                     else:
@@ -991,10 +937,12 @@ class SIPClient:
             # Build XML items for COMPLETE CATALOG FORMAT (parent device + channels)
             # CRITICAL FIX: WVP platform requires the parent device as first item, then channels
             xml_items = []
+            item_sizes = []  # encoded (GB2312) byte length of each item
             
             # STEP 1: Add the parent device as the first item (required by WVP) - ULTRA-MINIMAL FORMAT
             parent_device_xml = f"""    <Item><DeviceID>{self.device_id}</DeviceID><Name>Restreamer</Name><Status>ON</Status><Parental>0</Parental></Item>"""
             xml_items.append(parent_device_xml)
+            item_sizes.append(len(parent_device_xml))  # ASCII only
             
             # STEP 2: Add prioritized channels - RTSP live streams first, then video files - ULTRA-MINIMAL FORMAT
             rtsp_count = 0
@@ -1002,9 +950,10 @@ class SIPClient:
             
             for channel_id, channel_info in prioritized_catalog:
                 # ULTRA-MINIMAL FORMAT: Remove all whitespace and non-essential fields for maximum UDP efficiency
-                name = channel_info['name'][:20]  # Truncate long names
-                channel_item_xml = f"""    <Item><DeviceID>{channel_id}</DeviceID><Name>{name}</Name><Status>{channel_info['status']}</Status><Parental>1</Parental><ParentID>{self.device_id}</ParentID></Item>"""
+                # Items and their encoded sizes are cached per channel state, names truncated to 20 characters
+                channel_item_xml, item_size = self.catalog_items.item(channel_id, channel_info, self.device_id)
                 xml_items.append(channel_item_xml)
+                item_sizes.append(item_size)
                 
                 # Count channel types for logging
                 if channel_info.get('channel_type') == 'rtsp' or 'rtsp_url' in channel_info:
@@ -1017,7 +966,8 @@ class SIPClient:
             
             # FIXED: Check message size for UDP safety with proper newlines - Apply size limits with RTSP priority
             xml_content = "\n".join(xml_items)  # FIXED: Use actual newlines, not \\n
-            estimated_size = len(xml_content.encode('utf-8')) + 1000  # Add overhead for headers
+            content_size = sum(item_sizes) + len(item_sizes) - 1
+            estimated_size = content_size + 1000  # Add overhead for headers
             
             log.info(f"[SIP] 🏗️ Building WVP-compatible catalog response (RTSP prioritized):")
             log.info(f"[SIP]   • Parent Device: {self.device_id} (GB28181-Restreamer)")
@@ -1032,7 +982,7 @@ class SIPClient:
                 
                 # Always keep parent device + ALL RTSP streams, limit video files
                 safe_items = [xml_items[0]]  # Parent device
-                running_size = len(xml_items[0].encode('utf-8')) + 600  # Base response size + headers (reduced for minimal format)
+                running_size = item_sizes[0] + 600  # Base response size + headers (reduced for minimal format)
                 
                 rtsp_included = 0
                 video_included = 0
@@ -1041,7 +991,7 @@ class SIPClient:
                 for i, (channel_id, channel_info) in enumerate(prioritized_catalog):
                     if channel_info.get('channel_type') == 'rtsp' or 'rtsp_url' in channel_info:
                         item_xml = xml_items[i + 1]  # +1 to skip parent device
-                        item_size = len(item_xml.encode('utf-8'))
+                        item_size = item_sizes[i + 1]
                         if running_size + item_size < 1400:  # Ensure RTSP streams fit with ultra-minimal format
                             safe_items.append(item_xml)
                             running_size += item_size
@@ -1053,7 +1003,7 @@ class SIPClient:
                 for i, (channel_id, channel_info) in enumerate(prioritized_catalog):
                     if not (channel_info.get('channel_type') == 'rtsp' or 'rtsp_url' in channel_info):
                         item_xml = xml_items[i + 1]  # +1 to skip parent device
-                        item_size = len(item_xml.encode('utf-8'))
+                        item_size = item_sizes[i + 1]
                         if running_size + item_size < 1400:  # Updated for ultra-minimal format
                             safe_items.append(item_xml)
                             running_size += item_size
@@ -1063,6 +1013,7 @@ class SIPClient:
                 
                 xml_content = "\n".join(safe_items)
                 actual_count = len(safe_items)
+                content_size = running_size - 600 + actual_count - 1
                 
                 log.info(f"[SIP] 📦 RTSP-PRIORITY result: {rtsp_included} RTSP streams + {video_included} video files (total: {actual_count} items)")
                 log.info(f"[SIP] 🎯 ALL LIVE STREAMS INCLUDED: {rtsp_included}/{len(rtsp_channels)} RTSP channels")
@@ -1085,8 +1036,8 @@ class SIPClient:
 </DeviceList>
 </Response>"""
 
-            # Validate the response structure
-            message_size = len(xml_response.encode('utf-8'))
+            # Validate the response structure: envelope is ASCII, items were sized by the codec
+            message_size = len(xml_response) - len(xml_content) + content_size
             log.info(f"[SIP] 📊 Final WVP-compatible catalog response (RTSP-prioritized):")
             log.info(f"[SIP]   • Message size: {message_size} bytes")
             log.info(f"[SIP]   • SumNum: {actual_count}")
@@ -1114,7 +1065,7 @@ class SIPClient:
 {minimal_xml}
 </DeviceList>
 </Response>"""
-                log.info(f"[SIP] 📦 Emergency RTSP-only fallback: {len(minimal_items)} items, {len(xml_response.encode('utf-8'))} bytes")
+                log.info(f"[SIP] 📦 Emergency RTSP-only fallback: {len(minimal_items)} items, {len(encode_xml(xml_response))} bytes")
 
             return xml_response
 
@@ -1133,13 +1084,14 @@ class SIPClient:
 </DeviceList>
 </Response>"""
 
-    def handle_device_info_query(self, msg_text):
+    def handle_device_info_query(self, msg_text, message=None):
         """Handle device info query according to GB28181 protocol"""
         log.info("[SIP] Received device info query")
         
         # Extract SN from the query for proper response
-        sn_match = re.search(r'<SN>(\d+)</SN>', msg_text)
-        sn = sn_match.group(1) if sn_match else "0"
+        if message is None:
+            message = parse_manscdp(msg_text)
+        sn = message["sn"] if message and message["sn"] else "0"
         
         # Prepare device info response XML
         device_info_xml = f"""<?xml version="1.0" encoding="GB2312"?>
@@ -1159,23 +1111,30 @@ class SIPClient:
         log.info(f"[SIP] Generated DeviceInfo response for SN: {sn}")
         return device_info_xml
 
-    def handle_device_control(self, msg_text):
+    def handle_device_control(self, msg_text, message=None):
         """Handle device control commands according to GB28181 protocol"""
+        if message is None:
+            message = parse_manscdp(msg_text)
+        commands = message.get("commands", {}) if message else {}
+        
         # Example control commands include PTZ control, recording control, etc.
-        if "PTZ" in msg_text:
+        if "PTZCmd" in commands or (message is None and "PTZ" in msg_text):
             log.info("[SIP] Received PTZ control command (not supported)")
             # Would send appropriate response for unsupported command
-        elif "RECORD" in msg_text:
+        elif "RecordCmd" in commands or (message is None and "RECORD" in msg_text):
             log.info("[SIP] Received recording control command (not supported)")
             # Would send appropriate response for unsupported command
         else:
-            log.info("[SIP] Received unknown control command")
+            log.info(f"[SIP] Received unknown control command: {', '.join(commands) or 'none'}")
             # Would send appropriate response
             
-    def handle_recordinfo_query(self, msg_text):
-        """Handle record info query from platform"""
+    def handle_recordinfo_query(self, msg_text, message=None, platform=None):
+        """Handle record info query from platform (the answer goes to platform, the primary if None)"""
         try:
-            query_info = parse_recordinfo_query(msg_text)
+            if message is not None and message.get("cmd_type") == "RecordInfo":
+                query_info = message
+            else:
+                query_info = parse_recordinfo_query(msg_text)
             log.info(f"[SIP] RecordInfo query received: {query_info}")
             
             if not query_info:
@@ -1210,7 +1169,7 @@ class SIPClient:
             
             # Send response via SIP message
             if response:
-                success = self.send_sip_message(response)
+                success = self.send_sip_message(response, platform)
                 if success:
                     log.info(f"[SIP] Sent record info response with {len(recordings)} recordings")
                 else:
@@ -1244,24 +1203,34 @@ class SIPClient:
                 target_channel = channel_match.group(1).strip()
                 log.info(f"[SIP] INVITE targets channel: {target_channel}")
             
-            # Check if this is a playback request with time parameters
-            is_playback = False
+            # Parse the offer once; everything below works on the parsed object
+            sdp = self.parse_sdp_offer(msg_text)
+            if not sdp:
+                return False
+            
+            # Playback/Download sessions carry the window as SDP t= (Unix seconds), passed on as is
+            is_playback = sdp.is_playback or sdp.is_download
             start_time = None
             end_time = None
+            if is_playback and sdp.start_time and sdp.stop_time:
+                start_time, end_time = sdp.start_time, sdp.stop_time
             
-            # Look for playback time parameters in the SDP
-            playback_match = re.search(r"y=playback:(.+)", msg_text)
-            if playback_match:
-                playback_info = playback_match.group(1).strip()
-                log.info(f"[SIP] Playback request detected: {playback_info}")
+            # Legacy y=playback:starttime=...;endtime=... form
+            if sdp.ssrc and sdp.ssrc.startswith("playback:"):
+                log.info(f"[SIP] Playback request detected: {sdp.ssrc[len('playback:'):]}")
                 is_playback = True
-                
-                # Check for time range parameters
-                time_range_match = re.search(r"starttime=(\d+T\d+Z);endtime=(\d+T\d+Z)", msg_text)
+                time_range_match = re.search(r"starttime=(\d+T\d+Z);endtime=(\d+T\d+Z)", sdp.ssrc)
                 if time_range_match:
-                    start_time = time_range_match.group(1).strip()
-                    end_time = time_range_match.group(2).strip()
-                    log.info(f"[SIP] Playback time range: {start_time} to {end_time}")
+                    start_time, end_time = time_range_match.groups()
+            
+            if is_playback:
+                log.info(f"[SIP] Playback time range: {start_time} to {end_time}")
+            
+            # Download sessions also carry a speed multiplier
+            download_speed = None
+            if sdp.is_download:
+                download_speed = sdp.download_speed
+                log.info(f"[SIP] Download request detected: {start_time} to {end_time} at {download_speed}x")
             
             # Handle the streaming differently based on whether it's a playback request
             if is_playback:
@@ -1274,28 +1243,27 @@ class SIPClient:
                     log.error("[SIP] Recording manager not available for playback")
                     return False
                 
-                # Query for matching recordings
-                matching_recordings = recording_manager.query_recordings(
-                    device_id=target_channel,
-                    start_time=start_time,
-                    end_time=end_time
-                )
+                # Map the requested window onto the recording files that cover it
+                segments = recording_manager.get_playback_segments(start_time, end_time)
                 
-                if not matching_recordings:
+                if not segments:
                     log.warning("[SIP] No matching recordings found for playback request")
                     return False
                 
-                # Use the first matching recording
-                recording = matching_recordings[0]
-                log.info(f"[SIP] Selected recording for playback: {recording['name']}")
+                # The first file covering the window is the recording we report on
+                recording = segments[0]
+                log.info(f"[SIP] Selected recording for playback: {recording['name']} "
+                         f"({len(segments)} file(s) in window)")
                 
                 # Parse SDP to get destination IP/port
                 success = self.parse_sdp_and_stream_recording(
-                    sdp_text=msg_text,
+                    sdp_text=sdp,
                     callid=callid,
                     recording_info=recording,
                     start_time=start_time,
-                    end_time=end_time
+                    end_time=end_time,
+                    segments=segments,
+                    download_speed=download_speed
                 )
                 
                 if success:
@@ -1306,63 +1274,74 @@ class SIPClient:
                 return success
             else:
                 # This is a regular live streaming request
-                return self.parse_sdp_and_stream(msg_text, callid, target_channel)
+                return self.parse_sdp_and_stream(sdp, callid, target_channel)
                 
         except Exception as e:
             log.error(f"[SIP] Error handling INVITE: {e}")
             return False
             
     def parse_sdp_and_stream_recording(self, sdp_text, callid, recording_info, 
-                                     start_time=None, end_time=None):
+                                     start_time=None, end_time=None, segments=None,
+                                     download_speed=None, ssrc=None, admission=None):
         """Parse SDP offer and start streaming a recording to the specified destination
         
-        This method handles playback of recordings with time parameters.
+        This method handles playback of recordings with time parameters. When
+        download_speed is given the session is a Download: the recording is
+        remuxed without re-encoding and sent at that speed multiplier.
+        ssrc overrides the SDP y= value; admission is the encoder_governor decision
+        when the caller already asked for one (a playback is admitted here otherwise).
         """
         try:
-            # Extract SDP content
-            sdp_content = self.extract_sdp_from_message(sdp_text)
-            if not sdp_content:
+            sdp = self.parse_sdp_offer(sdp_text)
+            if not sdp:
                 log.warning("[SIP] ⚠️ No SDP content found in message, cannot start playback")
                 return False
-                
-            log.debug(f"[SIP] Parsed SDP content for playback: {sdp_content}")
-                
-            # Extract destination IP
-            ip_match = re.search(r"c=IN IP4 (\d+\.\d+\.\d+\.\d+)", sdp_content)
-            if not ip_match:
-                log.warning("[SIP] ⚠️ Failed to extract IP address from SDP")
-                ip = self.server
-                log.info(f"[SIP] Using fallback IP: {ip}")
-            else:
-                ip = ip_match.group(1)
-                
-            # Extract port
-            port_match = re.search(r"m=video (\d+)", sdp_content)
-            if not port_match:
-                log.warning("[SIP] ⚠️ Failed to extract port from SDP")
-                port = 9000
-                log.info(f"[SIP] Using fallback port: {port}")
+            
+            ip = sdp.dest_ip
+            port = sdp.dest_port
+            if not ssrc:
+                ssrc = sdp.ssrc if sdp.ssrc and sdp.ssrc.isdigit() else "0000000001"
+            
+            # Transport as offered, so downloads can use TCP framing
+            transport_protocol = "TCP/RTP/AVP" if sdp.is_tcp else "UDP"
+            
+            on_complete = lambda: self._on_playback_complete(callid)
+            
+            if download_speed is not None:
+                mode = "download"
+                success = self.streamer.start_recording_download(
+                    segments=segments or [recording_info],
+                    dest_ip=ip,
+                    dest_port=port,
+                    ssrc=ssrc,
+                    speed=download_speed,
+                    transport_protocol=transport_protocol,
+                    on_complete=on_complete
+                )
             else:
-                port = int(port_match.group(1))
-            
-            # Extract SSRC
-            y_match = re.search(r"y=(\d+)", sdp_content)
-            ssrc = y_match.group(1) if y_match else "0000000001"
-            
-            # Start playback of the recording
-            success = self.streamer.start_recording_playback(
-                recording_info=recording_info,
-                dest_ip=ip,
-                dest_port=port,
-                start_timestamp=start_time,
-                end_timestamp=end_time,
-                ssrc=ssrc
-            )
+                # Playback re-encodes, so it goes through admission control (downloads are remuxed)
+                mode = "playback"
+                admission = admission or self.encoder_governor.admit(callid, {})
+                if admission["status"] != 200:
+                    log.error(f"[SIP] ❌ Playback refused by admission control: {admission['reason']}")
+                    return False
+                success = self.streamer.start_recording_playback(
+                    recording_info=recording_info,
+                    dest_ip=ip,
+                    dest_port=port,
+                    start_timestamp=start_time,
+                    end_timestamp=end_time,
+                    ssrc=ssrc,
+                    encoder_params=admission["params"] or None,
+                    segments=segments,
+                    on_complete=on_complete
+                )
                 
             if success:
                 # Record this stream in active streams
                 self.active_streams[callid] = {
-                    "type": "playback",
+                    "type": mode,
+                    "stream_id": self.streamer.get_playback_stream_id(ip, port, ssrc, mode=mode),
                     "recording": recording_info,
                     "dest_ip": ip,
                     "dest_port": port,
@@ -1378,12 +1357,167 @@ class SIPClient:
                 return True
             else:
                 log.error("[SIP] Failed to start playback stream")
+                self.encoder_governor.release(callid)
                 return False
                 
         except Exception as e:
             log.error(f"[SIP] Error starting playback: {e}")
             return False
 
+    def _on_playback_complete(self, callid):
+        """Send MediaStatus 121 once a playback or download session has sent its whole window"""
+        try:
+            stream = self.active_streams.get(callid)
+            if not stream:
+                return
+                
+            stream["status"] = "completed"
+            log.info(f"[SIP] ✅ {stream.get('type', 'playback').capitalize()} complete for Call-ID {callid}, sending MediaStatus 121")
+            
+            dialog = self.dialogs.get(callid)
+            if not self.send_sip_message(format_media_status_notify(self.device_id), dialog.platform if dialog else None):
+                log.error(f"[SIP] Failed to send MediaStatus 121 for Call-ID {callid}")
+                
+        except Exception as e:
+            log.error(f"[SIP] Error sending playback completion status: {e}")
+    
+    def handle_playback_control(self, msg_text):
+        """Handle a MANSRTSP playback control INFO (PLAY/PAUSE/Scale/Range) for a playback session"""
+        try:
+            callid_match = re.search(r"^(?:Call-ID|i):\s*(.+)$", msg_text, re.MULTILINE | re.IGNORECASE)
+            if not callid_match:
+                log.warning("[SIP] Failed to extract Call-ID from playback control INFO")
+                return False
+            callid = callid_match.group(1).strip()
+            
+            control = parse_mansrtsp(extract_mansrtsp_body(msg_text))
+            if not control:
+                log.warning(f"[SIP] Invalid MANSRTSP body in INFO for Call-ID: {callid}")
+                self._send_in_dialog_response(msg_text, "400", "Bad Request")
+                return False
+            
+            stream = self.active_streams.get(callid)
+            if not stream or stream.get("type") != "playback":
+                log.warning(f"[SIP] Playback control for unknown session Call-ID: {callid}")
+                self._send_in_dialog_response(msg_text, "481", "Call/Transaction Does Not Exist")
+                return False
+            
+            log.info(f"[SIP] ⏯ Playback control {control['method']} for Call-ID {callid} "
+                     f"(scale={control['scale']}, range_start={control['range_start']})")
+            
+            success = self.streamer.control_playback(
+                stream["stream_id"],
+                control["method"],
+                scale=control["scale"],
+                position=control["range_start"]
+            )
+            
+            if success:
+                if control["method"] == "TEARDOWN":
+                    del self.active_streams[callid]
+                    self.port_manager.release(callid)
+                    self.encoder_governor.release(callid)
+                else:
+                    stream["status"] = "paused" if control["method"] == "PAUSE" else "active"
+                    if control["scale"] is not None:
+                        stream["scale"] = control["scale"]
+                self._send_in_dialog_response(msg_text, "200", "OK")
+            else:
+                self._send_in_dialog_response(msg_text, "400", "Bad Request")
+            
+            return success
+            
+        except Exception as e:
+            log.error(f"[SIP] Error handling playback control: {e}")
+            return False
+    
+    def _send_in_dialog_response(self, msg_text, status_code, reason_phrase):
+        """Send a response to an in-dialog request (INFO, BYE, CANCEL) by echoing its headers"""
+        response_lines = [f"SIP/2.0 {status_code} {reason_phrase}"]
+        for header in ("Via", "From", "To", "Call-ID", "CSeq"):
+            for match in re.finditer(rf"^{header}:.*$", msg_text, re.MULTILINE | re.IGNORECASE):
+                response_lines.append(match.group(0).strip())
+        response_lines += [
+            "User-Agent: GB28181-Restreamer/1.0",
+            "Content-Length: 0"
+        ]
+        
+        response_msg = "\r\n".join(response_lines) + "\r\n\r\n"
+        return self._send_sip_response_udp(response_msg, self.platforms.resolve(*response_lines[1:],
+                                                                                source=self._source_address()))
+
+    def handle_call_end(self, msg_text, method="BYE"):
+        """Handle BYE or CANCEL by stopping the call's media right away
+        
+        Args:
+            msg_text (str): The BYE/CANCEL request
+            method (str): "BYE" or "CANCEL"
+        """
+        try:
+            callid_match = re.search(r"^(?:Call-ID|i):\s*(.+)$", msg_text, re.MULTILINE | re.IGNORECASE)
+            if not callid_match:
+                log.warning(f"[SIP] Failed to extract Call-ID from {method}")
+                return False
+            callid = callid_match.group(1).strip()
+            
+            dialog = self.dialogs.get(callid)
+            if callid not in self.active_streams and (dialog is None or dialog.is_final):
+                log.warning(f"[SIP] {method} for unknown call Call-ID: {callid}")
+                self._send_in_dialog_response(msg_text, "481", "Call/Transaction Does Not Exist")
+                return False
+            
+            log.info(f"[SIP] 📴 {method} received for Call-ID {callid}, tearing down media")
+            self._send_in_dialog_response(msg_text, "200", "OK")
+            
+            if method == "CANCEL":
+                # Once 200 OK is out the CANCEL has no effect; the platform follows up with BYE
+                if dialog and dialog.state in (ANSWERED, CONFIRMED):
+                    return True
+                # The INVITE still being prerolled is answered with 487 and torn down by its worker
+                if dialog and dialog.transition(TERMINATING):
+                    self._send_invite_response(callid, "487", "Request Terminated")
+            
+            self._teardown_call(callid, method.lower())
+            return True
+            
+        except Exception as e:
+            log.error(f"[SIP] Error handling {method}: {e}")
+            return False
+    
+    def _teardown_call(self, callid, reason):
+        """Stop a call's pipeline and give back its port lease, TCP-passive port and SSRC
+        
+        Args:
+            callid (str): Call-ID of the call
+            reason (str): What ended the call (bye, cancel, failure, ...), counted in the teardown metrics
+        """
+        started = time.time()
+        stream_info = self.active_streams.pop(callid, None)
+        if stream_info and stream_info.get("shared_from"):
+            # Mirrors another call's stream; that stream keeps running
+            self.streamer.udp_egress.remove_mirror(stream_info["shared_from"], callid)
+        elif stream_info and (reason == "failure" or not self._hand_over_stream(callid, stream_info)):
+            stream_id = stream_info.get("stream_id") or self._media_stream_id(stream_info)
+            try:
+                # Also closes the TCP-passive session and returns its listening port
+                self.streamer.stop_stream(stream_id)
+            except Exception as e:
+                log.error(f"[SIP] Error stopping stream {stream_id} for Call-ID {callid}: {e}")
+        self.port_manager.release(callid)
+        self.encoder_governor.release(callid)
+        
+        dialog = self.dialogs.get(callid)
+        if dialog:
+            if not dialog.is_final and dialog.state != TERMINATING:
+                dialog.transition(TERMINATING)
+            if dialog.state in (TERMINATING, FAILED):
+                dialog.transition(TERMINATED)
+        
+        elapsed = time.time() - started
+        self.dialogs.record_teardown(reason, elapsed)
+        log.info(f"[SIP] 🧹 Call {callid} torn down ({reason}) in {elapsed * 1000:.1f} ms"
+                 f"{', stream ' + stream_info.get('stream_id', '') if stream_info else ', no media'}")
+    
     def handle_keepalive(self, msg_text):
         """Handle keepalive messages according to GB28181 protocol"""
         log.info("[SIP] Received keepalive message")
@@ -1399,6 +1533,9 @@ class SIPClient:
 
         # Start the SIP sender
         self.sip_sender.start()
+        self.catalog_subscriptions.start()
+        self.keepalives.start()
+        threading.Thread(target=self._sip_response_worker, daemon=True, name="sip-responses").start()
 
         # Generate device catalog on startup
         self.generate_device_catalog()
@@ -1436,11 +1573,17 @@ class SIPClient:
         log.info(f"[SIP] Proxy: {proxy_uri}")
         log.info(f"[SIP] Local port: {self.local_port}")
 
+        # pjsua only registers when the in-process client is off
+        registrar_options = "" if self.registration else (
+            f"--registrar sip:{effective_sip_domain}:{sip['port']}\n"
+            "--reg-timeout=120\n"
+            "--rereg-delay=60\n"
+        )
+
         # Updated PJSUA configuration for WVP-pro compatibility
         with open(cfg_path, "w") as f:
             f.write(f"""--id sip:{sip['username']}@{effective_sip_domain}
---registrar sip:{effective_sip_domain}:{sip['port']}
---proxy {proxy_uri}
+{registrar_options}--proxy {proxy_uri}
 --realm *
 --username {sip['username']}
 --password {sip['password']}
@@ -1448,11 +1591,9 @@ class SIPClient:
 --duration 0
 --log-level 5
 --auto-update-nat=1
---reg-timeout=120
---rereg-delay=60
 --max-calls=4
 --thread-cnt=4
---rtp-port=10000
+--rtp-port={self.pjsua_rtp_port}
 --dis-codec=speex/16000
 --dis-codec=speex/8000
 --dis-codec=iLBC
@@ -1493,6 +1634,11 @@ class SIPClient:
 
         thread = threading.Thread(target=listen_loop, daemon=True)
         thread.start()
+        
+        if self.registration:
+            # Register once pjsua is listening on local_port for the platforms' requests
+            for platform in self.platforms:
+                threading.Timer(2.0, platform.registration.register).start()
 
         try:
             while True:
@@ -1522,7 +1668,6 @@ class SIPClient:
         # Create PJSUA configuration
         config = [
             "--id", f"sip:{self.username}@{self.server}",
-            "--registrar", f"sip:{self.server}:{self.port}",
             "--realm", "*",
             "--username", self.username,
             "--password", self.password,
@@ -1538,10 +1683,30 @@ class SIPClient:
             "--thread-cnt", "4",  # Use default thread count
             "--capture-dev", "-1",  # Disable audio capture
             "--playback-dev", "-1",  # Disable audio playback
-            "--reg-timeout", "120",  # FIXED: 2 minute registration timeout to match WVP platform expectations
-            "--rereg-delay", "60",   # FIXED: Re-register every 60 seconds to prevent timeout
         ]
         
+        # pjsua only registers when the in-process client is off
+        if not self.registration:
+            config += [
+                "--registrar", f"sip:{self.server}:{self.port}",
+                "--reg-timeout", "120",  # FIXED: 2 minute registration timeout to match WVP platform expectations
+                "--rereg-delay", "60",   # FIXED: Re-register every 60 seconds to prevent timeout
+            ]
+        
+        # One more pjsua account per additional platform
+        for platform in list(self.platforms)[1:]:
+            sip = platform.sip_config
+            config += [
+                "--next-account",
+                "--id", f"sip:{sip['username']}@{platform.server}",
+                "--realm", "*",
+                "--username", sip['username'],
+                "--password", sip['password'],
+            ]
+            if not self.registration:
+                config += ["--registrar", f"sip:{platform.server}:{platform.port}", "--reg-timeout", "120",
+                           "--rereg-delay", "60"]
+        
         # Set transport based on configuration
         if transport == "udp":
             config.append("--no-tcp")  # Only use UDP
@@ -1616,7 +1781,7 @@ class SIPClient:
                     break
                     
                 line_count += 1
-                print(line.strip())
+                self.capture.record("pjsua", line)
                 
                 # Debug: Log every few lines to ensure we're receiving output
                 if line_count % 50 == 0:
@@ -1643,6 +1808,7 @@ class SIPClient:
                     
         except Exception as e:
             log.error(f"[SIP] Error in output handler: {e}")
+            self.capture.error("pjsua-output")
         finally:
             log.info(f"[SIP] PJSUA output handler finished after processing {line_count} lines")
             self.running = False
@@ -1661,26 +1827,28 @@ class SIPClient:
             self._last_call_id = line.strip()
         elif line.startswith("CSeq:"):
             self._last_cseq = line.strip()
+        
+        source = re.search(r"Request msg .*?\bfrom (?:UDP|TCP|TLS) \[?([0-9A-Fa-f.:]+?)\]?:(\d+)", line)
+        if source:
+            self._last_source = source.group(1)
+            self._last_source_port = int(source.group(2))
             
         # ───────────────────────────────────────────────────────────────────────
         # Immediately respond to any incoming OPTIONS so the server knows we're alive
         if "Request msg OPTIONS" in line or re.match(r'^OPTIONS\s', line):
             log.info("[SIP] Received OPTIONS → replying 200 OK to keep‐alive")
-            # Build a simple 200 OK response
-            ok_resp = (
-                "SIP/2.0 200 OK\r\n"
-                f"{self._last_via}\r\n"
-                f"{self._last_from}\r\n"
-                f"{self._last_to};tag={self._local_tag}\r\n"
-                f"{self._last_call_id}\r\n"
-                f"{self._last_cseq}\r\n"
-                f"Contact: <sip:{self.local_ip}:{self.local_port}>\r\n"
-                "Content-Length: 0\r\n"
-                "\r\n"
-            )
+            # Build a simple 200 OK response for the platform that asked
+            platform = self._requesting_platform()
+            ok_resp = platform.messages.response(200, "OK", [
+                self._last_via,
+                self._last_from,
+                f"{self._last_to};tag={self._local_tag}",
+                self._last_call_id,
+                self._last_cseq
+            ])
             
-            # Send the response using our SIP sender
-            sent = self.send_sip_message(ok_resp)
+            # Send the response on the SIP socket
+            sent = self._send_sip_response_udp(ok_resp, platform)
             if not sent:
                 log.error("[SIP] Failed to send 200 OK for OPTIONS")
             else:
@@ -1691,26 +1859,11 @@ class SIPClient:
         # Registration status handling
         if "Registration successfully sent" in line:
             log.info("[SIP] Registration request sent successfully")
-            self.registration_status = "registering"
+            self._set_registration_status(self.platforms.resolve(line), "registering")
         elif "registration success" in line:
-            log.info("[SIP] ✅ Registration completed successfully")
-            self.registration_status = "registered"
-            self.registration_attempts = 0
-            # ADDED: Start heartbeat thread immediately after successful registration
-            self._start_heartbeat_thread()
-            # ADDED: Send immediate heartbeat to update keepaliveTime in WVP platform
-            log.info("[SIP] 💓 Sending immediate heartbeat after registration to update WVP keepaliveTime")
-            threading.Timer(2.0, self._send_keepalive).start()  # Send after 2 seconds
-            
-            # NEW FIX: Send proactive catalog notification to WVP platform for immediate frontend visibility
-            log.info("[SIP] 🚀 Sending proactive catalog notification for immediate frontend visibility")
-            threading.Timer(3.0, self._send_proactive_catalog_notification).start()  # Send after 3 seconds
+            self._on_registered(self.platforms.resolve(line))
         elif "Registration failed" in line:
-            log.warning("[SIP] ⚠️ Registration failed")
-            self.registration_status = "failed"
-            # ADDED: Stop heartbeat thread if registration fails
-            self._stop_heartbeat_thread()
-            self._handle_registration_failure()
+            self._on_registration_failed(self.platforms.resolve(line))
             
         # Handle Route header warnings that cause offline issues
         if "sip: unkonw message head Route" in line or "sip: unknown message head Route" in line:
@@ -1728,6 +1881,9 @@ class SIPClient:
         if ("pjsua_core.c" in line and "Request msg MESSAGE" in line) or \
            ("pjsua_app.c" in line and ".MESSAGE from" in line):
             log.info(f"[SIP] 🎯 Direct PJSUA XML capture - detected MESSAGE line: {line.strip()}")
+            if "pjsua_core.c" in line:
+                # The headers of this MESSAGE follow; don't key it on the previous request's
+                self._last_via = self._last_from = self._last_call_id = self._last_cseq = ""
             
             # Initialize XML collection for subsequent lines
             self._pjsua_xml_lines = []
@@ -1955,6 +2111,50 @@ class SIPClient:
             self._current_message_buffer = []
             return
             
+        # ACK confirms a dialog we answered with 200 OK
+        if "Request msg ACK" in line or re.match(r'^ACK\s+sip:', line):
+            self._collecting_ack = True
+            return
+            
+        if getattr(self, '_collecting_ack', False):
+            if line.startswith("Call-ID:"):
+                self._handle_ack(line.split(':', 1)[1].strip())
+            if "--end msg--" in line:
+                self._collecting_ack = False
+            return
+            
+        # BYE/CANCEL end a call; its media is stopped as soon as the request is complete
+        call_end = re.search(r'Request msg (BYE|CANCEL)', line) or re.match(r'^(BYE|CANCEL)\s+sip:', line)
+        if call_end:
+            self._collecting_call_end = call_end.group(1)
+            self._call_end_buffer = [line]
+            return
+            
+        if getattr(self, '_collecting_call_end', None):
+            if "--end msg--" in line:
+                self.handle_call_end("".join(self._call_end_buffer), self._collecting_call_end)
+                self._collecting_call_end = None
+                self._call_end_buffer = []
+            else:
+                self._call_end_buffer.append(line)
+            return
+            
+        # MANSRTSP playback control arrives as an in-dialog INFO request
+        if "Request msg INFO" in line or re.match(r'^INFO\s+sip:', line):
+            log.info("[SIP] ⏯ INFO detected, collecting playback control message")
+            self._collecting_info = True
+            self._info_buffer = [line]
+            return
+            
+        if getattr(self, '_collecting_info', False):
+            if "--end msg--" in line:
+                self._collecting_info = False
+                self.handle_playback_control("".join(self._info_buffer))
+                self._info_buffer = []
+            else:
+                self._info_buffer.append(line)
+            return
+            
         # Enhanced INVITE detection for GB28181 streaming - FIXED: Multiple patterns
         if ("Request msg INVITE" in line or 
             "INVITE sip:" in line or 
@@ -2009,7 +2209,7 @@ class SIPClient:
                     call_id = self._extract_call_id_from_invite_message(invite_message)
                     if call_id:
                         log.info(f"[SIP] 🎬 Processing INVITE with Call-ID: {call_id}")
-                        self._handle_invite_request(call_id, invite_message)
+                        self._dispatch_invite(call_id, invite_message)
                     else:
                         log.warning("[SIP] ⚠️ Could not extract Call-ID from INVITE message")
                         log.debug(f"[SIP] 🔍 INVITE content for Call-ID debug: {invite_message[:200]}...")
@@ -2025,7 +2225,7 @@ class SIPClient:
             if stripped_line and (
                 stripped_line.startswith(('Call-ID:', 'CSeq:', 'From:', 'To:', 'Via:', 'Max-Forwards:', 
                                         'User-Agent:', 'Contact:', 'Subject:', 'Content-Type:', 'Content-Length:',
-                                        'v=', 'o=', 's=', 'c=', 't=', 'm=', 'a=')) or
+                                        'v=', 'o=', 's=', 'c=', 't=', 'm=', 'a=', 'y=', 'f=', 'u=')) or
                 stripped_line.startswith('SIP/') or
                 'sip:' in stripped_line.lower()
             ):
@@ -2117,92 +2317,134 @@ class SIPClient:
             log.info(f"[SIP] ✅ Processing XML content ({len(xml_content)} bytes)")
             log.debug(f"[SIP] XML content preview: {xml_content[:200]}...")
             
-            # Parse XML to determine message type
-            import xml.etree.ElementTree as ET
+            # One pass over the body; only RecordInfo and DeviceControl get a full tree
+            message = parse_manscdp(xml_content)
+            if message is None:
+                log.error("[SIP] ❌ Could not parse MANSCDP message")
+                log.debug(f"[SIP] Failed XML content: {xml_content}")
+                return
             
-            # Clean XML content for parsing
-            clean_xml = xml_content.strip()
+            root, cmd_type = message["root"], message["cmd_type"]
+            log.info(f"[SIP] ✅ Successfully parsed {root} message with CmdType: {cmd_type}")
             
-            # Handle cases where XML might not have proper declaration
-            if not clean_xml.startswith('<?xml'):
-                clean_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + clean_xml
+            # A retransmitted MESSAGE was handled already; pjsua answers the retransmission itself
+            key = request_key("\n".join((self._last_call_id, self._last_cseq, self._last_via)))
+            if key and key[2] == "MESSAGE" and not self.transactions.begin(key)[0]:
+                log.info(f"[SIP] 🔁 Ignoring retransmitted {root} {cmd_type} (SN: {message['sn']})")
+                return
             
-            # Parse the XML
-            root = ET.fromstring(clean_xml)
-            cmd_type = None
+            # Query floods are shed per source before they reach the handlers
+            if root == "Query" and not self.rate_limiter.allow(self._request_source()):
+                log.debug(f"[SIP] Shed {cmd_type} query (SN: {message['sn']}) from {self._request_source()}")
+                return
             
-            # Extract command type
-            if root.tag == "Query":
-                cmd_type_elem = root.find("CmdType")
-                if cmd_type_elem is not None:
-                    cmd_type = cmd_type_elem.text
-                    
-            log.info(f"[SIP] ✅ Successfully parsed {root.tag} message with CmdType: {cmd_type}")
-            
-            # Handle different query types
-            if root.tag == "Query":
-                if cmd_type == "Catalog":
-                    log.info("[SIP] 📂 Processing Catalog query - will send device catalog")
-                    response = self.handle_catalog_query(xml_content)
-                    if response:
-                        log.info("[SIP] ✅ Sending catalog response to WVP platform")
-                        success = self.send_sip_message(response)
-                        if success:
-                            log.info("[SIP] ✅ Catalog response sent successfully")
-                        else:
-                            log.error("[SIP] ❌ Failed to send catalog response")
-                    else:
-                        log.error("[SIP] ❌ Failed to generate catalog response")
-                elif cmd_type == "DeviceStatus":
-                    log.info("[SIP] 🔍 Processing DeviceStatus query")
-                    response = self.handle_device_info_query(xml_content)
-                    if response:
-                        self.send_sip_message(response)
-                elif cmd_type == "DeviceInfo":
-                    log.info("[SIP] ℹ️ Processing DeviceInfo query")
-                    response = self.handle_device_info_query(xml_content)
-                    if response:
-                        self.send_sip_message(response)
-                elif cmd_type == "RecordInfo":
-                    log.info("[SIP] 📹 Processing RecordInfo query")
-                    response = self.handle_recordinfo_query(xml_content)
-                    if response:
-                        success = self.send_sip_message(response)
-                        if success:
-                            log.info(f"[SIP] Sent record info response with {len(recordings)} recordings")
-                        else:
-                            log.error("[SIP] Failed to send record info response")
-                    else:
-                        log.error("[SIP] Failed to format record info response")
-                else:
-                    log.warning(f"[SIP] ⚠️ Unhandled query type: {cmd_type}")
-            elif root.tag == "Control":
-                log.info("[SIP] 🎮 Processing Control message")
-                response = self.handle_device_control(xml_content)
-                if response:
-                    self.send_sip_message(response)
+            handler = self._manscdp_handlers.get((root, cmd_type))
+            if handler:
+                handler(xml_content, message)
+            elif root == "Query":
+                log.warning(f"[SIP] ⚠️ Unhandled query type: {cmd_type}")
+            elif root == "Control":
+                self._answer_device_control(xml_content, message)
+            elif root in ("Response", "Notify"):
+                log.debug(f"[SIP] Ignoring {root} {cmd_type} (SN: {message['sn']})")
             else:
-                log.warning(f"[SIP] ❓ Unknown XML message type: {root.tag}")
-                
-        except ET.ParseError as e:
-            log.error(f"[SIP] ❌ XML parsing error: {e}")
-            log.debug(f"[SIP] Failed XML content: {xml_content}")
-            # Try manual processing for Catalog queries
-            if "Catalog" in xml_content:
-                log.info("[SIP] 🔧 Attempting manual catalog processing")
-                try:
-                    response = self.handle_catalog_query(xml_content)
-                    if response:
-                        log.info("[SIP] ✅ Manual catalog processing successful")
-                        self.send_sip_message(response)
-                except Exception as manual_e:
-                    log.error(f"[SIP] ❌ Manual catalog processing failed: {manual_e}")
+                log.warning(f"[SIP] ❓ Unknown XML message type: {root}")
+                
         except Exception as e:
             log.error(f"[SIP] ❌ Error processing XML message: {e}")
             import traceback
             log.debug(f"[SIP] Full traceback: {traceback.format_exc()}")
 
-    def _handle_registration_failure(self):
+    def _requesting_platform(self):
+        """Platform that sent the request being processed, from its From/Via headers and source address"""
+        return self.platforms.resolve(self._last_from, self._last_via, source=self._source_address())
+    
+    def _source_address(self):
+        """(ip, port) pjsua received the request being processed from, or None"""
+        return (self._last_source, self._last_source_port) if self._last_source else None
+
+    def _request_source(self):
+        """Address the request being processed came from: pjsua's RX line, else the top Via host"""
+        if self._last_source:
+            return self._last_source
+        via = re.search(r"SIP/2\.0/\w+\s+\[?([^\]\s;:]+)", self._last_via)
+        return via.group(1) if via else ""
+
+    def _answer_catalog_query(self, xml_content, message):
+        log.info("[SIP] 📂 Processing Catalog query - will send device catalog")
+        platform = self._requesting_platform()
+        response = self.handle_catalog_query(xml_content, message, platform)
+        if response:
+            log.info(f"[SIP] ✅ Sending catalog response to {platform.name} platform")
+            success = self.send_sip_message(response, platform)
+            if success:
+                log.info("[SIP] ✅ Catalog response sent successfully")
+            else:
+                log.error("[SIP] ❌ Failed to send catalog response")
+        else:
+            log.error("[SIP] ❌ Failed to generate catalog response")
+
+    def _answer_device_info_query(self, xml_content, message):
+        log.info(f"[SIP] ℹ️ Processing {message['cmd_type']} query")
+        response = self.handle_device_info_query(xml_content, message)
+        if response:
+            self.send_sip_message(response, self._requesting_platform())
+
+    def _answer_recordinfo_query(self, xml_content, message):
+        log.info("[SIP] 📹 Processing RecordInfo query")
+        self.handle_recordinfo_query(xml_content, message, self._requesting_platform())  # sends its own response
+
+    def _answer_device_control(self, xml_content, message):
+        log.info("[SIP] 🎮 Processing Control message")
+        response = self.handle_device_control(xml_content, message)
+        if response:
+            self.send_sip_message(response, self._requesting_platform())
+
+    def _set_registration_status(self, platform, status):
+        """Set a platform's registration status; self.registration_status follows the primary"""
+        platform.registration_status = status
+        if platform is self.platforms.primary:
+            self.registration_status = status
+
+    def _on_registered(self, platform=None):
+        """Registration succeeded: start keepalives and announce the catalog"""
+        platform = platform or self.platforms.primary
+        log.info(f"[SIP] ✅ Registration with {platform.name} ({platform.key}) completed successfully")
+        self._set_registration_status(platform, "registered")
+        self.registration_attempts = 0
+        self.last_registration_time = time.time()
+        # ADDED: Start heartbeat thread immediately after successful registration
+        # The first keepalive follows after 2 seconds to update keepaliveTime in WVP platform
+        self._start_heartbeat_thread(platform)
+        
+        # NEW FIX: Send proactive catalog notification to WVP platform for immediate frontend visibility
+        log.info("[SIP] 🚀 Sending proactive catalog notification for immediate frontend visibility")
+        threading.Timer(3.0, self._send_proactive_catalog_notification, args=(platform,)).start()  # Send after 3 seconds
+
+    def _on_registration_failed(self, platform=None):
+        platform = platform or self.platforms.primary
+        log.warning(f"[SIP] ⚠️ Registration with {platform.name} ({platform.key}) failed")
+        self._set_registration_status(platform, "failed")
+        # ADDED: Stop heartbeat thread if registration fails
+        self._stop_heartbeat_thread(platform)
+        self._handle_registration_failure(platform)
+
+    def _on_registration_state(self, platform, state):
+        """RegistrationClient callback"""
+        if state == REGISTERED:
+            self._on_registered(platform)
+        elif state == REGISTRATION_FAILED:
+            self._on_registration_failed(platform)
+
+    def _send_registration(self, platform, message):
+        """RegistrationClient transport: send a REGISTER on the shared SIP socket"""
+        try:
+            return self._get_sip_socket().sendto(message, platform.address) == len(message)
+        except OSError as e:
+            log.error(f"[SIP] ❌ Error sending REGISTER: {e}")
+            return False
+
+    def _handle_registration_failure(self, platform=None):
         """Handle registration failures with retry logic"""
         self.registration_attempts += 1
         
@@ -2214,20 +2456,24 @@ class SIPClient:
         log.info(f"[SIP] Will retry registration in {retry_delay} seconds")
         
         # Schedule registration retry
-        threading.Timer(retry_delay, self._retry_registration).start()
+        threading.Timer(retry_delay, self._retry_registration, args=(platform,)).start()
 
-    def _retry_registration(self):
-        """Retry SIP registration"""
-        if self.registration_status == "registered":
+    def _retry_registration(self, platform=None):
+        """Retry SIP registration with a platform (the primary if None)"""
+        platform = platform or self.platforms.primary
+        if platform.registration_status == "registered":
             return
             
-        log.info("[SIP] Retrying registration...")
-        self._start_pjsua_process("/tmp/pjsua.cfg")
+        log.info(f"[SIP] Retrying registration with {platform.name}...")
+        if platform.registration:
+            platform.registration.register()  # one round trip with the cached credentials
+        else:
+            self._start_pjsua_process("/tmp/pjsua.cfg")
 
     def _check_registration(self):
         """Periodically check registration status and renew proactively for WVP platform compatibility"""
-        if self.registration_status != "registered":
-            return
+        if self.registration_status != "registered" or self.registration:
+            return  # the in-process client refreshes at refresh_fraction of the granted Expires
             
         now = time.time()
         
@@ -2251,22 +2497,20 @@ class SIPClient:
             self._retry_registration()
 
     def _check_streams(self):
-        """Check and maintain active streams with enhanced monitoring"""
+        """Keep active calls' leases alive and send periodic media status
+        
+        Liveness is not polled here: the media streamer's buffer-flow watchdog
+        recovers stalled pipelines and reports the ones it gives up on to
+        _on_stream_failed.
+        """
         now = time.time()
+        
+        # Keep the port leases of calls that are still up from expiring
+        for call_id in list(self.active_streams):
+            self.port_manager.renew(call_id)
+        
         for call_id, stream_info in list(self.active_streams.items()):
             try:
-                # Convert Call-ID to MediaStreamer stream ID format
-                media_stream_id = f"{stream_info['dest_ip']}:{stream_info['dest_port']}"
-                if stream_info.get('ssrc'):
-                    media_stream_id = f"{media_stream_id}:{stream_info['ssrc']}"
-                
-                # Check stream health using get_stream_status with correct stream ID
-                status = self.streamer.get_stream_status(media_stream_id)
-                if not status or status.get("status") in ["stopped", "unknown"] or status.get("health") == "critical":
-                    log.warning(f"[SIP] Stream {call_id} (media: {media_stream_id}) appears unhealthy: {status}")
-                    self._handle_stream_failure(call_id, stream_info)
-                    continue
-
                 # Check stream duration
                 duration = now - stream_info["start_time"]
                 if duration > 3600:  # 1 hour
@@ -2279,33 +2523,24 @@ class SIPClient:
             except Exception as e:
                 log.error(f"[SIP] Error checking stream {call_id}: {e}")
 
-    def _handle_stream_failure(self, call_id, stream_info):
-        """Handle stream failures with recovery attempts"""
+    def _media_stream_id(self, stream_info):
+        """MediaStreamer stream ID of an active_streams entry"""
+        if stream_info.get('stream_id'):
+            return stream_info['stream_id']
+        media_stream_id = f"{stream_info['dest_ip']}:{stream_info['dest_port']}"
+        if stream_info.get('ssrc'):
+            media_stream_id = f"{media_stream_id}:{stream_info['ssrc']}"
+        return media_stream_id
+
+    def _on_stream_failed(self, stream_id):
+        """Media streamer callback: a stream stayed stalled after all recovery attempts"""
         try:
-            # Create MediaStreamer stream ID format
-            media_stream_id = f"{stream_info['dest_ip']}:{stream_info['dest_port']}"
-            if stream_info.get('ssrc'):
-                media_stream_id = f"{media_stream_id}:{stream_info['ssrc']}"
-                
-            log.info(f"[SIP] Handling stream failure for Call-ID: {call_id}, Media stream: {media_stream_id}")
-            
-            # Stop the failed stream using correct stream ID
-            self.streamer.stop_stream(media_stream_id)
-            
-            # Attempt to restart the stream
-            success = self.streamer.start_stream(
-                video_path=stream_info.get("video_path"),
-                dest_ip=stream_info["dest_ip"],
-                dest_port=stream_info["dest_port"],
-                ssrc=stream_info["ssrc"]
-            )
-            
-            if success:
-                log.info(f"[SIP] Successfully restarted stream for Call-ID: {call_id}")
-            else:
-                log.error(f"[SIP] Failed to restart stream for Call-ID: {call_id}")
-                del self.active_streams[call_id]
-                
+            for call_id, stream_info in list(self.active_streams.items()):
+                # Calls mirroring the stream end with it
+                if self._media_stream_id(stream_info) == stream_id or stream_info.get('shared_from') == stream_id:
+                    log.error(f"[SIP] Stream {stream_id} for Call-ID {call_id} could not be recovered, ending call")
+                    self._teardown_call(call_id, "failure")
+                    
         except Exception as e:
             log.error(f"[SIP] Error handling stream failure: {e}")
 
@@ -2318,6 +2553,15 @@ class SIPClient:
         # ADDED: Stop heartbeat thread first
         self._stop_heartbeat_thread()
         
+        if self.registration:
+            for platform in self.platforms:
+                platform.registration.unregister()
+                platform.registration.stop()
+        
+        # No new calls are set up once we are stopping
+        self.dialogs.shutdown()
+        self.catalog_subscriptions.stop()
+        
         # Stop the SIP sender
         try:
             if hasattr(self, 'sip_sender'):
@@ -2325,20 +2569,13 @@ class SIPClient:
         except Exception as e:
             log.error(f"[SIP] Error stopping SIP sender: {e}")
         
-        # Stop all active media streams
-        for callid, stream_info in list(self.active_streams.items()):
+        # Stop all active media streams and hand their media ports back
+        for callid in list(self.active_streams):
             try:
-                stream_id = f"{stream_info['dest_ip']}:{stream_info['dest_port']}"
-                if stream_info.get('ssrc'):
-                    stream_id = f"{stream_id}:{stream_info['ssrc']}"
-                
-                log.info(f"[SIP] Stopping stream {stream_id} for Call-ID: {callid}")
-                if self.streamer:
-                    self.streamer.stop_stream(stream_id)
+                log.info(f"[SIP] Stopping stream for Call-ID: {callid}")
+                self._teardown_call(callid, "shutdown")
             except Exception as e:
                 log.error(f"[SIP] Error stopping stream for Call-ID {callid}: {e}")
-        
-        # Clear active streams
         self.active_streams.clear()
             
         # Properly shutdown the media streamer
@@ -2387,6 +2624,7 @@ class SIPClient:
                 os.close(self.pipe_write)
         except Exception as e:
             log.debug(f"[SIP] Error closing pipes: {e}")
+        self._close_sip_socket()
             
         log.info("[SIP] SIP client stopped and cleanup completed")
 
@@ -2403,6 +2641,55 @@ class SIPClient:
                 
         threading.Timer(delay, _update).start()
 
+    def _track_catalog_changes(self):
+        """Record the freshly generated catalog as a new version and notify subscribers of the changes"""
+        self.catalog_subscriptions.publish(self.catalog_tracker.update(self.device_catalog))
+        self.catalog_items.prune(self.device_catalog)
+
+    def _catalog_sources_changed(self):
+        """Whether the stream directory or the RTSP sources changed since the last check"""
+        stream_dir = self.config.get('stream_directory', './recordings')
+        mtimes = []
+        for root, dirs, files in os.walk(stream_dir):
+            try:
+                mtimes.append((root, os.stat(root).st_mtime))
+            except OSError:
+                pass
+        signature = (tuple(mtimes), json.dumps(self.config.get('rtsp_sources', []), sort_keys=True))
+        changed = self._catalog_sources_signature is not None and signature != self._catalog_sources_signature
+        self._catalog_sources_signature = signature
+        return changed
+
+    def _send_subscription_notify(self, subscription, events, state):
+        """SubscriptionManager callback: send one catalog NOTIFY within a subscription dialog
+        
+        events lists the changed channels, is None when the subscriber needs the full catalog,
+        and is empty for the final NOTIFY of an expired subscription.
+        """
+        platform = subscription.get("platform") or self.platforms.primary
+        if events:
+            events = [event for event in events if platform.sees(event["channel_id"])]
+            if not events:
+                return True  # none of the changes are in this platform's catalog view
+        sn = int(time.time() * 1000) % 1000000
+        if events is None:
+            log.info(f"[SIP] 📋 Catalog history too short for {subscription['call_id']}, sending full catalog")
+            notify_xml = self._generate_catalog_response(str(sn), platform).replace("<Response>", "<Notify>").replace("</Response>", "</Notify>")
+        elif events:
+            notify_xml = format_catalog_notify(self.device_id, events, str(sn))
+        else:
+            notify_xml = ""
+        
+        # The dialog headers are compiled once per subscription
+        if "template" not in subscription:
+            subscription["template"] = platform.messages.compile_notify(subscription)
+        sip_message = platform.messages.notify(subscription["template"], subscription['cseq'], state, notify_xml or None)
+        
+        success = self._send_udp_message(sip_message, sn, platform)
+        if success and events:
+            log.info(f"[SIP] 📋 Catalog NOTIFY to {subscription['call_id']}: {len(events)} changed channel(s)")
+        return success
+
     def handle_catalog_subscription(self, msg_text):
         """Handle catalog subscription requests"""
         try:
@@ -2424,6 +2711,21 @@ class SIPClient:
             via_header = via_match.group(1).strip()
             cseq = cseq_match.group(1).strip()
             
+            # Store the subscription dialog, Expires and event ID; later changes go out as NOTIFY deltas
+            expires_match = re.search(r"^Expires:\s*(\d+)", msg_text, re.IGNORECASE | re.MULTILINE)
+            from_header = re.search(r"^From:\s*(.+?)\s*$", msg_text, re.IGNORECASE | re.MULTILINE).group(1)
+            to_header = re.search(r"^To:\s*(.+?)\s*$", msg_text, re.IGNORECASE | re.MULTILINE).group(1)
+            event_header = re.search(r"^Event:\s*(.+?)\s*$", msg_text, re.IGNORECASE | re.MULTILINE).group(1)
+            granted = self.catalog_subscriptions.subscribe(call_id, {
+                "remote_uri": from_uri,
+                "from_header": to_header if ";tag=" in to_header else f"{to_header};tag={self._local_tag}",
+                "to_header": from_header,
+                "event": event_header,
+                "platform": self.platforms.resolve(from_header, via_header, source=self._source_address())
+            }, int(expires_match.group(1)) if expires_match else None)
+            if not granted:
+                return
+            
             # Extract SN and DeviceID from the XML body if present
             xml_match = re.search(r'<\?xml.*<\/Query>', msg_text, re.DOTALL)
             if xml_match:
@@ -2472,8 +2774,8 @@ class SIPClient:
         except Exception as e:
             log.error(f"[SIP] Error handling alarm subscription: {e}")
 
-    def send_sip_message(self, xml_content):
-        """Send SIP message with XML content by writing to file for PJSUA to process"""
+    def send_sip_message(self, xml_content, platform=None):
+        """Send SIP message with XML content to a platform (the primary if None)"""
         try:
             if not xml_content:
                 log.warning("[SIP] No XML content to send")
@@ -2487,69 +2789,21 @@ class SIPClient:
             log.info(f"[SIP] 📤 Sending catalog response (SN: {sn}) via file-based method")
             
             # Use file-based method to avoid any socket conflicts
-            return self._send_via_file_method(xml_content, sn)
+            return self._send_via_file_method(xml_content, sn, platform)
                     
         except Exception as e:
             log.error(f"[SIP] ❌ Error sending SIP message: {e}")
             return False
 
-    def _send_via_file_method(self, xml_content, sn):
+    def _send_via_file_method(self, xml_content, sn, platform=None):
         """Send SIP message via file-based method for reliable delivery"""
         try:
-            import time
-            import random
-            
-            # Generate unique identifiers for the SIP message
-            current_time = int(time.time())
-            call_id = f"catalog-{sn}-{current_time}"
-            branch = f"z9hG4bK-{current_time}"
-            tag = f"tag{current_time}"
-            # FIXED: Handle both string and numeric SNs for CSeq conversion
-            try:
-                if isinstance(sn, str) and sn.isdigit():
-                    cseq = int(sn) % 9999 + 1000
-                elif isinstance(sn, int):
-                    cseq = sn % 9999 + 1000
-                else:
-                    # Fallback for non-numeric SNs
-                    cseq = hash(str(sn)) % 9999 + 1000
-            except (ValueError, TypeError):
-                # Final fallback
-                cseq = int(time.time()) % 9999 + 1000
-            
-            # FIXED: Use the platform's actual SIP address from recent query
-            # Instead of hardcoded platform ID, use the actual server domain
-            from_uri = f"sip:{self.device_id}@{self.local_ip}:{self.local_port}"
-            # CRITICAL FIX: Use the platform's domain/realm, not specific user ID
-            to_uri = f"sip:{self.server}:{self.port}"  # Use platform server directly
-            contact_uri = f"<sip:{self.local_ip}:{self.local_port}>"
-            
-            # Write XML content to a temporary file for debugging
-            temp_file = f"catalog_response_{sn}.xml"
-            try:
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    f.write(xml_content)
-                log.debug(f"[SIP] Saved response XML to {temp_file}")
-            except Exception as file_error:
-                log.warning(f"[SIP] Could not save debug file: {file_error}")
-            
-            # Build complete SIP message
-            sip_message = f"""MESSAGE {to_uri} SIP/2.0
-Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};rport;branch={branch}
-Max-Forwards: 70
-From: <{from_uri}>;tag={tag}
-To: <{to_uri}>
-Call-ID: {call_id}
-CSeq: {cseq} MESSAGE
-Contact: {contact_uri}
-User-Agent: GB28181-Restreamer/1.0
-Content-Type: Application/MANSCDP+xml
-Content-Length: {len(xml_content)}
-
-{xml_content}"""
+            # Build complete SIP message, addressed to the platform's domain rather than a user ID
+            platform = platform or self.platforms.primary
+            sip_message, _ = platform.messages.message(xml_content)
             
             # Send using a clean UDP socket that doesn't conflict with PJSUA
-            success = self._send_udp_message(sip_message, sn)
+            success = self._send_udp_message(sip_message, sn, platform)
             
             if success:
                 log.info(f"[SIP] ✅ File-based catalog response sent successfully (SN: {sn})")
@@ -2562,53 +2816,59 @@ Content-Length: {len(xml_content)}
             log.error(f"[SIP] ❌ Error in file-based sending: {e}")
             return False
             
-    def _send_udp_message(self, sip_message, sn):
-        """Send SIP message via clean UDP socket"""
+    def _send_udp_message(self, sip_message, sn, platform=None):
+        """Send SIP message via clean UDP socket
+        
+        Args:
+            sip_message (bytes or str): Wire bytes from SipMessageBuilder; a str is encoded here
+            sn: SN of the MANSCDP body, for logging
+            platform (Platform): Platform to send to (the primary if None)
+        """
         try:
             import socket
             
-            # Create a new UDP socket for this message only
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            server, port = (platform or self.platforms.primary).address
+            
+            # One socket is shared by every message we originate (keepalives, catalog, NOTIFY)
+            sock = self._get_sip_socket()
             
             try:
-                # Don't bind to any specific port - let OS choose
-                # This avoids any conflicts with PJSUA
-                sock.settimeout(5.0)  # 5 second timeout
-                
                 # ENHANCED DEBUGGING: Analyze message before sending
-                message_bytes = sip_message.encode('utf-8')
+                # Body in its declared encoding (GB2312 for MANSCDP), Content-Length in encoded bytes
+                if isinstance(sip_message, bytes):
+                    message_bytes = sip_message
+                else:
+                    message_bytes = encode_sip_message(sip_message)
                 
                 # FIXED: Determine message type for accurate logging
                 message_type = "Unknown"
                 item_count = 0
                 declared_count = 0
                 
-                if "<CmdType>Keepalive</CmdType>" in sip_message:
+                if b"<CmdType>Keepalive</CmdType>" in message_bytes:
                     message_type = "Keepalive"
                     # Don't count items for keepalive messages
-                elif "<CmdType>Catalog</CmdType>" in sip_message:
+                elif b"<CmdType>Catalog</CmdType>" in message_bytes:
                     message_type = "Catalog"
                     # Count XML elements in catalog messages only
-                    import re
-                    item_count = len(re.findall(r'<Item>', sip_message))
-                    sumnum_match = re.search(r'<SumNum>(\d+)</SumNum>', sip_message)
+                    item_count = message_bytes.count(b"<Item>")
+                    sumnum_match = re.search(rb'<SumNum>(\d+)</SumNum>', message_bytes)
                     declared_count = int(sumnum_match.group(1)) if sumnum_match else 0
-                elif "Notify" in sip_message and "CmdType" in sip_message:
+                elif b"Notify" in message_bytes and b"CmdType" in message_bytes:
                     message_type = "Notify"
                 else:
                     # Generic SIP message analysis
-                    import re
-                    item_count = len(re.findall(r'<Item>', sip_message))
+                    item_count = message_bytes.count(b"<Item>")
                     if item_count > 0:
                         message_type = "Catalog"
-                        sumnum_match = re.search(r'<SumNum>(\d+)</SumNum>', sip_message)
+                        sumnum_match = re.search(rb'<SumNum>(\d+)</SumNum>', message_bytes)
                         declared_count = int(sumnum_match.group(1)) if sumnum_match else 0
                 
                 log.info(f"[SIP] 📊 UDP TRANSMISSION ANALYSIS (SN: {sn}):")
                 log.info(f"[SIP]   • Message type: {message_type}")
                 log.info(f"[SIP]   • Message size: {len(message_bytes)} bytes")
-                log.info(f"[SIP]   • Target: {self.server}:{self.port}")
-                log.info(f"[SIP]   • Encoding: UTF-8")
+                log.info(f"[SIP]   • Target: {server}:{port}")
+                log.info(f"[SIP]   • Body encoding: {declared_encoding(message_bytes) or 'UTF-8'}")
                 
                 if message_type == "Catalog":
                     log.info(f"[SIP]   • XML <Item> count: {item_count}")
@@ -2625,22 +2885,24 @@ Content-Length: {len(xml_content)}
                     log.warning(f"[SIP] ⚠️ Large UDP packet: {len(message_bytes)} bytes (may fragment)")
                     
                 # Log message headers and start of content
-                lines = sip_message.split('\n')
+                lines = message_bytes.split(b'\n')
                 log.debug(f"[SIP] 📨 Message headers:")
                 for i, line in enumerate(lines[:10]):  # First 10 lines
-                    log.debug(f"[SIP]   {i+1}: {line.strip()}")
+                    log.debug(f"[SIP]   {i+1}: {line.strip().decode('utf-8', errors='replace')}")
                 if len(lines) > 10:
                     log.debug(f"[SIP]   ... and {len(lines) - 10} more lines")
                 
                 # Send the message
-                log.info(f"[SIP] 🚀 Sending UDP packet to {self.server}:{self.port}...")
-                bytes_sent = sock.sendto(message_bytes, (self.server, self.port))
+                log.info(f"[SIP] 🚀 Sending UDP packet to {server}:{port}...")
+                self.capture.record("tx", message_bytes, sn=sn, to=f"{server}:{port}")
+                bytes_sent = sock.sendto(message_bytes, (server, port))
                 
                 # Verify transmission
                 if bytes_sent == len(message_bytes):
                     log.info(f"[SIP] ✅ UDP transmission SUCCESSFUL: {bytes_sent}/{len(message_bytes)} bytes")
                 else:
                     log.error(f"[SIP] ❌ UDP transmission INCOMPLETE: {bytes_sent}/{len(message_bytes)} bytes")
+                    self.capture.error(f"send-{sn}")
                     return False
                 
                 # Additional verification for large messages
@@ -2653,7 +2915,7 @@ Content-Length: {len(xml_content)}
                 # FIXED: Accurate success logging based on message type
                 if message_type == "Keepalive":
                     log.info(f"[SIP] 💓 Keepalive message (SN: {sn}) delivered successfully")
-                    log.info(f"[SIP]   • Device should stay online for next 15-30 seconds")
+                    log.info(f"[SIP]   • Device should stay online for the next {self.keepalives.interval}s")
                 elif message_type == "Catalog":
                     log.info(f"[SIP] 📤 Catalog response (SN: {sn}) delivered successfully")
                     log.info(f"[SIP]   • Contains {item_count} devices")
@@ -2672,17 +2934,38 @@ Content-Length: {len(xml_content)}
             except socket.error as send_error:
                 log.error(f"[SIP] ❌ UDP socket error for SN: {sn}: {send_error}")
                 log.error(f"[SIP] This may indicate network connectivity issues")
+                self.capture.error(f"send-{sn}")
+                self._close_sip_socket()  # a fresh socket is created for the next message
                 return False
             except Exception as send_error:
                 log.error(f"[SIP] ❌ UDP send error for SN: {sn}: {send_error}")
                 return False
-            finally:
-                sock.close()
                 
         except Exception as e:
             log.error(f"[SIP] ❌ Error creating UDP socket: {e}")
             return False
 
+    def _get_sip_socket(self):
+        """Shared UDP socket for outgoing SIP messages, created on first use"""
+        import socket
+        with self._sip_socket_lock:
+            if self._sip_socket is None:
+                # Don't bind to any specific port - let OS choose
+                # This avoids any conflicts with PJSUA; responses come back here (rport)
+                self._sip_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self._sip_socket.bind(("", 0))
+                self._sip_socket.settimeout(5.0)  # 5 second timeout
+            return self._sip_socket
+
+    def _close_sip_socket(self):
+        with self._sip_socket_lock:
+            if self._sip_socket is not None:
+                try:
+                    self._sip_socket.close()
+                except OSError:
+                    pass
+                self._sip_socket = None
+
     def _extract_call_id_from_line(self, line):
         """Extract Call-ID from a SIP message line"""
         try:
@@ -2709,48 +2992,6 @@ Content-Length: {len(xml_content)}
             log.error(f"[SIP] Error extracting Call-ID from INVITE message: {e}")
             return None
     
-    def _extract_sdp_from_buffer(self, buffer):
-        """Extract SDP content from message buffer"""
-        try:
-            return self.extract_sdp_from_message(buffer)
-        except Exception as e:
-            log.error(f"[SIP] Error extracting SDP from buffer: {e}")
-            return None
-    
-    def _extract_sdp_from_invite_message(self, invite_message):
-        """Extract SDP content from INVITE message"""
-        try:
-            # SDP content starts after empty line and consists of lines starting with v=, o=, s=, c=, t=, m=, a=
-            lines = invite_message.split('\n')
-            sdp_lines = []
-            in_sdp = False
-            
-            for line in lines:
-                line = line.strip()
-                if line.startswith('v='):
-                    in_sdp = True
-                    sdp_lines.append(line)
-                elif in_sdp and line.startswith(('o=', 's=', 'c=', 't=', 'm=', 'a=')):
-                    sdp_lines.append(line)
-                elif in_sdp and not line:
-                    # Empty line ends SDP
-                    break
-                elif in_sdp and not line.startswith(('v=', 'o=', 's=', 'c=', 't=', 'm=', 'a=')):
-                    # Non-SDP line ends SDP
-                    break
-            
-            if sdp_lines:
-                sdp_content = '\n'.join(sdp_lines)
-                log.debug(f"[SIP] Extracted SDP from INVITE: {sdp_content}")
-                return sdp_content
-            else:
-                log.warning("[SIP] No SDP content found in INVITE message")
-                return None
-                
-        except Exception as e:
-            log.error(f"[SIP] Error extracting SDP from INVITE message: {e}")
-            return None
-    
     def _extract_target_channel_from_invite(self, invite_message):
         """Extract target channel ID from INVITE URI"""
         try:
@@ -2821,7 +3062,11 @@ Content-Length: {len(xml_content)}
             return None
             
     def _capture_invite_headers(self, invite_message):
-        """Capture exact headers from INVITE for SIP compliance - CRITICAL for avoiding 488 errors"""
+        """Capture exact headers from INVITE for SIP compliance - CRITICAL for avoiding 488 errors
+        
+        Returns:
+            dict: via/from/to/cseq header lines, stored on the call's dialog
+        """
         try:
             # Initialize header storage
             self._invite_via = None
@@ -2859,6 +3104,13 @@ Content-Length: {len(xml_content)}
             self._invite_to = "To: <sip:unknown@unknown>"
             self._invite_cseq = "CSeq: 1 INVITE"
             
+        return {
+            'via': self._invite_via,
+            'from': self._invite_from,
+            'to': self._invite_to,
+            'cseq': self._invite_cseq
+        }
+            
     def _build_to_header_with_tag(self):
         """Build To header by echoing INVITE To header and adding our local tag"""
         try:
@@ -2877,12 +3129,18 @@ Content-Length: {len(xml_content)}
             log.error(f"[SIP] Error building To header with tag: {e}")
             return f"To: <sip:{self.server}:{self.port}>;tag={getattr(self, '_local_tag', 'device123')}"
             
-    def _create_gb28181_sdp_response(self, target_channel, call_id, expected_ssrc=None, incoming_sdp=None):
-        """Create GB28181-compliant SDP response for WVP-Pro platform"""
+    def _create_gb28181_sdp_response(self, target_channel, call_id, expected_ssrc=None, incoming_sdp=None, local_port=None):
+        """Create GB28181-compliant SDP response for WVP-Pro platform
+        
+        incoming_sdp is the parsed offer (or its text). local_port is the TCP-passive
+        listening port when the platform offered a=setup:active.
+        """
         try:
+            offer = self.parse_sdp_offer(incoming_sdp) if incoming_sdp else None
+            video = offer.video if offer else None
+            
             # Get network configuration
             local_ip = self.get_local_ip() 
-            rtp_port = self.get_available_port()
             
             # Generate unique session ID
             session_id = str(int(time.time()))
@@ -2891,189 +3149,82 @@ Content-Length: {len(xml_content)}
             if not expected_ssrc:
                 expected_ssrc = target_channel  # Fallback to channel ID
                 
-            # CRITICAL FIX: Detect transport protocol from incoming INVITE
-            # Default to UDP RTP, but match what WVP platform offered
-            transport_protocol = "RTP/AVP"
-            payload_types = ""
-            h264_pt = None   # PT for H264/90000 if offered
-            ps_pt   = None   # PT for PS/90000 if offered
-            
-            if incoming_sdp:
-                # Check if WVP platform offered TCP/RTP/AVP and extract payload types
-                for line in incoming_sdp.split('\n'):
-                    line = line.strip()
-                    if line.startswith('m=video '):
-                        parts = line.split()
-                        if len(parts) >= 3:
-                            if 'TCP/RTP/AVP' in line:
-                                transport_protocol = "TCP/RTP/AVP"
-                                log.info(f"[SIP] 🔧 WVP platform uses TCP/RTP/AVP - matching transport protocol")
-                            elif 'RTP/SAVP' in line:
-                                transport_protocol = "RTP/SAVP"
-                                log.info(f"[SIP] 🔧 WVP platform uses RTP/SAVP - matching transport protocol")
-                            elif 'RTP/AVP' in line:
-                                transport_protocol = "RTP/AVP"
-                                log.info(f"[SIP] 🔧 WVP platform uses RTP/AVP - matching transport protocol")
-                            
-                            # Extract payload types (everything after transport protocol)
-                            if len(parts) > 3:
-                                offered_pts = parts[3:]
-                                payload_types = " ".join(offered_pts)
-                                log.info(f"[SIP] 🔧 WVP offered payload types: {payload_types}")
-                                h264_pt = offered_pts[0]
-                                ps_pt = offered_pts[1] if len(offered_pts) > 1 else None
-                        break
-                        
-                # Look for explicit rtpmap lines to detect which PT corresponds to H264/90000
-                for line in incoming_sdp.split('\n'):
-                    line = line.strip()
-                    if line.lower().startswith('a=rtpmap:'):
-                        if 'h264/90000' in line.lower():
-                            try:
-                                h264_pt = line.split()[0].split(':')[1]
-                                log.info(f"[SIP] 🔧 Detected H264 payload type in offer: {h264_pt}")
-                            except Exception:
-                                pass
-                        if 'ps/90000' in line.lower():
-                            try:
-                                ps_pt = line.split()[0].split(':')[1]
-                                log.info(f"[SIP] 🔧 Detected PS payload type in offer: {ps_pt}")
-                            except Exception:
-                                pass
-
-                # If we still don't have payload_types, default to H264 PT or first offered
-                if not payload_types:
-                    payload_types = h264_pt if h264_pt else '96'
-
-            # If we still have multiple payload types, narrow to the selected H264 PT for the answer
-            if payload_types and ' ' in payload_types:
-                if h264_pt:
-                    payload_types = h264_pt
-                else:
-                    # default to the first one
-                    payload_types = payload_types.split()[0]
-
-            # Decide which PT/codec we will answer with - CRITICAL FIX for WVP compatibility
-            chosen_pt = None
-            chosen_codec = None
+            # CRITICAL FIX: Match the transport protocol the WVP platform offered (default UDP RTP)
+            transport_protocol = video.protocol if video else "RTP/AVP"
+            log.info(f"[SIP] 🔧 WVP platform uses {transport_protocol} - matching transport protocol")
             
-            # CRITICAL: WVP expects PS format with payload type 97
-            # Check if WVP offered PS/90000 and use that payload type
-            if ps_pt:
-                chosen_pt = ps_pt
-                chosen_codec = "PS/90000"
-                log.info(f"[SIP] 🔧 Using PS format with PT {ps_pt} as offered by WVP")
-            elif '97' in payload_types:
-                # WVP typically uses PT 97 for PS format
-                chosen_pt = "97"
-                chosen_codec = "PS/90000"
-                log.info(f"[SIP] 🔧 Using PS format with PT 97 (WVP standard)")
-            elif '96' in payload_types:
-                # WVP sometimes uses PT 96 for PS format
+            # Payload types: explicit rtpmap wins, otherwise WVP's usual order (H264 first, PS second)
+            offered_pts = video.formats if video else []
+            h264_pt = (video.payload_type_for("H264") if video else None) or (offered_pts[0] if offered_pts else None)
+            ps_pt = (video.payload_type_for("PS") if video else None) or (offered_pts[1] if len(offered_pts) > 1 else None)
+            if offered_pts:
+                log.info(f"[SIP] 🔧 WVP offered payload types: {' '.join(offered_pts)}")
+
+            # Decide which PT/codec we will answer with - CRITICAL FIX for WVP compatibility.
+            # WVP expects PS; PT 96/97 on their own mean PS as well.
+            # --- SEGFAULT MITIGATION ---
+            # PS is always answered on PT 96 so that pjmedia only ever sees one PT
+            # mapped to PS/90000. This avoids the known table over-run segfault
+            # when duplicate mappings (e.g. 96 and 97) appear.
+            if ps_pt or not h264_pt or h264_pt in ("96", "97"):
                 chosen_pt = "96"
                 chosen_codec = "PS/90000"
-                log.info(f"[SIP] 🔧 Using PS format with PT 96 (WVP fallback)")
-            elif h264_pt:
+            else:
                 chosen_pt = h264_pt
                 chosen_codec = "H264/90000"
-                log.info(f"[SIP] 🔧 Using H264 format with PT {h264_pt}")
-            else:
-                # Default to PT 97 with PS format for GB28181 compliance
-                chosen_pt = "97"
-                chosen_codec = "PS/90000"
-                log.info(f"[SIP] 🔧 Using default PS format with PT 97")
 
-            payload_types = chosen_pt  # our m-line will contain only this PT
-            # --- SEGFAULT MITIGATION ---
-            # If we are going to use Program-Stream (PS/90000) but the selected
-            # payload-type is not 96, override it to 96 so that pjmedia only ever
-            # sees one PT mapped to PS/90000. This avoids the known table
-            # over-run segfault when duplicate mappings (e.g. 96 and 97) appear.
-            if chosen_codec == "PS/90000" and chosen_pt != "96":
-                log.warning(f"[SIP] Segfault workaround: overriding payload type {chosen_pt} to 96")
-                chosen_pt = "96"
-                payload_types = chosen_pt
-
-            # Create GB28181-compliant SDP content according to GB/T 28181-2016 standard
-            # CRITICAL FIX: Use PS (Program Stream) format which is standard for GB28181
-            
             # CRITICAL FIX: For TCP-PASSIVE mode, WVP expects us to use THEIR destination port
             # NOT port 9 - we need to mirror what they specified
-            if 'TCP' in transport_protocol:
-                # Get the destination port that WVP specified for streaming  
-                dest_ip, dest_port = self._parse_destination_from_sdp(incoming_sdp)
-                media_port = dest_port if dest_port else 9  # Use WVP's port, fallback to 9
-                log.info(f"[SIP] 🚀 TCP mode: Using WVP destination port {media_port}")
+            setup = None
+            connection_ip = local_ip
+            if 'TCP' in transport_protocol and local_port:
+                # TCP-PASSIVE: advertise our pooled listener port, the platform connects to it
+                media_port = local_port
+                setup = "passive"
+                log.info(f"[SIP] 🚀 TCP-PASSIVE mode: Using listening port {media_port}")
+            elif 'TCP' in transport_protocol:
+                # WVP is the passive side, we connect to the destination it specified
+                media_port = offer.dest_port if offer and offer.dest_port else 9
+                setup = "active"
+                if offer and offer.dest_ip:
+                    connection_ip = offer.dest_ip
+                log.info(f"[SIP] 🚀 TCP mode: Using WVP destination {connection_ip}:{media_port}")
             else:
-                media_port = rtp_port
+                media_port = self.get_available_port(call_id)
+                if media_port is None:
+                    return None
                 log.info(f"[SIP] 🚀 UDP mode: Using allocated RTP port {media_port}")
             
-            # CRITICAL FIX: For TCP-PASSIVE, use WVP's destination IP in connection line
-            # This tells WVP where they should expect to receive the stream
-            if 'TCP' in transport_protocol and dest_ip:
-                connection_ip = dest_ip  # Use WVP's destination IP
-                log.info(f"[SIP] 🚀 TCP-PASSIVE: Using WVP destination IP {dest_ip} in SDP")
-            else:
-                connection_ip = local_ip  # Use our local IP for UDP
-                log.info(f"[SIP] 🚀 UDP mode: Using local IP {local_ip} in SDP")
-            
-            sdp_lines = [
-                "v=0",
-                f"o=- {session_id} {session_id} IN IP4 {local_ip}",
-                "s=Play",
-                f"c=IN IP4 {connection_ip}",
-                "t=0 0",
-                # CRITICAL FIX: Match the transport protocol and payload types from WVP platform
-                f"m=video {media_port} {transport_protocol} {payload_types}",
-                # The offer was a=recvonly, so our answer must be a=sendonly
-                "a=sendonly",
-            ]
-            
-            # Add connection setup for TCP transport - CRITICAL FIX for WVP TCP-PASSIVE
-            if 'TCP' in transport_protocol:
-                # For TCP-PASSIVE mode, WVP is the passive side, we are active
-                # This means WVP listens, we connect to them
-                sdp_lines.append("a=setup:active")
-                sdp_lines.append("a=connection:new")
-            
-            # CRITICAL SEGFAULT FIX: Add only ONE rtpmap line for our chosen payload type
-            # Multiple rtpmap lines cause PJSUA to crash with segmentation fault
-            sdp_lines.append(f"a=rtpmap:{chosen_pt} {chosen_codec}")
-            
-            # Add GB28181-specific attributes
-            sdp_lines.extend([
-                f"y={expected_ssrc}",
-                "f=v/2/25"
-            ])
-            
-            sdp_content = "\r\n".join(sdp_lines) + "\r\n"
+            # Mirror the GB28181 session type and window of the offer
+            session_name = "Play"
+            start, stop = 0, 0
+            if offer and offer.session_type in GB28181_SESSION_TYPES:
+                session_name = offer.session_type
+                start, stop = offer.start_time, offer.stop_time
+            
+            # The offer was a=recvonly, so our answer is a=sendonly with exactly
+            # ONE rtpmap line (multiple rtpmap lines crash PJSUA)
+            sdp_content = build_sdp_answer(
+                origin_ip=local_ip,
+                connection_ip=connection_ip,
+                port=media_port,
+                protocol=transport_protocol,
+                payload_type=chosen_pt,
+                encoding=chosen_codec,
+                ssrc=expected_ssrc,
+                session_name=session_name,
+                setup=setup,
+                start=start,
+                stop=stop,
+                session_id=session_id
+            )
             
             log.info(f"[SIP] 📄 Created GB28181-compliant SDP response for channel {target_channel}")
             log.info(f"[SIP] 🎯 Using WVP-expected SSRC: {expected_ssrc}")
             log.info(f"[SIP] 🚀 Using transport protocol: {transport_protocol} (CRITICAL FIX)")
             log.info(f"[SIP] 🎯 Using payload type: {chosen_pt} ({chosen_codec})")
-            log.info(f"[SIP] 🌐 Media endpoint: {local_ip}:{media_port}")
+            log.info(f"[SIP] 🌐 Media endpoint: {connection_ip}:{media_port}")
             log.debug(f"[SIP] SDP content:\n{sdp_content}")
-            
-            # CRITICAL: Validate SDP content before returning
-            if not sdp_content or len(sdp_content) < 50:
-                log.error(f"[SIP] ❌ Generated SDP content is too short or empty")
-                return None
-                
-            # Ensure all required SDP lines are present
-            required_lines = ['v=0', 'm=video', 'a=sendonly', f'a=rtpmap:{chosen_pt}']
-            for required in required_lines:
-                if required not in sdp_content:
-                    log.error(f"[SIP] ❌ Missing required SDP line: {required}")
-                    return None
-            
-            # SEGFAULT PREVENTION: Ensure no duplicate rtpmap lines exist
-            rtpmap_count = sdp_content.count('a=rtpmap:')
-            if rtpmap_count != 1:
-                log.error(f"[SIP] ❌ SEGFAULT RISK: Found {rtpmap_count} rtpmap lines, expected exactly 1")
-                return None
-            
-            log.info(f"[SIP] ✅ SDP validation passed - ready for WVP platform")
             return sdp_content
             
         except Exception as e:
@@ -3094,53 +3245,31 @@ Content-Length: {len(xml_content)}
             log.warning(f"[SIP] Could not detect local IP: {e}, using fallback")
             return "127.0.0.1"
             
-    def get_available_port(self):
-        """Get an available port for RTP"""
-        try:
-            import socket
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.bind(('', 0))
-                port = s.getsockname()[1]
-                log.debug(f"[SIP] Allocated RTP port: {port}")
-                return port
-        except Exception as e:
-            log.warning(f"[SIP] Could not allocate dynamic port: {e}, using default")
-            return 10000
-            
-    def _parse_destination_from_sdp(self, sdp_content):
-        """Parse destination IP and port from WVP's SDP"""
-        try:
-            dest_ip = None
-            dest_port = None
+    def get_available_port(self, call_id=None):
+        """Lease an RTP port for a call from the media port pool
+        
+        Args:
+            call_id (str, optional): Call-ID owning the lease; released when the call ends
             
-            for line in sdp_content.split('\n'):
-                line = line.strip()
-                
-                # Connection line: c=IN IP4 203.142.93.131
-                if line.startswith('c=IN IP4 '):
-                    dest_ip = line.split()[-1]
-                    log.debug(f"[SIP] Found destination IP: {dest_ip}")
-                
-                # Media line: m=video 10000 TCP/RTP/AVP 96 97 98 99
-                if line.startswith('m=video '):
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        dest_port = int(parts[1])
-                        log.debug(f"[SIP] Found destination port: {dest_port}")
-                        
-            if dest_ip and dest_port:
-                log.info(f"[SIP] 📍 Parsed destination: {dest_ip}:{dest_port}")
-                return dest_ip, dest_port
-            else:
-                log.warning(f"[SIP] ⚠️ Could not parse destination from SDP: ip={dest_ip}, port={dest_port}")
-                return None, None
-                
-        except Exception as e:
-            log.error(f"[SIP] Error parsing destination from SDP: {e}")
-            return None, None
+        Returns:
+            int or None: Even RTP port (RTCP on port + 1), None if the pool is exhausted
+        """
+        owner = call_id or f"anonymous-{time.time()}"
+        port = self.port_manager.allocate(owner)
+        if port is None:
+            log.error("[SIP] ❌ Media port pool exhausted, no RTP port for the call")
+            return None
+        log.debug(f"[SIP] Allocated RTP port: {port}")
+        return port
             
-    def _start_streaming_to_platform(self, channel_id, call_id, dest_ip, dest_port, ssrc=None, transport_protocol="TCP/RTP/AVP"):
-        """Start streaming to WVP platform at specified destination with correct SSRC"""
+    def _start_streaming_to_platform(self, channel_id, call_id, dest_ip, dest_port, ssrc=None, transport_protocol="TCP/RTP/AVP",
+                                     local_port=None, encoder_params=None):
+        """Start streaming to WVP platform at specified destination with correct SSRC
+        
+        With local_port set (TCP passive), the platform connects to that port of our
+        pooled media listener instead of us connecting to dest_ip:dest_port.
+        encoder_params are the ones admission control granted (PLATFORM_ENCODER_PARAMS by default).
+        """
         try:
             log.info(f"[SIP] 🎥 Starting stream from channel {channel_id} to WVP at {dest_ip}:{dest_port}")
             
@@ -3195,19 +3324,30 @@ Content-Length: {len(xml_content)}
                 log.error("[SIP] ❌ Media streamer not available")
                 return False
             
-            # Configure encoder parameters for GB28181 compatibility
-            # FIXED: Include use_ps_format inside encoder_params, not as separate parameter
-            encoder_params = {
-                'width': 704,
-                'height': 576,
-                'framerate': 25,
-                'bitrate': 1024,
-                'keyframe_interval': 50,
-                'speed_preset': 'superfast',
-                'use_ps_format': True,  # GB28181 typically uses PS format
-                'codec': 'h264',
-                'payload_type': 96
-            }
+            # Another platform already watches this channel over UDP: mirror that stream instead of a second ingest
+            owner = self._find_shared_stream(channel_id, transport_protocol, local_port)
+            if owner and self.streamer.udp_egress.add_mirror(owner['stream_id'], call_id, dest_ip, dest_port, ssrc):
+                log.info(f"[SIP] 🔀 Sharing the ingest of channel {channel_id} (stream {owner['stream_id']}) "
+                         f"with Call-ID {call_id}")
+                self.encoder_governor.release(call_id)  # no encoder of its own
+                self.active_streams[call_id] = {
+                    'channel_id': channel_id,
+                    'dest_ip': dest_ip,
+                    'dest_port': dest_port,
+                    'ssrc': ssrc,
+                    'start_time': time.time(),
+                    'status': 'active',
+                    'stream_id': stream_id,
+                    'shared_from': owner['stream_id'],
+                    'video_path': video_path,
+                    'local_port': local_port,
+                    'encoder_params': owner.get('encoder_params'),
+                    'transport_protocol': transport_protocol
+                }
+                return True
+            
+            # Encoder parameters for GB28181 compatibility, as granted by admission control
+            encoder_params = dict(encoder_params or PLATFORM_ENCODER_PARAMS)
             
             log.info(f"[SIP] Using media streamer for file: {video_path}")
             
@@ -3219,7 +3359,9 @@ Content-Length: {len(xml_content)}
                     dest_port=dest_port,
                     ssrc=ssrc,
                     encoder_params=encoder_params,
-                    transport_protocol=transport_protocol
+                    transport_protocol=transport_protocol,
+                    tcp_setup="passive" if local_port else "active",
+                    local_port=local_port
                 )
             except Exception as stream_error:
                 log.error(f"[SIP] ❌ Media streamer crashed: {stream_error}")
@@ -3231,10 +3373,8 @@ Content-Length: {len(xml_content)}
                 log.info(f"[SIP] ✅ Stream started successfully to WVP platform")
                 log.info(f"[SIP] Started stream to {dest_ip}:{dest_port} with SSRC {ssrc}")
                 
-                # Store stream info
-                if not hasattr(self, '_active_streams'):
-                    self._active_streams = {}
-                self._active_streams[call_id] = {
+                # Store stream info where _check_streams and BYE handling find it
+                self.active_streams[call_id] = {
                     'channel_id': channel_id,
                     'dest_ip': dest_ip,
                     'dest_port': dest_port,
@@ -3242,7 +3382,10 @@ Content-Length: {len(xml_content)}
                     'start_time': time.time(),
                     'status': 'active',
                     'stream_id': stream_id,
-                    'video_path': video_path
+                    'video_path': video_path,
+                    'local_port': local_port,
+                    'encoder_params': encoder_params,
+                    'transport_protocol': transport_protocol
                 }
                 return True
             else:
@@ -3255,14 +3398,102 @@ Content-Length: {len(xml_content)}
             log.debug(f"[SIP] Platform streaming error: {traceback.format_exc()}")
             return False
     
+    def _find_shared_stream(self, channel_id, transport_protocol, local_port=None):
+        """Active UDP stream of the same channel whose packets a new call can mirror, or None
+        
+        Mirroring needs the batched UDP egress (media.egress.udp) and a numeric SSRC to rewrite.
+        The media worker pool has no egress in this process (each worker sends its own streams),
+        so with media.workers every call gets its own stream.
+        """
+        egress = getattr(self.streamer, "udp_egress", None)
+        if "TCP" in transport_protocol.upper() or local_port or egress is None or not egress.enabled:
+            return None
+        for stream_info in self.active_streams.values():
+            if (stream_info.get('channel_id') == channel_id and not stream_info.get('shared_from') and stream_info.get('status') == 'active'
+                    and "TCP" not in stream_info.get('transport_protocol', '').upper()
+                    and egress.get_stats(stream_info['stream_id']) is not None):
+                return stream_info
+        return None
+
+    def _hand_over_stream(self, callid, stream_info):
+        """Keep a stream running for the calls mirroring it: promote one of them to its main destination
+        
+        Returns:
+            bool: Whether another call took the stream over (so it must not be stopped)
+        """
+        stream_id = stream_info['stream_id']
+        if getattr(self.streamer, "udp_egress", None) is None:
+            return False
+        for heir_call_id, heir in self.active_streams.items():
+            if heir.get('shared_from') != stream_id:
+                continue
+            if not self.streamer.udp_egress.promote_mirror(stream_id, heir_call_id):
+                return False
+            heir.pop('shared_from')
+            heir['stream_id'] = stream_id
+            heir['encoder_params'] = stream_info.get('encoder_params')
+            self.encoder_governor.transfer(callid, heir_call_id)
+            # Pipeline rebuilds re-register the egress stream with this destination
+            info = self.streamer.streams_info.get(stream_id)
+            if info:
+                info.update(dest_ip=heir['dest_ip'], dest_port=heir['dest_port'])
+            log.info(f"[SIP] 🔀 Stream {stream_id} handed over to Call-ID {heir_call_id}")
+            return True
+        return False
+
+    def _dispatch_invite(self, call_id, invite_message):
+        """Answer 100 Trying right away and set the call up on a dialog worker
+        
+        Keeps the pjsua output thread free while the pipeline prerolls, so
+        keepalives, catalog queries and other INVITEs are not held up.
+        """
+        # A retransmission of this INVITE transaction only gets the response already sent
+        key = request_key(invite_message)
+        if key:
+            is_new, transaction = self.transactions.begin(key)
+            if not is_new:
+                dialog = self.dialogs.get(call_id)
+                log.info(f"[SIP] 🔁 INVITE retransmission for {call_id} (CSeq {key[1]})")
+                if transaction["response"]:
+                    self._send_sip_response_udp(transaction["response"], dialog.platform if dialog else None)
+                return
+        
+        dialog, is_new = self.dialogs.create(call_id, self._capture_invite_headers(invite_message))
+        if not is_new:
+            log.info(f"[SIP] 🔁 INVITE retransmission for {call_id} (dialog {dialog.state})")
+            if dialog.last_response:
+                self._send_sip_response_udp(dialog.last_response, dialog.platform)
+            return
+            
+        dialog.transaction = key
+        dialog.platform = self.platforms.resolve(dialog.headers.get('from'), dialog.headers.get('via'),
+                                                 source=self._source_address())
+        dialog.channel_id = self._extract_target_channel_from_invite(invite_message)
+        dialog.transition(TRYING)
+        self._send_invite_response(call_id, "100", "Trying")
+        self.dialogs.submit(self._handle_invite_request, call_id, invite_message)
+        
+    def _handle_ack(self, call_id):
+        """ACK for our 200 OK: the dialog is established and media is flowing"""
+        dialog = self.dialogs.get(call_id)
+        if dialog and dialog.transition(CONFIRMED):
+            log.info(f"[SIP] ✅ Dialog {call_id} confirmed by ACK ({dialog.setup_time:.2f}s INVITE→200)")
+            
     def _handle_invite_request(self, call_id, invite_message):
-        """Handle incoming INVITE request for GB28181 streaming"""
+        """Handle incoming INVITE request for GB28181 streaming
+        
+        Runs on a dialog worker (see _dispatch_invite); the 200 OK is only sent
+        once the media pipeline has prerolled in start_stream.
+        """
         try:
             log.info(f"[SIP] 🎬 Processing INVITE request with Call-ID: {call_id}")
             
             # CRITICAL: Capture exact headers from INVITE for SIP compliance
-            self._capture_invite_headers(invite_message)
-            
+            dialog = self.dialogs.get(call_id)
+            if dialog is None:
+                dialog, _ = self.dialogs.create(call_id, self._capture_invite_headers(invite_message))
+                dialog.transition(TRYING)
+                
             # Extract target channel from INVITE URI - this is what WVP wants us to stream
             target_channel = self._extract_target_channel_from_invite(invite_message)
             if not target_channel:
@@ -3278,23 +3509,20 @@ Content-Length: {len(xml_content)}
                 self._send_invite_response(call_id, "404", "Not Found")
                 return
                 
-            # Extract incoming SDP from WVP - this tells us WHERE to send the stream
-            incoming_sdp = self._extract_sdp_from_invite_message(invite_message)
+            # Parse the SDP offer from WVP once - this tells us WHERE to send the stream
+            incoming_sdp = parse_sdp(invite_message)
             if not incoming_sdp:
                 log.warning("[SIP] ⚠️ No SDP in INVITE - cannot determine streaming destination")
                 self._send_invite_response(call_id, "400", "Bad Request")
                 return
                 
-            # CRITICAL FIX: Extract SSRC from WVP's INVITE subject
-            expected_ssrc = self._extract_ssrc_from_invite(invite_message)
+            # CRITICAL FIX: Extract SSRC from WVP's INVITE subject, then the SDP y= line
+            expected_ssrc = self._extract_ssrc_from_invite(invite_message) or incoming_sdp.ssrc
             if not expected_ssrc:
-                log.warning("[SIP] ⚠️ No SSRC found in INVITE Subject line")
+                log.warning("[SIP] ⚠️ No SSRC found in INVITE Subject line or SDP")
                 expected_ssrc = "0000009593"  # Default fallback
                 
-            log.info(f"[SIP] 📄 WVP provided destination SDP: {incoming_sdp[:200]}...")
-            
-            # Parse WVP's SDP to get destination IP and port
-            dest_ip, dest_port = self._parse_destination_from_sdp(incoming_sdp)
+            dest_ip, dest_port = incoming_sdp.dest_ip, incoming_sdp.dest_port
             if not dest_ip or not dest_port:
                 log.error("[SIP] ❌ Could not parse destination from WVP SDP")
                 self._send_invite_response(call_id, "488", "Not Acceptable Here")
@@ -3302,35 +3530,62 @@ Content-Length: {len(xml_content)}
                 
             log.info(f"[SIP] 🎯 WVP expects stream at: {dest_ip}:{dest_port}")
             
-            # CRITICAL FIX: Detect transport protocol from WVP's SDP for consistent usage
-            transport_protocol = "TCP/RTP/AVP"  # Default for WVP
-            for line in incoming_sdp.split('\n'):
-                line = line.strip()
-                if line.startswith('m=video ') and 'TCP/RTP/AVP' in line:
-                    transport_protocol = "TCP/RTP/AVP"
-                    break
-                elif line.startswith('m=video ') and 'RTP/SAVP' in line:
-                    transport_protocol = "RTP/SAVP"
-                    break
-                elif line.startswith('m=video ') and 'RTP/AVP' in line:
-                    transport_protocol = "RTP/AVP"
-                    break
+            # CRITICAL FIX: Use the transport protocol from WVP's SDP consistently
+            transport_protocol = incoming_sdp.transport or "TCP/RTP/AVP"  # Default for WVP
+            
+            # Playback/Download: send the recordings covering the t= window instead of the live channel
+            if incoming_sdp.is_playback or incoming_sdp.is_download:
+                self._start_recording_session(call_id, dialog, target_channel, incoming_sdp, expected_ssrc)
+                return
+            
+            # Admission control: step the encoder down under load, answer 486/503 once saturated;
+            # a call that mirrors another platform's stream of this channel encodes nothing
+            admission = {"status": 200, "params": None}
+            if not self._find_shared_stream(target_channel, transport_protocol):
+                admission = self.encoder_governor.admit(call_id, PLATFORM_ENCODER_PARAMS)
+            if admission["status"] != 200:
+                self._send_invite_response(call_id, str(admission["status"]), admission["reason"])
+                return
+            
+            # UDP answers advertise a leased RTP port; out of ports is overload, like admission control
+            if not incoming_sdp.is_tcp and self.get_available_port(call_id) is None:
+                self._send_invite_response(call_id, "503", "Service Unavailable")
+                return
+            
+            # a=setup:active in the offer means the platform connects to us (TCP passive)
+            local_port = None
+            if incoming_sdp.is_tcp and incoming_sdp.setup == "active":
+                local_port = self.streamer.tcp_listener.reserve_port()
+                if not local_port:
+                    log.error("[SIP] ❌ No TCP-passive media port available")
+                    self._send_invite_response(call_id, "503", "Service Unavailable")
+                    return
+                log.info(f"[SIP] 🚀 TCP-PASSIVE: platform will connect to local port {local_port}")
             
             # Start streaming TO the WVP platform using the exact SSRC WVP expects
-            success = self._start_streaming_to_platform(target_channel, call_id, dest_ip, dest_port, expected_ssrc, transport_protocol)
-            if success:
+            dialog.transition(PREROLLING)
+            success = self._start_streaming_to_platform(target_channel, call_id, dest_ip, dest_port, expected_ssrc,
+                                                        transport_protocol, local_port, admission["params"])
+            if success and dialog.state in (TERMINATING, TERMINATED):
+                log.info(f"[SIP] 📴 INVITE {call_id} was cancelled during preroll, stopping its stream")
+                self._teardown_call(call_id, "cancel")
+            elif success:
                 log.info(f"[SIP] ✅ Successfully started stream for channel {target_channel}")
                 
                 # Create GB28181-compliant SDP response with WVP's expected SSRC and matching transport protocol
-                response_sdp = self._create_gb28181_sdp_response(target_channel, call_id, expected_ssrc, incoming_sdp)
+                response_sdp = self._create_gb28181_sdp_response(target_channel, call_id, expected_ssrc, incoming_sdp,
+                                                                 local_port=local_port)
                 if response_sdp:
                     log.info(f"[SIP] 📄 Generated SDP response for 200 OK")
                     self._send_invite_response(call_id, "200", "OK", response_sdp)
                 else:
                     log.error(f"[SIP] ❌ Failed to generate SDP response")
                     self._send_invite_response(call_id, "500", "Internal Server Error")
+                    self._teardown_call(call_id, "failure")
             else:
                 log.error(f"[SIP] ❌ Failed to start media stream for channel {target_channel}")
+                if local_port:
+                    self.streamer.tcp_listener.release_port(local_port)
                 self._send_invite_response(call_id, "488", "Not Acceptable Here")
                 
         except Exception as e:
@@ -3339,6 +3594,66 @@ Content-Length: {len(xml_content)}
             log.debug(f"[SIP] Full traceback: {traceback.format_exc()}")
             self._send_invite_response(call_id, "500", "Internal Server Error")
 
+    def _start_recording_session(self, call_id, dialog, target_channel, incoming_sdp, expected_ssrc):
+        """Set up a Playback or Download INVITE from the recordings covering its t= window
+        
+        Same flow as a live call: admission control (playbacks only, downloads are
+        remuxed), preroll, then a 200 OK whose SDP mirrors the offer's s= and t=.
+        """
+        mode = "download" if incoming_sdp.is_download else "playback"
+        start_time = incoming_sdp.start_time or None
+        end_time = incoming_sdp.stop_time or None
+        log.info(f"[SIP] 📼 {mode.capitalize()} request for channel {target_channel}: {start_time} to {end_time}"
+                 + (f" at {incoming_sdp.download_speed}x" if mode == "download" else ""))
+        
+        if incoming_sdp.is_tcp and incoming_sdp.setup == "active":
+            log.warning(f"[SIP] ⚠️ TCP-passive {mode} is not supported")
+            self._send_invite_response(call_id, "488", "Not Acceptable Here")
+            return
+        
+        recording_manager = get_recording_manager(self.config)
+        segments = recording_manager.get_playback_segments(start_time, end_time) if recording_manager else []
+        if not segments:
+            log.warning(f"[SIP] ⚠️ No recordings found for {mode} window {start_time} - {end_time}")
+            self._send_invite_response(call_id, "404", "Not Found")
+            return
+        
+        admission = None
+        if mode == "playback":
+            admission = self.encoder_governor.admit(call_id, {})
+            if admission["status"] != 200:
+                self._send_invite_response(call_id, str(admission["status"]), admission["reason"])
+                return
+        
+        if not incoming_sdp.is_tcp and self.get_available_port(call_id) is None:
+            self._send_invite_response(call_id, "503", "Service Unavailable")
+            return
+        
+        dialog.transition(PREROLLING)
+        success = self.parse_sdp_and_stream_recording(
+            incoming_sdp, call_id, segments[0],
+            start_time=start_time,
+            end_time=end_time,
+            segments=segments,
+            download_speed=incoming_sdp.download_speed if mode == "download" else None,
+            ssrc=expected_ssrc,
+            admission=admission
+        )
+        if success and dialog.state in (TERMINATING, TERMINATED):
+            log.info(f"[SIP] 📴 INVITE {call_id} was cancelled during preroll, stopping its {mode}")
+            self._teardown_call(call_id, "cancel")
+        elif success:
+            response_sdp = self._create_gb28181_sdp_response(target_channel, call_id, expected_ssrc, incoming_sdp)
+            if response_sdp:
+                self._send_invite_response(call_id, "200", "OK", response_sdp)
+            else:
+                log.error(f"[SIP] ❌ Failed to generate SDP response")
+                self._send_invite_response(call_id, "500", "Internal Server Error")
+                self._teardown_call(call_id, "failure")
+        else:
+            log.error(f"[SIP] ❌ Failed to start {mode} for channel {target_channel}")
+            self._send_invite_response(call_id, "488", "Not Acceptable Here")
+
     def _is_valid_channel(self, channel_id):
         """Check if the requested channel exists in our device catalog"""
         try:
@@ -3381,45 +3696,37 @@ Content-Length: {len(xml_content)}
                 if not sdp_content.endswith('\r\n'):
                     sdp_content = sdp_content.rstrip() + '\r\n'
             
-            # Generate unique local tag for this dialog
-            if not hasattr(self, '_local_tag'):
-                self._local_tag = f"device{int(time.time())}"
+            # Echo the headers of this call's own INVITE - other INVITEs may be in flight
+            dialog = self.dialogs.get(call_id)
+            platform = dialog.platform if dialog else None
+            if dialog:
+                headers, local_tag = dialog.headers, dialog.local_tag
+            else:
+                if not hasattr(self, '_local_tag'):
+                    self._local_tag = f"device{int(time.time())}"
+                headers = {name: getattr(self, f'_invite_{name}', None) for name in ('via', 'from', 'to', 'cseq')}
+                local_tag = self._local_tag
             
             # MEMORY SAFETY: Validate all header components exist
-            required_headers = ['_invite_via', '_invite_to', '_invite_from', '_invite_cseq']
-            for header in required_headers:
-                if not hasattr(self, header) or not getattr(self, header):
+            for header in ('via', 'to', 'from', 'cseq'):
+                if not headers.get(header):
                     log.error(f"[SIP] ❌ Missing required header: {header}, cannot send response")
                     return False
             
             # Build response headers by echoing INVITE headers - CRITICAL for SIP compliance
             response_lines = [
-                f"SIP/2.0 {status_code} {reason_phrase}",       # 1. Status line
-                self._invite_via,                               # 2. Via
-                f"{self._invite_to};tag={self._local_tag}",     # 3. To with our tag
-                self._invite_from,                              # 4. From
-                f"Call-ID: {call_id}",                          # 5. Call-ID
-                self._invite_cseq,                              # 6. CSeq
-                f"Contact: <sip:{self.device_id}@{self.local_ip}:{self.local_port}>",
-                "User-Agent: GB28181-Restreamer/1.0"             # 7. Other headers
+                headers['via'],                                 # 1. Via
+                f"{headers['to']};tag={local_tag}",             # 2. To with our tag
+                headers['from'],                                # 3. From
+                f"Call-ID: {call_id}",                          # 4. Call-ID
+                headers['cseq']                                 # 5. CSeq (Contact/User-Agent are precompiled)
             ]
-            
-            if status_code == "200" and sdp_content:
-                response_lines += [
-                    "Content-Type: application/sdp",
-                    f"Content-Length: {len(sdp_content)}",
-                    "",                  # 8. Single blank line
-                    sdp_content.rstrip() # 9. SDP body
-                ]
-            else:
-                response_lines += [
-                    "Content-Length: 0",
-                    ""  # blank line
-                ]
+            body = sdp_content.rstrip() + "\r\n" if status_code == "200" and sdp_content else None
             
             # MEMORY SAFETY: Build response with proper encoding
             try:
-                response_msg = "\r\n".join(response_lines).strip("\r\n") + "\r\n\r\n"
+                response_msg = (platform or self.platforms.primary).messages.response(
+                    status_code, reason_phrase, response_lines, body, "application/sdp")
                 
                 # Validate response message size (prevent buffer overflows)
                 if len(response_msg) > 65536:  # 64KB limit
@@ -3431,15 +3738,29 @@ Content-Length: {len(xml_content)}
                 return False
             
             log.info(f"[SIP] 📋 Response headers echoed from INVITE:")
-            log.info(f"[SIP]   Via: {getattr(self, '_invite_via', 'MISSING')}")
-            log.info(f"[SIP]   CSeq: {getattr(self, '_invite_cseq', 'MISSING')}")
+            log.info(f"[SIP]   Via: {headers['via']}")
+            log.info(f"[SIP]   CSeq: {headers['cseq']}")
             
             # Send response via UDP socket directly with error handling
-            success = self._send_sip_response_udp(response_msg)
+            success = self._send_sip_response_udp(response_msg, platform)
             if success:
                 log.info(f"[SIP] ✅ INVITE response {status_code} sent successfully")
             else:
                 log.error(f"[SIP] ❌ Failed to send INVITE response {status_code}")
+                
+            # Final responses move the dialog on and are replayed to INVITE retransmissions
+            if dialog:
+                dialog.last_response = response_msg
+                if dialog.transaction:
+                    self.transactions.respond(dialog.transaction, response_msg)
+                if status_code == "200":
+                    dialog.transition(ANSWERED)
+                elif not status_code.startswith("1") and dialog.state != TERMINATING:
+                    # A refused INVITE gives back its port lease and encoder budget here;
+                    # one with a running stream gets them back from _teardown_call
+                    if dialog.transition(FAILED) and call_id not in self.active_streams:
+                        self.port_manager.release(call_id)
+                        self.encoder_governor.release(call_id)
             
             # Store response info for debugging
             if not hasattr(self, '_invite_responses'):
@@ -3450,12 +3771,7 @@ Content-Length: {len(xml_content)}
                 'sdp_content': sdp_content,
                 'timestamp': time.time(),
                 'sent': success,
-                'headers_echoed': {
-                    'via': getattr(self, '_invite_via', None),
-                    'from': getattr(self, '_invite_from', None),
-                    'to': getattr(self, '_invite_to', None),
-                    'cseq': getattr(self, '_invite_cseq', None)
-                }
+                'headers_echoed': dict(headers)
             }
             
             return success
@@ -3466,12 +3782,11 @@ Content-Length: {len(xml_content)}
             log.debug(f"[SIP] Response error traceback: {traceback.format_exc()}")
             return False
 
-    def _send_sip_response_udp(self, response_message):
-        """Send SIP response via UDP socket with enhanced error handling"""
-        sock = None
+    def _send_sip_response_udp(self, response_message, platform=None):
+        """Send SIP response via UDP socket to a platform (the primary if None)"""
         try:
             # MEMORY SAFETY: Validate input parameters
-            if not response_message or not isinstance(response_message, str):
+            if not response_message or not isinstance(response_message, (str, bytes)):
                 log.error(f"[SIP] ❌ Invalid response message for UDP sending")
                 return False
             
@@ -3479,18 +3794,20 @@ Content-Length: {len(xml_content)}
                 log.error(f"[SIP] ❌ Response message too large for UDP: {len(response_message)} bytes")
                 return False
             
-            # Use the same UDP sending method as keepalive
+            # Use the same UDP socket as keepalive
             import socket
             
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.settimeout(5)
+            sock = self._get_sip_socket()
             
-            # Send to server IP and port
-            server_addr = (self.server, self.port)
+            # Send to the platform's IP and port
+            server_addr = (platform or self.platforms.primary).address
             
             # MEMORY SAFETY: Encode with error handling
             try:
-                response_bytes = response_message.encode('utf-8')
+                if isinstance(response_message, bytes):
+                    response_bytes = response_message
+                else:
+                    response_bytes = encode_sip_message(response_message)
             except UnicodeEncodeError as encode_error:
                 log.error(f"[SIP] ❌ Unicode encoding error: {encode_error}")
                 return False
@@ -3518,13 +3835,6 @@ Content-Length: {len(xml_content)}
         except Exception as e:
             log.error(f"[SIP] ❌ Error sending SIP response via UDP: {e}")
             return False
-        finally:
-            # MEMORY SAFETY: Always close socket
-            if sock:
-                try:
-                    sock.close()
-                except:
-                    pass
 
     def _handle_invite_with_sdp(self, call_id, sdp_content):
         """Handle INVITE with SDP content (legacy method)"""
@@ -3539,53 +3849,100 @@ Content-Length: {len(xml_content)}
             log.error(f"[SIP] Error handling INVITE with SDP: {e}")
             return False
 
-    def _start_heartbeat_thread(self):
-        """Start dedicated heartbeat thread for WVP platform compatibility"""
+    def _start_heartbeat_thread(self, platform=None):
+        """Schedule keepalives for a platform's registration and start the catalog worker"""
+        platform = platform or self.platforms.primary
+        if self.keepalives.get_stats(platform.key) is None:
+            log.info(f"[SIP] 💓 Scheduling keepalives every {self.keepalives.interval}s for {platform.name} ({platform.key})")
+            self.keepalives.add(platform.key, partial(self._send_keepalive, platform), self._on_keepalive_timeout,
+                                delay=2.0)
+        
         if self._heartbeat_running:
             return
-            
-        log.info("[SIP] 💓 Starting dedicated heartbeat thread for WVP platform")
         self._heartbeat_running = True
-        self._heartbeat_thread = threading.Thread(target=self._heartbeat_worker, daemon=True)
-        self._heartbeat_thread.start()
         
         # ADDED: Start periodic catalog notification thread
         log.info("[SIP] 📋 Starting periodic catalog notification thread")
         self._catalog_notification_thread = threading.Thread(target=self._catalog_notification_worker, daemon=True)
         self._catalog_notification_thread.start()
         
-    def _stop_heartbeat_thread(self):
-        """Stop the heartbeat thread"""
-        log.info("[SIP] 🛑 Stopping heartbeat thread")
-        self._heartbeat_running = False
-        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
-            self._heartbeat_thread.join(timeout=2)
+    def _stop_heartbeat_thread(self, platform=None):
+        """Stop a platform's keepalives, or every platform's and the catalog worker if None"""
+        for stopped in [platform] if platform else self.platforms:
+            if self.keepalives.remove(stopped.key):
+                log.info(f"[SIP] 🛑 Stopping keepalives for {stopped.name} ({stopped.key})")
+        if platform is None or all(self.keepalives.get_stats(p.key) is None for p in self.platforms):
+            self._heartbeat_running = False
+    
+    def _on_keepalive_timeout(self, key):
+        """KeepaliveScheduler callback: the platform stopped answering keepalives, so register again"""
+        platform = self.platforms.get(key) or self.platforms.primary
+        log.error(f"[SIP] 🚨 Platform {key} stopped answering keepalives - re-registering")
+        self._stop_heartbeat_thread(platform)
+        self._set_registration_status(platform, "failed")
+        threading.Timer(0, self._retry_registration, args=(platform,)).start()
+    
+    def _sip_response_worker(self):
+        """Read the platform's responses to the SIP messages we originate on the shared socket"""
+        import socket
+        
+        while self.running:
+            try:
+                data, _ = self._get_sip_socket().recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                time.sleep(1)  # socket was closed and will be recreated
+                continue
+            
+            self.capture.record("rx", data)
+            response = decode_sip_message(data)
+            if self.registration and any(p.registration.handle_response(response) for p in self.platforms):
+                continue
+            status = re.match(r"SIP/2\.0\s+(\d{3})", response)
+            call_id = re.search(r"^(?:Call-ID|i):\s*(.+?)\s*$", response, re.IGNORECASE | re.MULTILINE)
+            if not status or not call_id:
+                continue
+            if status.group(1).startswith("2") and self.keepalives.acknowledge(call_id.group(1)):
+                log.debug(f"[SIP] 💓 Keepalive acknowledged ({status.group(1)})")
+            else:
+                log.debug(f"[SIP] Response {status.group(1)} for {call_id.group(1)}")
             
     def _catalog_notification_worker(self):
-        """Periodic catalog notification worker - sends catalog every 60 seconds to ensure frontend visibility"""
-        log.info("[SIP] 📋 Catalog notification worker started - will send catalog every 60s")
+        """Catalog change worker - rescans sources when they change and only resends the full catalog slowly
         
-        # Wait 10 seconds after start before first notification
-        time.sleep(10)
+        Changed channels reach subscribed platforms as NOTIFY deltas (see _track_catalog_changes);
+        the full catalog is resent every catalog.full_refresh_interval seconds (0 disables it).
+        """
+        log.info(f"[SIP] 📋 Catalog change worker started - checking sources every {self.catalog_check_interval}s, "
+                 f"full refresh every {self.catalog_full_refresh_interval or 'never'}s")
+        
+        # Registration already sends the full catalog once
+        last_full_refresh = time.time()
+        self._catalog_sources_changed()
         
         while self._heartbeat_running and self.running:
             try:
-                # Only send catalog if registered
-                if self.registration_status == "registered":
-                    log.info("[SIP] 📋 Sending periodic catalog notification to maintain frontend visibility")
-                    success = self._send_proactive_catalog_notification()
-                    if success:
-                        log.info("[SIP] ✅ Periodic catalog notification sent successfully")
-                    else:
-                        log.warning("[SIP] ⚠️ Periodic catalog notification failed")
-                else:
-                    log.debug("[SIP] 📋 Skipping catalog notification - not registered")
-                
-                # Wait 60 seconds before next notification
-                for _ in range(60):  # Split into 1-second intervals for responsive shutdown
+                # Wait before the next check, in 1-second steps for responsive shutdown
+                for _ in range(self.catalog_check_interval):
                     if not self._heartbeat_running or not self.running:
                         break
                     time.sleep(1)
+                if not self._heartbeat_running or not self.running:
+                    break
+                
+                if self._catalog_sources_changed():
+                    log.info("[SIP] 📋 Catalog sources changed - regenerating catalog")
+                    self.generate_device_catalog()  # changed channels are sent as NOTIFY deltas
+                
+                registered = [p for p in self.platforms if p.registration_status == "registered"]
+                if (self.catalog_full_refresh_interval and registered
+                        and time.time() - last_full_refresh >= self.catalog_full_refresh_interval):
+                    log.info(f"[SIP] 📋 Sending periodic full catalog refresh to {len(registered)} platform(s)")
+                    if all([self._send_proactive_catalog_notification(p) for p in registered]):
+                        last_full_refresh = time.time()
+                    else:
+                        log.warning("[SIP] ⚠️ Periodic catalog refresh failed")
                     
             except Exception as e:
                 log.error(f"[SIP] ❌ Error in catalog notification worker: {e}")
@@ -3593,33 +3950,12 @@ Content-Length: {len(xml_content)}
                 
         log.info("[SIP] 📋 Catalog notification worker stopped")
 
-    def _heartbeat_worker(self):
-        """Dedicated heartbeat worker thread - sends keepalive every 15 seconds for WVP platform compatibility"""
-        log.info("[SIP] 💓 Heartbeat worker started - will send keepalive every 15s to prevent WVP timeout")
+    def _send_keepalive(self, platform=None):
+        """Send keepalive message to maintain a platform's registration with enhanced WVP compatibility
         
-        while self._heartbeat_running and self.running:
-            try:
-                # Only send heartbeat if registered
-                if self.registration_status == "registered":
-                    log.info("[SIP] 💓 Sending scheduled heartbeat to WVP platform")
-                    self._send_keepalive()
-                else:
-                    log.debug("[SIP] 💓 Skipping heartbeat - not registered")
-                
-                # FIXED: Wait 15 seconds before next heartbeat (increased frequency for WVP platform)
-                for _ in range(15):  # Split into 1-second intervals for responsive shutdown
-                    if not self._heartbeat_running or not self.running:
-                        break
-                    time.sleep(1)
-                    
-            except Exception as e:
-                log.error(f"[SIP] ❌ Error in heartbeat worker: {e}")
-                time.sleep(5)  # Brief pause before retry
-                
-        log.info("[SIP] 💓 Heartbeat worker stopped")
-
-    def _send_keepalive(self):
-        """Send keepalive message to maintain registration with enhanced WVP compatibility"""
+        Returns:
+            str: Call-ID of the keepalive, which the platform's 200 OK acknowledges; None if not sent
+        """
         try:
             # Create proper GB28181 keepalive message according to WVP platform requirements
             current_time = time.time()
@@ -3643,82 +3979,40 @@ Content-Length: {len(xml_content)}
             log.info(f"[SIP] 💓 Sending WVP-compatible keepalive (SN: {sn}) to prevent heartbeat timeout")
             
             # FIXED: Send keepalive via dedicated UDP socket, not catalog response method
-            success = self._send_keepalive_message(keepalive_xml, sn)
+            call_id = self._send_keepalive_message(keepalive_xml, sn, platform)
             
-            if success:
+            # Missed keepalives are counted by the scheduler, which re-registers after max_heartbeat_timeout
+            if call_id:
                 self.last_keepalive_time = current_time
                 self.last_keepalive = current_time
                 log.info(f"[SIP] ✅ Keepalive sent successfully - device should stay online")
             else:
                 log.warning(f"[SIP] ⚠️ Keepalive failed to send - device may go offline")
-                
-                # If keepalive fails consistently, try emergency registration renewal
-                if hasattr(self, '_last_successful_keepalive'):
-                    time_since_last_success = current_time - self._last_successful_keepalive
-                    if time_since_last_success > 90:  # 90 seconds without successful keepalive
-                        log.error("[SIP] 🚨 Keepalive failures detected - triggering emergency registration renewal")
-                        self._retry_registration()
-                else:
-                    self._last_successful_keepalive = current_time
-                    
-            # Track successful keepalive for failure detection
-            if success:
-                self._last_successful_keepalive = current_time
+            return call_id
                 
         except Exception as e:
             log.error(f"[SIP] ❌ Error sending keepalive: {e}")
             import traceback
             log.debug(f"[SIP] Keepalive error traceback: {traceback.format_exc()}")
-            
-            # Emergency fallback - try to renew registration if keepalive fails
-            try:
-                log.warning("[SIP] 🔄 Keepalive failed, attempting registration renewal as fallback")
-                self._retry_registration()
-            except Exception as retry_error:
-                log.error(f"[SIP] ❌ Emergency registration renewal also failed: {retry_error}")
+            return None
 
-    def _send_keepalive_message(self, keepalive_xml, sn):
-        """Send keepalive message via clean UDP socket"""
+    def _send_keepalive_message(self, keepalive_xml, sn, platform=None):
+        """Send keepalive message via clean UDP socket; returns its Call-ID, or None if not sent"""
         try:
-            import socket
-            import time
-            
-            # Generate unique identifiers for the SIP message
-            current_time = int(time.time())
-            call_id = f"keepalive-{sn}-{current_time}"
-            branch = f"z9hG4bK-ka-{current_time}"
-            tag = f"katag{current_time}"
-            cseq = sn % 9999 + 2000  # Different range for keepalives
-            
-            # Build SIP URIs
-            from_uri = f"sip:{self.device_id}@{self.local_ip}:{self.local_port}"
-            to_uri = f"sip:{self.server}:{self.port}"
-            contact_uri = f"<sip:{self.local_ip}:{self.local_port}>"
-            
             # Build complete SIP MESSAGE for keepalive
-            sip_message = f"""MESSAGE {to_uri} SIP/2.0
-Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};rport;branch={branch}
-Max-Forwards: 70
-From: <{from_uri}>;tag={tag}
-To: <{to_uri}>
-Call-ID: {call_id}
-CSeq: {cseq} MESSAGE
-Contact: {contact_uri}
-User-Agent: GB28181-Restreamer/1.0
-Content-Type: Application/MANSCDP+xml
-Content-Length: {len(keepalive_xml)}
-
-{keepalive_xml}"""
+            platform = platform or self.platforms.primary
+            sip_message, call_id = platform.messages.message(keepalive_xml)
 
             # Send the keepalive via UDP helper
-            return self._send_udp_message(sip_message, sn)
+            return call_id if self._send_udp_message(sip_message, sn, platform) else None
         
         except Exception as e:
             log.error(f"[SIP] ❌ Error constructing/sending keepalive: {e}")
-            return False
+            return None
 
-    def _send_proactive_catalog_notification(self):
-        """Send proactive catalog notification to WVP platform after registration - CRITICAL for device visibility"""
+    def _send_proactive_catalog_notification(self, platform=None):
+        """Send proactive catalog notification to a platform after registration - CRITICAL for device visibility"""
+        platform = platform or self.platforms.primary
         max_retries = 3
         retry_count = 0
         
@@ -3747,7 +4041,7 @@ Content-Length: {len(keepalive_xml)}
                 sn = current_time % 100000 + 50000  # Different range from keepalives
                 
                 # Generate catalog response XML
-                catalog_xml = self._generate_catalog_response(str(sn))
+                catalog_xml = self._generate_catalog_response(str(sn), platform)
                 
                 if not catalog_xml:
                     log.error("[SIP] ❌ Failed to generate catalog for proactive notification")
@@ -3772,34 +4066,13 @@ Content-Length: {len(keepalive_xml)}
                         return False
                 
                 # Build complete SIP MESSAGE for catalog notification
-                from_uri = f"sip:{self.device_id}@{self.local_ip}:{self.local_port}"
-                to_uri = f"sip:{self.server}:{self.port}"
-                contact_uri = f"<sip:{self.local_ip}:{self.local_port}>"
-                
-                call_id = f"catalog-proactive-{sn}-{current_time}"
-                branch = f"z9hG4bK-cat-{current_time}"
-                tag = f"cattag{current_time}"
-                cseq = sn % 9999 + 5000  # Different range for catalog
-                
-                sip_message = f"""MESSAGE {to_uri} SIP/2.0
-Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};rport;branch={branch}
-Max-Forwards: 70
-From: <{from_uri}>;tag={tag}
-To: <{to_uri}>
-Call-ID: {call_id}
-CSeq: {cseq} MESSAGE
-Contact: {contact_uri}
-User-Agent: GB28181-Restreamer/1.0
-Content-Type: Application/MANSCDP+xml
-Content-Length: {len(catalog_xml)}
-
-{catalog_xml}"""
+                sip_message, _ = platform.messages.message(catalog_xml)
 
                 # Send via UDP
-                success = self._send_udp_message(sip_message, sn)
+                success = self._send_udp_message(sip_message, sn, platform)
                 
                 if success:
-                    log.info(f"[SIP] ✅ Proactive catalog notification sent successfully (SN: {sn})")
+                    log.info(f"[SIP] ✅ Proactive catalog notification sent to {platform.name} (SN: {sn})")
                     log.info(f"[SIP] 📱 WVP frontend should now show {len(self.device_catalog)} available channels")
                     return True
                 else:
@@ -1,6 +1,6 @@
-import re
 import time
 from media_streamer import MediaStreamer
+from sdp import parse_sdp
 import os
 
 LOG_FILE = "logs/sip.log"
@@ -9,12 +9,9 @@ VIDEO_FILE = "sample_videos/Entryyy.mp4"
 streamer = MediaStreamer()
 
 def extract_sdp_info(sdp_text):
-    c_line = re.search(r"c=IN IP4 (\d+\.\d+\.\d+\.\d+)", sdp_text)
-    m_line = re.search(r"m=video (\d+)", sdp_text)
-    if c_line and m_line:
-        ip = c_line.group(1)
-        port = int(m_line.group(1))
-        return ip, port
+    sdp = parse_sdp(sdp_text)
+    if sdp and sdp.dest_ip and sdp.dest_port:
+        return sdp.dest_ip, sdp.dest_port
     return None, None
 
 print("👀 Watching logs/sip.log for SIP INVITE...")
@@ -0,0 +1,190 @@
+# src/sip_message_builder.py
+
+"""
+Outbound SIP message assembly
+
+Keepalives, catalog MESSAGEs, NOTIFYs and responses used to be rebuilt
+from multi-line f-strings on every send, with Call-ID, branch and tag
+taken from int(time.time()) (so two messages in the same second
+collided) and Content-Length counted in characters. The builder
+precompiles the static header bytes of each message type once:
+
+- MESSAGE to the platform: everything but branch, tag, Call-ID, CSeq and
+  Content-Length is fixed for the life of the client
+- NOTIFY within a subscription: compiled once per subscription dialog
+- REGISTER: compiled once per registration (Call-ID and tag are kept
+  across refreshes)
+- responses: the echoed request headers plus our fixed Contact/User-Agent
+
+so assembling a message is a single bytes join. IDs come from a random
+per-process prefix plus a counter, and Content-Length is the byte length
+of the body encoded as it declares (see manscdp_codec).
+"""
+
+import itertools
+import os
+
+from manscdp_codec import encode_xml
+
+USER_AGENT = "GB28181-Restreamer/1.0"
+MANSCDP_CONTENT_TYPE = "Application/MANSCDP+xml"
+
+
+class IdGenerator:
+    """Unique Call-IDs, branches and tags without clock or locking"""
+
+    def __init__(self):
+        self._prefix = os.urandom(4).hex()
+        self._counter = itertools.count(1)  # next() on itertools.count is atomic under the GIL
+
+    def next(self):
+        return f"{self._prefix}{next(self._counter):x}"
+
+    def branch(self):
+        return f"z9hG4bK{self.next()}"
+
+    def tag(self):
+        return self.next()
+
+    def call_id(self, host):
+        return f"{self.next()}@{host}"
+
+
+class SipMessageBuilder:
+    """Builds outbound SIP messages from precompiled header bytes"""
+
+    def __init__(self, device_id, local_ip, local_port, server, port, user_agent=USER_AGENT):
+        self.device_id = device_id
+        self.local_ip = local_ip
+        self.local_port = local_port
+        self.server = server
+        self.port = port
+        self.user_agent = user_agent
+        self.ids = IdGenerator()
+        self._cseq = itertools.count(1)
+
+        # Static chunks around the dynamic fields: branch, tag, Call-ID, CSeq, Content-Length, body
+        self._message = (
+            f"MESSAGE sip:{server}:{port} SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP {local_ip}:{local_port};rport;branch=".encode(),
+            f"\r\nMax-Forwards: 70\r\nFrom: <sip:{device_id}@{local_ip}:{local_port}>;tag=".encode(),
+            f"\r\nTo: <sip:{server}:{port}>\r\nCall-ID: ".encode(),
+            b"\r\nCSeq: ",
+            f" MESSAGE\r\nContact: <sip:{local_ip}:{local_port}>\r\nUser-Agent: {user_agent}\r\n"
+            f"Content-Type: {MANSCDP_CONTENT_TYPE}\r\nContent-Length: ".encode(),
+            b"\r\n\r\n"
+        )
+        self._response_tail = (f"Contact: <sip:{device_id}@{local_ip}:{local_port}>\r\n"
+                               f"User-Agent: {user_agent}\r\n").encode()
+
+    @staticmethod
+    def _body(body):
+        if body is None:
+            return b""
+        return encode_xml(body) if isinstance(body, str) else body
+
+    def message(self, body):
+        """Out-of-dialog MESSAGE to the platform
+
+        Args:
+            body (str or bytes): MANSCDP body; str is encoded as its XML declaration says
+
+        Returns:
+            tuple: (message bytes, Call-ID)
+        """
+        body = self._body(body)
+        call_id = self.ids.call_id(self.local_ip)
+        chunks = self._message
+        return b"".join((
+            chunks[0], self.ids.branch().encode(),
+            chunks[1], self.ids.tag().encode(),
+            chunks[2], call_id.encode(),
+            chunks[3], str(next(self._cseq)).encode(),
+            chunks[4], str(len(body)).encode(),
+            chunks[5], body
+        )), call_id
+
+    def compile_notify(self, dialog):
+        """Precompile the NOTIFY headers of one subscription dialog
+
+        Args:
+            dialog (dict): remote_uri, from_header (ours, with tag), to_header, call_id and event
+
+        Returns:
+            tuple: Static chunks for notify()
+        """
+        target = dialog['remote_uri'].replace('sip:', '', 1)
+        return (
+            f"NOTIFY sip:{target} SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};rport;branch=".encode(),
+            f"\r\nMax-Forwards: 70\r\nFrom: {dialog['from_header']}\r\nTo: {dialog['to_header']}\r\n"
+            f"Call-ID: {dialog['call_id']}\r\nCSeq: ".encode(),
+            f" NOTIFY\r\nContact: <sip:{self.device_id}@{self.local_ip}:{self.local_port}>\r\n"
+            f"Event: {dialog['event']}\r\nUser-Agent: {self.user_agent}\r\nSubscription-State: ".encode(),
+            f"\r\nContent-Type: {MANSCDP_CONTENT_TYPE}\r\nContent-Length: ".encode(),
+            b"\r\nContent-Length: "
+        )
+
+    def notify(self, template, cseq, state, body=None):
+        """NOTIFY within a subscription dialog compiled by compile_notify"""
+        body = self._body(body)
+        return b"".join((
+            template[0], self.ids.branch().encode(),
+            template[1], str(cseq).encode(),
+            template[2], state.encode(),
+            template[3] if body else template[4], str(len(body)).encode(),
+            b"\r\n\r\n", body
+        ))
+
+    def compile_register(self, registration):
+        """Precompile the REGISTER headers of one registration
+
+        Args:
+            registration (dict): aor (sip:user@domain), call_id, tag and contact (sip URI)
+
+        Returns:
+            tuple: Static chunks for register()
+        """
+        return (
+            f"REGISTER sip:{self.server}:{self.port} SIP/2.0\r\n"
+            f"Via: SIP/2.0/UDP {self.local_ip}:{self.local_port};rport;branch=".encode(),
+            f"\r\nMax-Forwards: 70\r\nFrom: <{registration['aor']}>;tag={registration['tag']}\r\n"
+            f"To: <{registration['aor']}>\r\nCall-ID: {registration['call_id']}\r\nCSeq: ".encode(),
+            f" REGISTER\r\nContact: <{registration['contact']}>\r\n".encode(),
+            f"\r\nUser-Agent: {self.user_agent}\r\nContent-Length: 0\r\n\r\n".encode()
+        )
+
+    def register(self, template, cseq, expires, authorization=None):
+        """REGISTER of a registration compiled by compile_register
+
+        Args:
+            authorization (str): Complete credentials header line, e.g. "Authorization: Digest ..."
+        """
+        return b"".join((
+            template[0], self.ids.branch().encode(),
+            template[1], str(cseq).encode(),
+            template[2], f"{authorization}\r\n".encode() if authorization else b"",
+            b"Expires: ", str(expires).encode(),
+            template[3]
+        ))
+
+    def response(self, status_code, reason_phrase, header_lines, body=None, content_type=None):
+        """Response echoing the request's Via, From, To (with our tag), Call-ID and CSeq lines
+
+        Args:
+            status_code (str or int): e.g. 200
+            reason_phrase (str): e.g. "OK"
+            header_lines (list): Complete header lines, in order
+            body (str or bytes): Optional body, e.g. an SDP answer
+            content_type (str): Content-Type of the body
+
+        Returns:
+            bytes: The response
+        """
+        body = self._body(body)
+        head = f"SIP/2.0 {status_code} {reason_phrase}\r\n" + "".join(f"{line}\r\n" for line in header_lines)
+        if body:
+            tail = f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        else:
+            tail = b"Content-Length: 0\r\n\r\n"
+        return b"".join((head.encode(), self._response_tail, tail, body))
@@ -0,0 +1,299 @@
+# src/sip_registration.py
+
+"""
+In-process SIP registration
+
+REGISTER used to be left to the pjsua subprocess (--reg-timeout/--rereg-delay),
+with our state inferred from its log output and every retry restarting the
+process. RegistrationClient sends REGISTER itself over the shared SIP socket:
+
+- digest credentials are cached after the first challenge, so refreshes carry
+  Authorization with the same nonce and the next nc and cost one round trip;
+  a new or stale nonce is answered once, a second rejection fails
+- the binding is refreshed at refresh_fraction of the Expires the registrar
+  granted (423 Interval Too Brief is retried with its Min-Expires)
+- requests are retransmitted from T1 doubling up to T2 until
+  transaction_timeout, like a non-INVITE client transaction
+- state moves UNREGISTERED -> REGISTERING -> REGISTERED, or FAILED, and each
+  change is reported to on_state
+
+pjsua keeps receiving requests on local_port; the Contact we register points
+there. Settings come from config["sip"] (expires) and config["sip"]["registration"].
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+from logger import log
+
+UNREGISTERED = "unregistered"
+REGISTERING = "registering"
+REGISTERED = "registered"
+FAILED = "failed"
+
+T1 = 0.5
+T2 = 4.0
+
+_AUTH_PARAM = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|([^,\s]+))')
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _header(response, name):
+    match = re.search(rf"^{name}:\s*(.+?)\s*$", response, re.IGNORECASE | re.MULTILINE)
+    return match.group(1) if match else None
+
+
+class DigestCredentials:
+    """Digest credentials with the last challenge cached for reuse"""
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.challenge = None   # realm, nonce, opaque, qop, ... of the last challenge
+        self.header = "Authorization"
+        self.nc = 0
+        self._ha1 = None
+
+    def update(self, challenge, proxy=False):
+        """Take a WWW-Authenticate / Proxy-Authenticate challenge
+
+        Returns:
+            bool: Whether the nonce is new (or stale), i.e. retrying with it may succeed
+        """
+        if not challenge or not challenge.lower().startswith("digest"):
+            return False
+        params = {key.lower(): quoted or token
+                  for key, quoted, token in _AUTH_PARAM.findall(challenge[6:])}
+        if params.get("algorithm", "MD5").upper() != "MD5":
+            log.warning(f"[REGISTER] Unsupported digest algorithm {params['algorithm']}, trying MD5")
+        fresh = (self.challenge is None or params.get("nonce") != self.challenge.get("nonce")
+                 or params.get("stale", "").lower() == "true")
+        self.challenge = params
+        self.header = "Proxy-Authorization" if proxy else "Authorization"
+        self.nc = 0
+        self._ha1 = _md5(f"{self.username}:{params.get('realm', '')}:{self.password}")
+        return fresh
+
+    def authorization(self, method, uri):
+        """Credentials header line for a request, or None before the first challenge"""
+        if self.challenge is None:
+            return None
+        challenge = self.challenge
+        self.nc += 1
+        ha2 = _md5(f"{method}:{uri}")
+        fields = [f'username="{self.username}"', f'realm="{challenge.get("realm", "")}"',
+                  f'nonce="{challenge.get("nonce", "")}"', f'uri="{uri}"']
+        qops = [qop.strip() for qop in challenge.get("qop", "").split(",")]
+        if "auth" in qops:
+            nc = f"{self.nc:08x}"
+            cnonce = os.urandom(8).hex()
+            response = _md5(f"{self._ha1}:{challenge.get('nonce', '')}:{nc}:{cnonce}:auth:{ha2}")
+            fields += [f'response="{response}"', "algorithm=MD5", "qop=auth", f"nc={nc}", f'cnonce="{cnonce}"']
+        else:
+            response = _md5(f"{self._ha1}:{challenge.get('nonce', '')}:{ha2}")
+            fields += [f'response="{response}"', "algorithm=MD5"]
+        if "opaque" in challenge:
+            fields.append(f'opaque="{challenge["opaque"]}"')
+        return f"{self.header}: Digest {', '.join(fields)}"
+
+
+class RegistrationClient:
+    """REGISTER client with cached digest credentials and refresh before expiry"""
+
+    def __init__(self, config, messages, send, on_state):
+        """
+        Args:
+            config (dict): Application config
+            messages (SipMessageBuilder): Builds the REGISTER requests
+            send (callable): send(message bytes) -> bool, over the shared SIP socket
+            on_state (callable): on_state(state) on every state change
+        """
+        sip_config = config["sip"]
+        registration_config = sip_config.get("registration", {})
+        self.expires = sip_config.get("expires", 3600)
+        self.refresh_fraction = registration_config.get("refresh_fraction", 0.8)
+        self.transaction_timeout = registration_config.get("transaction_timeout", 16.0)
+        self.send = send
+        self.on_state = on_state
+        self.messages = messages
+
+        self.credentials = DigestCredentials(sip_config["username"], sip_config["password"])
+        self.request_uri = f"sip:{messages.server}:{messages.port}"
+        contact_host = sip_config.get("contact_ip") or messages.local_ip
+        self.call_id = messages.ids.call_id(messages.local_ip)
+        self.template = messages.compile_register({
+            "aor": f"sip:{sip_config['username']}@{messages.server}",
+            "tag": messages.ids.tag(),
+            "call_id": self.call_id,
+            "contact": f"sip:{sip_config['device_id']}@{contact_host}:{messages.local_port}"
+        })
+
+        self.state = UNREGISTERED
+        self.granted = None        # Expires granted by the registrar
+        self.registered_at = None
+        self.cseq = 0
+        self._pending = None       # the REGISTER transaction in flight
+        self._timer = None         # retransmission or refresh timer
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retransmissions": 0, "challenges": 0, "refreshes": 0, "failures": 0}
+
+    def register(self, expires=None):
+        """Send REGISTER (or refresh the binding); the outcome arrives through handle_response"""
+        with self._lock:
+            self._send_request(self.expires if expires is None else expires, authorized=False)
+            changed = self._set_state(REGISTERING) if self.state != REGISTERED else None
+        self._report(changed)
+
+    def unregister(self):
+        """Remove the binding (Expires: 0) without waiting for the answer"""
+        with self._lock:
+            if self.state != REGISTERED:
+                self._cancel_timer()
+                return
+            self._send_request(0, authorized=False)
+            self._pending = None  # nobody waits for the answer
+            self._cancel_timer()
+            changed = self._set_state(UNREGISTERED)
+        self._report(changed)
+
+    def stop(self):
+        with self._lock:
+            self._pending = None
+            self._cancel_timer()
+
+    def handle_response(self, response):
+        """Handle a response read from the SIP socket
+
+        Returns:
+            bool: Whether the response belonged to this registration
+        """
+        if _header(response, "Call-ID") != self.call_id and _header(response, "i") != self.call_id:
+            return False
+        status = re.match(r"SIP/2\.0\s+(\d{3})", response)
+        cseq = re.match(r"(\d+)\s+REGISTER", _header(response, "CSeq") or "", re.IGNORECASE)
+        if not status or not cseq:
+            return True
+        code = int(status.group(1))
+
+        with self._lock:
+            pending = self._pending
+            if pending is None or int(cseq.group(1)) != pending["cseq"]:
+                return True  # retransmitted or stale answer
+            if code < 200:
+                return True
+            self._pending = None
+            self._cancel_timer()
+            changed = None
+
+            if 200 <= code < 300:
+                changed = self._registered(response, pending)
+            elif code in (401, 407):
+                self.stats["challenges"] += 1
+                challenge = _header(response, "WWW-Authenticate" if code == 401 else "Proxy-Authenticate")
+                fresh = self.credentials.update(challenge, proxy=code == 407)
+                if self.credentials.challenge is not None and (fresh or not pending["authorized"]):
+                    self._send_request(pending["expires"], authorized=True)
+                else:
+                    log.error("[REGISTER] ❌ Credentials rejected by the registrar")
+                    changed = self._failed()
+            elif code == 423 and (_header(response, "Min-Expires") or "").isdigit():
+                self._send_request(int(_header(response, "Min-Expires")), authorized=pending["authorized"])
+            else:
+                log.error(f"[REGISTER] ❌ REGISTER rejected: {response.splitlines()[0]}")
+                changed = self._failed()
+        self._report(changed)
+        return True
+
+    def _send_request(self, expires, authorized):
+        """Send a new REGISTER transaction (caller holds the lock)"""
+        self.cseq += 1
+        authorization = self.credentials.authorization("REGISTER", self.request_uri)
+        message = self.messages.register(self.template, self.cseq, expires, authorization)
+        self._pending = {"cseq": self.cseq, "expires": expires, "message": message,
+                         "authorized": authorized or authorization is not None,
+                         "deadline": time.time() + self.transaction_timeout, "interval": T1}
+        self.stats["requests"] += 1
+        log.info(f"[REGISTER] 📤 REGISTER (CSeq {self.cseq}, Expires {expires}"
+                 f"{', cached credentials' if authorization else ''})")
+        if not self.send(message):
+            log.warning("[REGISTER] ⚠️ Failed to send REGISTER, will retransmit")
+        self._arm(T1, self._retransmit, self.cseq)
+
+    def _retransmit(self, cseq):
+        with self._lock:
+            pending = self._pending
+            if pending is None or pending["cseq"] != cseq:
+                return
+            changed = None
+            if time.time() >= pending["deadline"]:
+                log.error(f"[REGISTER] ❌ No answer to REGISTER within {self.transaction_timeout}s")
+                self._pending = None
+                changed = self._failed()
+            else:
+                self.stats["retransmissions"] += 1
+                self.send(pending["message"])
+                pending["interval"] = min(pending["interval"] * 2, T2)
+                self._arm(pending["interval"], self._retransmit, cseq)
+        self._report(changed)
+
+    def _registered(self, response, pending):
+        if pending["expires"] == 0:
+            return self._set_state(UNREGISTERED)
+        granted = re.search(r";\s*expires=(\d+)", _header(response, "Contact") or "", re.IGNORECASE)
+        expires = _header(response, "Expires")
+        self.granted = int(granted.group(1)) if granted else int(expires) if (expires or "").isdigit() else pending["expires"]
+        self.registered_at = time.time()
+        refresh = max(1.0, self.granted * self.refresh_fraction)
+        log.info(f"[REGISTER] ✅ Registered for {self.granted}s, refreshing in {refresh:.0f}s")
+        self._arm(refresh, self._refresh)
+        return self._set_state(REGISTERED)
+
+    def _refresh(self):
+        with self._lock:
+            if self.state != REGISTERED or self._pending is not None:
+                return
+            self.stats["refreshes"] += 1
+            self._send_request(self.expires, authorized=False)
+
+    def _failed(self):
+        self.stats["failures"] += 1
+        self.granted = None
+        return self._set_state(FAILED)
+
+    def _set_state(self, state):
+        """Change state (caller holds the lock); returns the new state if it changed"""
+        if state == self.state:
+            return None
+        log.info(f"[REGISTER] {self.state} -> {state}")
+        self.state = state
+        return state
+
+    def _report(self, changed):
+        if changed is None:
+            return
+        try:
+            self.on_state(changed)
+        except Exception as e:
+            log.error(f"[REGISTER] State listener error: {e}")
+
+    def _arm(self, delay, callback, *args):
+        self._cancel_timer()
+        self._timer = threading.Timer(delay, callback, args=args)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "state": self.state, "granted": self.granted,
+                    "registered_at": self.registered_at}
@@ -0,0 +1,109 @@
+# src/sip_transactions.py
+
+"""
+Server transaction cache for incoming SIP requests
+
+Platforms retransmit MESSAGE and INVITE over UDP until they get an answer,
+and pjsua hands every copy to us. Requests are identified by their
+transaction (Call-ID, CSeq, Via branch) so a retransmission is recognised
+before it reaches a handler:
+
+- begin(key) returns whether the request is new; a retransmission gets the
+  entry of the original, whose cached response (if one was sent already)
+  the caller replays instead of handling the request again
+- respond(key, response) caches the last response sent for a transaction
+- entries live for ttl seconds (64*T1, the longest a client retransmits)
+  and at most max_entries are kept, oldest dropped first
+
+Settings come from config["sip"]["transactions"].
+"""
+
+import collections
+import re
+import threading
+import time
+
+from logger import log
+
+_BRANCH = re.compile(r";\s*branch=([^;,\s]+)", re.IGNORECASE)
+
+
+def transaction_key(call_id, cseq, via):
+    """Transaction key of a request from its Call-ID, CSeq and top Via header values
+
+    Returns:
+        tuple: (Call-ID, CSeq number, method, branch), or None if a part is missing
+    """
+    call_id = (call_id or "").strip()
+    cseq = (cseq or "").split()
+    branch = _BRANCH.search(via or "")
+    if not call_id or len(cseq) != 2 or not branch:
+        return None
+    return (call_id, cseq[0], cseq[1].upper(), branch.group(1))
+
+
+def request_key(message):
+    """Transaction key of a request given as text or header lines (the first Via is the top one)"""
+    headers = {}
+    for line in message.splitlines():
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name in ("call-id", "i", "cseq", "via", "v") and value:
+            headers.setdefault({"i": "call-id", "v": "via"}.get(name, name), value)
+    return transaction_key(headers.get("call-id"), headers.get("cseq"), headers.get("via"))
+
+
+class TransactionCache:
+    """Recently seen request transactions with the response sent for each"""
+
+    def __init__(self, config):
+        transactions_config = (config or {}).get("sip", {}).get("transactions", {})
+        self.ttl = transactions_config.get("ttl", 32)
+        self.max_entries = transactions_config.get("max_entries", 2048)
+        self.entries = collections.OrderedDict()   # key -> {"seen", "response", "retransmissions"}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retransmissions": 0, "replayed": 0, "evicted": 0}
+
+    def begin(self, key):
+        """Record a request
+
+        Returns:
+            tuple: (bool, dict) - whether the request is new, and its transaction entry
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["retransmissions"] += 1
+                self.stats["retransmissions"] += 1
+                if entry["response"] is not None:
+                    self.stats["replayed"] += 1
+                log.debug(f"[TRANSACTION] Retransmission {entry['retransmissions']} of {key[2]} {key[0]}")
+                return False, entry
+            entry = {"seen": now, "response": None, "retransmissions": 0}
+            self.entries[key] = entry
+            self.stats["requests"] += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+            return True, entry
+
+    def respond(self, key, response):
+        """Cache the response sent for a transaction, for replay to its retransmissions"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["response"] = response
+
+    def _expire(self, now):
+        """Drop transactions older than ttl (caller holds the lock)"""
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if now - entry["seen"] < self.ttl:
+                break
+            del self.entries[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "cached": len(self.entries)}
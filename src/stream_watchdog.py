@@ -0,0 +1,268 @@
+# src/stream_watchdog.py
+
+"""
+Buffer-flow watchdog for media pipelines
+
+A pipeline can sit in PLAYING while its source has stopped delivering data
+(a hung RTSP camera, a stuck demuxer), so get_state() cannot tell a stalled
+stream from a healthy one. Instead a pad probe on every sink of a watched
+pipeline counts buffers, bytes and the last PTS, and one hashed timer wheel
+for all streams checks each stream once its flow deadline comes up:
+
+- the probe only updates counters, it never touches the wheel
+- an expired entry whose stream saw data since it was scheduled is simply
+  re-armed at last_flow + stall time
+- a stream with no data for media.watchdog.stall_ms is flagged once per
+  stall and its on_stall callback runs on its own thread
+- on_flowing runs (on the streaming thread, so it must be cheap) when data
+  first arrives after registration or after a stall
+
+Settings come from config["media"]["watchdog"].
+"""
+
+import math
+import threading
+import time
+
+from logger import log
+
+
+class StreamWatchdog:
+    """Single timer wheel watching the buffer flow of every pipeline"""
+
+    def __init__(self, config):
+        watchdog_config = (config or {}).get("media", {}).get("watchdog", {})
+        self.stall = watchdog_config.get("stall_ms", 3000) / 1000.0
+        self.startup = watchdog_config.get("startup_ms", 10000) / 1000.0
+        self.tick = watchdog_config.get("tick_ms", 100) / 1000.0
+        self.slots = [set() for _ in range(watchdog_config.get("wheel_slots", 512))]
+
+        self.cursor = 0
+        self.wheel_time = time.monotonic()
+        self.streams = {}
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the wheel thread"""
+        if self.running:
+            return
+        self.running = True
+        self.wheel_time = time.monotonic()
+        self.thread = threading.Thread(target=self._wheel_loop, daemon=True)
+        self.thread.start()
+        log.info(f"[WATCHDOG] Buffer-flow watchdog started (stall {self.stall * 1000:.0f} ms, "
+                 f"tick {self.tick * 1000:.0f} ms)")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(1)
+        log.info("[WATCHDOG] Buffer-flow watchdog stopped")
+
+    def register(self, stream_id, on_stall=None, on_flowing=None):
+        """Start watching a stream; data must arrive within the startup grace time
+
+        Re-registering (e.g. after the pipeline was rebuilt) keeps the counters.
+
+        Args:
+            stream_id (str): Stream to watch
+            on_stall (callable, optional): Called with stream_id when its flow stops
+            on_flowing (callable, optional): Called with stream_id when data (re)starts
+        """
+        self.start()
+        now = time.monotonic()
+        with self._lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                entry = {
+                    "buffers": 0,
+                    "bytes": 0,
+                    "last_pts": None,
+                    "stalls": 0,
+                    "probes": [],
+                    "slot": None,
+                    "rounds": 0
+                }
+                self.streams[stream_id] = entry
+            entry.update({
+                "on_stall": on_stall,
+                "on_flowing": on_flowing,
+                "last_flow": now + self.startup - self.stall,
+                "stalled": False,
+                "waiting": True,
+                "suspended": False
+            })
+            self._schedule(stream_id, entry, now + self.startup)
+
+    def watch(self, stream_id, pipeline, on_stall=None, on_flowing=None):
+        """Register a stream and probe the sink pads of its pipeline"""
+        from gi.repository import Gst
+
+        self.register(stream_id, on_stall, on_flowing)
+        self._remove_probes(self.streams[stream_id])
+
+        def on_probe(pad, info):
+            if info.type & Gst.PadProbeType.BUFFER_LIST:
+                buffers = info.get_buffer_list()
+                self.feed(stream_id, sum(buffers.get(i).get_size() for i in range(buffers.length())),
+                          count=buffers.length())
+            else:
+                buffer = info.get_buffer()
+                self.feed(stream_id, buffer.get_size(),
+                          buffer.pts if buffer.pts != Gst.CLOCK_TIME_NONE else None)
+            return Gst.PadProbeReturn.OK
+
+        probes = []
+        sinks = pipeline.iterate_sinks()
+        while True:
+            result, sink = sinks.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            pad = sink.get_static_pad("sink")
+            if pad is not None:
+                probe_id = pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, on_probe)
+                probes.append((pad, probe_id))
+        self.streams[stream_id]["probes"] = probes
+        log.debug(f"[WATCHDOG] Watching {len(probes)} sink pad(s) of {stream_id}")
+
+    def unwatch(self, stream_id):
+        """Stop watching a stream and remove its probes
+
+        Returns:
+            dict or None: Final flow counters of the stream
+        """
+        with self._lock:
+            entry = self.streams.pop(stream_id, None)
+            if entry is None:
+                return None
+            if entry["slot"] is not None:
+                self.slots[entry["slot"]].discard(stream_id)
+        self._remove_probes(entry)
+        return self._stream_stats(entry)
+
+    def feed(self, stream_id, size, pts=None, count=1):
+        """Account data that reached a sink (called from the streaming thread)"""
+        entry = self.streams.get(stream_id)
+        if entry is None:
+            return
+        entry["buffers"] += count
+        entry["bytes"] += size
+        if pts is not None:
+            entry["last_pts"] = pts
+        entry["last_flow"] = time.monotonic()
+        if entry["stalled"]:
+            entry["stalled"] = False
+            log.info(f"[WATCHDOG] ✅ Data flowing again on {stream_id}")
+        if entry["waiting"]:
+            entry["waiting"] = False
+            if entry["on_flowing"]:
+                entry["on_flowing"](stream_id)
+
+    def suspend(self, stream_id):
+        """Pause stall detection, e.g. while a playback stream is paused"""
+        entry = self.streams.get(stream_id)
+        if entry:
+            entry["suspended"] = True
+
+    def resume(self, stream_id):
+        """Resume stall detection with a fresh grace period"""
+        entry = self.streams.get(stream_id)
+        if entry:
+            entry["last_flow"] = time.monotonic()
+            entry["stalled"] = False
+            entry["suspended"] = False
+
+    def is_stalled(self, stream_id):
+        entry = self.streams.get(stream_id)
+        return bool(entry and entry["stalled"])
+
+    def _remove_probes(self, entry):
+        for pad, probe_id in entry["probes"]:
+            try:
+                pad.remove_probe(probe_id)
+            except Exception as e:
+                log.debug(f"[WATCHDOG] Could not remove probe: {e}")
+        entry["probes"] = []
+
+    def _schedule(self, stream_id, entry, deadline):
+        """Put a stream in the wheel slot of its deadline (caller holds the lock)"""
+        if entry["slot"] is not None:
+            self.slots[entry["slot"]].discard(stream_id)
+        ticks = max(1, math.ceil((deadline - self.wheel_time) / self.tick))
+        entry["rounds"] = (ticks - 1) // len(self.slots)
+        entry["slot"] = (self.cursor + ticks) % len(self.slots)
+        self.slots[entry["slot"]].add(stream_id)
+
+    def _wheel_loop(self):
+        while self.running:
+            time.sleep(self.tick)
+            try:
+                self._advance(time.monotonic())
+            except Exception as e:
+                log.error(f"[WATCHDOG] Timer wheel error: {e}")
+
+    def _advance(self, now):
+        """Turn the wheel up to now, checking the streams in each slot passed"""
+        stalled = []
+        with self._lock:
+            while self.wheel_time + self.tick <= now:
+                self.wheel_time += self.tick
+                self.cursor = (self.cursor + 1) % len(self.slots)
+                slot = self.slots[self.cursor]
+                for stream_id in list(slot):
+                    entry = self.streams[stream_id]
+                    if entry["rounds"] > 0:
+                        entry["rounds"] -= 1
+                        continue
+                    slot.discard(stream_id)
+                    entry["slot"] = None
+                    if entry["suspended"] or entry["stalled"]:
+                        self._schedule(stream_id, entry, now + self.stall)
+                    elif now - entry["last_flow"] >= self.stall:
+                        entry["stalled"] = True
+                        entry["waiting"] = True
+                        entry["stalls"] += 1
+                        stalled.append((stream_id, entry["on_stall"], now - entry["last_flow"]))
+                        self._schedule(stream_id, entry, now + self.stall)
+                    else:
+                        self._schedule(stream_id, entry, entry["last_flow"] + self.stall)
+
+        for stream_id, on_stall, idle in stalled:
+            log.warning(f"[WATCHDOG] ⚠️ No data on {stream_id} for {idle * 1000:.0f} ms")
+            if on_stall:
+                threading.Thread(target=on_stall, args=(stream_id,), daemon=True).start()
+
+    def _stream_stats(self, entry):
+        return {
+            "buffers": entry["buffers"],
+            "bytes": entry["bytes"],
+            "last_pts": entry["last_pts"],
+            "idle_ms": int(max(0.0, time.monotonic() - entry["last_flow"]) * 1000),
+            "stalled": entry["stalled"],
+            "stalls": entry["stalls"]
+        }
+
+    def get_stats(self, stream_id=None):
+        """Get per-stream flow counters (all streams if stream_id is None)"""
+        if stream_id is not None:
+            entry = self.streams.get(stream_id)
+            return self._stream_stats(entry) if entry else None
+        return {sid: self._stream_stats(e) for sid, e in list(self.streams.items())}
+
+
+# Global instance
+_stream_watchdog = None
+
+
+def get_stream_watchdog(config=None):
+    """Get or create the shared StreamWatchdog instance"""
+    global _stream_watchdog
+
+    if _stream_watchdog is None:
+        _stream_watchdog = StreamWatchdog(config)
+
+    return _stream_watchdog
@@ -0,0 +1,411 @@
+# src/tcp_media_listener.py
+
+"""
+Pooled TCP-passive media listener for GB28181
+
+When the platform offers `a=setup:active` it connects to us, so the device
+has to listen. Instead of one listening socket and thread per stream, a
+single epoll loop owns a pre-bound range of media ports:
+
+- reserve_port() hands out a listening port for the SDP answer (O(1))
+- open_session() attaches a stream to that port (and optionally its SSRC)
+- the platform's connection is matched to the session by the port it
+  arrived on, or by the SSRC of the first RTP packet when several sessions
+  share a port
+- send() writes RFC 4571 framed RTP packets; whatever the socket does not
+  take immediately is flushed by the epoll loop on EPOLLOUT
+"""
+
+import collections
+import select
+import socket
+import struct
+import threading
+import time
+
+from logger import log
+from ps_packetizer import gb28181_ssrc
+
+APPSINK_NAME = "tcp_passive"
+
+
+class TcpMediaListener:
+    """Single epoll loop serving every TCP-passive media session"""
+
+    def __init__(self, config):
+        media_config = (config or {}).get("media", {})
+        self.port_start, self.port_end = media_config.get("tcp_passive_port_range", [30000, 30099])
+        self.bind_ip = media_config.get("tcp_passive_bind_ip", "0.0.0.0")
+        self.accept_timeout = media_config.get("tcp_passive_accept_timeout", 30)
+        self.max_buffer = media_config.get("tcp_passive_max_buffer", 4 * 1024 * 1024)
+
+        self.epoll = None
+        self.listeners = {}       # fd -> (socket, port)
+        self.free_ports = collections.deque()
+        self.sessions = {}        # session_id -> session state
+        self.port_sessions = {}   # port -> [session_id, ...]
+        self.connections = {}     # fd -> connection state
+        self._lock = threading.RLock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Bind the port range and start the epoll loop"""
+        with self._lock:
+            if self.running:
+                return True
+
+            self.epoll = select.epoll()
+            for port in range(self.port_start, self.port_end + 1):
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    sock.bind((self.bind_ip, port))
+                    sock.listen(8)
+                    sock.setblocking(False)
+                except OSError as e:
+                    log.warning(f"[TCP-PASSIVE] Port {port} unavailable, skipping: {e}")
+                    sock.close()
+                    continue
+                self.listeners[sock.fileno()] = (sock, port)
+                self.free_ports.append(port)
+                self.epoll.register(sock.fileno(), select.EPOLLIN)
+
+            if not self.listeners:
+                log.error(f"[TCP-PASSIVE] No port in {self.port_start}-{self.port_end} could be bound")
+                self.epoll.close()
+                self.epoll = None
+                return False
+
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            log.info(f"[TCP-PASSIVE] Listening on {len(self.listeners)} ports "
+                     f"({self.port_start}-{self.port_end})")
+            return True
+
+    def stop(self):
+        """Close every connection and listening socket"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(2)
+        with self._lock:
+            for fd in list(self.connections):
+                self._close_connection(fd)
+            for sock, _ in self.listeners.values():
+                sock.close()
+            self.listeners.clear()
+            self.free_ports.clear()
+            self.epoll.close()
+            self.epoll = None
+        log.info("[TCP-PASSIVE] Listener stopped")
+
+    def reserve_port(self):
+        """Take a listening port for a new session
+
+        Returns:
+            int or None: The port to advertise in the SDP answer, None if the pool is exhausted
+        """
+        if not self.running and not self.start():
+            return None
+        with self._lock:
+            if not self.free_ports:
+                log.warning("[TCP-PASSIVE] Port pool exhausted")
+                return None
+            return self.free_ports.popleft()
+
+    def release_port(self, port):
+        """Return a port to the pool once no session uses it"""
+        with self._lock:
+            if port in self.port_sessions or port in self.free_ports:
+                return
+            if any(p == port for _, p in self.listeners.values()):
+                self.free_ports.append(port)
+
+    def open_session(self, session_id, port, ssrc=None):
+        """Attach a media session to a reserved port
+
+        Reopening an existing session keeps its connection (pipeline restarts).
+
+        Args:
+            session_id (str): Stream identifier
+            port (int): Port returned by reserve_port()
+            ssrc (str, optional): GB28181 SSRC, used when several sessions share the port
+        """
+        with self._lock:
+            if session_id in self.sessions:
+                return True
+            self.sessions[session_id] = {
+                "port": port,
+                "ssrc": gb28181_ssrc(ssrc) if ssrc is not None else None,
+                "fd": None,
+                "peer": None,
+                "opened": time.time(),
+                "connected_at": None,
+                "frames_sent": 0,
+                "bytes_sent": 0,
+                "dropped": 0
+            }
+            self.port_sessions.setdefault(port, []).append(session_id)
+
+            # The platform may have connected before the session was registered
+            for fd, conn in list(self.connections.items()):
+                if conn["session_id"] is None and conn["port"] == port:
+                    self._try_match(fd)
+        log.info(f"[TCP-PASSIVE] Session {session_id} waiting for connection on port {port}")
+        return True
+
+    def close_session(self, session_id):
+        """Drop a session, close its connection and free its port"""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return None
+            if session["fd"] is not None:
+                self._close_connection(session["fd"])
+            port = session["port"]
+            sessions_on_port = self.port_sessions.get(port, [])
+            if session_id in sessions_on_port:
+                sessions_on_port.remove(session_id)
+            if not sessions_on_port:
+                self.port_sessions.pop(port, None)
+                self.release_port(port)
+        log.info(f"[TCP-PASSIVE] Session {session_id} closed")
+        return self._session_stats(session)
+
+    def send(self, session_id, packet):
+        """Queue one RTP packet with its RFC 4571 length prefix
+
+        Returns:
+            bool: False if the session has no connection yet or its buffer is full
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return False
+        with self._lock:
+            conn = self.connections.get(session["fd"])
+            if conn is None:
+                session["dropped"] += 1
+                return False
+
+            frame = struct.pack("!H", len(packet)) + packet
+            outbuf = conn["outbuf"]
+            if len(outbuf) + len(frame) > self.max_buffer:
+                session["dropped"] += 1
+                return False
+
+            if not outbuf:
+                try:
+                    sent = conn["sock"].send(frame)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError as e:
+                    log.warning(f"[TCP-PASSIVE] Send failed for {session_id}: {e}")
+                    self._close_connection(session["fd"])
+                    return False
+                if sent < len(frame):
+                    outbuf += frame[sent:]
+                    self.epoll.modify(session["fd"], select.EPOLLIN | select.EPOLLOUT)
+            else:
+                outbuf += frame
+
+            session["frames_sent"] += 1
+            session["bytes_sent"] += len(frame)
+            return True
+
+    def attach_appsink(self, session_id, appsink):
+        """Feed a pipeline's appsink into this session"""
+        from gi.repository import Gst
+
+        def on_new_sample(sink):
+            sample = sink.emit("pull-sample")
+            if not sample:
+                return Gst.FlowReturn.ERROR
+            buffer = sample.get_buffer()
+            self.send(session_id, buffer.extract_dup(0, buffer.get_size()))
+            return Gst.FlowReturn.OK
+
+        appsink.connect("new-sample", on_new_sample)
+
+    def _run(self):
+        while self.running:
+            try:
+                events = self.epoll.poll(0.5)
+            except InterruptedError:
+                continue
+            except Exception as e:
+                log.error(f"[TCP-PASSIVE] epoll error: {e}")
+                break
+
+            with self._lock:
+                for fd, event in events:
+                    if fd in self.listeners:
+                        self._accept(fd)
+                    elif fd in self.connections:
+                        if event & (select.EPOLLHUP | select.EPOLLERR):
+                            self._close_connection(fd)
+                            continue
+                        if event & select.EPOLLIN:
+                            self._read(fd)
+                        if event & select.EPOLLOUT and fd in self.connections:
+                            self._flush(fd)
+                self._expire_unmatched()
+
+    def _accept(self, listen_fd):
+        sock, port = self.listeners[listen_fd]
+        try:
+            conn_sock, peer = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn_sock.setblocking(False)
+        conn_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        fd = conn_sock.fileno()
+        self.connections[fd] = {
+            "sock": conn_sock,
+            "port": port,
+            "peer": peer,
+            "session_id": None,
+            "accepted": time.time(),
+            "inbuf": bytearray(),
+            "outbuf": bytearray()
+        }
+        self.epoll.register(fd, select.EPOLLIN)
+        log.info(f"[TCP-PASSIVE] Connection from {peer[0]}:{peer[1]} on port {port}")
+        self._try_match(fd)
+
+    def _try_match(self, fd):
+        """Bind a connection to its session by port, or by SSRC if the port is shared"""
+        conn = self.connections[fd]
+        candidates = [sid for sid in self.port_sessions.get(conn["port"], [])
+                      if self.sessions[sid]["fd"] is None]
+        if not candidates:
+            return False
+
+        session_id = None
+        if len(candidates) == 1:
+            session_id = candidates[0]
+        else:
+            ssrc = self._peek_ssrc(conn["inbuf"])
+            if ssrc is None:
+                return False  # wait for the peer's first RTP/RTCP packet
+            for sid in candidates:
+                if self.sessions[sid]["ssrc"] == ssrc:
+                    session_id = sid
+                    break
+            if session_id is None:
+                log.warning(f"[TCP-PASSIVE] No session on port {conn['port']} for SSRC {ssrc}")
+                self._close_connection(fd)
+                return False
+
+        session = self.sessions[session_id]
+        session["fd"] = fd
+        session["peer"] = "%s:%d" % conn["peer"]
+        session["connected_at"] = time.time()
+        conn["session_id"] = session_id
+        conn["inbuf"].clear()
+        log.info(f"[TCP-PASSIVE] ✅ Session {session_id} connected from {session['peer']}")
+        return True
+
+    @staticmethod
+    def _peek_ssrc(data):
+        """Extract the SSRC from the first RFC 4571 framed RTP/RTCP packet"""
+        if len(data) < 2:
+            return None
+        length = struct.unpack("!H", data[:2])[0]
+        if len(data) < 2 + length or length < 8:
+            return None
+        packet = bytes(data[2:2 + length])
+        if 200 <= packet[1] <= 204:
+            return struct.unpack("!I", packet[4:8])[0]  # RTCP sender SSRC
+        if length < 12:
+            return None
+        return struct.unpack("!I", packet[8:12])[0]
+
+    def _read(self, fd):
+        conn = self.connections[fd]
+        try:
+            data = conn["sock"].recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close_connection(fd)
+            return
+        if conn["session_id"] is None:
+            conn["inbuf"] += data
+            self._try_match(fd)
+        # Data from a matched peer is RTCP feedback; nothing consumes it yet
+
+    def _flush(self, fd):
+        conn = self.connections[fd]
+        outbuf = conn["outbuf"]
+        try:
+            sent = conn["sock"].send(outbuf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close_connection(fd)
+            return
+        del outbuf[:sent]
+        if not outbuf:
+            self.epoll.modify(fd, select.EPOLLIN)
+
+    def _close_connection(self, fd):
+        conn = self.connections.pop(fd, None)
+        if conn is None:
+            return
+        try:
+            self.epoll.unregister(fd)
+        except (OSError, ValueError):
+            pass
+        conn["sock"].close()
+        session = self.sessions.get(conn["session_id"])
+        if session is not None:
+            session["fd"] = None
+            log.info(f"[TCP-PASSIVE] Session {conn['session_id']} disconnected, waiting for reconnect")
+
+    def _expire_unmatched(self):
+        now = time.time()
+        for fd, conn in list(self.connections.items()):
+            if conn["session_id"] is None and now - conn["accepted"] > self.accept_timeout:
+                log.warning(f"[TCP-PASSIVE] Closing unmatched connection on port {conn['port']}")
+                self._close_connection(fd)
+
+    def _session_stats(self, session):
+        return {
+            "port": session["port"],
+            "connected": session["fd"] is not None,
+            "peer": session["peer"],
+            "frames_sent": session["frames_sent"],
+            "bytes_sent": session["bytes_sent"],
+            "dropped": session["dropped"]
+        }
+
+    def get_stats(self, session_id=None):
+        """Get per-session counters (all sessions if session_id is None)"""
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            return self._session_stats(session) if session else None
+        return {
+            "ports_total": len(self.listeners),
+            "ports_free": len(self.free_ports),
+            "sessions": {sid: self._session_stats(s) for sid, s in list(self.sessions.items())}
+        }
+
+
+# Global instance
+_tcp_media_listener = None
+
+
+def get_tcp_media_listener(config=None):
+    """Get or create the shared TcpMediaListener instance"""
+    global _tcp_media_listener
+
+    if _tcp_media_listener is None:
+        _tcp_media_listener = TcpMediaListener(config)
+
+    return _tcp_media_listener
@@ -0,0 +1,499 @@
+# src/udp_egress.py
+
+"""
+Batched UDP egress for RTP streams
+
+`udpsink` costs one sendto() per RTP packet. With many concurrent streams the
+syscall overhead dominates, so pipelines can instead end in an appsink whose
+packets are queued here and flushed once per tick for all streams together:
+
+- "sendmmsg": one sendmmsg(2) call carries the packets of every stream
+- "gso": UDP generic segmentation offload (UDP_SEGMENT), one send per run of
+  equal-sized packets of a stream; falls back to sendmmsg if the kernel
+  does not support it
+- "udpsink": keep the plain GStreamer sink
+
+A stream can also be mirrored to more destinations (another platform asking
+for the same channel): each packet is copied with the mirror's SSRC written
+into its RTP header, so one pipeline feeds every platform.
+
+The mode is selected per transport in config["media"]["egress"]["udp"].
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import threading
+import time
+
+from logger import log
+
+EGRESS_MODES = ("udpsink", "sendmmsg", "gso")
+
+# Linux UDP_SEGMENT socket option (not exported by every Python build)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65000
+
+# Kernel limit on messages per sendmmsg call
+UIO_MAXIOV = 1024
+
+# Send errors after which the unsent packets are kept for the next tick (socket buffer full);
+# any other error drops the one packet that failed
+TRANSIENT_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS, errno.EINTR)
+
+# Seconds between warnings about send failures of one stream
+ERROR_LOG_INTERVAL = 10
+
+APPSINK_NAME = "udp_egress"
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _Msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_Iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _Mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _Msghdr), ("msg_len", ctypes.c_uint)]
+
+
+_libc = None
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+except (OSError, AttributeError, TypeError):
+    _libc = None
+
+
+def sockaddr_in(ip, port):
+    """Build a raw struct sockaddr_in for use as a sendmmsg destination"""
+    return struct.pack("=H", socket.AF_INET) + struct.pack("!H", int(port)) + socket.inet_aton(ip) + b"\x00" * 8
+
+
+def sendmmsg(sock, packets, addresses=None):
+    """Send a list of datagrams with as few syscalls as possible
+
+    Uses sendmmsg(2) when available, falling back to one send()/sendto() per packet.
+
+    Args:
+        sock (socket.socket): UDP socket (connected unless addresses are given)
+        packets (list): Datagram payloads
+        addresses (list, optional): (ip, port) destination per packet
+
+    Returns:
+        int: Number of packets sent
+
+    Raises:
+        OSError: When a packet could not be sent; its `sent` attribute is the
+            number of packets sent before it
+    """
+    if not packets:
+        return 0
+
+    if _libc is None:
+        for i, packet in enumerate(packets):
+            try:
+                if addresses:
+                    sock.sendto(packet, addresses[i])
+                else:
+                    sock.send(packet)
+            except OSError as e:
+                e.sent = i
+                raise
+        return len(packets)
+
+    count = len(packets)
+    buffers = [ctypes.create_string_buffer(bytes(p), len(p)) for p in packets]
+    iovecs = (_Iovec * count)()
+    msgs = (_Mmsghdr * count)()
+    names = {}
+    for i, buf in enumerate(buffers):
+        iovecs[i].iov_base = ctypes.cast(buf, ctypes.c_void_p)
+        iovecs[i].iov_len = len(packets[i])
+        msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+        msgs[i].msg_hdr.msg_iovlen = 1
+        if addresses:
+            dest = addresses[i]
+            if dest not in names:
+                names[dest] = ctypes.create_string_buffer(sockaddr_in(*dest), 16)
+            msgs[i].msg_hdr.msg_name = ctypes.cast(names[dest], ctypes.c_void_p)
+            msgs[i].msg_hdr.msg_namelen = 16
+
+    sent = 0
+    while sent < count:
+        batch = min(count - sent, UIO_MAXIOV)
+        result = _libc.sendmmsg(sock.fileno(), ctypes.addressof(msgs) + sent * ctypes.sizeof(_Mmsghdr),
+                                batch, 0)
+        if result < 0:
+            err = ctypes.get_errno()
+            error = OSError(err, os.strerror(err))
+            error.sent = sent
+            raise error
+        sent += result
+    return sent
+
+
+def ssrc_bytes(ssrc):
+    """RTP header SSRC field for a GB28181 SSRC string (decimal digits)"""
+    return struct.pack("!I", int(ssrc) & 0xFFFFFFFF)
+
+
+def rewrite_ssrc(packets, ssrc):
+    """Copies of RTP packets with their SSRC replaced (ssrc as packed by ssrc_bytes)"""
+    if ssrc is None:
+        return packets
+    return [packet[:8] + ssrc + packet[12:] for packet in packets]
+
+
+def gso_supported(sock):
+    """Check whether the kernel accepts UDP_SEGMENT on this socket"""
+    try:
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, 0)
+        return True
+    except OSError:
+        return False
+
+
+def send_gso(sock, packets, dest):
+    """Send one stream's packets using UDP GSO
+
+    Consecutive packets of equal size (plus one trailing shorter packet) are
+    concatenated and handed to the kernel in a single send with a UDP_SEGMENT
+    control message; the kernel splits them back into datagrams.
+
+    Returns:
+        int: Number of sendmsg calls made
+
+    Raises:
+        OSError: When a send failed; its `sent` attribute is the number of
+            packets sent before the failed run
+    """
+    calls = 0
+    i = 0
+    while i < len(packets):
+        first = i
+        segment_size = len(packets[i])
+        run = [packets[i]]
+        total = segment_size
+        i += 1
+        while (i < len(packets) and len(run) < GSO_MAX_SEGMENTS
+               and total + len(packets[i]) <= GSO_MAX_BYTES
+               and len(packets[i]) <= segment_size):
+            run.append(packets[i])
+            total += len(packets[i])
+            i += 1
+            if len(run[-1]) < segment_size:
+                break  # only the last segment may be short
+
+        try:
+            if len(run) == 1:
+                sock.sendto(run[0], dest)
+            else:
+                sock.sendmsg([b"".join(run)], [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", segment_size))], 0, dest)
+        except OSError as e:
+            e.sent = first
+            raise
+        calls += 1
+    return calls
+
+
+class UdpEgress:
+    """Shared batched UDP sender for all RTP streams of the process"""
+
+    def __init__(self, config):
+        egress_config = (config or {}).get("media", {}).get("egress", {})
+        self.mode = egress_config.get("udp", "udpsink")
+        if self.mode not in EGRESS_MODES:
+            log.warning(f"[EGRESS] Unknown UDP egress mode '{self.mode}', using udpsink")
+            self.mode = "udpsink"
+        self.tick = egress_config.get("tick_ms", 2) / 1000.0
+        self.max_queue = egress_config.get("max_queue_packets", 4096)
+
+        self.sock = None
+        self.gso = False
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    @property
+    def enabled(self):
+        """True when pipelines should end in the egress appsink instead of udpsink"""
+        return self.mode != "udpsink"
+
+    def start(self):
+        """Open the shared socket and start the flush thread"""
+        if self.running:
+            return
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        if self.mode == "gso":
+            self.gso = gso_supported(self.sock)
+            if not self.gso:
+                log.warning("[EGRESS] UDP GSO not supported by this kernel, using sendmmsg")
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        log.info(f"[EGRESS] Batched UDP egress started ({'gso' if self.gso else 'sendmmsg'}, "
+                 f"tick {self.tick * 1000:.0f} ms)")
+
+    def stop(self):
+        """Flush remaining packets and stop the flush thread"""
+        if not self.running:
+            return
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(1)
+        self.flush()
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        log.info("[EGRESS] Batched UDP egress stopped")
+
+    def register_stream(self, stream_id, dest_ip, dest_port):
+        """Register (or re-point) a stream; counters survive re-registration"""
+        self.start()
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                stream = {
+                    "queue": collections.deque(),
+                    "ssrc": None,     # SSRC rewrite for the main destination (after a promotion)
+                    "mirrors": {},    # mirror ID -> {"dest", "ssrc"}
+                    "packets": 0,
+                    "bytes": 0,
+                    "batches": 0,
+                    "dropped": 0,
+                    "errors": 0,
+                    "error_logged": 0.0
+                }
+                self.streams[stream_id] = stream
+            stream["dest"] = (dest_ip, int(dest_port))
+        log.debug(f"[EGRESS] Stream {stream_id} registered for {dest_ip}:{dest_port}")
+
+    def add_mirror(self, stream_id, mirror_id, dest_ip, dest_port, ssrc):
+        """Also send a stream's packets to dest_ip:dest_port, rewritten to ssrc"""
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                return False
+            stream["mirrors"][mirror_id] = {"dest": (dest_ip, int(dest_port)), "ssrc": ssrc_bytes(ssrc)}
+        log.info(f"[EGRESS] Stream {stream_id} mirrored to {dest_ip}:{dest_port} (SSRC {ssrc})")
+        return True
+
+    def remove_mirror(self, stream_id, mirror_id):
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            return stream is not None and stream["mirrors"].pop(mirror_id, None) is not None
+
+    def promote_mirror(self, stream_id, mirror_id):
+        """Make a mirror the stream's main destination (its original receiver went away)"""
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            mirror = stream["mirrors"].pop(mirror_id, None) if stream else None
+            if mirror is None:
+                return False
+            stream["dest"], stream["ssrc"] = mirror["dest"], mirror["ssrc"]
+        log.info(f"[EGRESS] Stream {stream_id} now sent to mirror {mirror_id}")
+        return True
+
+    def unregister_stream(self, stream_id):
+        """Remove a stream and return its final counters"""
+        with self._lock:
+            stream = self.streams.pop(stream_id, None)
+        if stream is None:
+            return None
+        return self._stream_stats(stream)
+
+    def enqueue(self, stream_id, packet):
+        """Queue one RTP packet for the next flush"""
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            return False
+        queue = stream["queue"]
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            stream["dropped"] += 1
+        queue.append(packet)
+        return True
+
+    def attach_appsink(self, stream_id, appsink):
+        """Feed a pipeline's egress appsink into this sender"""
+        from gi.repository import Gst
+
+        def on_new_sample(sink):
+            sample = sink.emit("pull-sample")
+            if not sample:
+                return Gst.FlowReturn.ERROR
+            buffer = sample.get_buffer()
+            self.enqueue(stream_id, buffer.extract_dup(0, buffer.get_size()))
+            return Gst.FlowReturn.OK
+
+        appsink.connect("new-sample", on_new_sample)
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"[EGRESS] Flush error: {e}")
+
+    def flush(self):
+        """Send everything queued since the last tick"""
+        if not self.sock:
+            return
+        with self._lock:
+            streams = list(self.streams.values())
+
+        with self._flush_lock:
+            self._flush_streams(streams)
+
+    def _flush_streams(self, streams):
+        """Send the queued packets of every stream, mirrors included
+
+        A stream's packets are only counted once the kernel has taken them. When a
+        send fails on a full socket buffer the stream's unsent packets go back to
+        the front of its queue for the next tick; any other error drops just the
+        packet that failed, so one unreachable destination does not hold up the rest.
+        """
+        batches = []   # (stream, packets taken from its queue, packets done with)
+        packets = []
+        addresses = []
+        owners = []    # (batch index, main destination?) per packet in the sendmmsg list
+        stalled = False
+        for stream in streams:
+            queue = stream["queue"]
+            count = len(queue)
+            if not count:
+                continue
+            batch = [queue.popleft() for _ in range(count)]
+            stream["batches"] += 1
+            entry = [stream, batch, 0]
+            batches.append(entry)
+
+            sends = [(stream["dest"], rewrite_ssrc(batch, stream["ssrc"]), True)]
+            sends += [(mirror["dest"], rewrite_ssrc(batch, mirror["ssrc"]), False) for mirror in list(stream["mirrors"].values())]
+            for dest, copies, main in sends:
+                if not self.gso:
+                    packets.extend(copies)
+                    addresses.extend([dest] * count)
+                    owners.extend([(len(batches) - 1, main)] * count)
+                elif not stalled:
+                    stalled = not self._send_all(lambda start: self._send_gso(copies[start:], dest),
+                                                 copies, [(len(batches) - 1, main)] * count, batches)
+
+        if packets:
+            self._send_all(lambda start: sendmmsg(self.sock, packets[start:], addresses[start:]),
+                           packets, owners, batches)
+
+        for stream, batch, done in batches:
+            unsent = batch[done:]
+            if not unsent:
+                continue
+            queue = stream["queue"]
+            queue.extendleft(reversed(unsent))
+            while len(queue) > self.max_queue:
+                queue.popleft()
+                stream["dropped"] += 1
+
+    def _send_all(self, send, packets, owners, batches):
+        """Run send(start), which sends packets[start:], until every packet is sent or dropped
+
+        Returns:
+            bool: False when sending stopped on a transient error with packets left over
+        """
+        start = 0
+        while start < len(packets):
+            try:
+                sent, error = send(start), None
+            except OSError as e:
+                sent, error = getattr(e, "sent", 0), e
+            for i in range(start, start + sent):
+                self._done(batches, owners[i], packets[i], sent=True)
+            start += sent
+            if error is None:
+                continue
+
+            stream = batches[owners[start][0]][0]
+            stream["errors"] += 1
+            now = time.monotonic()
+            if now - stream["error_logged"] >= ERROR_LOG_INTERVAL:
+                stream["error_logged"] = now
+                dest = "%s:%d" % stream["dest"]
+                log.warning(f"[EGRESS] ⚠️ Send for stream to {dest} failed: {error} ({stream['errors']} errors so far)")
+            if error.errno in TRANSIENT_ERRORS:
+                return False
+            self._done(batches, owners[start], packets[start], sent=False)
+            start += 1
+        return True
+
+    def _send_gso(self, packets, dest):
+        """send_gso() counting packets sent, like sendmmsg()"""
+        send_gso(self.sock, packets, dest)
+        return len(packets)
+
+    @staticmethod
+    def _done(batches, owner, packet, sent):
+        """Account for one packet that was sent or dropped; only main-destination copies count"""
+        index, main = owner
+        if not main:
+            return
+        entry = batches[index]
+        stream = entry[0]
+        entry[2] += 1
+        if sent:
+            stream["packets"] += 1
+            stream["bytes"] += len(packet)
+        else:
+            stream["dropped"] += 1
+
+    def _stream_stats(self, stream):
+        return {
+            "dest": "%s:%d" % stream["dest"],
+            "packets_sent": stream["packets"],
+            "bytes_sent": stream["bytes"],
+            "batches": stream["batches"],
+            "dropped": stream["dropped"],
+            "errors": stream["errors"],
+            "queued": len(stream["queue"]),
+            "mirrors": len(stream["mirrors"])
+        }
+
+    def get_stats(self, stream_id=None):
+        """Get per-stream packet/byte counters (all streams if stream_id is None)"""
+        if stream_id is not None:
+            stream = self.streams.get(stream_id)
+            return self._stream_stats(stream) if stream else None
+        return {sid: self._stream_stats(s) for sid, s in list(self.streams.items())}
+
+
+# Global instance
+_udp_egress = None
+
+
+def get_udp_egress(config=None):
+    """Get or create the shared UdpEgress instance"""
+    global _udp_egress
+
+    if _udp_egress is None:
+        _udp_egress = UdpEgress(config)
+
+    return _udp_egress
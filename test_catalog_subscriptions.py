@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the catalog subscription table.
+Checks the expiry timer wheel, that bursts of channel changes reach each
+subscriber as a single NOTIFY, and that expired subscriptions are terminated.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from catalog_subscriptions import SubscriptionManager, TimerWheel
+from catalog_tracker import CatalogTracker
+
+DIALOG = {"remote_uri": "sip:34020000002000000001@10.0.0.1:5060", "from_header": "<sip:dev@10.0.0.2>;tag=a",
+          "to_header": "<sip:34020000002000000001@10.0.0.1>;tag=b", "event": "Catalog;id=7"}
+
+
+def _channel(name, status="ON"):
+    return {"name": name, "manufacturer": "GB28181-Restreamer", "model": "RTSP Camera",
+            "status": status, "parent_id": "81000000465001000001"}
+
+
+def _make_manager(**catalog_config):
+    tracker = CatalogTracker({})
+    tracker.update({"ch1": _channel("A"), "ch2": _channel("B")})
+    sent = []
+    done = threading.Event()
+
+    def send(subscription, events, state):
+        sent.append((subscription["call_id"], subscription["cseq"], events, state))
+        done.set()
+        return True
+
+    manager = SubscriptionManager({"sip": {"catalog": catalog_config}}, tracker, send)
+    return manager, tracker, sent, done
+
+
+def test_timer_wheel():
+    """Timers fire once their deadline passes, also after wrapping the wheel"""
+    wheel = TimerWheel(tick=1.0, slots=8, now=100.0)
+    wheel.schedule("a", 102.5)
+    wheel.schedule("b", 115.0)  # more than one turn of the wheel away
+    wheel.schedule("c", 103.0)
+    wheel.cancel("c")
+    assert wheel.advance(102.0) == []
+    assert wheel.advance(103.0) == ["a"]
+    assert wheel.advance(110.0) == [], "b stays in its slot until its own round"
+    assert wheel.advance(200.0) == ["b"] and len(wheel) == 0
+
+    wheel.schedule("d", 50.0)  # already due: fires on the next tick
+    assert wheel.advance(201.0) == ["d"]
+    print("✅ Timer wheel fires each timer once, at its deadline")
+    return True
+
+
+def test_coalesced_notify():
+    """A burst of changes within the window is one NOTIFY per subscriber"""
+    manager, tracker, sent, done = _make_manager(coalesce_window=0.2)
+    manager.start()
+    try:
+        assert manager.subscribe("sub-1", DIALOG, 600) == 600
+        assert manager.subscribe("sub-2", DIALOG, 10 ** 6) == 86400, "Expires is capped"
+
+        manager.publish(tracker.set_status("ch1", "OFF"))
+        manager.publish(tracker.update({"ch1": _channel("A", "OFF"), "ch2": _channel("B"), "ch3": _channel("C")}))
+        manager.publish(tracker.set_status("ch1", "ON"))
+        assert done.wait(2)
+        time.sleep(0.3)
+
+        assert sorted(call_id for call_id, *_ in sent) == ["sub-1", "sub-2"], sent
+        call_id, cseq, events, state = sent[0]
+        assert cseq == 1 and state.startswith("active;expires=")
+        assert {e["channel_id"]: e["event"] for e in events} == {"ch1": "ON", "ch3": "ADD"}
+        assert manager.get_stats()["coalesced"] == 2
+
+        manager.publish(tracker.update({"ch1": _channel("A"), "ch2": _channel("B"), "ch3": _channel("C")}))
+        time.sleep(0.4)
+        assert len(sent) == 2, "no changes, no NOTIFY"
+    finally:
+        manager.stop()
+    print("✅ Channel changes are coalesced into one NOTIFY per subscriber")
+    return True
+
+
+def test_expiry_and_unsubscribe():
+    """Expired subscriptions get a terminated NOTIFY; Expires: 0 removes without one"""
+    manager, tracker, sent, done = _make_manager()
+    manager.start()
+    try:
+        manager.subscribe("sub-1", DIALOG, 1)
+        manager.subscribe("sub-2", DIALOG, 600)
+        assert manager.subscribe("sub-2", DIALOG, 0) == 0
+        assert done.wait(3)
+        assert sent == [("sub-1", 1, [], "terminated;reason=timeout")], sent
+        assert manager.get_stats()["subscriptions"] == 0 and manager.get_stats()["expired"] == 1
+
+        manager.publish(tracker.set_status("ch1", "OFF"))
+        time.sleep(1.2)
+        assert len(sent) == 1, "no subscribers left to notify"
+    finally:
+        manager.stop()
+    print("✅ Subscriptions expire through the timer wheel")
+    return True
+
+
+def main():
+    tests = [
+        test_timer_wheel,
+        test_coalesced_notify,
+        test_expiry_and_unsubscribe,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for catalog versioning and change notifications.
+Checks that only changed channels produce ADD/DEL/ON/OFF/UPDATE events,
+that missed versions are merged into one batch, and the Notify XML.
+"""
+
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from catalog_tracker import CatalogTracker
+from gb28181_xml import format_catalog_notify
+
+
+def _channel(name, status="ON", **extra):
+    return {"name": name, "manufacturer": "GB28181-Restreamer", "model": "RTSP Camera",
+            "status": status, "parent_id": "81000000465001000001", **extra}
+
+
+def test_events_for_changed_channels():
+    """Unchanged catalogs produce nothing; each kind of change its own event"""
+    tracker = CatalogTracker({})
+    catalog = {"ch1": _channel("Front Door"), "ch2": _channel("Parking Lot")}
+    assert tracker.update(catalog) == [] and tracker.version == 1, "first snapshot is the baseline"
+    assert tracker.update(dict(catalog)) == [] and tracker.version == 1
+
+    changed = {
+        "ch1": _channel("Front Door", status="OFF", rtsp_url="rtsp://moved"),  # internal field ignored
+        "ch3": _channel("Lobby"),
+    }
+    events = {e["channel_id"]: e["event"] for e in tracker.update(changed)}
+    assert events == {"ch1": "OFF", "ch2": "DEL", "ch3": "ADD"}, events
+    assert tracker.version == 2
+
+    renamed = {**changed, "ch3": _channel("Main Lobby")}
+    assert [e["event"] for e in tracker.update(renamed)] == ["UPDATE"]
+    assert tracker.set_status("ch1", "ON")[0]["event"] == "ON"
+    assert tracker.set_status("ch1", "ON") == [] and tracker.set_status("missing", "OFF") == []
+    assert tracker.version == 4
+    print("✅ Only changed channels produce catalog events")
+    return True
+
+
+def test_changes_since_merges():
+    """A subscriber behind by several versions gets one merged batch"""
+    tracker = CatalogTracker({"sip": {"catalog": {"history": 3}}})
+    tracker.update({"ch1": _channel("A")})
+    tracker.update({"ch1": _channel("A"), "ch2": _channel("B")})            # v2: ch2 ADD
+    tracker.set_status("ch2", "OFF")                                        # v3: ch2 OFF
+    tracker.update({"ch2": _channel("B", status="OFF"), "ch3": _channel("C")})  # v4: ch1 DEL, ch3 ADD
+
+    merged = {e["channel_id"]: e for e in tracker.changes_since(1)}
+    assert {k: e["event"] for k, e in merged.items()} == {"ch1": "DEL", "ch2": "ADD", "ch3": "ADD"}
+    assert merged["ch2"]["info"]["status"] == "OFF", "ADD carries the latest fields"
+    assert tracker.changes_since(4) == []
+
+    tracker.update({"ch3": _channel("C")})                                  # v5 pushes v2 out of the history
+    assert tracker.changes_since(1) is None, "too old for the history: send the full catalog"
+    pending = [(e["channel_id"], e["event"]) for e in tracker.changes_since(3)]
+    assert pending == [("ch3", "ADD"), ("ch1", "DEL"), ("ch2", "DEL")], pending
+    print("✅ Missed versions are merged into one batch")
+    return True
+
+
+def test_notify_xml():
+    """Catalog Notify lists only the changed channels"""
+    events = [
+        {"channel_id": "ch1", "event": "OFF", "info": _channel("Front Door", status="OFF")},
+        {"channel_id": "ch3", "event": "ADD", "info": _channel("Lobby")},
+    ]
+    xml = format_catalog_notify("81000000465001000001", events, sn="42")
+    root = ET.fromstring(xml.split("?>", 1)[1])
+    assert root.tag == "Notify" and root.findtext("CmdType") == "Catalog" and root.findtext("SN") == "42"
+    assert root.findtext("SumNum") == "2" and root.find("DeviceList").get("Num") == "2"
+    items = root.find("DeviceList").findall("Item")
+    assert [(i.findtext("DeviceID"), i.findtext("Event")) for i in items] == [("ch1", "OFF"), ("ch3", "ADD")]
+    assert items[0].find("Name") is None, "ON/OFF items carry no channel fields"
+    assert items[1].findtext("Name") == "Lobby" and items[1].findtext("Status") == "ON"
+    print("✅ Catalog Notify carries only the changed channels")
+    return True
+
+
+def main():
+    tests = [
+        test_events_for_changed_channels,
+        test_changes_since_merges,
+        test_notify_xml,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test script for encoder admission control.
+Uses a fixed encode budget and a pinned host CPU reading to check cost
+estimates, stepping down under pressure and 486/503 rejections.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from encoder_governor import EncoderGovernor
+
+D1_SUPERFAST = {"width": 704, "height": 576, "framerate": 25, "bitrate": 1024, "speed_preset": "superfast"}
+
+
+def _make_governor(budget_cores=2.0, cpu=0.2):
+    governor = EncoderGovernor({"media": {"admission": {"budget_cores": budget_cores}}})
+    governor.host_cpu = lambda: cpu  # pin the host load reading
+    return governor
+
+
+def test_cost_estimate():
+    """Cost grows with the preset and the pixel rate"""
+    governor = _make_governor()
+    d1 = governor.estimate_cost(D1_SUPERFAST)
+    assert abs(d1 - 0.035 * 704 * 576 * 25 / 1e6) < 1e-9
+    assert governor.estimate_cost({**D1_SUPERFAST, "speed_preset": "ultrafast"}) < d1
+    assert governor.estimate_cost({**D1_SUPERFAST, "width": 352, "height": 288}) < d1 / 3
+    assert governor.estimate_cost({}) > d1, "missing keys use MediaStreamer's medium D1 default"
+    print("✅ Encode cost follows preset and pixel rate")
+    return True
+
+
+def test_admit_and_step_down():
+    """Sessions are admitted as requested until the soft limit, then stepped down"""
+    governor = _make_governor(budget_cores=2.0)
+    admitted = [governor.admit(f"call-{i}", D1_SUPERFAST) for i in range(3)]
+    assert all(a["status"] == 200 and not a["degraded"] for a in admitted)
+    assert admitted[0]["params"] == D1_SUPERFAST
+
+    # 4 x 0.355 cores would pass 70% of the 2-core budget
+    stepped = governor.admit("call-3", D1_SUPERFAST)
+    assert stepped["status"] == 200 and stepped["degraded"]
+    assert stepped["params"]["speed_preset"] == "ultrafast"
+    assert stepped["cost"] < admitted[0]["cost"]
+    assert governor.get_stats()["degraded"] == 1
+    print("✅ New sessions step down under encoder pressure")
+    return True
+
+
+def test_high_cpu_steps_down():
+    """High host CPU alone steps new sessions down, and resolution follows once presets run out"""
+    governor = _make_governor(budget_cores=8.0, cpu=0.8)
+    stepped = governor.admit("call-1", {**D1_SUPERFAST, "speed_preset": "ultrafast"})
+    assert stepped["status"] == 200 and stepped["degraded"]
+    assert (stepped["params"]["width"], stepped["params"]["height"]) == (640, 360)
+    assert stepped["params"]["bitrate"] < 1024
+    print("✅ High host CPU steps the resolution down")
+    return True
+
+
+def test_reject_when_saturated():
+    """486 once no step fits the budget, 503 when the host is overloaded"""
+    governor = _make_governor(budget_cores=0.4)
+    assert governor.admit("call-1", D1_SUPERFAST)["status"] == 200  # ultrafast D1
+    assert governor.admit("call-2", D1_SUPERFAST)["status"] == 200  # only fits at 360p
+    busy = governor.admit("call-3", D1_SUPERFAST)
+    assert (busy["status"], busy["reason"]) == (486, "Busy Here")
+
+    governor.release("call-1")
+    assert governor.admit("call-3", D1_SUPERFAST)["status"] == 200, "released budget is reused"
+
+    overloaded = _make_governor(cpu=0.97).admit("call-9", D1_SUPERFAST)
+    assert (overloaded["status"], overloaded["reason"]) == (503, "Service Unavailable")
+    stats = governor.get_stats()
+    assert stats["rejected_busy"] == 1 and stats["sessions"] == 2
+    print("✅ Saturated encoder budget answers 486, host overload 503")
+    return True
+
+
+def main():
+    tests = [
+        test_cost_estimate,
+        test_admit_and_step_down,
+        test_high_cpu_steps_down,
+        test_reject_when_saturated,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test script for INVITE handling in the pjsua-driven SIP client.
+Drives platform INVITEs through SIPClient._dispatch_invite with a stand-in
+media streamer and checks which session type is started and what the
+platform is answered.
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sip_handler_pjsip import SIPClient
+from media_workers import MediaWorkerPool
+from recording_manager import get_recording_manager
+from sip_dialog import ANSWERED, FAILED
+
+CHANNEL_ID = "81000000461310000001"
+RECORDING_START = datetime.datetime(2025, 6, 1, 10, 0, 0, tzinfo=datetime.timezone.utc).timestamp()
+
+CONFIG = {
+    "sip": {
+        "device_id": "81000000465001000001", "username": "81000000465001000001", "password": "admin123",
+        "server": "127.0.0.1", "port": 5060, "local_port": 5080, "server_id": "34020000002000000001"
+    },
+    "stream_directory": tempfile.mkdtemp(prefix="invite_sessions_"),
+    "media": {"admission": {"enabled": False}},
+    "rtsp_sources": [{"channel_id": CHANNEL_ID, "url": "rtsp://127.0.0.1/live"}]
+}
+
+
+class RecordingStreamer:
+    """Stands in for MediaStreamer and records the sessions it is asked to start"""
+
+    def __init__(self, fail=False):
+        self.started = []
+        self.fail = fail
+        self.on_stream_failed = None
+
+    def start_stream(self, **kwargs):
+        self.started.append(("live", kwargs))
+        return not self.fail
+
+    def start_recording_playback(self, **kwargs):
+        self.started.append(("playback", kwargs))
+        return not self.fail
+
+    def start_recording_download(self, **kwargs):
+        self.started.append(("download", kwargs))
+        return not self.fail
+
+    def get_playback_stream_id(self, dest_ip, dest_port, ssrc=None, mode="playback"):
+        return f"{dest_ip}:{dest_port}:{mode}:{ssrc}"
+
+    def stop_stream(self, stream_id=None):
+        pass
+
+
+def _make_client(streamer):
+    client = SIPClient({**CONFIG, "streamer": streamer})
+    client.sent = []
+    client._send_sip_response_udp = lambda message, platform=None: client.sent.append(
+        message.decode() if isinstance(message, bytes) else message) or True
+
+    # One hour of recordings starting 10:00 UTC, seeded once the startup scan is done with the cache
+    manager = get_recording_manager(CONFIG)
+    if manager.scan_thread:
+        manager.scan_thread.join(5)
+    path = os.path.join(CONFIG["stream_directory"], "10-00-00.mp4")
+    manager.metadata_cache = {path: {"path": path, "filename": "10-00-00.mp4", "timestamp": RECORDING_START,
+                                     "duration": 3600, "size": 450000000}}
+    manager.last_scan_time = time.time()
+    return client
+
+
+def _invite(call_id, session_name, start=0, stop=0):
+    sdp = "\r\n".join([
+        "v=0",
+        "o=34020000002000000001 0 0 IN IP4 10.0.0.1",
+        f"s={session_name}",
+        f"u={CHANNEL_ID}:0",
+        "c=IN IP4 10.0.0.1",
+        f"t={start} {stop}",
+        "m=video 30000 RTP/AVP 96",
+        "a=recvonly",
+        "a=rtpmap:96 PS/90000",
+        "y=1100000001",
+        ""
+    ])
+    return "\r\n".join([
+        f"INVITE sip:{CHANNEL_ID}@3402000000 SIP/2.0",
+        f"Via: SIP/2.0/UDP 127.0.0.1:5060;rport;branch=z9hG4bK{call_id}",
+        "From: <sip:34020000002000000001@3402000000>;tag=platform1",
+        f"To: <sip:{CHANNEL_ID}@3402000000>",
+        f"Call-ID: {call_id}",
+        "CSeq: 1 INVITE",
+        f"Subject: {CHANNEL_ID}:1100000001,34020000002000000001:0",
+        "Content-Type: application/sdp",
+        f"Content-Length: {len(sdp)}",
+        "",
+        sdp
+    ])
+
+
+def _wait_for_answer(client, call_id):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        dialog = client.dialogs.get(call_id)
+        if dialog and dialog.state in (ANSWERED, FAILED):
+            return dialog
+        time.sleep(0.05)
+    return client.dialogs.get(call_id)
+
+
+def test_playback_invite():
+    """A Playback INVITE streams the recordings of its t= window and answers s=Playback"""
+    streamer = RecordingStreamer()
+    client = _make_client(streamer)
+    start = int(RECORDING_START) + 1800
+    client._dispatch_invite("playback-1", _invite("playback-1", "Playback", start, start + 600))
+
+    dialog = _wait_for_answer(client, "playback-1")
+    assert dialog.state == ANSWERED, dialog.state
+    assert [kind for kind, _ in streamer.started] == ["playback"], streamer.started
+    kwargs = streamer.started[0][1]
+    assert kwargs["start_timestamp"] == start and kwargs["end_timestamp"] == start + 600
+    assert kwargs["segments"][0]["offset"] == 1800 and kwargs["segments"][0]["stop"] == 2400
+    assert kwargs["dest_ip"] == "10.0.0.1" and kwargs["dest_port"] == 30000 and kwargs["ssrc"] == "1100000001"
+    assert client.active_streams["playback-1"]["type"] == "playback"
+
+    answer = client.sent[-1]
+    assert answer.startswith("SIP/2.0 200 OK"), answer
+    assert "s=Playback" in answer and f"t={start} {start + 600}" in answer
+    print("✅ Playback INVITE streams the recorded window")
+    return True
+
+
+def test_download_and_missing_window():
+    """Download INVITEs are remuxed at their speed; a window without recordings gets 404"""
+    streamer = RecordingStreamer()
+    client = _make_client(streamer)
+    start = int(RECORDING_START)
+    download = _invite("download-1", "Download", start, start + 3600).replace(
+        "a=recvonly", "a=recvonly\r\na=downloadspeed:4")
+    client._dispatch_invite("download-1", download)
+    assert _wait_for_answer(client, "download-1").state == ANSWERED
+    assert streamer.started[0][0] == "download" and streamer.started[0][1]["speed"] == 4.0
+
+    client._dispatch_invite("playback-2", _invite("playback-2", "Playback", start - 7200, start - 3600))
+    assert _wait_for_answer(client, "playback-2").state == FAILED
+    assert client.sent[-1].startswith("SIP/2.0 404"), client.sent[-1]
+    assert len(streamer.started) == 1
+    print("✅ Download INVITEs are remuxed and empty windows are refused")
+    return True
+
+
+def test_port_pool_exhausted():
+    """With every RTP port leased a live INVITE is refused with 503 instead of reusing a port"""
+    streamer = RecordingStreamer()
+    client = _make_client(streamer)
+    holders = []
+    while client.port_manager.allocate(f"holder-{len(holders)}") is not None:
+        holders.append(f"holder-{len(holders)}")
+    try:
+        client._dispatch_invite("live-1", _invite("live-1", "Play"))
+        assert _wait_for_answer(client, "live-1").state == FAILED
+        assert client.sent[-1].startswith("SIP/2.0 503"), client.sent[-1]
+        assert streamer.started == []
+    finally:
+        for holder in holders:
+            client.port_manager.release(holder)
+    print("✅ Exhausted port pool answers 503")
+    return True
+
+
+def test_failed_invites_release_ports():
+    """Refused and failed INVITEs give their RTP port lease back right away"""
+    streamer = RecordingStreamer(fail=True)
+    client = _make_client(streamer)
+    free = len(client.port_manager.free_ports)
+    start = int(RECORDING_START)
+    client._dispatch_invite("live-fail", _invite("live-fail", "Play"))
+    client._dispatch_invite("playback-fail", _invite("playback-fail", "Playback", start, start + 600))
+    for call_id in ("live-fail", "playback-fail"):
+        assert _wait_for_answer(client, call_id).state == FAILED
+        assert call_id not in client.port_manager.leases, f"{call_id} still holds its port"
+    assert client.sent[-1].startswith("SIP/2.0 488"), client.sent[-1]
+    assert len(client.port_manager.free_ports) == free
+    assert not client.encoder_governor.release("live-fail"), "admission already given back"
+    print("✅ Failed INVITEs release their port leases")
+    return True
+
+
+def test_live_stream_on_worker_pool():
+    """Live streams start on the media worker pool, which has no in-process egress to mirror from"""
+    pool = MediaWorkerPool({**CONFIG, "media": {"workers": {"processes": 1}}})
+    pool.workers[0]["alive"] = True
+    calls = []
+    pool._call = lambda worker, method, *args, **kwargs: calls.append((method, args, kwargs)) or True
+    client = _make_client(pool)
+
+    for call_id in ("pool-1", "pool-2"):
+        assert client._start_streaming_to_platform(CHANNEL_ID, call_id, "10.0.0.1", 30000, "1100000001", "RTP/AVP")
+    assert [method for method, _, _ in calls] == ["start_stream", "start_stream"], calls
+    assert calls[0][1][:3] == ("rtsp://127.0.0.1/live", "10.0.0.1", 30000)
+    assert not client.active_streams["pool-2"].get("shared_from"), "no ingest sharing without the egress"
+    assert client._hand_over_stream("pool-1", client.active_streams["pool-1"]) is False
+    print("✅ Live streams start on the media worker pool")
+    return True
+
+
+def main():
+    tests = [
+        test_playback_invite,
+        test_download_and_missing_window,
+        test_port_pool_exhausted,
+        test_failed_invites_release_ports,
+        test_live_stream_on_worker_pool,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared keepalive scheduler.
+Checks that answered keepalives keep going, that unanswered or unsent ones
+trigger the timeout only after max_heartbeat_timeout misses in a row, and
+that intervals are spread by the configured jitter.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from keepalive_scheduler import KeepaliveScheduler
+
+
+def _scheduler(interval=0.05, max_missed=3, jitter=0.0):
+    scheduler = KeepaliveScheduler({"sip": {"heartbeat_interval": interval, "max_heartbeat_timeout": max_missed,
+                                            "heartbeat_jitter": jitter}})
+    scheduler.start()
+    return scheduler
+
+
+def test_acknowledged_keepalives():
+    """Keepalives the platform answers never time out"""
+    scheduler = _scheduler()
+    sent, timeouts = [], []
+
+    def send():
+        token = f"ka-{len(sent)}"
+        sent.append(token)
+        threading.Timer(0.01, scheduler.acknowledge, args=(token,)).start()
+        return token
+
+    scheduler.add("platform", send, timeouts.append, delay=0)
+    time.sleep(0.5)
+    scheduler.stop()
+    assert len(sent) >= 5, f"keepalives follow the interval ({len(sent)} sent)"
+    assert not timeouts
+    assert scheduler.get_stats("platform")["missed"] == 0 and scheduler.get_stats()["acknowledged"] >= 4
+    assert not scheduler.acknowledge("unknown")
+    print("✅ Answered keepalives keep the registration alive")
+    return True
+
+
+def test_timeout_after_missed():
+    """A lost answer is tolerated; max_heartbeat_timeout misses in a row trigger on_timeout"""
+    scheduler = _scheduler(max_missed=3)
+    sent, timeouts = [], []
+
+    def send():
+        sent.append(time.time())
+        if len(sent) == 1:
+            scheduler.acknowledge("lost")  # answers to other messages do not count
+        return f"ka-{len(sent)}"
+
+    def on_timeout(key):
+        timeouts.append((key, len(sent)))
+        scheduler.remove(key)
+
+    scheduler.add("platform", send, on_timeout, delay=0)
+    time.sleep(0.5)
+    scheduler.stop()
+    assert timeouts == [("platform", 3)], timeouts
+    assert len(sent) == 3, "keepalives stop once the key is removed"
+
+    failing = _scheduler(max_missed=2)
+    failures = []
+    failing.add("platform", lambda: None, failures.append, delay=0)
+    time.sleep(0.2)
+    failing.stop()
+    assert failures and failing.get_stats()["timeouts"] == len(failures)
+    print("✅ Re-registration only after consecutive missed keepalives")
+    return True
+
+
+def test_jittered_intervals():
+    """Intervals are spread by the jitter and first keepalives get a random phase"""
+    scheduler = KeepaliveScheduler({"sip": {"heartbeat_interval": 60, "heartbeat_jitter": 0.1}})
+    delays = [scheduler._next_delay() for _ in range(1000)]
+    assert all(54 <= d <= 66 for d in delays)
+    assert max(delays) - min(delays) > 6, "delays are actually spread"
+
+    scheduler.add("a", lambda: "x", lambda key: None)
+    scheduler.add("b", lambda: "y", lambda key: None)
+    due = sorted(entry[0] for entry in scheduler.heap)
+    assert due[1] - due[0] > 0 and all(d - time.time() <= 60 for d in due)
+
+    defaults = KeepaliveScheduler({})
+    assert (defaults.interval, defaults.max_missed) == (60, 3)
+    print("✅ Keepalive intervals are jittered")
+    return True
+
+
+def main():
+    tests = [
+        test_acknowledged_keepalives,
+        test_timeout_after_missed,
+        test_jittered_intervals,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
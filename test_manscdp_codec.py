@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the MANSCDP body codec.
+Checks that bodies go out in their declared encoding with a byte-correct
+Content-Length, that received GB2312 bodies decode, and that catalog items
+are cached with their encoded sizes.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from manscdp_codec import (CatalogItemCache, decode_sip_message, declared_encoding, encode_sip_message,
+                           encode_xml)
+
+BODY = """<?xml version="1.0" encoding="GB2312"?>
+<Response>
+<CmdType>Catalog</CmdType>
+<Item><Name>前门摄像机</Name></Item>
+</Response>"""
+
+
+def _message(body, content_length):
+    return ("MESSAGE sip:34020000002000000001@10.0.0.1:5060 SIP/2.0\n"
+            "Call-ID: abc\n"
+            "Content-Type: Application/MANSCDP+xml\n"
+            f"Content-Length: {content_length}\n\n{body}")
+
+
+def test_declared_encoding():
+    """Bodies are encoded as declared, falling back to UTF-8"""
+    assert declared_encoding(BODY) == "GB2312"
+    assert encode_xml(BODY) == BODY.encode("gbk")
+    assert len(encode_xml(BODY)) == len(BODY) + 5, "each Chinese character is two bytes in GB2312"
+
+    utf8 = BODY.replace("GB2312", "UTF-8")
+    assert encode_xml(utf8) == utf8.encode("utf-8")
+    assert encode_xml("<Query/>") == b"<Query/>"
+    assert encode_xml('<?xml version="1.0" encoding="GB2312"?><a>😀</a>').endswith(b"<a>&#128512;</a>")
+    assert encode_xml('<?xml version="1.0" encoding="x-unknown"?><a>é</a>').endswith("<a>é</a>".encode("utf-8"))
+    print("✅ Bodies are encoded in their declared encoding")
+    return True
+
+
+def test_sip_message_round_trip():
+    """Content-Length counts encoded bytes and received bodies decode as declared"""
+    wire = encode_sip_message(_message(BODY, len(BODY)))
+    head, body = wire.split(b"\n\n", 1)
+    assert body == BODY.encode("gbk")
+    assert f"Content-Length: {len(body)}".encode() in head
+
+    assert decode_sip_message(wire) == _message(BODY, len(body))
+    assert encode_sip_message("OPTIONS sip:x SIP/2.0\nContent-Length: 0") == b"OPTIONS sip:x SIP/2.0\nContent-Length: 0"
+    print("✅ SIP messages carry byte-correct Content-Length")
+    return True
+
+
+def test_catalog_item_cache():
+    """Items are built once per channel state and sized in GB2312 bytes"""
+    cache = CatalogItemCache("GB2312")
+    channel = {"name": "停车场摄像机一号位于北门入口处的高清摄像机", "status": "ON"}
+    xml, size = cache.item("ch1", channel, "81000000465001000001")
+    assert "<Name>停车场摄像机一号位于北门入口处的高清摄像</Name>" in xml, "names keep 20 whole characters"
+    assert size == len(xml.encode("gbk")) and size != len(xml.encode("utf-8"))
+
+    assert cache.item("ch1", dict(channel), "81000000465001000001")[0] is xml, "unchanged channels reuse the item"
+    offline, _ = cache.item("ch1", {**channel, "status": "OFF"}, "81000000465001000001")
+    assert "<Status>OFF</Status>" in offline
+
+    cache.item("ch2", {"name": "Lobby", "status": "ON"}, "81000000465001000001")
+    cache.prune({"ch2": {}})
+    assert list(cache._items) == ["ch2"]
+    print("✅ Catalog items are cached with their encoded sizes")
+    return True
+
+
+def main():
+    tests = [
+        test_declared_encoding,
+        test_sip_message_round_trip,
+        test_catalog_item_cache,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
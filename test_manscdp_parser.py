@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass MANSCDP parser.
+Checks that CmdType/SN/DeviceID are read without building a tree, that
+only RecordInfo and DeviceControl are fully parsed, and that the old
+parse helpers still return the same fields.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from gb28181_xml import scan_manscdp, parse_manscdp, parse_recordinfo_query, parse_xml_message
+
+CATALOG_MESSAGE = """MESSAGE sip:81000000465001000001@10.0.0.2:5080 SIP/2.0
+Via: SIP/2.0/UDP 10.0.0.1:5060;rport;branch=z9hG4bK123
+From: <sip:34020000002000000001@3402000000>;tag=abc
+To: <sip:81000000465001000001@3402000000>
+Call-ID: 1234@10.0.0.1
+CSeq: 20 MESSAGE
+Content-Type: Application/MANSCDP+xml
+Content-Length: 123
+
+<?xml version="1.0" encoding="GB2312"?>
+<!-- catalog query -->
+<Query>
+<CmdType>Catalog</CmdType>
+<SN> 17430 </SN>
+<DeviceID>81000000465001000001</DeviceID>
+</Query>
+"""
+
+RECORDINFO_QUERY = """<Query xmlns="http://www.chinamobile.com/wvmp">
+<CmdType>RecordInfo</CmdType>
+<SN>88</SN>
+<DeviceID>81000000465001000002</DeviceID>
+<StartTime>2025-06-01T00:00:00</StartTime>
+<EndTime>2025-06-01T23:59:59</EndTime>
+<Type>all</Type>
+</Query>"""
+
+CONTROL_MESSAGE = """<?xml version="1.0"?>
+<Control>
+<CmdType>DeviceControl</CmdType>
+<SN>9</SN>
+<DeviceID>81000000465001000001</DeviceID>
+<PTZCmd>A50F4D1000001021</PTZCmd>
+</Control>"""
+
+
+def test_scan_simple_query():
+    """Catalog queries are read from the raw SIP message without a tree"""
+    message = parse_manscdp(CATALOG_MESSAGE)
+    assert message["root"] == "Query", "SIP header <sip:...> URIs are not taken for the root"
+    assert (message["cmd_type"], message["sn"], message["device_id"]) == ("Catalog", "17430", "81000000465001000001")
+    assert "tree" not in message
+    assert message["xml"].startswith("<Query>") and message["xml"].endswith("</Query>")
+
+    keepalive = scan_manscdp("<Notify><CmdType>Keepalive</CmdType><SN>5</SN><DeviceID>x</DeviceID></Notify>trailing")
+    assert keepalive["root"] == "Notify" and keepalive["cmd_type"] == "Keepalive"
+    assert keepalive["xml"].endswith("</Notify>")
+    assert scan_manscdp("SIP/2.0 200 OK\nContent-Length: 0\n\n") is None
+    print("✅ Simple MANSCDP messages are scanned without a tree")
+    return True
+
+
+def test_tree_for_complex_queries():
+    """RecordInfo and DeviceControl are parsed once, with their own fields"""
+    record = parse_manscdp(RECORDINFO_QUERY)
+    assert record["tree"].tag == "Query", "namespace is stripped before parsing"
+    assert (record["start_time"], record["end_time"]) == ("2025-06-01T00:00:00", "2025-06-01T23:59:59")
+    assert record["device_id"] == "81000000465001000002"
+
+    control = parse_manscdp(CONTROL_MESSAGE)
+    assert control["root"] == "Control" and control["commands"] == {"PTZCmd": "A50F4D1000001021"}
+
+    assert parse_manscdp("<Query><CmdType>RecordInfo</CmdType><SN>1</SN>") is None, "malformed tree queries are dropped"
+    print("✅ Only RecordInfo and DeviceControl build a full tree")
+    return True
+
+
+def test_legacy_helpers():
+    """parse_recordinfo_query and parse_xml_message keep their results"""
+    query = parse_recordinfo_query(RECORDINFO_QUERY)
+    assert query == {"cmd_type": "RecordInfo", "device_id": "81000000465001000002", "sn": "88",
+                     "start_time": "2025-06-01T00:00:00", "end_time": "2025-06-01T23:59:59"}, query
+    assert parse_recordinfo_query(CATALOG_MESSAGE) is None
+
+    parsed = parse_xml_message(CATALOG_MESSAGE)
+    assert parsed == {"cmd_type": "Catalog", "device_id": "81000000465001000001", "sn": "17430"}, parsed
+    print("✅ Existing parse helpers return the same fields")
+    return True
+
+
+def main():
+    tests = [
+        test_scan_simple_query,
+        test_tree_for_complex_queries,
+        test_legacy_helpers,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for GB28181 MANSRTSP playback control parsing.
+Checks PLAY/PAUSE/Scale/Range extraction from SIP INFO messages.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from mansrtsp import extract_mansrtsp_body, parse_mansrtsp
+
+INFO_MESSAGE = (
+    "INFO sip:34020000001320000001@192.168.1.10:5060 SIP/2.0\r\n"
+    "Via: SIP/2.0/UDP 192.168.1.1:5060;branch=z9hG4bK776asdhds\r\n"
+    "From: <sip:34020000002000000001@3402000000>;tag=1928301774\r\n"
+    "To: <sip:34020000001320000001@3402000000>;tag=a6c85cf\r\n"
+    "Call-ID: playback-call-1\r\n"
+    "CSeq: 21 INFO\r\n"
+    "Content-Type: Application/MANSRTSP\r\n"
+    "Content-Length: 52\r\n"
+    "\r\n"
+    "PLAY MANSRTSP/1.0\r\n"
+    "CSeq: 3\r\n"
+    "Scale: 2.0\r\n"
+    "Range: npt=120-\r\n"
+)
+
+
+def test_play_with_scale_and_range():
+    """PLAY carries both Scale and a Range start"""
+    control = parse_mansrtsp(extract_mansrtsp_body(INFO_MESSAGE))
+    assert control["method"] == "PLAY", control
+    assert control["cseq"] == "3"
+    assert control["scale"] == 2.0
+    assert control["range_start"] == 120.0
+    assert control["range_end"] is None
+    print("✅ PLAY with Scale and Range parsed")
+    return True
+
+
+def test_pause_and_resume():
+    """PAUSE has no position; PLAY with npt=now- resumes in place"""
+    pause = parse_mansrtsp("PAUSE MANSRTSP/1.0\r\nCSeq: 4\r\nPauseTime: now\r\n")
+    assert pause["method"] == "PAUSE" and pause["range_start"] is None, pause
+
+    resume = parse_mansrtsp("PLAY RTSP/1.0\r\nCSeq: 5\r\nRange: npt=now-\r\n")
+    assert resume["method"] == "PLAY", resume
+    assert resume["range_start"] is None and resume["scale"] is None
+    print("✅ PAUSE and resume parsed")
+    return True
+
+
+def test_invalid_body():
+    """Non-MANSRTSP bodies are rejected"""
+    assert extract_mansrtsp_body("INFO sip:x SIP/2.0\r\n\r\n<Control/>") is None
+    assert parse_mansrtsp(None) is None
+    assert parse_mansrtsp("OPTIONS MANSRTSP/1.0\r\nCSeq: 1\r\n") is None
+    print("✅ Invalid bodies rejected")
+    return True
+
+
+def main():
+    tests = [
+        test_play_with_scale_and_range,
+        test_pause_and_resume,
+        test_invalid_body,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
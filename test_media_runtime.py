@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared media runtime command queue.
+Checks that pipeline commands are serialized per stream, run concurrently
+across streams, that a command can issue another one for its own stream,
+and that it cannot block on another stream's queue.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from media_runtime import MediaRuntime
+
+
+def test_serialized_per_stream():
+    """Start, stop and bus handlers of one stream never overlap and keep their order"""
+    runtime = MediaRuntime({"media": {"runtime": {"command_workers": 4}}})
+    events = []
+    running = [0]
+    overlap = [False]
+
+    def command(name):
+        running[0] += 1
+        overlap[0] = overlap[0] or running[0] > 1
+        time.sleep(0.02)
+        events.append(name)
+        running[0] -= 1
+        return name
+
+    futures = [runtime.submit("cam-1", command, name) for name in ("start", "error", "restart", "stop")]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert results == ["start", "error", "restart", "stop"], results
+    assert events == results
+    assert not overlap[0], "commands of one stream ran concurrently"
+    assert runtime.queues == {}
+    runtime.executor.shutdown()
+    print("✅ Commands of one stream run one at a time, in order")
+    return True
+
+
+def test_streams_concurrent():
+    """Slow pipeline starts of different streams do not queue behind each other"""
+    runtime = MediaRuntime({"media": {"runtime": {"command_workers": 4}}})
+    start = time.time()
+    futures = [runtime.submit(f"cam-{i}", time.sleep, 0.2) for i in range(4)]
+    for future in futures:
+        future.result(timeout=2)
+
+    assert time.time() - start < 0.6
+    runtime.executor.shutdown()
+    print("✅ Different streams start concurrently")
+    return True
+
+
+def test_nested_call_and_errors():
+    """A command restarting its own stream runs inline; failures reach the caller"""
+    runtime = MediaRuntime({})
+    thread_ids = []
+
+    def restart():
+        thread_ids.append(threading.get_ident())
+        return runtime.call("cam-1", start)
+
+    def start():
+        thread_ids.append(threading.get_ident())
+        return True
+
+    assert runtime.call("cam-1", restart) is True
+    assert len(thread_ids) == 2 and thread_ids[0] == thread_ids[1]
+
+    def broken():
+        raise RuntimeError("pipeline refused to start")
+
+    try:
+        runtime.call("cam-1", broken)
+        assert False, "exception was swallowed"
+    except RuntimeError:
+        pass
+    assert runtime.get_stats()["failed"] == 1
+    assert runtime.call("cam-1", lambda: "still working") == "still working"
+    runtime.executor.shutdown()
+    print("✅ Nested commands run inline and errors propagate")
+    return True
+
+
+def test_cross_stream_call_refused():
+    """A command cannot block its worker on another stream's queue, but can submit to it"""
+    runtime = MediaRuntime({"media": {"runtime": {"command_workers": 2}}})
+
+    def stop_other():
+        try:
+            runtime.call("cam-2", lambda: "stopped")
+            return "blocked"
+        except RuntimeError:
+            return runtime.submit("cam-2", lambda: "stopped")
+
+    future = runtime.call("cam-1", stop_other)
+    assert future != "blocked", "cross-stream call was allowed"
+    assert future.result(timeout=2) == "stopped"
+    assert runtime.get_stats()["failed"] == 0
+    runtime.executor.shutdown()
+    print("✅ Commands submit to other streams instead of blocking on them")
+    return True
+
+
+def main():
+    tests = [
+        test_serialized_per_stream,
+        test_streams_concurrent,
+        test_nested_call_and_errors,
+        test_cross_stream_call_refused,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
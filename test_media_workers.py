@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the multi-process media worker pool.
+Checks how streams and TCP-passive ports are sharded across workers, and
+that a crashed worker's streams are reported failed without touching the
+rest of the pool.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from media_workers import MediaWorkerPool, create_media_streamer
+
+
+def _make_pool(processes=3):
+    return MediaWorkerPool({"media": {
+        "tcp_passive_port_range": [30000, 30099],
+        "workers": {"processes": processes, "restart_delay": 0}
+    }})
+
+
+def test_port_shards():
+    """Each worker owns a disjoint slice of the TCP-passive port range"""
+    pool = _make_pool(3)
+    ranges = [worker["port_range"] for worker in pool.workers]
+    assert ranges == [[30000, 30032], [30033, 30065], [30066, 30099]], ranges
+
+    for port, owner in ((30000, 0), (30040, 1), (30099, 2)):
+        assert pool._port_owner(port)["index"] == owner
+    assert pool._pick_worker(local_port=30050)["index"] == 1, "TCP-passive streams go to the port owner"
+    print("✅ TCP-passive ports are sharded across workers")
+    return True
+
+
+def test_least_loaded_routing():
+    """New streams go to the least loaded live worker, later calls to the stream's owner"""
+    pool = _make_pool(3)
+    for worker in pool.workers:
+        worker["alive"] = True
+    pool.workers[0]["streams"] = {"a", "b"}
+    pool.workers[1]["streams"] = {"c"}
+    pool.workers[2]["alive"] = False
+
+    assert pool._pick_worker()["index"] == 1
+    pool.workers[1]["ports"] = {30040, 30041}
+    assert pool._pick_worker()["index"] == 0, "reserved ports count as load"
+    assert pool._stream_owner("c")["index"] == 1
+    assert pool._stream_owner("missing") is None
+    assert pool.get_active_streams_count() == 3
+    assert pool.get_playback_stream_id("10.0.0.2", 9000, "0100000001") == "10.0.0.2:9000:playback:0100000001"
+    print("✅ Streams are routed to the least loaded worker and then to their owner")
+    return True
+
+
+def test_worker_crash():
+    """A worker that dies reports its streams failed and fails pending calls"""
+    pool = _make_pool(2)
+    worker = pool.workers[0]
+    crashed = pool.context.Process(target=os._exit, args=(139,))  # stands in for a segfaulting worker
+    crashed.start()
+    parent_conn, child_conn = pool.context.Pipe()
+    child_conn.close()
+    pending_call = Future()
+    worker["pending"][1] = pending_call
+    worker.update({"process": crashed, "conn": parent_conn, "alive": True, "streams": {"s1", "s2"}})
+
+    failed = []
+    done = threading.Event()
+    pool.running = True
+
+    def on_stream_failed(stream_id):
+        failed.append(stream_id)
+        if len(failed) == 2:
+            pool.running = False  # do not respawn a real worker in this test
+            done.set()
+
+    pool.on_stream_failed = on_stream_failed
+    pool._read_loop(worker, parent_conn)
+
+    assert done.wait(1)
+    assert sorted(failed) == ["s1", "s2"], failed
+    assert not worker["alive"] and worker["streams"] == set()
+    assert pending_call.result(0)["error"] == "media worker exited"
+    assert pool._call(worker, "stop_stream", "s1") is None, "calls to a dead worker are dropped"
+    print("✅ Crashed worker's streams are reported failed")
+    return True
+
+
+def test_in_process_default():
+    """The pool replaces MediaStreamer only when media.workers.processes is set"""
+    pool = create_media_streamer({"media": {"workers": {"processes": 2}}})
+    assert isinstance(pool, MediaWorkerPool) and pool.processes == 2
+    auto = MediaWorkerPool({"media": {"workers": {"processes": "auto"}}})
+    assert auto.processes == (os.cpu_count() or 1)
+    print("✅ Worker pool is created only when configured")
+    return True
+
+
+def main():
+    tests = [
+        test_port_shards,
+        test_least_loaded_routing,
+        test_worker_crash,
+        test_in_process_default,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for the SIP message capture buffer.
+Checks that the buffer stays bounded, that dumps are written by the
+background writer (wire bytes decoded with their declared encoding), and
+that dumps on error are throttled and old dump files pruned.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from message_capture import MessageCapture
+from manscdp_codec import encode_sip_message
+
+
+def _capture(dump_dir, **settings):
+    return MessageCapture({"logging": {"capture": {"dump_dir": dump_dir, **settings}}})
+
+
+def test_bounded_buffer():
+    """Only the newest size records are kept; recording does no I/O"""
+    with tempfile.TemporaryDirectory() as dump_dir:
+        capture = _capture(dump_dir, size=5)
+        for i in range(12):
+            capture.record("pjsua", f"line {i}\n")
+        records = capture.snapshot()
+        assert [r[2] for r in records] == [f"line {i}\n" for i in range(7, 12)]
+        assert capture.get_stats()["recorded"] == 12 and capture.get_stats()["buffered"] == 5
+        assert not os.listdir(dump_dir), "nothing is written until a dump is asked for"
+
+        capture.record("tx", b"MESSAGE", sn="1")
+        assert [r[1] for r in capture.snapshot("tx")] == ["tx"]
+
+        off = _capture(dump_dir, enabled=False)
+        off.record("pjsua", "line")
+        assert not off.snapshot() and off.dump() is None
+    print("✅ The capture buffer is bounded")
+    return True
+
+
+def test_dump():
+    """dump() writes the snapshot on the writer thread, decoding wire bytes"""
+    with tempfile.TemporaryDirectory() as dump_dir:
+        capture = _capture(dump_dir)
+        capture.record("pjsua", "RX 512 bytes Request msg MESSAGE/cseq=20\n")
+        body = '<?xml version="1.0" encoding="GB2312"?>\n<Response><Name>大门摄像头</Name></Response>'
+        message = f"MESSAGE sip:a@b SIP/2.0\r\nContent-Type: Application/MANSCDP+xml\r\n\r\n{body}"
+        capture.record("tx", encode_sip_message(message), sn="20", to="10.0.0.1:5060")
+
+        path = capture.dump("manual")
+        assert path and os.path.dirname(path) == dump_dir
+        capture.flush()
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        assert "# manual: 2 records" in text and "PJSUA" in text and "TX sn=20 to=10.0.0.1:5060" in text
+        assert "大门摄像头" in text, "GB2312 bodies are decoded for the dump"
+        assert capture.get_stats()["dumps"] == 1
+    print("✅ Dumps are written in the background")
+    return True
+
+
+def test_error_dumps():
+    """Dumps on error are throttled and only the newest max_dumps files are kept"""
+    with tempfile.TemporaryDirectory() as dump_dir:
+        capture = _capture(dump_dir, min_dump_interval=60, max_dumps=2)
+        capture.record("pjsua", "line")
+        assert capture.error("send-1")
+        assert capture.error("send-2") is None, "a second error within min_dump_interval does not dump"
+        assert capture.get_stats()["errors"] == 2
+
+        for reason in ("a", "b", "c"):
+            capture.dump(reason)
+            capture.flush()
+            time.sleep(0.01)
+        names = sorted(os.listdir(dump_dir))
+        assert len(names) == 2 and names[-1].endswith("-c.log"), names
+
+        quiet = _capture(dump_dir, dump_on_error=False)
+        assert quiet.error("x") is None
+    print("✅ Error dumps are throttled and pruned")
+    return True
+
+
+def main():
+    tests = [
+        test_bounded_buffer,
+        test_dump,
+        test_error_dumps,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-platform registration.
+Checks that extra platforms inherit the primary's settings, that requests
+are mapped back to the platform that sent them, and that catalog views
+limit the channels a platform sees.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from platforms import PlatformRegistry
+
+CONFIG = {"sip": {
+    "device_id": "81000000465001000001", "username": "81000000465001000001", "password": "admin123",
+    "server": "10.0.0.1", "port": 5060, "server_id": "34020000002000000001", "server_domain": "3402000000",
+    "expires": 3600,
+    "platforms": [
+        {"name": "backup", "server": "10.0.0.11", "port": 5060, "server_id": "34020000002000000002",
+         "password": "backup123", "channels": ["81000000461310000001"]},
+        {"name": "disabled", "server": "10.0.0.12", "port": 5060, "enabled": False},
+        {"name": "duplicate", "server": "10.0.0.1", "port": 5060}
+    ]
+}}
+
+
+def test_registry():
+    """Extra platforms inherit the primary's settings; disabled and duplicate ones are skipped"""
+    registry = PlatformRegistry(CONFIG, "10.0.0.2", 5080)
+    assert [p.name for p in registry] == ["primary", "backup"]
+    primary, backup = registry.platforms
+    assert registry.primary is primary and "platforms" not in primary.sip_config
+    assert backup.sip_config["username"] == "81000000465001000001" and backup.sip_config["password"] == "backup123"
+    assert backup.sip_config["server_domain"] is None, "the primary's domain is not inherited"
+    assert backup.address == ("10.0.0.11", 5060) and registry.get("10.0.0.11:5060") is backup
+    assert backup.messages.server == "10.0.0.11" and backup.messages.local_port == 5080
+    assert registry.get("10.0.0.12:5060") is None
+
+    single = PlatformRegistry({"sip": {k: v for k, v in CONFIG["sip"].items() if k != "platforms"}}, "10.0.0.2", 5080)
+    assert len(single) == 1
+    print("✅ Platforms are merged with the primary's settings")
+    return True
+
+
+def test_resolve():
+    """Requests are mapped to their platform by server ID, then by host"""
+    registry = PlatformRegistry(CONFIG, "10.0.0.2", 5080)
+    primary, backup = registry.platforms
+    assert registry.resolve("From: <sip:34020000002000000002@3402000000>;tag=1") is backup
+    assert registry.resolve("From: <sip:34020000002000000001@3402000000>;tag=1") is primary
+    assert registry.resolve("", "Via: SIP/2.0/UDP 10.0.0.11:5060;branch=z9hG4bK1") is backup
+    assert registry.resolve("Via: SIP/2.0/UDP 10.0.0.111:5060;branch=z9hG4bK1") is primary, "hosts match whole"
+    assert registry.resolve(None, "") is primary
+    assert registry.resolve("sip:81000000465001000001@10.0.0.11: registration success") is backup
+    print("✅ Requests resolve to the platform that sent them")
+    return True
+
+
+def test_resolve_by_source():
+    """Without a server ID in the headers, the address pjsua received the request from decides"""
+    config = {"sip": {**CONFIG["sip"], "server": "localhost", "platforms": [
+        {"name": "second", "server": "127.0.0.1", "port": 5070},
+        {"name": "lab", "server": "10.0.0.21", "port": 5060}
+    ]}}
+    registry = PlatformRegistry(config, "10.0.0.2", 5080)
+    primary, second, lab = registry.platforms
+    assert not second.server_id and not lab.server_id
+    assert registry.resolve("From: <sip:34020000002000000009@3402000000>", source=("10.0.0.21", 5060)) is lab
+    assert registry.resolve(source=("127.0.0.1", 5070)) is second, "same host told apart by port"
+    assert registry.resolve(source=("127.0.0.1", 5060)) is primary, "hostname matched by its resolved IP"
+    assert registry.resolve("Via: SIP/2.0/UDP 10.0.0.21:5060", source=("127.0.0.1", 5070)) is lab
+    assert registry.resolve("From: <sip:34020000002000000001@3402000000>", source=("10.0.0.21", 5060)) is primary
+    assert registry.resolve(source=("10.0.0.21", 5999)) is lab, "source IP alone before the primary"
+    assert registry.resolve(source=("10.9.9.9", 5060)) is primary
+    print("✅ Requests resolve by source address before the primary")
+    return True
+
+
+def test_catalog_views():
+    """channels limits a platform's catalog view; no list means every channel"""
+    registry = PlatformRegistry(CONFIG, "10.0.0.2", 5080)
+    primary, backup = registry.platforms
+    assert primary.sees("81000000461310000001") and primary.sees("81000000461310000002")
+    assert backup.sees("81000000461310000001") and not backup.sees("81000000461310000002")
+    print("✅ Catalog views limit the channels a platform sees")
+    return True
+
+
+def main():
+    tests = [
+        test_registry,
+        test_resolve,
+        test_resolve_by_source,
+        test_catalog_views,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
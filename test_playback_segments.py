@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for mapping GB28181 playback windows onto recording files.
+Verifies that RecordingManager.get_playback_segments() picks every file that
+overlaps the requested window and computes the in-file seek offsets.
+"""
+
+import os
+import sys
+import time
+import datetime
+import tempfile
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from recording_manager import RecordingManager
+
+
+def _make_manager():
+    config = {
+        "sip": {"device_id": "34020000001320000001"},
+        "stream_directory": tempfile.mkdtemp(prefix="playback_segments_"),
+    }
+    manager = RecordingManager(config)
+    if manager.scan_thread:
+        manager.scan_thread.join(5)
+
+    # Three consecutive one-hour files starting at 10:00, 11:00 and 12:00 local time
+    base = datetime.datetime(2025, 6, 1, 10, 0, 0)
+    manager.metadata_cache = {}
+    for hour in range(3):
+        start = base + datetime.timedelta(hours=hour)
+        path = f"/recordings/2025-06-01/{start.strftime('%H-%M-%S')}.mp4"
+        manager.metadata_cache[path] = {
+            "path": path,
+            "filename": os.path.basename(path),
+            "date_time": start,
+            "timestamp": start.timestamp(),
+            "duration": 3600,
+        }
+    manager.last_scan_time = time.time()
+    return manager
+
+
+def test_window_inside_one_file():
+    """The last minute of a file seeks straight to it"""
+    manager = _make_manager()
+    segments = manager.get_playback_segments("20250601T105900Z", "20250601T110000Z")
+
+    assert len(segments) == 1, segments
+    assert segments[0]["filename"] == "10-00-00.mp4"
+    assert segments[0]["offset"] == 3540
+    assert segments[0]["stop"] is None
+    print("✅ Window inside one file maps to a single seek")
+    return True
+
+
+def test_window_spanning_files():
+    """A window crossing a file boundary spans consecutive files in order"""
+    manager = _make_manager()
+    segments = manager.get_playback_segments("20250601T103000Z", "20250601T121500Z")
+
+    assert [s["filename"] for s in segments] == ["10-00-00.mp4", "11-00-00.mp4", "12-00-00.mp4"]
+    assert segments[0]["offset"] == 1800 and segments[0]["stop"] is None
+    assert segments[1]["offset"] == 0 and segments[1]["stop"] is None
+    assert segments[2]["offset"] == 0 and segments[2]["stop"] == 900
+    print("✅ Window spanning files yields ordered segments with offsets")
+    return True
+
+
+def test_window_outside_recordings():
+    """A window with no recordings yields nothing"""
+    manager = _make_manager()
+    segments = manager.get_playback_segments("20250601T080000Z", "20250601T090000Z")
+
+    assert segments == [], segments
+    print("✅ Window outside recordings yields no segments")
+    return True
+
+
+def test_window_in_unix_seconds():
+    """SDP t= seconds select the same files as the equivalent local time strings"""
+    manager = _make_manager()
+    start = datetime.datetime(2025, 6, 1, 10, 30, 0).timestamp()
+    segments = manager.get_playback_segments(int(start), int(start) + 6300)
+
+    assert [s["filename"] for s in segments] == ["10-00-00.mp4", "11-00-00.mp4", "12-00-00.mp4"]
+    assert segments[0]["offset"] == 1800 and segments[2]["stop"] == 900
+    assert manager._parse_time_string("20250601T103000Z") == start
+    print("✅ Unix second windows map like their local time strings")
+    return True
+
+
+def test_window_outside_utc():
+    """On a host east of UTC every window form lines up with recordings filed by local date and time"""
+    saved = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Shanghai"
+    time.tzset()
+    try:
+        manager = _make_manager()
+        path = os.path.join(manager.recordings_directory, "2025-06-01", "10-00-00.mp4")
+        recorded = manager._extract_datetime_from_path(path).timestamp()
+        assert recorded == datetime.datetime(2025, 6, 1, 2, 0, 0, tzinfo=datetime.timezone.utc).timestamp()
+        manager.metadata_cache = {path: {"path": path, "filename": "10-00-00.mp4",
+                                         "timestamp": recorded, "duration": 3600}}
+
+        for start, end in (("20250601T103000Z", "20250601T104000Z"),
+                           ("2025-06-01T10:30:00", "2025-06-01T10:40:00"),
+                           ("2025-06-01T02:30:00+00:00", "2025-06-01T02:40:00+00:00"),
+                           (int(recorded) + 1800, int(recorded) + 2400)):
+            segments = manager.get_playback_segments(start, end)
+            assert len(segments) == 1, (start, segments)
+            assert segments[0]["offset"] == 1800 and segments[0]["stop"] == 2400, (start, segments)
+    finally:
+        if saved is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = saved
+        time.tzset()
+    print("✅ Windows map onto recordings the same way away from UTC")
+    return True
+
+
+def main():
+    tests = [
+        test_window_inside_one_file,
+        test_window_spanning_files,
+        test_window_outside_recordings,
+        test_window_in_unix_seconds,
+        test_window_outside_utc,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the media port lease manager.
+Checks even/odd pairing, FIFO reuse, idempotent leases, expiry and
+exhaustion metrics.
+"""
+
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from port_manager import PortLeaseManager
+
+
+def _make_manager(start=10001, end=10010, timeout=300):
+    return PortLeaseManager({"media": {"rtp_port_range": [start, end], "port_lease_timeout": timeout}})
+
+
+def test_even_pairs():
+    """Leases are even RTP ports with room for the odd RTCP port"""
+    manager = _make_manager()
+    ports = [manager.allocate(f"call-{i}") for i in range(4)]
+    assert ports == [10002, 10004, 10006, 10008], ports
+    assert manager.allocate("call-4") is None, "10010 has no RTCP port inside the range"
+    print("✅ Leases are even/odd RTP/RTCP pairs")
+    return True
+
+
+def test_idempotent_and_fifo_reuse():
+    """Re-allocating for the same call returns its port; released ports go to the back"""
+    manager = _make_manager()
+    first = manager.allocate("call-a")
+    assert manager.allocate("call-a") == first
+    assert manager.release("call-a")
+    assert not manager.release("call-a")
+    assert manager.allocate("call-b") != first, "a just-released port must not be reused first"
+    print("✅ Leases are idempotent and released ports are reused last")
+    return True
+
+
+def test_expiry_and_exhaustion():
+    """Expired leases are reclaimed on exhaustion and metrics are counted"""
+    manager = _make_manager(10000, 10004, timeout=0.1)
+    manager.allocate("old-1")
+    manager.allocate("old-2", timeout=60)
+    assert manager.allocate("new") is None
+
+    time.sleep(0.2)
+    assert manager.renew("old-2")
+    port = manager.allocate("new")
+    assert port == 10000, port
+
+    stats = manager.get_stats()
+    assert stats["exhaustions"] == 1 and stats["expirations"] == 1, stats
+    assert stats["in_use"] == 2 and stats["peak_in_use"] == 2, stats
+    print("✅ Expired leases are reclaimed and exhaustion is counted")
+    return True
+
+
+def test_reserved_block():
+    """A reserved block is never leased"""
+    manager = _make_manager(10000, 10020)
+    assert manager.reserve_block("pjsua", 4) == 10000
+    assert manager.allocate("call") == 10008
+    assert manager.reserve_block("again", 1) is None
+    print("✅ Reserved block is kept out of the pool")
+    return True
+
+
+def main():
+    tests = [
+        test_even_pairs,
+        test_idempotent_and_fifo_reuse,
+        test_expiry_and_exhaustion,
+        test_reserved_block,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
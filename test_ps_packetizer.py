@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the native GB28181 PS-over-RTP packetizer.
+Checks PS header layout, PES splitting, RTP framing and RFC 4571 TCP output.
+"""
+
+import os
+import sys
+import socket
+import struct
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from ps_packetizer import (
+    PSRtpPacketizer, PSRtpSender, build_pack_header, build_psm,
+    build_pes_packets, mpeg_crc32, gb28181_ssrc, MAX_PES_PAYLOAD
+)
+
+KEYFRAME = b"\x00\x00\x00\x01\x67" + b"\x11" * 20 + b"\x00\x00\x00\x01\x65" + b"\x22" * 5000
+
+
+def test_ps_headers():
+    """Pack header, PSM CRC and PES timestamps are well formed"""
+    pack = build_pack_header(90000)
+    assert len(pack) == 14 and pack[:4] == b"\x00\x00\x01\xba", pack
+
+    psm = build_psm()
+    assert psm[:4] == b"\x00\x00\x01\xbc"
+    assert struct.unpack("!H", psm[4:6])[0] == len(psm) - 6
+    assert mpeg_crc32(psm) == 0, "PSM CRC must validate to zero"
+
+    pes = build_pes_packets(b"\x00" * (MAX_PES_PAYLOAD + 10), pts=3600)
+    headers = pes[0::2]
+    assert len(headers) == 2, len(headers)
+    assert headers[0][7] == 0x80 and headers[1][7] == 0x00, "only the first PES carries a PTS"
+    print("✅ PS headers are well formed")
+    return True
+
+
+def test_rtp_packetization():
+    """Frames split to MTU with marker on the last packet and a GB28181 SSRC"""
+    packetizer = PSRtpPacketizer("0100000001", mtu=1400)
+    packets = packetizer.packetize(KEYFRAME, pts=3600, keyframe=True)
+    assert len(packets) > 1
+    assert all(len(p) <= 1400 + 12 for p in packets)
+
+    for i, packet in enumerate(packets):
+        v, m_pt, seq, ts, ssrc = struct.unpack("!BBHII", packet[:12])
+        assert v == 0x80 and (m_pt & 0x7F) == 96
+        assert seq == i and ts == 3600
+        assert ssrc == 100000001
+        assert bool(m_pt & 0x80) == (i == len(packets) - 1)
+
+    assert gb28181_ssrc("1340200001") == 1340200001
+    print("✅ RTP packetization follows GB28181 rules")
+    return True
+
+
+def test_timestamp_rebase():
+    """RTP timestamps keep increasing when the source PTS restarts"""
+    packetizer = PSRtpPacketizer("0100000001")
+    first = packetizer.packetize(b"\x00" * 10, pts=900000)
+    second = packetizer.packetize(b"\x00" * 10, pts=0)
+    ts1 = struct.unpack("!I", first[0][4:8])[0]
+    ts2 = struct.unpack("!I", second[0][4:8])[0]
+    assert ts2 > ts1, (ts1, ts2)
+    print("✅ Timestamps stay monotonic across source restarts")
+    return True
+
+
+def test_tcp_framing():
+    """RFC 4571 framing prefixes every RTP packet with its length"""
+    left, right = socket.socketpair()
+    sender = PSRtpSender("127.0.0.1", 9, "0100000001", transport="TCP/RTP/AVP", sock=left)
+    assert sender.send_frame(KEYFRAME, pts=3600, keyframe=True)
+    left.close()
+
+    data = b""
+    while True:
+        chunk = right.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    right.close()
+
+    count = 0
+    offset = 0
+    while offset < len(data):
+        length = struct.unpack("!H", data[offset:offset + 2])[0]
+        assert data[offset + 2] == 0x80
+        offset += 2 + length
+        count += 1
+    assert offset == len(data) and count == sender.get_stats()["packets_sent"]
+    print("✅ TCP output is RFC 4571 framed")
+    return True
+
+
+def test_pacing_change():
+    """A running sender's pacing follows its new rate without losing the bucket"""
+    sender = PSRtpSender("127.0.0.1", 9, "0100000001", pacing_kbps=8000)
+    pacer = sender.pacer
+    assert pacer.rate == 1000000
+    sender.set_pacing(4000)
+    assert sender.pacer is pacer and pacer.rate == 500000
+    sender.set_pacing(None)
+    assert sender.pacer is None
+    sender.set_pacing(800)
+    assert sender.pacer.rate == 100000
+    print("✅ Pacing follows rate changes of a running sender")
+    return True
+
+
+def main():
+    tests = [
+        test_ps_headers,
+        test_rtp_packetization,
+        test_timestamp_rebase,
+        test_tcp_framing,
+        test_pacing_change,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-source query rate limiter.
+Checks that a source may burst up to its bucket size and is then held to
+the refill rate, that sources do not share buckets, and that the limiter
+can be turned off.
+"""
+
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from rate_limiter import SourceRateLimiter
+
+
+def _limiter(**settings):
+    return SourceRateLimiter({"sip": {"rate_limit": settings}})
+
+
+def test_burst_then_rate():
+    """A flood is shed once the burst is used up; the bucket refills at rate"""
+    limiter = _limiter(rate=20, burst=5)
+    results = [limiter.allow("10.0.0.1") for _ in range(10)]
+    assert results == [True] * 5 + [False] * 5, results
+    time.sleep(0.12)  # ~2.4 tokens
+    assert limiter.allow("10.0.0.1") and limiter.allow("10.0.0.1") and not limiter.allow("10.0.0.1")
+    stats = limiter.get_stats()
+    assert stats["allowed"] == 7 and stats["shed"] == 6
+    assert limiter.get_stats("10.0.0.1")["shed"] == 6
+    print("✅ Floods are shed after the burst")
+    return True
+
+
+def test_sources_are_independent():
+    """One flooding source does not use up another source's bucket"""
+    limiter = _limiter(rate=1, burst=3)
+    for _ in range(10):
+        limiter.allow("10.0.0.66")
+    assert all(limiter.allow("10.0.0.1") for _ in range(3))
+    assert limiter.allow("") and limiter.allow(None), "unknown sources are not limited"
+    assert limiter.get_stats()["sources"] == 2
+    print("✅ Buckets are kept per source")
+    return True
+
+
+def test_disabled():
+    """enabled: false lets everything through"""
+    limiter = _limiter(enabled=False, rate=1, burst=1)
+    assert all(limiter.allow("10.0.0.1") for _ in range(100))
+    defaults = SourceRateLimiter({})
+    assert defaults.enabled and (defaults.rate, defaults.burst) == (5, 20)
+    print("✅ The limiter can be disabled")
+    return True
+
+
+def main():
+    tests = [
+        test_burst_then_rate,
+        test_sources_are_independent,
+        test_disabled,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared live-source reconnect scheduler.
+Uses fake reconnect callables to check request coalescing, backoff with
+jitter, the concurrency cap and the circuit breaker.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from reconnect_scheduler import ReconnectScheduler, CLOSED, OPEN, HALF_OPEN
+
+
+def _make_scheduler(**overrides):
+    settings = {
+        "base_delay": 0.02,
+        "max_delay": 0.2,
+        "multiplier": 2.0,
+        "jitter": 0.5,
+        "max_concurrent": 2,
+        "failure_threshold": 3,
+        "open_timeout": 0.3,
+        "stable_time": 0.1
+    }
+    settings.update(overrides)
+    return ReconnectScheduler({"media": {"reconnect": settings}})
+
+
+def _wait_for(predicate, timeout=2.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_single_in_flight():
+    """Repeated errors for one stream result in a single reconnect"""
+    scheduler = _make_scheduler()
+    calls = []
+    for _ in range(10):
+        scheduler.request("cam-1", lambda: calls.append(1) or True, source="rtsp://cam1")
+
+    assert _wait_for(lambda: calls)
+    time.sleep(0.1)
+    assert len(calls) == 1, calls
+    assert scheduler.stats["coalesced"] == 9
+    scheduler.stop()
+    print("✅ Overlapping recovery requests are merged into one")
+    return True
+
+
+def test_backoff_with_jitter():
+    """Delays grow exponentially, stay capped and are jittered"""
+    scheduler = _make_scheduler(base_delay=1.0, max_delay=8.0)
+    for attempts, nominal in ((0, 1.0), (1, 2.0), (2, 4.0), (3, 8.0), (10, 8.0)):
+        delays = [scheduler._delay(attempts) for _ in range(50)]
+        assert all(nominal * 0.5 <= d <= nominal for d in delays), (attempts, min(delays), max(delays))
+        assert len(set(delays)) > 1, "delays must be jittered"
+    scheduler.stop()
+    print("✅ Backoff grows exponentially with jitter up to max_delay")
+    return True
+
+
+def test_concurrency_cap():
+    """No more than max_concurrent reconnects run at the same time"""
+    scheduler = _make_scheduler(max_concurrent=2)
+    running = [0]
+    peak = [0]
+    done = []
+    lock = threading.Lock()
+
+    def reconnect():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+            done.append(1)
+        return True
+
+    for i in range(6):
+        scheduler.request(f"cam-{i}", reconnect)
+    assert _wait_for(lambda: len(done) == 6)
+    assert peak[0] == 2, peak
+    scheduler.stop()
+    print("✅ Reconnect storm is capped at max_concurrent")
+    return True
+
+
+def test_circuit_breaker():
+    """A source that keeps failing opens its circuit, then closes once healthy again"""
+    scheduler = _make_scheduler()
+    states = []
+    scheduler.add_listener(lambda source, state: states.append(state))
+    camera_up = [False]
+    attempts = []
+
+    def reconnect():
+        attempts.append(time.time())
+        return camera_up[0]
+
+    scheduler.request("cam-1", reconnect, source="rtsp://cam1")
+    assert _wait_for(lambda: scheduler.get_source_state("rtsp://cam1") == OPEN)
+    failed_attempts = len(attempts)
+    assert failed_attempts == 3, failed_attempts
+
+    # While open no attempts are made until the open timeout passes
+    time.sleep(0.15)
+    assert len(attempts) == failed_attempts
+
+    camera_up[0] = True
+    assert _wait_for(lambda: len(attempts) > failed_attempts)
+    assert _wait_for(lambda: not scheduler.get_stats("cam-1")["pending"])
+    assert scheduler.get_source_state("rtsp://cam1") == HALF_OPEN
+    scheduler.report_healthy("cam-1")
+    assert scheduler.get_source_state("rtsp://cam1") == CLOSED
+    assert states == [OPEN, HALF_OPEN, CLOSED], states
+    scheduler.stop()
+    print("✅ Circuit breaker opens on repeated failures and closes on recovery")
+    return True
+
+
+def main():
+    tests = [
+        test_single_in_flight,
+        test_backoff_with_jitter,
+        test_concurrency_cap,
+        test_circuit_breaker,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
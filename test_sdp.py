@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the GB28181 SDP parser and answer template.
+Parses Play, Download and TCP offers as sent by WVP and checks the typed
+fields and the rendered answer.
+"""
+
+import os
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sdp import parse_sdp, build_sdp_answer
+
+PLAY_INVITE = (
+    "INVITE sip:34020000001320000001@192.168.1.10:5080 SIP/2.0\r\n"
+    "Call-ID: 1234@192.168.1.2\r\n"
+    "Content-Type: APPLICATION/SDP\r\n"
+    "Content-Length: 250\r\n"
+    "\r\n"
+    "v=0\r\n"
+    "o=34020000001320000001 0 0 IN IP4 192.168.1.2\r\n"
+    "s=Play\r\n"
+    "c=IN IP4 192.168.1.2\r\n"
+    "t=0 0\r\n"
+    "m=video 30002 TCP/RTP/AVP 96 97 98\r\n"
+    "a=recvonly\r\n"
+    "a=rtpmap:96 PS/90000\r\n"
+    "a=rtpmap:97 MPEG4/90000\r\n"
+    "a=rtpmap:98 H264/90000\r\n"
+    "a=setup:active\r\n"
+    "a=connection:new\r\n"
+    "y=0100000001\r\n"
+    "f=v/2/5/25/1/4000a///\r\n"
+)
+
+DOWNLOAD_SDP = """v=0
+o=34020000001320000001 0 0 IN IP4 10.0.0.5
+s=Download
+u=34020000001320000001:0
+c=IN IP4 10.0.0.5
+t=1748772000 1748775600
+m=video 6000 RTP/AVP 96
+a=recvonly
+a=rtpmap:96 PS/90000
+a=downloadspeed:4
+y=1100000002
+"""
+
+
+def test_play_offer():
+    """Typed access to c=/m=/a=rtpmap/a=setup/y=/f= of a Play offer"""
+    sdp = parse_sdp(PLAY_INVITE)
+    assert sdp.session_type == "Play" and not sdp.is_playback
+    assert sdp.dest_ip == "192.168.1.2" and sdp.dest_port == 30002
+    assert sdp.transport == "TCP/RTP/AVP" and sdp.is_tcp and sdp.setup == "active"
+    assert sdp.video.payload_type_for("PS") == "96"
+    assert sdp.video.payload_type_for("H264") == "98"
+    assert sdp.video.direction == "recvonly"
+    assert sdp.ssrc == "0100000001"
+    assert sdp.video_format == {"codec": "h264", "width": 1280, "height": 720, "framerate": 25}
+    print("✅ Play offer parsed")
+    return True
+
+
+def test_download_offer():
+    """Download sessions expose window and speed"""
+    sdp = parse_sdp(DOWNLOAD_SDP)
+    assert sdp.is_download and sdp.download_speed == 4.0
+    assert (sdp.start_time, sdp.stop_time) == (1748772000, 1748775600)
+    assert not sdp.is_tcp and sdp.setup is None
+    assert sdp.uri == "34020000001320000001:0"
+    print("✅ Download offer parsed")
+    return True
+
+
+def test_no_sdp():
+    """Messages without SDP yield None; partial log output is still usable"""
+    assert parse_sdp("OPTIONS sip:x SIP/2.0\r\nCall-ID: 1\r\n\r\n") is None
+    partial = parse_sdp("RX 512 bytes\nc=IN IP4 10.1.1.1\nm=video 9000 RTP/AVP 96\n--end msg--")
+    assert partial.dest_ip == "10.1.1.1" and partial.dest_port == 9000
+    print("✅ Missing and partial SDP handled")
+    return True
+
+
+def test_answer_roundtrip():
+    """The answer template renders a parseable GB28181 answer"""
+    answer = build_sdp_answer("192.168.1.10", "192.168.1.10", 30010, "TCP/RTP/AVP", "96", "PS/90000",
+                              "0100000001", setup="passive", session_id=17)
+    assert answer.endswith("\r\n") and answer.count("a=rtpmap:") == 1
+
+    sdp = parse_sdp(answer)
+    assert sdp.dest_port == 30010 and sdp.setup == "passive"
+    assert sdp.video.direction == "sendonly" and sdp.ssrc == "0100000001"
+    assert "a=setup" not in build_sdp_answer("1.1.1.1", "1.1.1.1", 10000, "RTP/AVP", "96",
+                                             "PS/90000", "1")
+    print("✅ Answer template round-trips")
+    return True
+
+
+def main():
+    tests = [
+        test_play_offer,
+        test_download_offer,
+        test_no_sdp,
+        test_answer_roundtrip,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
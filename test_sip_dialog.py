@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for per-Call-ID SIP dialog state.
+Checks the INVITE state machine, retransmission detection and that several
+INVITEs are set up concurrently on the dialog workers.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sip_dialog import DialogManager, INVITED, TRYING, PREROLLING, ANSWERED, CONFIRMED, TERMINATING, TERMINATED, FAILED
+
+
+def test_state_machine():
+    """A dialog follows INVITE -> 100 -> 200 -> ACK -> BYE and rejects skipped steps"""
+    manager = DialogManager({})
+    dialog, is_new = manager.create("call-1", {"via": "Via: SIP/2.0/UDP 10.0.0.1:5060"})
+    assert is_new and dialog.state == INVITED
+
+    assert not dialog.transition(ANSWERED), "200 OK cannot be sent before preroll"
+    assert dialog.state == INVITED
+
+    for state in (TRYING, PREROLLING, ANSWERED, CONFIRMED, TERMINATING, TERMINATED):
+        assert dialog.transition(state), state
+    assert dialog.is_final
+    assert dialog.setup_time is not None
+    assert [state for state, _ in dialog.history][-1] == TERMINATED
+    manager.shutdown()
+    print("✅ Dialog state machine enforces INVITE → 100 → 200 → ACK → BYE")
+    return True
+
+
+def test_retransmission():
+    """A second INVITE with the same Call-ID returns the existing dialog"""
+    manager = DialogManager({})
+    first, _ = manager.create("call-1", {"cseq": "CSeq: 1 INVITE"})
+    again, is_new = manager.create("call-1", {"cseq": "CSeq: 1 INVITE"})
+    assert again is first and not is_new
+
+    other, is_new = manager.create("call-2", {"cseq": "CSeq: 7 INVITE"})
+    assert is_new and other.local_tag and other.headers["cseq"] == "CSeq: 7 INVITE"
+    assert first.headers["cseq"] == "CSeq: 1 INVITE", "headers are kept per dialog"
+    manager.shutdown()
+    print("✅ Retransmitted INVITEs map to the existing dialog")
+    return True
+
+
+def test_expiry():
+    """Final dialogs linger for retransmissions and are then dropped"""
+    manager = DialogManager({"sip": {"dialog_linger": 0}})
+    dialog, _ = manager.create("call-1")
+    dialog.transition(FAILED)
+    active, _ = manager.create("call-2")
+    active.transition(TRYING)
+    time.sleep(0.01)
+
+    manager.create("call-3")
+    assert manager.get("call-1") is None
+    assert manager.get("call-2") is active
+    assert manager.get_stats() == {TRYING: 1, INVITED: 1}
+    manager.shutdown()
+    print("✅ Finished dialogs expire after the linger time")
+    return True
+
+
+def test_teardown():
+    """BYE/CANCEL end dialogs from any live state and are counted by reason"""
+    manager = DialogManager({})
+    answered, _ = manager.create("call-1")
+    for state in (TRYING, PREROLLING, ANSWERED, CONFIRMED):
+        answered.transition(state)
+    cancelled, _ = manager.create("call-2")
+    cancelled.transition(TRYING)
+    cancelled.transition(PREROLLING)
+
+    for dialog, reason in ((answered, "bye"), (cancelled, "cancel")):
+        assert dialog.transition(TERMINATING) and dialog.transition(TERMINATED)
+        manager.record_teardown(reason, 0.004)
+    assert not cancelled.transition(ANSWERED), "a cancelled INVITE must not be answered"
+
+    manager.record_teardown("bye", 0.002)
+    assert manager.teardowns == {"bye": 2, "cancel": 1}
+    assert abs(manager.last_teardown_ms - 2.0) < 1e-9
+    manager.shutdown()
+    print("✅ BYE and CANCEL tear dialogs down and are counted")
+    return True
+
+
+def test_concurrent_setup():
+    """Slow pipeline startups for several calls overlap instead of queueing"""
+    manager = DialogManager({"sip": {"invite_workers": 4}})
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def setup(call_id):
+        with lock:
+            running.append(call_id)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.2)  # stands in for pipeline preroll
+        with lock:
+            running.remove(call_id)
+        manager.get(call_id).transition(PREROLLING)
+
+    start = time.time()
+    futures = []
+    for i in range(4):
+        dialog, _ = manager.create(f"call-{i}")
+        dialog.transition(TRYING)
+        futures.append(manager.submit(setup, f"call-{i}"))
+    for future in futures:
+        future.result(timeout=5)
+
+    assert peak[0] == 4, peak
+    assert time.time() - start < 0.6
+    assert manager.get_stats() == {PREROLLING: 4}
+    manager.shutdown()
+    print("✅ Several INVITEs are set up concurrently")
+    return True
+
+
+def main():
+    tests = [
+        test_state_machine,
+        test_retransmission,
+        test_expiry,
+        test_teardown,
+        test_concurrent_setup,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
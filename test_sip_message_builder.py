@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the outbound SIP message builder.
+Checks that Call-IDs, branches and tags are unique within one second, that
+Content-Length counts the encoded body bytes, and that NOTIFYs and responses
+carry the dialog headers they were built from.
+"""
+
+import os
+import re
+import sys
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sip_message_builder import IdGenerator, SipMessageBuilder
+
+CATALOG_XML = """<?xml version="1.0" encoding="GB2312"?>
+<Response>
+<CmdType>Catalog</CmdType>
+<SN>7</SN>
+<Item><Name>前门摄像机</Name></Item>
+</Response>"""
+
+
+def _builder():
+    return SipMessageBuilder("81000000465001000001", "10.0.0.2", 5080, "10.0.0.1", 5060)
+
+
+def _split(message):
+    head, body = message.split(b"\r\n\r\n", 1)
+    headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n")[1:])
+    return head.decode().split("\r\n")[0], headers, body
+
+
+def test_unique_ids():
+    """IDs never repeat, however fast messages are built"""
+    ids = IdGenerator()
+    generated = [ids.call_id("10.0.0.2") for _ in range(10000)]
+    assert len(set(generated)) == len(generated)
+    assert ids.branch().startswith("z9hG4bK")
+    assert IdGenerator().next() != IdGenerator().next(), "each process/client gets its own prefix"
+
+    builder = _builder()
+    first, call_id_1 = builder.message("<Notify/>")
+    second, call_id_2 = builder.message("<Notify/>")
+    assert call_id_1 != call_id_2
+    assert _split(first)[1]["Via"] != _split(second)[1]["Via"]
+    assert _split(first)[1]["CSeq"] == "1 MESSAGE" and _split(second)[1]["CSeq"] == "2 MESSAGE"
+    print("✅ Call-ID, branch, tag and CSeq are unique per message")
+    return True
+
+
+def test_message_content_length():
+    """MESSAGE bodies go out in GB2312 with a byte-correct Content-Length"""
+    message, call_id = _builder().message(CATALOG_XML)
+    start, headers, body = _split(message)
+    assert start == "MESSAGE sip:10.0.0.1:5060 SIP/2.0"
+    assert body == CATALOG_XML.encode("gbk")
+    assert int(headers["Content-Length"]) == len(body) != len(CATALOG_XML)
+    assert headers["Call-ID"] == call_id and call_id.endswith("@10.0.0.2")
+    assert re.match(r"<sip:81000000465001000001@10\.0\.0\.2:5080>;tag=\w+$", headers["From"])
+    assert headers["Content-Type"] == "Application/MANSCDP+xml"
+    print("✅ MESSAGE Content-Length counts encoded bytes")
+    return True
+
+
+def test_notify_and_response():
+    """NOTIFYs reuse the compiled dialog; responses echo the request headers"""
+    builder = _builder()
+    template = builder.compile_notify({
+        "remote_uri": "sip:34020000002000000001@10.0.0.1:5060",
+        "from_header": "<sip:81000000465001000001@3402000000>;tag=ours",
+        "to_header": "<sip:34020000002000000001@3402000000>;tag=theirs",
+        "call_id": "sub-1@10.0.0.1",
+        "event": "Catalog;id=3"
+    })
+    start, headers, body = _split(builder.notify(template, 4, "active;expires=60", CATALOG_XML))
+    assert start == "NOTIFY sip:34020000002000000001@10.0.0.1:5060 SIP/2.0"
+    assert (headers["Call-ID"], headers["CSeq"], headers["Event"]) == ("sub-1@10.0.0.1", "4 NOTIFY", "Catalog;id=3")
+    assert headers["Subscription-State"] == "active;expires=60"
+    assert int(headers["Content-Length"]) == len(body) == len(CATALOG_XML.encode("gbk"))
+
+    _, headers, body = _split(builder.notify(template, 5, "terminated;reason=timeout"))
+    assert headers["Content-Length"] == "0" and "Content-Type" not in headers and body == b""
+
+    request = ["Via: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bKabc", "From: <sip:a@b>;tag=1",
+               "To: <sip:c@d>;tag=ours", "Call-ID: xyz", "CSeq: 3 OPTIONS"]
+    start, headers, body = _split(builder.response(200, "OK", request))
+    assert start == "SIP/2.0 200 OK" and headers["CSeq"] == "3 OPTIONS" and headers["Content-Length"] == "0"
+
+    sdp = "v=0\r\no=x 0 0 IN IP4 10.0.0.2\r\n"
+    _, headers, body = _split(builder.response("200", "OK", request, sdp, "application/sdp"))
+    assert body == sdp.encode() and headers["Content-Type"] == "application/sdp"
+    assert int(headers["Content-Length"]) == len(body)
+    print("✅ NOTIFYs and responses are assembled from their dialog headers")
+    return True
+
+
+def main():
+    tests = [
+        test_unique_ids,
+        test_message_content_length,
+        test_notify_and_response,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process REGISTER client.
+Checks the digest response against a registrar-side computation, that
+refreshes reuse the cached nonce with the next nc, and that rejections and
+unanswered requests move the registration to failed.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sip_message_builder import SipMessageBuilder
+from sip_registration import DigestCredentials, RegistrationClient, REGISTERED, REGISTERING, FAILED
+
+CONFIG = {"sip": {"device_id": "81000000465001000001", "username": "81000000465001000001",
+                  "password": "admin123", "expires": 3600,
+                  "registration": {"refresh_fraction": 0.8, "transaction_timeout": 1.2}}}
+
+CHALLENGE = 'Digest realm="3402000000", nonce="{nonce}", qop="auth", algorithm=MD5{stale}'
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _client():
+    sent, states = [], []
+    messages = SipMessageBuilder("81000000465001000001", "10.0.0.2", 5080, "10.0.0.1", 5060)
+    client = RegistrationClient(CONFIG, messages, lambda m: sent.append(m.decode()) or True, states.append)
+    return client, sent, states
+
+
+def _answer(client, request, status, *headers):
+    call_id = re.search(r"^Call-ID: (.+)$", request, re.MULTILINE).group(1).strip()
+    cseq = re.search(r"^CSeq: (.+)$", request, re.MULTILINE).group(1).strip()
+    lines = [f"SIP/2.0 {status}", f"Call-ID: {call_id}", f"CSeq: {cseq}", *headers, "Content-Length: 0"]
+    return client.handle_response("\r\n".join(lines) + "\r\n\r\n")
+
+
+def _verify(request, password="admin123"):
+    """Registrar side: recompute the digest response of a REGISTER"""
+    header = re.search(r"^Authorization: Digest (.+)$", request, re.MULTILINE).group(1)
+    params = {k: v.strip('"') for k, v in re.findall(r'(\w+)=("[^"]*"|[^,\s]+)', header)}
+    ha1 = _md5(f"{params['username']}:{params['realm']}:{password}")
+    ha2 = _md5(f"REGISTER:{params['uri']}")
+    expected = _md5(f"{ha1}:{params['nonce']}:{params['nc']}:{params['cnonce']}:auth:{ha2}")
+    return params, params["response"] == expected
+
+
+def test_digest_response():
+    """Digest responses match RFC 2617 (qop=auth) and RFC 2069"""
+    credentials = DigestCredentials("Mufasa", "Circle Of Life")
+    assert credentials.authorization("GET", "/dir/index.html") is None
+    credentials.update('Digest realm="testrealm@host.com", qop="auth,auth-int", '
+                       'nonce="dcd98b7102dd2f0e8b11d0f600bfb0c093", opaque="5ccc069c403ebaf9f0171e9517f40e41"')
+    header = credentials.authorization("GET", "/dir/index.html")
+    params = {k: v.strip('"') for k, v in re.findall(r'(\w+)=("[^"]*"|[^,\s]+)', header)}
+    ha1 = _md5("Mufasa:testrealm@host.com:Circle Of Life")
+    expected = _md5(f"{ha1}:dcd98b7102dd2f0e8b11d0f600bfb0c093:00000001:{params['cnonce']}:auth:{_md5('GET:/dir/index.html')}")
+    assert params["response"] == expected and params["opaque"] == "5ccc069c403ebaf9f0171e9517f40e41"
+
+    legacy = DigestCredentials("a", "b")
+    legacy.update('Digest realm="r", nonce="n"')
+    expected = _md5(":".join([_md5("a:r:b"), "n", _md5("REGISTER:sip:x")]))
+    assert f'response="{expected}"' in legacy.authorization("REGISTER", "sip:x")
+    print("✅ Digest responses are computed correctly")
+    return True
+
+
+def test_register_and_refresh():
+    """The first REGISTER is challenged once; refreshes reuse the nonce in one round trip"""
+    client, sent, states = _client()
+    client.register()
+    assert states == [REGISTERING] and "Authorization" not in sent[0] and "Expires: 3600" in sent[0]
+    assert "Contact: <sip:81000000465001000001@10.0.0.2:5080>" in sent[0]
+
+    assert _answer(client, sent[0], "401 Unauthorized", f"WWW-Authenticate: {CHALLENGE.format(nonce='n1', stale='')}")
+    params, valid = _verify(sent[1])
+    assert valid and params["nc"] == "00000001" and "CSeq: 2 REGISTER" in sent[1]
+
+    _answer(client, sent[1], "200 OK", "Contact: <sip:x@10.0.0.2:5080>;expires=600")
+    assert states == [REGISTERING, REGISTERED] and client.granted == 600
+    assert abs(client._timer.interval - 480) < 1e-6, "refresh at 80% of the granted Expires"
+
+    client._refresh()
+    params, valid = _verify(sent[2])
+    assert valid and params["nonce"] == "n1" and params["nc"] == "00000002", "cached nonce, next nc"
+    assert _split_call_id(sent[2]) == _split_call_id(sent[0]), "refreshes keep the Call-ID"
+    _answer(client, sent[2], "200 OK", "Expires: 600")
+    assert len(sent) == 3 and states == [REGISTERING, REGISTERED] and client.stats["refreshes"] == 1
+    assert not _answer(client, sent[2].replace(_split_call_id(sent[2]), "other"), "200 OK")
+    client.stop()
+    print("✅ Refreshes cost one round trip with cached credentials")
+    return True
+
+
+def _split_call_id(request):
+    return re.search(r"^Call-ID: (.+)$", request, re.MULTILINE).group(1).strip()
+
+
+def test_failures():
+    """Stale nonces are retried, rejected credentials and silence fail the registration"""
+    client, sent, states = _client()
+    client.register()
+    _answer(client, sent[0], "401 Unauthorized", f"WWW-Authenticate: {CHALLENGE.format(nonce='n1', stale='')}")
+    _answer(client, sent[1], "401 Unauthorized", f"WWW-Authenticate: {CHALLENGE.format(nonce='n1', stale=', stale=true')}")
+    assert len(sent) == 3 and states == [REGISTERING], "a stale nonce is answered once more"
+    _answer(client, sent[2], "401 Unauthorized", f"WWW-Authenticate: {CHALLENGE.format(nonce='n1', stale='')}")
+    assert len(sent) == 3 and states == [REGISTERING, FAILED], "the same nonce rejected twice fails"
+
+    client, sent, states = _client()
+    client.register()
+    time.sleep(1.8)
+    assert states == [REGISTERING, FAILED], states
+    assert len(sent) >= 2 and len(set(sent)) == 1, "retransmissions repeat the request unchanged"
+    client.stop()
+    print("✅ Rejected or unanswered REGISTERs fail the registration")
+    return True
+
+
+def main():
+    tests = [
+        test_digest_response,
+        test_register_and_refresh,
+        test_failures,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
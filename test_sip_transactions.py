@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for the server transaction cache.
+Checks that requests are keyed on (Call-ID, CSeq, branch), that
+retransmissions get the cached response instead of being handled again,
+and that entries expire after the transaction lifetime.
+"""
+
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from sip_transactions import TransactionCache, request_key, transaction_key
+
+INVITE = """INVITE sip:81000000461310000001@10.0.0.2:5080 SIP/2.0
+Via: SIP/2.0/UDP 10.0.0.1:5060;rport;branch=z9hG4bK1234
+Via: SIP/2.0/UDP 10.0.0.9:5060;branch=z9hG4bKproxy
+From: <sip:34020000002000000001@3402000000>;tag=abc
+To: <sip:81000000461310000001@3402000000>
+Call-ID: 42@10.0.0.1
+CSeq: 20 INVITE
+Content-Length: 0"""
+
+
+def test_request_keys():
+    """Keys come from Call-ID, CSeq and the top Via branch, in long or compact form"""
+    key = request_key(INVITE)
+    assert key == ("42@10.0.0.1", "20", "INVITE", "z9hG4bK1234"), key
+    compact = "v: SIP/2.0/UDP 10.0.0.1:5060;branch=z9hG4bK1234\ni: 42@10.0.0.1\nCSeq: 20 INVITE"
+    assert request_key(compact) == key
+    assert request_key(INVITE.replace("CSeq: 20", "CSeq: 21")) != key, "a new CSeq is a new transaction"
+    assert request_key(INVITE.replace(";rport;branch=z9hG4bK1234", "")) is None, "no branch, no key"
+    assert transaction_key("42@10.0.0.1", "20 message", "SIP/2.0/UDP h;branch=b")[2] == "MESSAGE"
+    assert transaction_key("", "20 MESSAGE", "SIP/2.0/UDP h;branch=b") is None
+    print("✅ Requests are keyed on their transaction")
+    return True
+
+
+def test_retransmissions():
+    """Retransmissions get the original's entry and its cached response"""
+    cache = TransactionCache({})
+    key = request_key(INVITE)
+    is_new, entry = cache.begin(key)
+    assert is_new and entry["response"] is None
+
+    is_new, entry = cache.begin(key)
+    assert not is_new and entry["response"] is None, "retransmitted before any response was sent"
+    cache.respond(key, b"SIP/2.0 100 Trying\r\n\r\n")
+    cache.respond(key, b"SIP/2.0 200 OK\r\n\r\n")
+    is_new, entry = cache.begin(key)
+    assert not is_new and entry["response"] == b"SIP/2.0 200 OK\r\n\r\n", "the last response is replayed"
+    assert entry["retransmissions"] == 2
+
+    stats = cache.get_stats()
+    assert stats["requests"] == 1 and stats["retransmissions"] == 2 and stats["replayed"] == 1
+    cache.respond(("other", "1", "MESSAGE", "b"), b"ignored")
+    assert cache.get_stats()["cached"] == 1
+    print("✅ Retransmissions are answered from the cache")
+    return True
+
+
+def test_expiry_and_bounds():
+    """Entries expire after ttl and the cache keeps at most max_entries"""
+    cache = TransactionCache({"sip": {"transactions": {"ttl": 0.1, "max_entries": 3}}})
+    key = request_key(INVITE)
+    cache.begin(key)
+    time.sleep(0.15)
+    assert cache.begin(key)[0], "an expired transaction is new again"
+
+    for cseq in range(5):
+        cache.begin(("call", str(cseq), "MESSAGE", "b"))
+    stats = cache.get_stats()
+    assert stats["cached"] == 3 and stats["evicted"] == 3
+    assert cache.begin(("call", "4", "MESSAGE", "b"))[0] is False
+    assert cache.begin(("call", "0", "MESSAGE", "b"))[0] is True, "the oldest entries were dropped"
+    print("✅ Transactions expire and the cache stays bounded")
+    return True
+
+
+def main():
+    tests = [
+        test_request_keys,
+        test_retransmissions,
+        test_expiry_and_bounds,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
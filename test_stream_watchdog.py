@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the buffer-flow watchdog.
+Feeds buffers the way the sink pad probes do and checks that the timer
+wheel flags stalled streams once, leaves flowing and paused ones alone,
+and notices when data comes back.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from stream_watchdog import StreamWatchdog
+
+
+def _make_watchdog(stall_ms=150, startup_ms=150):
+    return StreamWatchdog({"media": {"watchdog": {
+        "stall_ms": stall_ms,
+        "startup_ms": startup_ms,
+        "tick_ms": 10,
+        "wheel_slots": 8  # small wheel so deadlines wrap around it
+    }}})
+
+
+def _feed_for(watchdog, stream_id, seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        watchdog.feed(stream_id, 1400, pts=int(time.time() * 1e9))
+        time.sleep(0.02)
+
+
+def test_flowing_stream_not_flagged():
+    """A stream that keeps delivering buffers is never reported"""
+    watchdog = _make_watchdog()
+    stalls = []
+    watchdog.register("live", stalls.append)
+    _feed_for(watchdog, "live", 0.5)
+
+    stats = watchdog.get_stats("live")
+    assert not stalls and not stats["stalled"], stats
+    assert stats["buffers"] > 10 and stats["bytes"] == stats["buffers"] * 1400
+    assert stats["last_pts"] is not None
+    watchdog.stop()
+    print("✅ Flowing stream is left alone")
+    return True
+
+
+def test_stall_detected_once():
+    """A stream whose data stops is reported once, not on every tick"""
+    watchdog = _make_watchdog()
+    stalled = threading.Event()
+    calls = []
+
+    def on_stall(stream_id):
+        calls.append(stream_id)
+        stalled.set()
+
+    watchdog.register("camera", on_stall)
+    _feed_for(watchdog, "camera", 0.2)
+    assert stalled.wait(1), "stall not detected"
+    time.sleep(0.5)
+
+    assert calls == ["camera"], calls
+    assert watchdog.is_stalled("camera")
+    assert watchdog.get_stats("camera")["stalls"] == 1
+
+    watchdog.feed("camera", 1400)
+    assert not watchdog.is_stalled("camera"), "flow resuming clears the stall"
+    watchdog.stop()
+    print("✅ Stalled stream is flagged once and cleared when data returns")
+    return True
+
+
+def test_startup_grace_and_suspend():
+    """New streams get the startup grace time and paused streams are not flagged"""
+    watchdog = _make_watchdog(stall_ms=100, startup_ms=400)
+    stalls = []
+    watchdog.register("slow-start", stalls.append)
+    watchdog.register("paused", stalls.append)
+    watchdog.suspend("paused")
+
+    time.sleep(0.25)
+    assert not stalls, "no stall inside the startup grace time"
+    time.sleep(0.5)
+    assert stalls == ["slow-start"], stalls
+
+    watchdog.resume("paused")
+    _feed_for(watchdog, "paused", 0.2)
+    assert "paused" not in stalls
+    watchdog.stop()
+    print("✅ Startup grace and suspended streams are respected")
+    return True
+
+
+def test_unwatch():
+    """Unwatched streams leave the wheel and report their final counters"""
+    watchdog = _make_watchdog()
+    stalls = []
+    watchdog.register("gone", stalls.append)
+    watchdog.feed("gone", 1000)
+    final = watchdog.unwatch("gone")
+
+    assert final["buffers"] == 1 and final["bytes"] == 1000
+    time.sleep(0.4)
+    assert not stalls
+    assert watchdog.get_stats() == {}
+    assert not any(watchdog.slots)
+    watchdog.stop()
+    print("✅ Unwatched stream is removed from the timer wheel")
+    return True
+
+
+def main():
+    tests = [
+        test_flowing_stream_not_flagged,
+        test_stall_detected_once,
+        test_startup_grace_and_suspend,
+        test_unwatch,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
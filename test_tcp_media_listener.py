@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled TCP-passive media listener.
+Connects to the listener over loopback like a platform with a=setup:active
+and checks port/SSRC matching and RFC 4571 framing.
+"""
+
+import os
+import sys
+import socket
+import struct
+import time
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+from tcp_media_listener import TcpMediaListener
+
+
+def _free_port_range(count):
+    """Find a run of free TCP ports on loopback"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    start = sock.getsockname()[1]
+    sock.close()
+    start = min(start, 65000 - count)
+    return [start, start + count - 1]
+
+
+def _make_listener(count=4):
+    return TcpMediaListener({"media": {
+        "tcp_passive_port_range": _free_port_range(count),
+        "tcp_passive_bind_ip": "127.0.0.1",
+        "tcp_passive_accept_timeout": 5
+    }})
+
+
+def _rtp(ssrc, seq, payload=b"\x00" * 100):
+    return struct.pack("!BBHII", 0x80, 96, seq, 0, ssrc) + payload
+
+
+def _read_frames(sock, count):
+    sock.settimeout(2)
+    data = b""
+    frames = []
+    while len(frames) < count:
+        data += sock.recv(65536)
+        while len(data) >= 2:
+            length = struct.unpack("!H", data[:2])[0]
+            if len(data) < 2 + length:
+                break
+            frames.append(data[2:2 + length])
+            data = data[2 + length:]
+    return frames
+
+
+def _wait_connected(listener, session_id):
+    for _ in range(50):
+        stats = listener.get_stats(session_id)
+        if stats and stats["connected"]:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_port_pool():
+    """Ports are handed out once and come back when the session closes"""
+    listener = _make_listener(2)
+    first = listener.reserve_port()
+    second = listener.reserve_port()
+    assert first and second and first != second
+    assert listener.reserve_port() is None, "pool of two must be exhausted"
+
+    listener.open_session("s1", first)
+    listener.close_session("s1")
+    assert listener.reserve_port() == first
+    listener.stop()
+    print("✅ Port pool reserves and releases ports")
+    return True
+
+
+def test_match_by_port():
+    """A connection on a reserved port is bound to its session and receives framed RTP"""
+    listener = _make_listener()
+    port = listener.reserve_port()
+    listener.open_session("s1", port, "0100000001")
+
+    assert not listener.send("s1", _rtp(1, 0)), "nothing can be sent before the platform connects"
+
+    client = socket.create_connection(("127.0.0.1", port))
+    assert _wait_connected(listener, "s1")
+
+    packets = [_rtp(100000001, seq, bytes([seq]) * 1400) for seq in range(20)]
+    for packet in packets:
+        assert listener.send("s1", packet)
+    assert _read_frames(client, len(packets)) == packets
+
+    stats = listener.get_stats("s1")
+    assert stats["frames_sent"] == 20 and stats["dropped"] == 1, stats
+    client.close()
+    listener.stop()
+    print("✅ Connection matched by port receives RFC 4571 frames")
+    return True
+
+
+def test_match_by_ssrc():
+    """Sessions sharing a port are told apart by the SSRC the platform sends first"""
+    listener = _make_listener()
+    port = listener.reserve_port()
+    listener.open_session("a", port, "0100000001")
+    listener.open_session("b", port, "0100000002")
+
+    client = socket.create_connection(("127.0.0.1", port))
+    rtcp = struct.pack("!BBHI", 0x81, 201, 1, 100000002)
+    client.sendall(struct.pack("!H", len(rtcp)) + rtcp)
+    assert _wait_connected(listener, "b")
+    assert not listener.get_stats("a")["connected"]
+
+    listener.send("b", _rtp(100000002, 1))
+    assert _read_frames(client, 1) == [_rtp(100000002, 1)]
+    client.close()
+    listener.stop()
+    print("✅ Shared port matches connection by SSRC")
+    return True
+
+
+def test_connect_before_session():
+    """A platform that connects before the session is registered is matched later"""
+    listener = _make_listener()
+    port = listener.reserve_port()
+    client = socket.create_connection(("127.0.0.1", port))
+    time.sleep(0.2)
+
+    listener.open_session("late", port)
+    assert _wait_connected(listener, "late")
+    client.close()
+    listener.stop()
+    print("✅ Early connection is matched once the session opens")
+    return True
+
+
+def main():
+    tests = [
+        test_port_pool,
+        test_match_by_port,
+        test_match_by_ssrc,
+        test_connect_before_session,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Test script for the batched UDP egress.
+Sends RTP-sized packets for several streams over loopback through sendmmsg
+and GSO and checks that every datagram arrives intact with per-stream counters.
+"""
+
+import errno
+import os
+import sys
+import socket
+
+# Add the src directory to the Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(current_dir, 'src')
+sys.path.insert(0, src_dir)
+
+import udp_egress
+from udp_egress import UdpEgress, sendmmsg, send_gso, gso_supported, sockaddr_in
+
+
+def _receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    return sock, sock.getsockname()[1]
+
+
+def _drain(sock, count):
+    received = []
+    for _ in range(count):
+        received.append(sock.recv(65535))
+    return received
+
+
+def test_sockaddr_layout():
+    """sockaddr_in is 16 bytes with network-order port"""
+    addr = sockaddr_in("127.0.0.1", 5004)
+    assert len(addr) == 16
+    assert addr[2:4] == b"\x13\x8c" and addr[4:8] == b"\x7f\x00\x00\x01"
+    print("✅ sockaddr_in layout is correct")
+    return True
+
+
+def test_sendmmsg_multiple_destinations():
+    """One sendmmsg call delivers to several destinations in order"""
+    rx1, port1 = _receiver()
+    rx2, port2 = _receiver()
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    packets = [bytes([i]) * 1200 for i in range(6)]
+    addresses = [("127.0.0.1", port1 if i % 2 == 0 else port2) for i in range(6)]
+    assert sendmmsg(tx, packets, addresses) == 6
+
+    assert _drain(rx1, 3) == packets[0::2]
+    assert _drain(rx2, 3) == packets[1::2]
+    for sock in (rx1, rx2, tx):
+        sock.close()
+    print("✅ sendmmsg delivers to multiple destinations")
+    return True
+
+
+def test_gso_segments():
+    """GSO runs are split back into the original datagrams"""
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if not gso_supported(tx):
+        tx.close()
+        print("✅ GSO not supported by this kernel (skipped)")
+        return True
+
+    rx, port = _receiver()
+    packets = [bytes([i]) * 1400 for i in range(5)] + [b"\xff" * 300]
+    calls = send_gso(tx, packets, ("127.0.0.1", port))
+    assert calls == 1, calls
+    assert _drain(rx, len(packets)) == packets
+    rx.close()
+    tx.close()
+    print("✅ GSO delivers segmented datagrams")
+    return True
+
+
+def test_egress_flush_and_stats():
+    """Queued packets of all streams go out on flush with per-stream counters"""
+    rx1, port1 = _receiver()
+    rx2, port2 = _receiver()
+    egress = UdpEgress({"media": {"egress": {"udp": "sendmmsg", "tick_ms": 1000, "max_queue_packets": 4}}})
+    egress.register_stream("a", "127.0.0.1", port1)
+    egress.register_stream("b", "127.0.0.1", port2)
+
+    for i in range(6):
+        egress.enqueue("a", bytes([i]) * 100)
+    egress.enqueue("b", b"\x42" * 200)
+    egress.flush()
+
+    assert _drain(rx1, 4) == [bytes([i]) * 100 for i in range(2, 6)]
+    assert _drain(rx2, 1) == [b"\x42" * 200]
+
+    stats = egress.get_stats("a")
+    assert stats["packets_sent"] == 4 and stats["bytes_sent"] == 400, stats
+    assert stats["dropped"] == 2 and stats["batches"] == 1, stats
+    assert egress.unregister_stream("b")["packets_sent"] == 1
+    assert egress.get_stats("b") is None
+
+    egress.stop()
+    rx1.close()
+    rx2.close()
+    print("✅ Egress flush sends every stream and tracks counters")
+    return True
+
+
+def test_egress_mirrors():
+    """Mirrored streams reach every destination with their own SSRC"""
+    rx1, port1 = _receiver()
+    rx2, port2 = _receiver()
+    egress = UdpEgress({"media": {"egress": {"udp": "sendmmsg", "tick_ms": 1000}}})
+    egress.register_stream("a", "127.0.0.1", port1)
+    assert egress.add_mirror("a", "call-2", "127.0.0.1", port2, "0100000002")
+
+    packet = bytes([0x80, 0x60, 0, 1]) + b"\x00" * 4 + (100000001).to_bytes(4, "big") + b"payload"
+    egress.enqueue("a", packet)
+    egress.flush()
+    assert _drain(rx1, 1) == [packet]
+    mirrored = _drain(rx2, 1)[0]
+    assert int.from_bytes(mirrored[8:12], "big") == 100000002 and mirrored[12:] == b"payload"
+    assert mirrored[:8] == packet[:8], "sequence numbers and timestamps are kept"
+    assert egress.get_stats("a")["mirrors"] == 1
+
+    assert egress.promote_mirror("a", "call-2")
+    egress.enqueue("a", packet)
+    egress.flush()
+    assert int.from_bytes(_drain(rx2, 1)[0][8:12], "big") == 100000002
+    assert egress.get_stats("a")["mirrors"] == 0 and not egress.remove_mirror("a", "call-2")
+
+    egress.stop()
+    rx1.close()
+    rx2.close()
+    print("✅ Mirrored streams are sent with rewritten SSRCs")
+    return True
+
+
+def test_egress_send_failures():
+    """Only packets the kernel took are counted; a full buffer keeps the rest queued"""
+    rx, port = _receiver()
+    egress = UdpEgress({"media": {"egress": {"udp": "sendmmsg", "tick_ms": 1000}}})
+    egress.register_stream("bad", "127.0.0.1", 0)   # the kernel refuses port 0 with EINVAL
+    egress.register_stream("a", "127.0.0.1", port)
+    for i in range(2):
+        egress.enqueue("bad", b"\x00" * 100)
+        egress.enqueue("a", bytes([i]) * 100)
+    egress.flush()
+    assert _drain(rx, 2) == [b"\x00" * 100, b"\x01" * 100], "one bad destination does not block the others"
+    bad = egress.get_stats("bad")
+    assert bad["packets_sent"] == 0 and bad["errors"] == 2 and bad["dropped"] == 2 and bad["queued"] == 0, bad
+    assert egress.get_stats("a")["packets_sent"] == 2
+
+    real_sendmmsg = udp_egress.sendmmsg
+
+    def buffer_full(sock, packets, addresses=None):
+        real_sendmmsg(sock, packets[:1], addresses[:1])
+        error = OSError(errno.ENOBUFS, "No buffer space available")
+        error.sent = 1
+        raise error
+
+    egress.unregister_stream("bad")
+    for i in range(2, 5):
+        egress.enqueue("a", bytes([i]) * 100)
+    udp_egress.sendmmsg = buffer_full
+    try:
+        egress.flush()
+    finally:
+        udp_egress.sendmmsg = real_sendmmsg
+    stats = egress.get_stats("a")
+    assert stats["packets_sent"] == 3 and stats["queued"] == 2 and stats["dropped"] == 0, stats
+    egress.flush()
+    assert _drain(rx, 3) == [bytes([i]) * 100 for i in range(2, 5)], "unsent packets keep their order"
+    assert egress.get_stats("a")["packets_sent"] == 5
+
+    egress.stop()
+    rx.close()
+    print("✅ Send failures are counted per packet and unsent packets are kept")
+    return True
+
+
+def main():
+    tests = [
+        test_sockaddr_layout,
+        test_sendmmsg_multiple_destinations,
+        test_gso_segments,
+        test_egress_flush_and_stats,
+        test_egress_mirrors,
+        test_egress_send_failures,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n🎯 Summary: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())